@@ -1,26 +1,39 @@
 import os
 import logging
-import time
+import asyncio
 import json
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Tuple
 from fastapi import FastAPI, HTTPException, Request, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from dotenv import load_dotenv
 import redis.asyncio as redis
 
 # Импорты для авторизации и БД
-from sqlalchemy.orm import Session
-from app.core.database import get_db, User, UserBot
-from app.core.auth import get_password_hash, verify_password, create_access_token, decode_access_token
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import SessionLocal, get_db, init_db, User, UserBot
+from app.core.auth import CurrentUser, hash_password, check_password, create_access_token, decode_access_token, token_user_cache, track_user_changes
 from fastapi.security import OAuth2PasswordBearer
 
 from app.config import load_config
-from app.adapters.llm.langchain_adapter import LangChainLLMAdapter
+from app.adapters.llm.langchain_adapter import get_llm_adapter
 from app.adapters.retriever.qdrant_adapter import QdrantRetrieverAdapter
+from app.adapters.retriever.reranker import with_reranking
+from app.adapters.retriever.cache import with_cache
+from app.adapters.retriever.score_gate import with_score_gate
+from app.adapters.retriever.kb_watcher import KnowledgeBaseWatcher
+from app.adapters.intent.centroid_classifier import create_intent_classifier
+from app.adapters.conversation.factory import create_conversation_store
+from app.adapters.conversation.turn_lock import SessionBusyError, SessionTurnGuard
+from app.core.models.conversation import Turn, client_turn, bot_turn
+from app.core.ports.conversation import ConversationStore
+from app.utils.metrics import get_metrics
 from app.core.scenarios.universal_graph import UniversalScenarioGraph
 from app.core.scenarios.onboarding.graph import OnboardingScenarioGraph
 from app.adapters.openai_assistants.adapter import OpenAIAssistantsAdapter
+from app.adapters.openai_assistants.thread_pool import AssistantsThreadPool
 from app.core.config.bots_registry import BOTS_REGISTRY
 
 # Настройка логирования
@@ -42,72 +55,137 @@ app.add_middleware(
 )
 
 # Глобальные переменные
-# Теперь мы храним графы для всех ботов
+# Боты: конфиги для общего скомпилированного графа (сам граф один на процесс)
 scenario_graphs: Dict[str, UniversalScenarioGraph] = {}
+# Ретриверы ботов: коллекции привязываются в фоне, готовность видна в /health
+retrievers: Dict[str, QdrantRetrieverAdapter] = {}
 onboarding_graph: Optional[OnboardingScenarioGraph] = None
+kb_watcher: Optional[KnowledgeBaseWatcher] = None
 assistants_adapter: Optional[OpenAIAssistantsAdapter] = None
+# Готовые треды для сессий ботов asst_* (выдаются на /api/chat/init)
+thread_pool: Optional[AssistantsThreadPool] = None
 
 # Подключение к Redis
 # По умолчанию используем localhost, если не задано в .env
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
 redis_client = None
 SESSION_TTL_SECONDS = 20 * 60  # 20 минут
+# История сессий виджета (Redis-списки; без Redis — в памяти процесса)
+conversations: Optional[ConversationStore] = None
+# Ходы одной сессии идут по очереди (Redis-блокировка — для нескольких реплик)
+turn_guard: Optional[SessionTurnGuard] = None
+
+def llm_for_role(bot_config: dict, role: str):
+    """Модель для роли бота (ключ models: {"router": ..., "agent": ...}), по умолчанию OPENAI_MODEL_NAME."""
+    model_name = bot_config.get("models", {}).get(role) or cfg.get("OPENAI_MODEL_NAME", "gpt-4o-mini")
+    return get_llm_adapter(cfg.get("OPENAI_API_KEY"), cfg.get("OPENAI_API_BASE"), model_name)
 
 @app.on_event("startup")
 async def startup_event():
-    global scenario_graphs, redis_client, onboarding_graph, assistants_adapter
+    global scenario_graphs, redis_client, onboarding_graph, assistants_adapter, thread_pool, kb_watcher, conversations, turn_guard
     logger.info("Инициализация API сервера и LangGraph для всех ботов...")
+    await init_db()
     
+    redis_ok = False
     try:
         # Инициализация Redis
         redis_client = redis.from_url(REDIS_URL, decode_responses=True)
         # Проверяем подключение
         await redis_client.ping()
+        redis_ok = True
         logger.info(f"Успешное подключение к Redis по адресу {REDIS_URL}")
     except Exception as e:
         logger.error(f"Ошибка подключения к Redis: {e}")
         # В продакшене здесь можно сделать raise e, чтобы сервер не стартовал без базы
+
+    conversations = create_conversation_store(
+        os.getenv("CONVERSATION_STORE") or ("redis" if redis_ok else "memory"),
+        redis_client if redis_ok else None,
+        ttl_seconds=SESSION_TTL_SECONDS,
+    )
+    turn_lock = os.getenv("TURN_LOCK") or ("redis" if redis_ok else "local")
+    turn_guard = SessionTurnGuard(redis_client if turn_lock == "redis" else None)
     
     try:
-        # LLM у нас один на всех (можно сделать и разные, если нужно разные модели)
-        llm_adapter = LangChainLLMAdapter(
-            api_key=cfg.get("OPENAI_API_KEY"),
-            base_url=cfg.get("OPENAI_API_BASE"),
-            model_name=cfg.get("OPENAI_MODEL_NAME", "gpt-4o-mini")
-        )
+        # Адаптер LLM один на модель: боты с одинаковыми моделями делят его (см. llm_for_role)
+        llm_adapter = llm_for_role({}, "agent")
         
         # Инициализация адаптера для Assistants API
         assistants_adapter = OpenAIAssistantsAdapter(
             api_key=cfg.get("OPENAI_API_KEY"),
-            base_url=cfg.get("OPENAI_API_BASE")
+            base_url=cfg.get("OPENAI_API_BASE"),
+            streaming=cfg.get("ASSISTANTS_STREAMING"),
+            run_timeout_seconds=cfg.get("ASSISTANTS_RUN_TIMEOUT_SECONDS")
         )
         
+        if cfg.get("ASSISTANTS_THREAD_POOL_SIZE") > 0:
+            # Брошенные треды удаляются после истечения TTL сессии
+            thread_pool = AssistantsThreadPool(
+                assistants_adapter,
+                conversations,
+                redis_client if redis_ok else None,
+                size=cfg.get("ASSISTANTS_THREAD_POOL_SIZE"),
+                lease_seconds=SESSION_TTL_SECONDS,
+            )
+            # Без ботов asst_* треды не создаются: иначе воркер поднимется с первой их сессией
+            if await has_assistants_bots():
+                thread_pool.ensure_started()
+        
         # Инициализация графа Онбординга
         onboarding_graph = OnboardingScenarioGraph(llm_adapter, assistants_adapter)
         
+        if cfg.get("KB_WATCH_ENABLED"):
+            kb_watcher = KnowledgeBaseWatcher(cfg.get("KB_WATCH_INTERVAL_SECONDS"), cfg.get("KB_WATCH_DEBOUNCE_SECONDS"))
+
         # Инициализируем графы для каждого бота из реестра
         for bot_id, bot_config in BOTS_REGISTRY.items():
             logger.info(f"Инициализация бота: {bot_id} ({bot_config['name']})")
             
             # Для каждого бота свой ретривер (своя коллекция Qdrant)
-            retriever_adapter = QdrantRetrieverAdapter(
+            qdrant_adapter = QdrantRetrieverAdapter(
                 collection_name=bot_config["collection_name"],
                 knowledge_base_path=f"{bot_id}_kb.md", # Фолбэк, если нужно пересоздать
                 openai_api_key=cfg.get("OPENAI_API_KEY"),
-                openai_api_base=cfg.get("OPENAI_API_BASE")
+                openai_api_base=cfg.get("OPENAI_API_BASE"),
+                index_profile=bot_config.get("index_profile"),
+                faq=bot_config.get("faq")
             )
+            # Привязка/сборка коллекции идет в фоне, сервер начинает отвечать сразу
+            qdrant_adapter.start_background_init()
+            retrievers[bot_id] = qdrant_adapter
+            if kb_watcher:
+                kb_watcher.watch(qdrant_adapter.knowledge_base_path, qdrant_adapter.reload_knowledge_base)
+            retriever_adapter = with_reranking(qdrant_adapter, bot_config.get("rerank"))
+            # Отсечение неуверенных чанков (ключ score_gate в конфиге бота)
+            retriever_adapter = with_score_gate(retriever_adapter, bot_config.get("score_gate"), qdrant_adapter.collection_name)
+            retriever_adapter = with_cache(retriever_adapter, qdrant_adapter.collection_name, qdrant_adapter.kb_version)
             
-            # Создаем универсальный граф с конфигом конкретного бота
-            graph = UniversalScenarioGraph(llm_adapter, retriever_adapter, bot_config)
+            # Классификатор интента на эмбеддингах бота (ключ intent_router в конфиге бота)
+            intent_classifier = create_intent_classifier(bot_id, lambda adapter=qdrant_adapter: adapter.embeddings, bot_config.get("intent_router"))
+
+            # Бот — это только его конфиг для общего графа (компилируется один раз на процесс)
+            graph = UniversalScenarioGraph(
+                llm_for_role(bot_config, "agent"),
+                retriever_adapter,
+                bot_config,
+                intent_classifier=intent_classifier,
+                router_llm=llm_for_role(bot_config, "router"),
+            )
             scenario_graphs[bot_id] = graph
             
         logger.info(f"Успешно инициализировано ботов: {len(scenario_graphs)}")
+        if kb_watcher:
+            asyncio.create_task(kb_watcher.start(), name="kb_watcher")
     except Exception as e:
         logger.error(f"Ошибка при инициализации LangGraph: {e}")
 
 @app.on_event("shutdown")
 async def shutdown_event():
     global redis_client
+    if kb_watcher:
+        kb_watcher.stop()
+    if thread_pool:
+        await thread_pool.close()
     if redis_client:
         await redis_client.close()
         logger.info("Подключение к Redis закрыто.")
@@ -117,6 +195,8 @@ class ChatRequest(BaseModel):
     bot_id: str
     message: str
     session_id: str
+    # Id сообщения на клиенте: повтор (двойной клик, ретрай) не генерирует ответ заново
+    client_message_id: Optional[str] = None
 
 class ChatResponse(BaseModel):
     reply: str
@@ -131,24 +211,25 @@ class AuthRequest(BaseModel):
 
 # --- Эндпоинты Авторизации ---
 @app.post("/api/auth/register")
-async def register_user(request: AuthRequest, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == request.email).first()
+async def register_user(request: AuthRequest, db: AsyncSession = Depends(get_db)):
+    user = (await db.execute(select(User).where(User.email == request.email))).scalar_one_or_none()
     if user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    hashed_password = get_password_hash(request.password)
+    # bcrypt — в пуле хэширования, event loop тем временем обслуживает чат
+    hashed_password = await hash_password(request.password)
     new_user = User(email=request.email, hashed_password=hashed_password)
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     
     access_token = create_access_token(data={"sub": new_user.email})
     return {"access_token": access_token, "token_type": "bearer"}
 
 @app.post("/api/auth/login")
-async def login_user(request: AuthRequest, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == request.email).first()
-    if not user or not verify_password(request.password, user.hashed_password):
+async def login_user(request: AuthRequest, db: AsyncSession = Depends(get_db)):
+    user = (await db.execute(select(User).where(User.email == request.email))).scalar_one_or_none()
+    if not user or not await check_password(request.password, user.hashed_password):
         raise HTTPException(status_code=401, detail="Incorrect email or password")
     
     access_token = create_access_token(data={"sub": user.email})
@@ -156,63 +237,73 @@ async def login_user(request: AuthRequest, db: Session = Depends(get_db)):
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+# Изменение или удаление пользователя сбрасывает его токены в кэше
+track_user_changes(User)
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> CurrentUser:
+    # Повторные запросы с тем же токеном не декодируют JWT и не ходят в БД
+    current = token_user_cache.get(token)
+    if current is not None:
+        return current
     payload = decode_access_token(token)
     if payload is None:
         raise HTTPException(status_code=401, detail="Invalid token")
     email: str = payload.get("sub")
-    user = db.query(User).filter(User.email == email).first()
+    user = (await db.execute(select(User).where(User.email == email))).scalar_one_or_none()
     if user is None:
         raise HTTPException(status_code=401, detail="User not found")
-    return user
+    # В кэш — id и клеймы, а не ORM-объект: после закрытия сессии он отвязан (DetachedInstanceError)
+    current = CurrentUser(id=user.id, email=user.email, token_exp=payload.get("exp"))
+    token_user_cache.put(token, current)
+    return current
 
-async def get_session_history(session_key: str) -> List[str]:
-    """Получает историю сессии из Redis"""
-    if not redis_client:
-        return []
-    
-    data = await redis_client.get(session_key)
-    if data:
-        try:
-            return json.loads(data)
-        except json.JSONDecodeError:
-            return []
-    return []
-
-async def get_onboarding_state(session_key: str) -> dict:
-    """Получает стейт онбординга из Redis"""
-    if not redis_client:
-        return {}
-    
-    data = await redis_client.get(f"state:{session_key}")
-    if data:
-        try:
-            return json.loads(data)
-        except json.JSONDecodeError:
-            return {}
-    return {}
-
-async def save_session_history(session_key: str, history: List[str], state: dict = None):
-    """Сохраняет историю сессии и стейт в Redis с TTL"""
-    if not redis_client:
-        return
-    
-    # Ограничиваем историю последними 20 сообщениями
-    if len(history) > 20:
-        history = history[-20:]
-        
-    await redis_client.setex(
-        name=session_key,
-        time=SESSION_TTL_SECONDS,
-        value=json.dumps(history)
-    )
-    
-    if state:
-        await redis_client.setex(
-            name=f"state:{session_key}",
-            time=SESSION_TTL_SECONDS,
-            value=json.dumps(state)
-        )
+async def session_thread_id(session_key: str, state: dict) -> str:
+    """Тред Assistants API сессии: хранится в стейте, выдается на /api/chat/init"""
+    thread_id = state.get("thread_id")
+    if not thread_id:
+        # Сессии, начатые без /api/chat/init (или до пула)
+        thread_id = await acquire_thread(session_key)
+        await save_session(session_key, [], state={"thread_id": thread_id})
+    return thread_id
+
+async def has_assistants_bots() -> bool:
+    """Есть ли боты Assistants API: в реестре или созданные пользователями"""
+    if any(bot_id.startswith("asst_") for bot_id in BOTS_REGISTRY):
+        return True
+    try:
+        async with SessionLocal() as db:
+            return (await db.execute(select(UserBot.id).limit(1))).first() is not None
+    except Exception as e:
+        # Пул все равно поднимется с первой сессией бота asst_*
+        logger.warning(f"[ThreadPool] Не удалось проверить ботов Assistants API: {e}")
+        return False
+
+async def acquire_thread(session_key: str) -> str:
+    """Тред из пула (без обращения к OpenAI), без пула — новый"""
+    if thread_pool:
+        thread_pool.ensure_started()
+        return await thread_pool.acquire(session_key)
+    return await assistants_adapter.create_thread()
+
+def answered_state(request: ChatRequest, reply: str, state: dict = None) -> Optional[dict]:
+    """Поля стейта хода + client_message_id и ответ на него (для повторов того же сообщения)"""
+    if not request.client_message_id:
+        return state
+    return {**(state or {}), "client_message_id": request.client_message_id, "reply": reply}
+
+def replayed_reply(request: ChatRequest, state: dict) -> Optional[str]:
+    """Сохраненный ответ, если это сообщение уже отвечено (ретрай после обрыва, другая реплика)"""
+    if request.client_message_id and state.get("client_message_id") == request.client_message_id:
+        return state.get("reply", "")
+    return None
+
+async def load_session(session_key: str) -> Tuple[List[Turn], dict]:
+    """Окно истории и стейт сессии — одно обращение к хранилищу"""
+    return await conversations.load(session_key)
+
+async def save_session(session_key: str, turns: List[Turn], state: dict = None, reset: bool = False):
+    """Дописывает реплики хода и поля стейта одной транзакцией (TTL сессии продлевается)"""
+    await conversations.save(session_key, turns, state, reset=reset)
 
 @app.post("/api/chat/init", response_model=ChatResponse)
 async def init_endpoint(request: InitRequest):
@@ -226,8 +317,7 @@ async def init_endpoint(request: InitRequest):
     # Специальная логика для Бота-Онбордера
     if bot_id == "creator_bot":
         greeting = "Привет! 👋 Я ИИ-архитектор. Я помогу вам создать собственного умного бота для вашего бизнеса за пару минут. Как называется ваша компания или продукт?"
-        history = [f"Бот: {greeting}"]
-        await save_session_history(session_key, history, state={"step": "collect_name"})
+        await save_session(session_key, [bot_turn(greeting)], state={"step": "collect_name"}, reset=True)
         return ChatResponse(reply=greeting)
         
     # Логика для обычных ботов
@@ -240,9 +330,13 @@ async def init_endpoint(request: InitRequest):
         bot_config = BOTS_REGISTRY[bot_id]
         greeting = bot_config.get("greeting", "Здравствуйте! Чем могу помочь?")
     
-    # Инициализируем историю с приветствием и сохраняем в Redis
-    history = [f"Бот: {greeting}"]
-    await save_session_history(session_key, history)
+    # Боту Assistants API тред выдается сразу: первое сообщение не ждет threads.create
+    state = None
+    if bot_id.startswith("asst_") and thread_pool:
+        state = {"thread_id": await acquire_thread(session_key)}
+
+    # Новая сессия: чистая история, начинается с приветствия
+    await save_session(session_key, [bot_turn(greeting)], state=state, reset=True)
     
     logger.info(f"Инициализирована новая сессия для бота {bot_id}: {request.session_id}")
     return ChatResponse(reply=greeting)
@@ -251,36 +345,46 @@ async def init_endpoint(request: InitRequest):
 async def chat_endpoint(request: ChatRequest):
     """
     Эндпоинт для обработки сообщений.
-    Берет историю из Redis.
+    Берет историю из Redis. Ходы одной сессии выполняются по очереди.
     """
+    session_key = f"session:{request.bot_id}:{request.session_id}"
+    try:
+        return await turn_guard.run(session_key, request.client_message_id, lambda: chat_turn(request, session_key))
+    except SessionBusyError as e:
+        logger.warning(f"{e}")
+        raise HTTPException(status_code=409, detail="Предыдущее сообщение еще обрабатывается")
+
+async def chat_turn(request: ChatRequest, session_key: str) -> ChatResponse:
+    """Ход сессии: чтение истории → генерация ответа → запись (под блокировкой сессии)"""
     bot_id = request.bot_id
-    session_key = f"session:{bot_id}:{request.session_id}"
     
-    # Получаем историю из Redis
-    formatted_history = await get_session_history(session_key)
-    logger.info(f"Получен запрос от сессии {session_key}: '{request.message}'. Длина истории: {len(formatted_history)}")
+    # История и стейт сессии одним обращением к Redis
+    history, state = await load_session(session_key)
+    logger.info(f"Получен запрос от сессии {session_key}: '{request.message}'. Длина истории: {len(history)}")
+
+    # Повтор уже отвеченного сообщения (ретрай после обрыва, другая реплика) — тот же ответ без генерации
+    reply = replayed_reply(request, state)
+    if reply is not None:
+        logger.info(f"Повтор сообщения {request.client_message_id} в сессии {session_key}, отдаем сохраненный ответ")
+        return ChatResponse(reply=reply)
     
     # 1. Логика для Бота-Онбордера
     if bot_id == "creator_bot":
         if not onboarding_graph:
             raise HTTPException(status_code=500, detail="Бот-Онбордер не инициализирован")
             
-        current_state = await get_onboarding_state(session_key)
-        
         try:
             result = await onboarding_graph.execute(
                 question=request.message,
-                history=formatted_history,
-                state_dict=current_state
+                history=history,
+                state_dict=state
             )
             
             response_text = result["reply"]
             new_state = result["state"]
             
-            # Обновляем историю и стейт
-            formatted_history.append(f"Клиент: {request.message}")
-            formatted_history.append(f"Бот: {response_text}")
-            await save_session_history(session_key, formatted_history, state=new_state)
+            # Дописываем ход и обновляем стейт
+            await save_session(session_key, [client_turn(request.message), bot_turn(response_text)], state=answered_state(request, response_text, new_state))
             
             return ChatResponse(reply=response_text)
             
@@ -293,14 +397,7 @@ async def chat_endpoint(request: ChatRequest):
         if not assistants_adapter:
             raise HTTPException(status_code=500, detail="Assistants Adapter не инициализирован")
             
-        # Для Assistants API нам нужен thread_id. Сохраним его в стейте сессии.
-        state = await get_onboarding_state(session_key)
-        thread_id = state.get("thread_id")
-        
-        if not thread_id:
-            thread_id = await assistants_adapter.create_thread()
-            state["thread_id"] = thread_id
-            await save_session_history(session_key, formatted_history, state=state)
+        thread_id = await session_thread_id(session_key, state)
             
         try:
             response_text = await assistants_adapter.send_message_and_get_response(
@@ -309,10 +406,8 @@ async def chat_endpoint(request: ChatRequest):
                 message=request.message
             )
             
-            # Обновляем локальную историю (хотя Assistants API хранит свою, нам нужна для виджета)
-            formatted_history.append(f"Клиент: {request.message}")
-            formatted_history.append(f"Бот: {response_text}")
-            await save_session_history(session_key, formatted_history, state=state)
+            # Дописываем локальную историю (хотя Assistants API хранит свою, нам нужна для виджета)
+            await save_session(session_key, [client_turn(request.message), bot_turn(response_text)], state=answered_state(request, response_text))
             
             return ChatResponse(reply=response_text)
             
@@ -330,14 +425,12 @@ async def chat_endpoint(request: ChatRequest):
         # Вызываем LangGraph конкретного бота с историей из Redis
         response_text = await graph.execute(
             question=request.message,
-            history=formatted_history,
+            history=history,
             session_id=request.session_id # Передаем session_id для Langfuse
         )
         
-        # Обновляем историю и сохраняем обратно в Redis
-        formatted_history.append(f"Клиент: {request.message}")
-        formatted_history.append(f"Бот: {response_text}")
-        await save_session_history(session_key, formatted_history)
+        # Дописываем ход в историю сессии
+        await save_session(session_key, [client_turn(request.message), bot_turn(response_text)], state=answered_state(request, response_text))
             
         logger.info(f"Ответ сгенерирован и сохранен в сессию {session_key}")
         return ChatResponse(reply=response_text)
@@ -345,6 +438,52 @@ async def chat_endpoint(request: ChatRequest):
         logger.error(f"Ошибка при обработке запроса: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Внутренняя ошибка сервера при генерации ответа")
 
+@app.post("/api/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest):
+    """
+    Ответ ботов Assistants API (asst_*) потоком Server-Sent Events:
+    `data: {"delta": "..."}` по мере генерации, в конце `event: done` с полным ответом
+    (или `event: error`). Ход сохраняется в сессию, как в /api/chat.
+    """
+    bot_id = request.bot_id
+    if not bot_id.startswith("asst_"):
+        raise HTTPException(status_code=400, detail="Стриминг доступен только для ботов Assistants API")
+    if not assistants_adapter:
+        raise HTTPException(status_code=500, detail="Assistants Adapter не инициализирован")
+
+    session_key = f"session:{bot_id}:{request.session_id}"
+
+    def sse(data: dict, event: Optional[str] = None) -> str:
+        payload = json.dumps(data, ensure_ascii=False)
+        return f"event: {event}\ndata: {payload}\n\n" if event else f"data: {payload}\n\n"
+
+    async def events():
+        parts = []
+        try:
+            # Блокировка сессии держится, пока идет стрим: ходы сессии не пересекаются, как в /api/chat
+            async with turn_guard.lock(session_key):
+                _, state = await load_session(session_key)
+                # Повтор того же client_message_id (в том числе ждавший блокировку, пока шел первый стрим) — сохраненный ответ
+                response_text = replayed_reply(request, state)
+                if response_text is not None:
+                    logger.info(f"Повтор сообщения {request.client_message_id} в сессии {session_key}, отдаем сохраненный ответ")
+                    yield sse({"delta": response_text})
+                    yield sse({"reply": response_text}, event="done")
+                    return
+                thread_id = await session_thread_id(session_key, state)
+                async for delta in assistants_adapter.stream_response(thread_id=thread_id, assistant_id=bot_id, message=request.message):
+                    parts.append(delta)
+                    yield sse({"delta": delta})
+                response_text = "".join(parts)
+                await save_session(session_key, [client_turn(request.message), bot_turn(response_text)], state=answered_state(request, response_text))
+        except Exception as e:
+            logger.error(f"Ошибка стрима Assistants API для сессии {session_key}: {e}", exc_info=True)
+            yield sse({"detail": "Ошибка при обращении к OpenAI Assistants"}, event="error")
+            return
+        yield sse({"reply": response_text}, event="done")
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.get("/health")
 async def health_check():
     redis_status = "ok"
@@ -355,13 +494,22 @@ async def health_check():
             redis_status = "error"
     else:
         redis_status = "not_configured"
+
+    knowledge_bases = {bot_id: retriever.status() for bot_id, retriever in retrievers.items()}
         
     return {
         "status": "ok", 
         "active_bots": list(scenario_graphs.keys()), 
-        "redis_status": redis_status
+        "redis_status": redis_status,
+        "ready": all(kb["ready"] for kb in knowledge_bases.values()),
+        "knowledge_bases": knowledge_bases
     }
 
+@app.get("/metrics")
+async def metrics():
+    """Метрики процесса (например, kb_reload_seconds — длительность горячей перезагрузки баз знаний)."""
+    return get_metrics().snapshot()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("api:app", host="0.0.0.0", port=8080, reload=True)
@@ -7,6 +7,7 @@ from app.adapters.channels.ozon.client import OzonClient
 from app.adapters.db.database_adapter import DatabaseAdapter
 from app.core.domain.models.marketplace_message import MarketplaceMessage
 from app.core.use_cases.answer_question import AnswerQuestionUseCase
+from app.utils.concurrency import PostThrottle, run_bounded
 
 logger = logging.getLogger(__name__)
 
@@ -16,12 +17,18 @@ class OzonChatWorker:
         ozon_client: OzonClient,
         db_adapter: DatabaseAdapter,
         answer_use_case: AnswerQuestionUseCase,
-        poll_interval: int = 60
+        poll_interval: int = 60,
+        concurrency: int = 1,
+        post_throttle: Optional[PostThrottle] = None
     ):
         self.ozon_client = ozon_client
         self.db_adapter = db_adapter
         self.answer_use_case = answer_use_case
         self.poll_interval = poll_interval
+        # Сколько чатов из пачки обрабатывать одновременно (их поиск в базе знаний объединяется в батчи)
+        self.concurrency = concurrency
+        # Отправки в чаты аккаунта — по одной с паузой, генерация ответов при этом параллельна
+        self.post_throttle = post_throttle or PostThrottle()
         self.is_running = False
 
     async def start(self):
@@ -45,131 +52,139 @@ class OzonChatWorker:
         if not chats_data:
             return
             
-        processed_count = 0
+        results = []
+
+        async def process(chat_info: dict):
+            results.append(await self._process_chat(chat_info))
+
+        await run_bounded(chats_data, process, self.concurrency, log_prefix="[OzonWorker-Chat]")
+        processed_count = sum(results)
+
+        if processed_count > 0:
+            logger.info(f"[OzonWorker-Chat] Обработано {processed_count} новых сообщений.")
+
+    async def _process_chat(self, chat_info: dict) -> bool:
+        chat = chat_info.get("chat", {})
+        chat_id = chat.get("chat_id")
         
-        for chat_info in chats_data:
-            chat = chat_info.get("chat", {})
-            chat_id = chat.get("chat_id")
+        if not chat_id:
+            return False
             
-            if not chat_id:
-                continue
-                
-            # Получаем историю чата
-            unread_count = chat_info.get("unread_count", 1)
-            history = await self.ozon_client.get_chat_history(chat_id, limit=unread_count + 5)
-            if not history or not history.get("messages"):
-                continue
-                
-            messages = history["messages"]
-            
-            # Собираем все непрочитанные сообщения от покупателя
-            customer_messages = []
-            last_msg_id = None
-            order_number = ""
+        # Получаем историю чата
+        unread_count = chat_info.get("unread_count", 1)
+        history = await self.ozon_client.get_chat_history(chat_id, limit=unread_count + 5)
+        if not history or not history.get("messages"):
+            return False
             
-            for msg in messages:
-                if not msg.get("is_read", True) and msg.get("user", {}).get("type") == "Customer":
-                    # Извлекаем текст
-                    data = msg.get("data", [])
-                    if data:
-                        text = data[-1] if isinstance(data, list) else str(data)
-                        customer_messages.append(text)
-                        
-                    if not last_msg_id:
-                        last_msg_id = str(msg.get("message_id"))
-                        
-                    if not order_number:
-                        order_number = msg.get("context", {}).get("order_number", "")
-            
-            if not customer_messages or not last_msg_id:
-                continue
-                
-            # Сообщения идут от новых к старым, поэтому переворачиваем для правильного порядка
-            customer_messages.reverse()
-            msg_text = "\n".join(customer_messages)
-            
-            # Собираем историю для контекста (до 10 последних сообщений)
-            chat_context = []
-            for msg in reversed(messages): # От старых к новым
-                user_type = msg.get("user", {}).get("type")
+        messages = history["messages"]
+        
+        # Собираем все непрочитанные сообщения от покупателя
+        customer_messages = []
+        last_msg_id = None
+        order_number = ""
+        
+        for msg in messages:
+            if not msg.get("is_read", True) and msg.get("user", {}).get("type") == "Customer":
+                # Извлекаем текст
                 data = msg.get("data", [])
                 if data:
                     text = data[-1] if isinstance(data, list) else str(data)
-                    prefix = "Клиент: " if user_type == "Customer" else "Бот: "
-                    chat_context.append(f"{prefix}{text}")
-            
-            # Оставляем только последние 10 сообщений в истории (исключая новые, которые еще не отвечены)
-            # В данном случае customer_messages - это новые. Мы не хотим их дублировать, если они уже есть в chat_context.
-            # На самом деле, лучше просто передать chat_context без последних непрочитанных сообщений.
-            
-            # Подсчитываем, сколько непрочитанных сообщений в конце
-            unread_count_in_context = len(customer_messages)
-            if unread_count_in_context > 0:
-                history_for_llm = chat_context[:-unread_count_in_context][-10:]
-            else:
-                history_for_llm = chat_context[-10:]
-            
-            # Проверяем, обрабатывали ли мы это сообщение (по ID последнего сообщения)
-            db_id = f"ozon_chat_{chat_id}_{last_msg_id}"
-            existing_msg = self.db_adapter.get_message(db_id)
+                    customer_messages.append(text)
+                    
+                if not last_msg_id:
+                    last_msg_id = str(msg.get("message_id"))
+                    
+                if not order_number:
+                    order_number = msg.get("context", {}).get("order_number", "")
+        
+        if not customer_messages or not last_msg_id:
+            return False
             
-            if existing_msg and existing_msg.status in ("processing", "answered"):
-                continue
-                
-            logger.info(f"[OzonWorker-Chat] Новое сообщение в чате {chat_id} (Заказ: {order_number}): {msg_text[:50]}...")
+        # Сообщения идут от новых к старым, поэтому переворачиваем для правильного порядка
+        customer_messages.reverse()
+        msg_text = "\n".join(customer_messages)
+        
+        # Собираем историю для контекста (до 10 последних сообщений)
+        chat_context = []
+        for msg in reversed(messages): # От старых к новым
+            user_type = msg.get("user", {}).get("type")
+            data = msg.get("data", [])
+            if data:
+                text = data[-1] if isinstance(data, list) else str(data)
+                prefix = "Клиент: " if user_type == "Customer" else "Бот: "
+                chat_context.append(f"{prefix}{text}")
+        
+        # Оставляем только последние 10 сообщений в истории (исключая новые, которые еще не отвечены)
+        # В данном случае customer_messages - это новые. Мы не хотим их дублировать, если они уже есть в chat_context.
+        # На самом деле, лучше просто передать chat_context без последних непрочитанных сообщений.
+        
+        # Подсчитываем, сколько непрочитанных сообщений в конце
+        unread_count_in_context = len(customer_messages)
+        if unread_count_in_context > 0:
+            history_for_llm = chat_context[:-unread_count_in_context][-10:]
+        else:
+            history_for_llm = chat_context[-10:]
+        
+        # Проверяем, обрабатывали ли мы это сообщение (по ID последнего сообщения)
+        db_id = f"ozon_chat_{chat_id}_{last_msg_id}"
+        existing_msg = self.db_adapter.get_message(db_id)
+        
+        if existing_msg and existing_msg.status in ("processing", "answered"):
+            return False
             
-            # Сохраняем в БД со статусом processing
-            message_record = MarketplaceMessage(
-                id=db_id,
-                marketplace="ozon",
-                message_type="chat",
-                item_id=chat_id,
-                product_name=f"Заказ {order_number}" if order_number else "Чат",
-                text=msg_text,
-                status="processing",
-                created_at=datetime.now()
+        logger.info(f"[OzonWorker-Chat] Новое сообщение в чате {chat_id} (Заказ: {order_number}): {msg_text[:50]}...")
+        
+        # Сохраняем в БД со статусом processing
+        message_record = MarketplaceMessage(
+            id=db_id,
+            marketplace="ozon",
+            message_type="chat",
+            item_id=chat_id,
+            product_name=f"Заказ {order_number}" if order_number else "Чат",
+            text=msg_text,
+            status="processing",
+            created_at=datetime.now()
+        )
+        self.db_adapter.save_message(message_record)
+        
+        # Генерируем ответ
+        try:
+            # Используем AnswerQuestionUseCase, так как он подходит для чатов
+            # Передаем user_id (chat_id), question и history
+            answer_text = await self.answer_use_case.execute(
+                user_id=chat_id, 
+                question=msg_text,
+                history=history_for_llm,
+                source="ozon_chat"
             )
-            self.db_adapter.save_message(message_record)
             
-            # Генерируем ответ
-            try:
-                # Используем AnswerQuestionUseCase, так как он подходит для чатов
-                # Передаем user_id (chat_id), question и history
-                answer_text = await self.answer_use_case.execute(
-                    user_id=chat_id, 
-                    question=msg_text,
-                    history=history_for_llm,
-                    source="ozon_chat"
-                )
-                
-                if answer_text:
-                    # Отправляем ответ
+            if answer_text:
+                # Отправляем ответ
+                async with self.post_throttle:
                     success = await self.ozon_client.send_chat_message(chat_id, answer_text)
+                
+                if success:
+                    logger.info(f"[OzonWorker-Chat] Успешно отправлен ответ в чат {chat_id}")
+                    
+                    # Помечаем сообщения как прочитанные
+                    await self.ozon_client.mark_chat_read(chat_id, last_msg_id)
                     
-                    if success:
-                        logger.info(f"[OzonWorker-Chat] Успешно отправлен ответ в чат {chat_id}")
-                        
-                        # Помечаем сообщения как прочитанные
-                        await self.ozon_client.mark_chat_read(chat_id, last_msg_id)
-                        
-                        message_record.status = "answered"
-                        message_record.answer_text = answer_text
-                        message_record.answered_at = datetime.now()
-                        self.db_adapter.save_message(message_record)
-                        processed_count += 1
-                    else:
-                        logger.error(f"[OzonWorker-Chat] Ошибка при отправке ответа в чат {chat_id}")
-                        message_record.status = "failed"
-                        self.db_adapter.save_message(message_record)
+                    message_record.status = "answered"
+                    message_record.answer_text = answer_text
+                    message_record.answered_at = datetime.now()
+                    self.db_adapter.save_message(message_record)
+                    return True
                 else:
-                    logger.warning(f"[OzonWorker-Chat] Не удалось сгенерировать ответ для чата {chat_id}")
+                    logger.error(f"[OzonWorker-Chat] Ошибка при отправке ответа в чат {chat_id}")
                     message_record.status = "failed"
                     self.db_adapter.save_message(message_record)
-                    
-            except Exception as e:
-                logger.error(f"[OzonWorker-Chat] Ошибка при обработке чата {chat_id}: {e}")
+            else:
+                logger.warning(f"[OzonWorker-Chat] Не удалось сгенерировать ответ для чата {chat_id}")
                 message_record.status = "failed"
                 self.db_adapter.save_message(message_record)
                 
-        if processed_count > 0:
-            logger.info(f"[OzonWorker-Chat] Обработано {processed_count} новых сообщений.")
+        except Exception as e:
+            logger.error(f"[OzonWorker-Chat] Ошибка при обработке чата {chat_id}: {e}")
+            message_record.status = "failed"
+            self.db_adapter.save_message(message_record)
+        return False
@@ -2,13 +2,17 @@ import asyncio
 import logging
 import base64
 from collections import defaultdict
+from typing import Optional
 from telethon import events, TelegramClient
 from app.core.use_cases.answer_question import AnswerQuestionUseCase
+from app.core.models.conversation import client_turn, bot_turn
+from app.core.ports.conversation import ConversationStore
+from app.adapters.conversation.memory_store import MemoryConversationStore
 
 logger = logging.getLogger(__name__)
 
 class TelegramAdapter:
-    def __init__(self, client: TelegramClient, use_case: AnswerQuestionUseCase, message_delay: int = 2):
+    def __init__(self, client: TelegramClient, use_case: AnswerQuestionUseCase, message_delay: int = 2, conversations: Optional[ConversationStore] = None):
         self.client = client
         self.use_case = use_case
         self.message_delay = message_delay
@@ -16,7 +20,8 @@ class TelegramAdapter:
         self.user_messages = defaultdict(list)
         self.user_tasks = {}
         self.operator_mode_chats = set() # Чаты, где управление перехвачено оператором
-        self.chat_history = defaultdict(list) # Храним историю диалогов (в памяти)
+        # История диалогов (окно последних реплик); по умолчанию в памяти процесса
+        self.conversations = conversations or MemoryConversationStore()
         
         # Регистрация хендлеров
         # Ловим абсолютно все входящие сообщения, включая фото, альбомы и файлы
@@ -176,8 +181,8 @@ class TelegramAdapter:
         if not full_message and image_base64:
              logger.info(f"[Telegram] Получено только фото без текста от {user_id}. Идем на распознавание.")
         
-        # Здесь мы достаем историю диалога из памяти (пока в ОЗУ)
-        history = self.chat_history[user_id].copy()
+        # Достаем окно истории диалога из хранилища
+        history = await self.conversations.window(f"telegram:{user_id}")
         
         # Увеличиваем счетчик сообщений для отслеживания "тупняков"
         self.user_attempts[user_id] += 1
@@ -223,13 +228,8 @@ class TelegramAdapter:
             await event.reply(answer)
             logger.info(f"[Telegram] Ответ отправлен {user_id}")
             
-            # Сохраняем в историю текущий шаг
-            self.chat_history[user_id].append(f"Клиент: {full_message}")
-            self.chat_history[user_id].append(f"Бот: {answer}")
-            
-            # Ограничиваем историю в памяти (например, храним только 20 последних сообщений)
-            if len(self.chat_history[user_id]) > 20:
-                self.chat_history[user_id] = self.chat_history[user_id][-20:]
+            # Дописываем текущий шаг (хранилище само держит окно последних реплик)
+            await self.conversations.append(f"telegram:{user_id}", [client_turn(full_message), bot_turn(answer)])
             
         except Exception as e:
             logger.error(f"[Telegram] Ошибка обработки: {e}", exc_info=True)
@@ -6,14 +6,22 @@ from datetime import datetime, timedelta
 from app.adapters.channels.wildberries.client import WBClient
 from app.core.use_cases.answer_question import AnswerQuestionUseCase
 from app.core.use_cases.reply_to_feedback import ReplyToFeedbackUseCase
+from app.utils.concurrency import PostThrottle, run_bounded
+from app.core.models.conversation import Turn, client_turn, bot_turn
+from app.core.ports.conversation import ConversationStore
+from app.adapters.conversation.memory_store import MemoryConversationStore
 
 logger = logging.getLogger(__name__)
 
 class WBQuestionsWorker:
-    def __init__(self, wb_client: WBClient, use_case: AnswerQuestionUseCase, check_interval: int = 300, ignore_older_than_days: int = 0):
+    def __init__(self, wb_client: WBClient, use_case: AnswerQuestionUseCase, check_interval: int = 300, ignore_older_than_days: int = 0, concurrency: int = 1, post_throttle: Optional[PostThrottle] = None):
         self.wb_client = wb_client
         self.use_case = use_case
         self.check_interval = check_interval
+        # Сколько вопросов из пачки обрабатывать одновременно (их поиск в базе знаний объединяется в батчи)
+        self.concurrency = concurrency
+        # Публикации ответов аккаунта — по одной с паузой, сколько бы вопросов ни генерировалось параллельно
+        self.post_throttle = post_throttle or PostThrottle()
         self.is_running = False
         
         # Дата, начиная с которой мы смотрим вопросы.
@@ -45,66 +53,64 @@ class WBQuestionsWorker:
         if not questions:
             return
 
-        for q in questions:
-            q_id = q.get("id")
-            q_text = q.get("text", "")
-            product_name = q.get("productDetails", {}).get("productName", "")
-            
-            if not q_id or not q_text:
-                continue
+        await run_bounded(questions, self._process_question, self.concurrency, log_prefix="[WBWorker-Questions]")
+
+    async def _process_question(self, q: dict):
+        q_id = q.get("id")
+        q_text = q.get("text", "")
+        product_name = q.get("productDetails", {}).get("productName", "")
+        
+        if not q_id or not q_text:
+            return
 
-            # Формируем контекст для LLM
-            full_query = f"Вопрос по товару '{product_name}': {q_text}"
-            logger.info(f"[WBWorker-Questions] Обработка вопроса {q_id}: {full_query}")
+        # Формируем контекст для LLM
+        full_query = f"Вопрос по товару '{product_name}': {q_text}"
+        logger.info(f"[WBWorker-Questions] Обработка вопроса {q_id}: {full_query}")
 
-            # 1. Получаем ответ от нейросети
-            answer = await self.use_case.execute(user_id=f"wb_question_{q_id}", question=full_query, history=[], source="wb")
+        # 1. Получаем ответ от нейросети
+        answer = await self.use_case.execute(user_id=f"wb_question_{q_id}", question=full_query, history=[], source="wb")
 
-            # 2. Отправляем ответ в WB
+        # 2. Отправляем ответ в WB (с паузой между ответами аккаунта)
+        async with self.post_throttle:
             success = await self.wb_client.answer_question(id=q_id, text=answer)
-            
-            if success:
-                logger.info(f"[WBWorker-Questions] Ответ на вопрос {q_id} успешно опубликован.")
-            else:
-                logger.warning(f"[WBWorker-Questions] Не удалось опубликовать ответ на вопрос {q_id}.")
-            
-            # Небольшая пауза между ответами
-            await asyncio.sleep(2)
+        
+        if success:
+            logger.info(f"[WBWorker-Questions] Ответ на вопрос {q_id} успешно опубликован.")
+        else:
+            logger.warning(f"[WBWorker-Questions] Не удалось опубликовать ответ на вопрос {q_id}.")
 
     def stop(self):
         self.is_running = False
         logger.info("[WBWorker-Questions] Остановка...")
 
 class WBChatWorker:
-    def __init__(self, wb_client: WBClient, use_case: AnswerQuestionUseCase, check_interval: int = 300):
+    def __init__(self, wb_client: WBClient, use_case: AnswerQuestionUseCase, check_interval: int = 300, conversations: Optional[ConversationStore] = None):
         self.wb_client = wb_client
         self.use_case = use_case
         self.check_interval = check_interval
         self.is_running = False
         # Для инкрементального получения событий (сохраняем в файл, чтобы не терять при перезапуске)
         self.token_file = "sessions/wb_chat_next_token.txt"
-        self.history_file = "sessions/wb_chat_history.json"
+        # Старый файл истории (список строк на чат) переносится в хранилище при первом запуске
+        self.legacy_history_file = "sessions/wb_chat_history.json"
         self.next_token: Optional[int] = self._load_token()
-        self.chat_history = self._load_chat_history()
+        # История чатов (окно последних реплик): SQLite/Redis из main.py, иначе в памяти процесса
+        self.conversations = conversations or MemoryConversationStore()
 
-    def _load_chat_history(self) -> dict:
-        try:
-            import os, json
-            if os.path.exists(self.history_file):
-                with open(self.history_file, "r", encoding="utf-8") as f:
-                    return json.load(f)
-        except Exception as e:
-            logger.error(f"[WBWorker-Chat] Ошибка загрузки истории чатов: {e}")
-        return {}
-
-    def _save_chat_history(self):
+    async def _migrate_legacy_history(self):
+        import os, json
+        if not os.path.exists(self.legacy_history_file):
+            return
         try:
-            import os, json
-            os.makedirs(os.path.dirname(self.history_file), exist_ok=True)
-            with open(self.history_file, "w", encoding="utf-8") as f:
-                json.dump(self.chat_history, f, ensure_ascii=False)
+            with open(self.legacy_history_file, "r", encoding="utf-8") as f:
+                legacy = json.load(f)
+            for chat_id, lines in legacy.items():
+                turns = [turn for turn in map(Turn.parse, lines) if turn]
+                await self.conversations.append(f"wb_chat:{chat_id}", turns)
+            os.replace(self.legacy_history_file, self.legacy_history_file + ".migrated")
+            logger.info(f"[WBWorker-Chat] История {len(legacy)} чатов перенесена в хранилище диалогов.")
         except Exception as e:
-            logger.error(f"[WBWorker-Chat] Ошибка сохранения истории чатов: {e}")
+            logger.error(f"[WBWorker-Chat] Ошибка переноса старой истории чатов: {e}")
 
     def _load_token(self) -> Optional[int]:
         try:
@@ -165,6 +171,7 @@ class WBChatWorker:
     async def start(self):
         self.is_running = True
         logger.info("[WBWorker-Chat] Запуск фоновой проверки чатов Wildberries...")
+        await self._migrate_legacy_history()
         
         if self.next_token is None:
             await self._fast_forward()
@@ -264,15 +271,13 @@ class WBChatWorker:
                     )
                     continue
 
-                # Инициализируем историю для чата, если её нет
-                if chat_id not in self.chat_history:
-                    self.chat_history[chat_id] = []
+                history = await self.conversations.window(f"wb_chat:{chat_id}")
 
                 # 1. Получаем ответ от нейросети
                 answer = await self.use_case.execute(
                     user_id=f"wb_chat_{chat_id}", 
                     question=text, 
-                    history=self.chat_history[chat_id], 
+                    history=history, 
                     source="wb_chat",
                     image_base64=image_base64
                 )
@@ -296,13 +301,7 @@ class WBChatWorker:
                 
                 if success:
                     logger.info(f"[WBWorker-Chat] Ответ в чат {chat_id} успешно отправлен.")
-                    self.chat_history[chat_id].append(f"Клиент: {text}")
-                    self.chat_history[chat_id].append(f"Бот: {answer}")
-                    
-                    if len(self.chat_history[chat_id]) > 20:
-                        self.chat_history[chat_id] = self.chat_history[chat_id][-20:]
-                        
-                    self._save_chat_history()
+                    await self.conversations.append(f"wb_chat:{chat_id}", [client_turn(text), bot_turn(answer)])
                 else:
                     logger.warning(f"[WBWorker-Chat] Не удалось отправить ответ в чат {chat_id}.")
                 
@@ -316,10 +315,12 @@ class WBChatWorker:
         logger.info("[WBWorker-Chat] Остановка...")
 
 class WBFeedbacksWorker:
-    def __init__(self, wb_client: WBClient, use_case: ReplyToFeedbackUseCase, check_interval: int = 300, ignore_older_than_days: int = 0):
+    def __init__(self, wb_client: WBClient, use_case: ReplyToFeedbackUseCase, check_interval: int = 300, ignore_older_than_days: int = 0, concurrency: int = 1, post_throttle: Optional[PostThrottle] = None):
         self.wb_client = wb_client
         self.use_case = use_case
         self.check_interval = check_interval
+        self.concurrency = concurrency
+        self.post_throttle = post_throttle or PostThrottle()
         self.is_running = False
         
         if ignore_older_than_days > 0:
@@ -347,55 +348,56 @@ class WBFeedbacksWorker:
         if not feedbacks:
             return
 
-        for fb in feedbacks:
-            fb_id = fb.get("id")
-            
-            # В Wildberries текст отзыва может быть разбит на 3 поля: text (комментарий), pros (плюсы), cons (минусы)
-            text_parts = []
-            if fb.get("text"):
-                text_parts.append(f"Комментарий: {fb.get('text')}")
-            if fb.get("pros"):
-                text_parts.append(f"Плюсы: {fb.get('pros')}")
-            if fb.get("cons"):
-                text_parts.append(f"Минусы: {fb.get('cons')}")
-                
-            fb_text = "\n".join(text_parts).strip()
-            
-            valuation = fb.get("productValuation", 5) # По умолчанию 5, если не указано
-            product_name = fb.get("productDetails", {}).get("productName", "")
-            
-            if not fb_id:
-                continue
-            
-            # НОВАЯ ЛОГИКА: Больше не пропускаем 5-звездочные отзывы, чтобы благодарить клиентов!
-            # Пропускаем только отзывы вообще без текста, если не хотим отвечать пустышкам (по желанию можно убрать и этот фильтр)
-            if not fb_text and valuation < 5:
-                # Если текст пустой и оценка ниже 5 - возможно стоит ответить шаблоном, но пока пропускаем
-                pass
-                
-            if not fb_text and valuation == 5:
-                # На пустые 5 звезд можно отвечать коротким "Спасибо!" - отправим на обработку промпту
-                logger.info(f"[WBWorker-Feedbacks] Пустой отзыв {fb_id} (Оценка: 5 звезд). Передаем нейросети для благодарности.")
-            
-            logger.info(f"[WBWorker-Feedbacks] Обработка отзыва {fb_id} (Оценка: {valuation}): {fb_text}")
+        await run_bounded(feedbacks, self._process_feedback, self.concurrency, log_prefix="[WBWorker-Feedbacks]")
 
-            # 1. Генерируем ответ
-            answer = await self.use_case.execute(
-                review_text=fb_text, 
-                valuation=valuation, 
-                product_name=product_name
-            )
-
-            # 2. Отправляем ответ
-            logger.info(f"[WBWorker-Feedbacks] Пытаюсь отправить ответ на отзыв {fb_id} в WB API...")
-            success = await self.wb_client.answer_feedback(id=fb_id, text=answer)
+    async def _process_feedback(self, fb: dict):
+        fb_id = fb.get("id")
+        
+        # В Wildberries текст отзыва может быть разбит на 3 поля: text (комментарий), pros (плюсы), cons (минусы)
+        text_parts = []
+        if fb.get("text"):
+            text_parts.append(f"Комментарий: {fb.get('text')}")
+        if fb.get("pros"):
+            text_parts.append(f"Плюсы: {fb.get('pros')}")
+        if fb.get("cons"):
+            text_parts.append(f"Минусы: {fb.get('cons')}")
             
-            if success:
-                logger.info(f"[WBWorker-Feedbacks] ✅ УСПЕШНО! Ответ на отзыв {fb_id} опубликован в WB. Текст ответа: '{answer[:100]}...'")
-            else:
-                logger.error(f"[WBWorker-Feedbacks] ❌ ОШИБКА! WB API вернул False. Не удалось опубликовать ответ на отзыв {fb_id}.")
+        fb_text = "\n".join(text_parts).strip()
+        
+        valuation = fb.get("productValuation", 5) # По умолчанию 5, если не указано
+        product_name = fb.get("productDetails", {}).get("productName", "")
+        
+        if not fb_id:
+            return
+        
+        # НОВАЯ ЛОГИКА: Больше не пропускаем 5-звездочные отзывы, чтобы благодарить клиентов!
+        # Пропускаем только отзывы вообще без текста, если не хотим отвечать пустышкам (по желанию можно убрать и этот фильтр)
+        if not fb_text and valuation < 5:
+            # Если текст пустой и оценка ниже 5 - возможно стоит ответить шаблоном, но пока пропускаем
+            pass
             
-            await asyncio.sleep(2)
+        if not fb_text and valuation == 5:
+            # На пустые 5 звезд можно отвечать коротким "Спасибо!" - отправим на обработку промпту
+            logger.info(f"[WBWorker-Feedbacks] Пустой отзыв {fb_id} (Оценка: 5 звезд). Передаем нейросети для благодарности.")
+        
+        logger.info(f"[WBWorker-Feedbacks] Обработка отзыва {fb_id} (Оценка: {valuation}): {fb_text}")
+
+        # 1. Генерируем ответ
+        answer = await self.use_case.execute(
+            review_text=fb_text, 
+            valuation=valuation, 
+            product_name=product_name
+        )
+
+        # 2. Отправляем ответ
+        logger.info(f"[WBWorker-Feedbacks] Пытаюсь отправить ответ на отзыв {fb_id} в WB API...")
+        async with self.post_throttle:
+            success = await self.wb_client.answer_feedback(id=fb_id, text=answer)
+        
+        if success:
+            logger.info(f"[WBWorker-Feedbacks] ✅ УСПЕШНО! Ответ на отзыв {fb_id} опубликован в WB. Текст ответа: '{answer[:100]}...'")
+        else:
+            logger.error(f"[WBWorker-Feedbacks] ❌ ОШИБКА! WB API вернул False. Не удалось опубликовать ответ на отзыв {fb_id}.")
 
     def stop(self):
         self.is_running = False
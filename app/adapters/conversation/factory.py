@@ -0,0 +1,33 @@
+"""
+Выбор хранилища диалогов: CONVERSATION_STORE = memory | redis | sqlite.
+По умолчанию redis, если передан клиент Redis, иначе sqlite (CONVERSATION_SQLITE_PATH).
+"""
+import logging
+import os
+from typing import Optional
+
+from app.core.ports.conversation import ConversationStore
+from app.adapters.conversation.memory_store import MemoryConversationStore
+from app.adapters.conversation.redis_store import RedisConversationStore
+from app.adapters.conversation.sqlite_store import SqliteConversationStore
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_TURNS = 20
+DEFAULT_SQLITE_PATH = "sessions/conversations.db"
+
+
+def create_conversation_store(backend: Optional[str] = None, redis_client=None, max_turns: Optional[int] = None, ttl_seconds: Optional[int] = None) -> ConversationStore:
+    backend = (backend or os.getenv("CONVERSATION_STORE") or ("redis" if redis_client is not None else "sqlite")).lower()
+    max_turns = max_turns or int(os.getenv("CONVERSATION_MAX_TURNS", DEFAULT_MAX_TURNS))
+
+    if backend == "redis":
+        if redis_client is None:
+            logger.warning("[ConversationStore] CONVERSATION_STORE=redis, но Redis недоступен — история в памяти процесса.")
+            return MemoryConversationStore(max_turns, ttl_seconds)
+        return RedisConversationStore(redis_client, max_turns, ttl_seconds)
+    if backend == "sqlite":
+        return SqliteConversationStore(os.getenv("CONVERSATION_SQLITE_PATH", DEFAULT_SQLITE_PATH), max_turns)
+    if backend != "memory":
+        logger.warning(f"[ConversationStore] Неизвестный CONVERSATION_STORE={backend}, история в памяти процесса.")
+    return MemoryConversationStore(max_turns, ttl_seconds)
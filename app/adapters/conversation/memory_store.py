@@ -0,0 +1,61 @@
+"""
+Диалоги в памяти процесса: окно последних max_turns реплик на диалог и не больше
+max_conversations диалогов (давно не активные вытесняются первыми).
+"""
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from app.core.models.conversation import Turn
+from app.core.ports.conversation import ConversationStore
+
+DEFAULT_MAX_CONVERSATIONS = 10000
+
+
+@dataclass
+class _Conversation:
+    turns: Deque[Turn]
+    state: Dict[str, Any] = field(default_factory=dict)
+    touched_at: float = field(default_factory=time.monotonic)
+
+
+class MemoryConversationStore(ConversationStore):
+    def __init__(self, max_turns: int = 20, ttl_seconds: Optional[float] = None, max_conversations: int = DEFAULT_MAX_CONVERSATIONS):
+        self.max_turns = max_turns
+        self.ttl_seconds = ttl_seconds
+        self.max_conversations = max_conversations
+        self._conversations: "OrderedDict[str, _Conversation]" = OrderedDict()
+
+    def _get(self, conversation_id: str) -> Optional[_Conversation]:
+        conversation = self._conversations.get(conversation_id)
+        if conversation and self.ttl_seconds is not None and time.monotonic() - conversation.touched_at > self.ttl_seconds:
+            del self._conversations[conversation_id]
+            return None
+        return conversation
+
+    async def save(self, conversation_id: str, turns: List[Turn], state: Optional[Dict[str, Any]] = None, reset: bool = False) -> None:
+        conversation = None if reset else self._get(conversation_id)
+        self._conversations.pop(conversation_id, None)
+        conversation = conversation or _Conversation(deque(maxlen=self.max_turns))
+        conversation.turns.extend(turns)
+        conversation.state.update(state or {})
+        conversation.touched_at = time.monotonic()
+        self._conversations[conversation_id] = conversation
+        while len(self._conversations) > self.max_conversations:
+            self._conversations.popitem(last=False)
+
+    async def append(self, conversation_id: str, turns: List[Turn]) -> None:
+        await self.save(conversation_id, turns)
+
+    async def load(self, conversation_id: str) -> Tuple[List[Turn], Dict[str, Any]]:
+        conversation = self._get(conversation_id)
+        if conversation is None:
+            return [], {}
+        return list(conversation.turns), dict(conversation.state)
+
+    async def window(self, conversation_id: str) -> List[Turn]:
+        return (await self.load(conversation_id))[0]
+
+    async def clear(self, conversation_id: str) -> None:
+        self._conversations.pop(conversation_id, None)
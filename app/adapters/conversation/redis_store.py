@@ -0,0 +1,97 @@
+"""
+Диалоги в Redis: список реплик `history:{conversation_id}` и хэш стейта
+`session_state:{conversation_id}` (поле — ключ стейта, значение — JSON).
+
+Ход стоит два обращения к Redis независимо от длины истории:
+  - load — LRANGE окна + HGETALL стейта одним пайплайном;
+  - save — RPUSH новых реплик + LTRIM до окна + HSET измененных полей стейта + EXPIRE
+    обоих ключей одной транзакцией (MULTI/EXEC). История целиком не перечитывается и не
+    перезаписывается.
+
+Реплика хранится компактной строкой `<роль><время>|<текст>` (например `c1718000000|привет`)
+вместо JSON-объекта. Клиент — redis.asyncio с decode_responses=True.
+Замеры: benchmarks/bench_session_store.py.
+"""
+import json
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.models.conversation import BOT, CLIENT, Turn
+from app.core.ports.conversation import ConversationStore
+
+logger = logging.getLogger(__name__)
+
+HISTORY_KEY = "history:{conversation_id}"
+STATE_KEY = "session_state:{conversation_id}"
+_ROLE_CODES = {CLIENT: "c", BOT: "b"}
+_CODE_ROLES = {code: role for role, code in _ROLE_CODES.items()}
+
+
+def dump_turn(turn: Turn) -> str:
+    return f"{_ROLE_CODES[turn.role]}{int(turn.created_at)}|{turn.text}"
+
+
+def load_turn(raw: str) -> Turn:
+    if raw.startswith("{"):
+        # Реплики, записанные до компактного формата
+        item = json.loads(raw)
+        return Turn(item["r"], item["t"], item.get("at", 0.0))
+    header, text = raw.split("|", 1)
+    return Turn(_CODE_ROLES[header[0]], text, float(header[1:]))
+
+
+class RedisConversationStore(ConversationStore):
+    def __init__(self, redis_client, max_turns: int = 20, ttl_seconds: Optional[int] = None):
+        self.redis = redis_client
+        self.max_turns = max_turns
+        self.ttl_seconds = ttl_seconds
+
+    @staticmethod
+    def key(conversation_id: str) -> str:
+        return HISTORY_KEY.format(conversation_id=conversation_id)
+
+    @staticmethod
+    def state_key(conversation_id: str) -> str:
+        return STATE_KEY.format(conversation_id=conversation_id)
+
+    def _parse(self, conversation_id: str, items: List[str]) -> List[Turn]:
+        turns = []
+        for raw in items:
+            try:
+                turns.append(load_turn(raw))
+            except (ValueError, KeyError) as e:
+                logger.warning(f"[ConversationStore] Пропущена битая реплика в {conversation_id}: {e}")
+        return turns
+
+    async def load(self, conversation_id: str) -> Tuple[List[Turn], Dict[str, Any]]:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.lrange(self.key(conversation_id), -self.max_turns, -1)
+            pipe.hgetall(self.state_key(conversation_id))
+            items, raw_state = await pipe.execute()
+        return self._parse(conversation_id, items), {field: json.loads(value) for field, value in raw_state.items()}
+
+    async def save(self, conversation_id: str, turns: List[Turn], state: Optional[Dict[str, Any]] = None, reset: bool = False) -> None:
+        if not turns and not state and not reset:
+            return
+        key, state_key = self.key(conversation_id), self.state_key(conversation_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            if reset:
+                pipe.delete(key, state_key)
+            if turns:
+                pipe.rpush(key, *(dump_turn(turn) for turn in turns))
+                pipe.ltrim(key, -self.max_turns, -1)
+            if state:
+                pipe.hset(state_key, mapping={field: json.dumps(value, ensure_ascii=False, separators=(",", ":")) for field, value in state.items()})
+            if self.ttl_seconds:
+                pipe.expire(key, self.ttl_seconds)
+                pipe.expire(state_key, self.ttl_seconds)
+            await pipe.execute()
+
+    async def append(self, conversation_id: str, turns: List[Turn]) -> None:
+        await self.save(conversation_id, turns)
+
+    async def window(self, conversation_id: str) -> List[Turn]:
+        return self._parse(conversation_id, await self.redis.lrange(self.key(conversation_id), -self.max_turns, -1))
+
+    async def clear(self, conversation_id: str) -> None:
+        await self.redis.delete(self.key(conversation_id), self.state_key(conversation_id))
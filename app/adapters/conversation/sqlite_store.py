@@ -0,0 +1,100 @@
+"""
+Диалоги в SQLite (один файл на процесс, например sessions/conversations.db) — для каналов
+без Redis, которым история нужна между перезапусками (чаты WB, Telegram).
+
+Реплики дописываются строками, после записи в диалоге остаются последние max_turns.
+Запросы синхронные и короткие, из async-кода идут через asyncio.to_thread.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.models.conversation import Turn
+from app.core.ports.conversation import ConversationStore
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversation_turns (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    conversation_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    text TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_conversation_turns ON conversation_turns (conversation_id, id);
+CREATE TABLE IF NOT EXISTS conversation_state (
+    conversation_id TEXT PRIMARY KEY,
+    state TEXT NOT NULL
+);
+"""
+
+
+class SqliteConversationStore(ConversationStore):
+    def __init__(self, path: str, max_turns: int = 20):
+        self.path = path
+        self.max_turns = max_turns
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def _save(self, conversation_id: str, turns: List[Turn], state: Optional[Dict[str, Any]], reset: bool):
+        with self._lock, self._conn:
+            if reset:
+                self._conn.execute("DELETE FROM conversation_turns WHERE conversation_id = ?", (conversation_id,))
+                self._conn.execute("DELETE FROM conversation_state WHERE conversation_id = ?", (conversation_id,))
+            if state:
+                row = self._conn.execute("SELECT state FROM conversation_state WHERE conversation_id = ?", (conversation_id,)).fetchone()
+                merged = {**(json.loads(row[0]) if row else {}), **state}
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO conversation_state (conversation_id, state) VALUES (?, ?)",
+                    (conversation_id, json.dumps(merged, ensure_ascii=False)),
+                )
+            if not turns:
+                return
+            self._conn.executemany(
+                "INSERT INTO conversation_turns (conversation_id, role, text, created_at) VALUES (?, ?, ?, ?)",
+                [(conversation_id, t.role, t.text, t.created_at) for t in turns],
+            )
+            self._conn.execute(
+                "DELETE FROM conversation_turns WHERE conversation_id = ? AND id <= "
+                "(SELECT id FROM conversation_turns WHERE conversation_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                (conversation_id, conversation_id, self.max_turns),
+            )
+
+    def _load(self, conversation_id: str) -> Tuple[List[Turn], Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT role, text, created_at FROM conversation_turns WHERE conversation_id = ? ORDER BY id DESC LIMIT ?",
+                (conversation_id, self.max_turns),
+            ).fetchall()
+            state = self._conn.execute("SELECT state FROM conversation_state WHERE conversation_id = ?", (conversation_id,)).fetchone()
+        return [Turn(role, text, created_at) for role, text, created_at in reversed(rows)], json.loads(state[0]) if state else {}
+
+    def _clear(self, conversation_id: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM conversation_turns WHERE conversation_id = ?", (conversation_id,))
+            self._conn.execute("DELETE FROM conversation_state WHERE conversation_id = ?", (conversation_id,))
+
+    async def save(self, conversation_id: str, turns: List[Turn], state: Optional[Dict[str, Any]] = None, reset: bool = False) -> None:
+        if turns or state or reset:
+            await asyncio.to_thread(self._save, conversation_id, turns, state, reset)
+
+    async def append(self, conversation_id: str, turns: List[Turn]) -> None:
+        await self.save(conversation_id, turns)
+
+    async def load(self, conversation_id: str) -> Tuple[List[Turn], Dict[str, Any]]:
+        return await asyncio.to_thread(self._load, conversation_id)
+
+    async def window(self, conversation_id: str) -> List[Turn]:
+        return (await self.load(conversation_id))[0]
+
+    async def clear(self, conversation_id: str) -> None:
+        await asyncio.to_thread(self._clear, conversation_id)
+
+    def close(self):
+        self._conn.close()
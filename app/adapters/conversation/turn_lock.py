@@ -0,0 +1,121 @@
+"""
+Последовательные ходы одной сессии: чтение истории → генерация → запись.
+
+Без блокировки два быстрых запроса одной сессии оба читают историю, оба зовут LLM, и
+запись последнего затирает ход первого. SessionTurnGuard держит на время хода:
+  - asyncio.Lock на сессию в процессе (ждущие запросы не ходят в Redis);
+  - при заданном redis_client — еще и Redis-блокировку `turn_lock:{session_key}`
+    (redis-py Lock: SET NX PX + снятие Lua-скриптом) для нескольких реплик api.py.
+
+Повтор с тем же client_message_id, пока первый запрос еще выполняется в этом процессе,
+присоединяется к его результату, а не генерирует ответ заново (двойной клик, ретрай виджета).
+Повтор уже завершенного хода (или пришедший на другую реплику) распознает сам ход —
+по client_message_id в стейте сессии, см. api.py.
+"""
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+from redis.exceptions import LockError
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+LOCK_KEY = "turn_lock:{session_key}"
+
+
+class SessionBusyError(Exception):
+    """Не дождались хода другой реплики за wait_seconds."""
+
+
+@dataclass
+class _LocalLock:
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    users: int = 0
+
+
+class SessionTurnGuard:
+    def __init__(self, redis_client=None, lock_seconds: float = 120.0, wait_seconds: float = 120.0):
+        """
+        lock_seconds — через сколько Redis-блокировка снимется сама (упавшая реплика),
+        должно быть больше самого долгого хода; wait_seconds — сколько ждать чужой ход
+        (и в процессе, и в Redis: зависший ход не блокирует сессию навсегда).
+        """
+        self.redis = redis_client
+        self.lock_seconds = lock_seconds
+        self.wait_seconds = wait_seconds
+        self._locks: Dict[str, _LocalLock] = {}
+        self._inflight: Dict[Tuple[str, str], asyncio.Task] = {}
+        self.coalesced = 0
+
+    @asynccontextmanager
+    async def lock(self, session_key: str) -> AsyncIterator[None]:
+        local = self._locks.get(session_key)
+        if local is None:
+            local = self._locks[session_key] = _LocalLock()
+        local.users += 1
+        deadline = time.monotonic() + self.wait_seconds
+        try:
+            try:
+                await asyncio.wait_for(local.lock.acquire(), self.wait_seconds)
+            except asyncio.TimeoutError:
+                raise SessionBusyError(f"Сессия {session_key} занята другим ходом дольше {self.wait_seconds:g} с")
+            try:
+                if self.redis is None:
+                    yield
+                else:
+                    async with self._redis_lock(session_key, max(0.0, deadline - time.monotonic())):
+                        yield
+            finally:
+                local.lock.release()
+        finally:
+            local.users -= 1
+            if not local.users:
+                del self._locks[session_key]
+
+    @asynccontextmanager
+    async def _redis_lock(self, session_key: str, wait_seconds: float) -> AsyncIterator[None]:
+        lock = self.redis.lock(LOCK_KEY.format(session_key=session_key), timeout=self.lock_seconds, sleep=0.05, blocking_timeout=wait_seconds)
+        if not await lock.acquire():
+            raise SessionBusyError(f"Сессия {session_key} занята другим ходом дольше {self.wait_seconds:g} с")
+        try:
+            yield
+        finally:
+            try:
+                await lock.release()
+            except LockError as e:
+                # Ход шел дольше lock_seconds, блокировку уже сняли по таймауту
+                logger.warning(f"[TurnLock] Блокировка {session_key} истекла до конца хода: {e}")
+
+    async def run(self, session_key: str, client_message_id: Optional[str], turn: Callable[[], Awaitable[T]]) -> T:
+        """Выполняет ход под блокировкой сессии; повтор client_message_id ждет уже идущий ход."""
+        if not client_message_id:
+            async with self.lock(session_key):
+                return await turn()
+
+        key = (session_key, client_message_id)
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            logger.info(f"[TurnLock] Повтор сообщения {client_message_id} в {session_key}: ждем уже идущий ход")
+        else:
+            task = asyncio.create_task(self._locked(session_key, turn))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        # shield: обрыв соединения одного из запросов не отменяет ход для остальных
+        return await asyncio.shield(task)
+
+    def _finished(self, key: Tuple[str, str], task: asyncio.Task):
+        self._inflight.pop(key, None)
+        # Все ждавшие запросы могли отмениться (обрыв соединения): ошибку хода забираем здесь,
+        # иначе asyncio пишет "Task exception was never retrieved"
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug(f"[TurnLock] Ход {key[1]} в {key[0]} завершился ошибкой: {task.exception()!r}")
+
+    async def _locked(self, session_key: str, turn: Callable[[], Awaitable[T]]) -> T:
+        async with self.lock(session_key):
+            return await turn()
@@ -0,0 +1,116 @@
+import os
+import logging
+from functools import partial
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OPENAI_MODEL = "text-embedding-3-small"
+DEFAULT_LOCAL_MODEL = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+
+# Размерности известных моделей: не нужно делать пробный embed_query при старте
+EMBEDDING_DIMENSIONS: Dict[str, int] = {
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+    "text-embedding-ada-002": 1536,
+    "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2": 384,
+    "sentence-transformers/paraphrase-multilingual-mpnet-base-v2": 768,
+    "sentence-transformers/all-MiniLM-L6-v2": 384,
+    "intfloat/multilingual-e5-small": 384,
+    "intfloat/multilingual-e5-base": 768,
+}
+
+
+# Калибровка косинусного сходства в оценку 0..1: (косинус "не про то", косинус "явное совпадение").
+# У моделей разный диапазон (у ada-002 даже несвязанные тексты дают ~0.7), поэтому пороги
+# отсечения задаются на калиброванной шкале и не зависят от модели.
+SCORE_CALIBRATION: Dict[str, Tuple[float, float]] = {
+    "text-embedding-3-small": (0.10, 0.60),
+    "text-embedding-3-large": (0.10, 0.60),
+    "text-embedding-ada-002": (0.70, 0.90),
+    "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2": (0.15, 0.75),
+    "sentence-transformers/paraphrase-multilingual-mpnet-base-v2": (0.15, 0.75),
+    "sentence-transformers/all-MiniLM-L6-v2": (0.10, 0.70),
+    "intfloat/multilingual-e5-small": (0.75, 0.92),
+    "intfloat/multilingual-e5-base": (0.75, 0.92),
+}
+
+
+def score_calibration(model_name: str) -> Tuple[float, float]:
+    """Калибровка из таблицы или из SCORE_CALIBRATION="floor,ceil"; для неизвестных моделей — сам косинус."""
+    if os.getenv("SCORE_CALIBRATION"):
+        floor, ceil = (float(x) for x in os.getenv("SCORE_CALIBRATION").split(","))
+        return floor, ceil
+    return SCORE_CALIBRATION.get(model_name, (0.0, 1.0))
+
+
+def calibrate_score(cosine: float, calibration: Tuple[float, float]) -> float:
+    floor, ceil = calibration
+    return min(1.0, max(0.0, (cosine - floor) / (ceil - floor)))
+
+
+def resolve_provider(openai_api_key: Optional[str]) -> str:
+    provider = (os.getenv("EMBEDDINGS_PROVIDER") or "openai").strip().lower()
+    if not openai_api_key and provider == "openai":
+        logger.warning("[Embeddings] Нет OpenAI API Key. Переключаюсь на локальные эмбеддинги.")
+        provider = "local"
+    return provider
+
+
+def embedding_model_name(provider: str) -> str:
+    # onnx — та же модель, что и local, только в ONNX: таблицы размерностей и калибровки общие
+    if provider in ("local", "onnx"):
+        return os.getenv("LOCAL_EMBEDDING_MODEL", DEFAULT_LOCAL_MODEL)
+    return os.getenv("OPENAI_EMBEDDING_MODEL", DEFAULT_OPENAI_MODEL)
+
+
+def embedding_dimension(model_name: str) -> Optional[int]:
+    """Размерность из таблицы или из EMBEDDING_DIMENSION; None — придется спросить модель."""
+    if os.getenv("EMBEDDING_DIMENSION"):
+        return int(os.getenv("EMBEDDING_DIMENSION"))
+    return EMBEDDING_DIMENSIONS.get(model_name)
+
+
+def create_local_embeddings(provider: str, model_name: str):
+    """Модель локальных эмбеддингов в текущем процессе (так ее создают и воркеры пула)."""
+    if provider == "onnx":
+        from app.adapters.embeddings.onnx_embeddings import DEFAULT_MODEL_PATH, get_onnx_embeddings
+        model_path = os.getenv("ONNX_EMBEDDING_MODEL_PATH", DEFAULT_MODEL_PATH)
+        try:
+            return get_onnx_embeddings(model_path)
+        except Exception as e:
+            # Векторы local совместимы с onnx, поэтому откат не ломает коллекции
+            logger.error(f"[Embeddings] ONNX-модель {model_path} недоступна ({e}), использую HuggingFaceEmbeddings.")
+
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+    logger.info(f"[Embeddings] Использую локальные эмбеддинги: {model_name}")
+    return HuggingFaceEmbeddings(model_name=model_name)
+
+
+def create_embeddings(openai_api_key: Optional[str] = None, openai_api_base: Optional[str] = None, provider: Optional[str] = None):
+    """Эмбеддинги по EMBEDDINGS_PROVIDER (openai | local | onnx), общие для всех адаптеров и скриптов."""
+    provider = provider or resolve_provider(openai_api_key)
+    model_name = embedding_model_name(provider)
+
+    if provider in ("local", "onnx"):
+        workers = int(os.getenv("EMBEDDING_WORKERS", "0"))
+        if workers <= 0:
+            return create_local_embeddings(provider, model_name)
+        # CPU-инференс в отдельных процессах: event loop и GIL основного процесса свободны
+        from app.adapters.embeddings.process_pool import DEFAULT_BATCH_WINDOW_MS, DEFAULT_MAX_BATCH, get_process_pool_embeddings
+        logger.info(f"[Embeddings] Локальные эмбеддинги {model_name} ({provider}) в пуле из {workers} процессов.")
+        return get_process_pool_embeddings(
+            (provider, model_name),
+            partial(create_local_embeddings, provider, model_name),
+            workers=workers,
+            batch_window_ms=float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", DEFAULT_BATCH_WINDOW_MS)),
+            max_batch_size=int(os.getenv("EMBEDDING_MAX_BATCH", DEFAULT_MAX_BATCH)),
+        )
+
+    from langchain_openai import OpenAIEmbeddings
+    logger.info(f"[Embeddings] Использую OpenAI эмбеддинги: {model_name}")
+    return OpenAIEmbeddings(
+        model=model_name,
+        openai_api_key=openai_api_key,
+        base_url=openai_api_base
+    )
@@ -0,0 +1,149 @@
+"""
+Локальные эмбеддинги на onnxruntime (EMBEDDINGS_PROVIDER=onnx) для CPU-серверов без GPU.
+
+Та же модель, что и у провайдера local (paraphrase-multilingual-MiniLM-L12-v2), но экспортированная
+в ONNX и квантизованная в int8: без PyTorch в памяти, быстрый импорт и в разы быстрее на запрос.
+Векторы совместимы с коллекциями, собранными HuggingFaceEmbeddings (mean pooling по маске
+внимания, без нормализации), — переиндексация при переключении не нужна.
+
+Экспорт и проверка паритета на tests/golden_questions.json:
+
+  python export_onnx_embeddings.py --output models/minilm-onnx
+
+В каталоге модели должны лежать model_quantized.onnx (или model.onnx) и tokenizer.json.
+onnxruntime и tokenizers опциональны: без них фабрика откатывается на HuggingFaceEmbeddings.
+"""
+import logging
+import os
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_PATH = "models/minilm-onnx"
+# max_seq_length модели в sentence-transformers: длиннее текст обрезается так же, как у провайдера local
+DEFAULT_MAX_LENGTH = 128
+DEFAULT_BATCH_SIZE = 32
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Эмбеддинги sentence-transformers модели на onnxruntime.
+
+    Динамический батчинг: тексты сортируются по длине в токенах и режутся на батчи не длиннее
+    batch_size, каждый батч паддится до своего самого длинного текста (а не до max_length) —
+    короткие вопросы не платят за длинные чанки базы знаний. Потокобезопасен: сессия ONNX Runtime
+    допускает параллельный run. Число потоков на один run — num_threads (ONNX_EMBEDDING_THREADS).
+    """
+    def __init__(self, model_path: str, max_length: int = DEFAULT_MAX_LENGTH, batch_size: int = DEFAULT_BATCH_SIZE, num_threads: Optional[int] = None):
+        self.model_path = model_path
+        self.max_length = max_length
+        self.batch_size = batch_size
+        self._load(num_threads)
+
+    def _load(self, num_threads: Optional[int]):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_file = next(
+            (os.path.join(self.model_path, name) for name in ("model_quantized.onnx", "model.onnx")
+             if os.path.exists(os.path.join(self.model_path, name))),
+            self.model_path,
+        )
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = num_threads or int(os.getenv("ONNX_EMBEDDING_THREADS", "2"))
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_file, sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(self.model_path, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=self.max_length)
+        self.tokenizer.no_padding()
+        logger.info(f"[Embeddings] Загружена ONNX-модель эмбеддингов {model_file} (потоков: {options.intra_op_num_threads})")
+
+    def _tokenize(self, texts: Sequence[str]) -> List[Tuple[List[int], List[int]]]:
+        """(input_ids, type_ids) без паддинга: паддинг — по батчу в _run."""
+        return [(e.ids, e.type_ids) for e in self.tokenizer.encode_batch(list(texts))]
+
+    def _run(self, encoded: Sequence[Tuple[List[int], List[int]]]) -> np.ndarray:
+        width = max(len(ids) for ids, _ in encoded)
+        input_ids = np.zeros((len(encoded), width), dtype=np.int64)
+        type_ids = np.zeros((len(encoded), width), dtype=np.int64)
+        attention_mask = np.zeros((len(encoded), width), dtype=np.int64)
+        for row, (ids, types) in enumerate(encoded):
+            input_ids[row, :len(ids)] = ids
+            type_ids[row, :len(types)] = types
+            attention_mask[row, :len(ids)] = 1
+
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask, "token_type_ids": type_ids}
+        output = self.session.run(None, {k: v for k, v in feeds.items() if k in self.input_names})[0]
+        if output.ndim == 2:
+            # Экспорт с пулингом внутри графа (sentence_embedding)
+            return output.astype(np.float32)
+        return mean_pooling(output, attention_mask)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        encoded = self._tokenize(texts)
+        order = sorted(range(len(texts)), key=lambda i: len(encoded[i][0]))
+        vectors = np.zeros((len(texts), 0), dtype=np.float32)
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            result = self._run([encoded[i] for i in batch])
+            if vectors.shape[1] == 0:
+                vectors = np.zeros((len(texts), result.shape[1]), dtype=np.float32)
+            vectors[batch] = result
+        return vectors.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+def mean_pooling(token_embeddings: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+    """Среднее по токенам с учетом маски — как pooling_mode_mean_tokens в sentence-transformers."""
+    mask = attention_mask[..., None].astype(np.float32)
+    summed = (token_embeddings * mask).sum(axis=1)
+    return (summed / np.clip(mask.sum(axis=1), 1e-9, None)).astype(np.float32)
+
+
+def embedding_parity(reference: Embeddings, candidate: Embeddings, texts: List[str]) -> Dict[str, float]:
+    """
+    Насколько candidate повторяет reference на texts: минимальный и средний косинус между
+    векторами одного текста и доля текстов, у которых совпадает ближайший сосед среди остальных.
+    """
+    a = np.asarray(reference.embed_documents(texts), dtype=np.float32)
+    b = np.asarray(candidate.embed_documents(texts), dtype=np.float32)
+    a /= np.linalg.norm(a, axis=1, keepdims=True)
+    b /= np.linalg.norm(b, axis=1, keepdims=True)
+    cosines = (a * b).sum(axis=1)
+
+    def neighbours(m: np.ndarray) -> np.ndarray:
+        similarity = m @ m.T
+        np.fill_diagonal(similarity, -np.inf)
+        return similarity.argmax(axis=1)
+
+    return {
+        "min_cosine": float(cosines.min()),
+        "mean_cosine": float(cosines.mean()),
+        "neighbour_agreement": float((neighbours(a) == neighbours(b)).mean()),
+    }
+
+
+_MODELS: Dict[str, OnnxEmbeddings] = {}
+_models_lock = threading.Lock()
+
+
+def get_onnx_embeddings(model_path: str) -> OnnxEmbeddings:
+    """Одна сессия на каталог модели на процесс: тенанты с локальными эмбеддингами делят ее."""
+    with _models_lock:
+        if model_path not in _MODELS:
+            _MODELS[model_path] = OnnxEmbeddings(
+                model_path,
+                max_length=int(os.getenv("ONNX_EMBEDDING_MAX_LENGTH", DEFAULT_MAX_LENGTH)),
+                batch_size=int(os.getenv("ONNX_EMBEDDING_BATCH_SIZE", DEFAULT_BATCH_SIZE)),
+            )
+        return _MODELS[model_path]
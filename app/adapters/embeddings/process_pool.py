@@ -0,0 +1,139 @@
+"""
+Локальные эмбеддинги в пуле процессов (EMBEDDING_WORKERS > 0).
+
+Запросы (embed_query из ретриверов, батчи индексации) складываются в очередь; поток-диспетчер
+набирает из нее пачку текстов за окно EMBEDDING_BATCH_WINDOW_MS (или до EMBEDDING_MAX_BATCH
+текстов) и отдает ее одному воркеру одним вызовом embed_documents. Одиночные вопросы
+клиентов разных тенантов так считаются одним батчем, а большие батчи индексации режутся на
+части и расходятся по всем воркерам.
+
+Снаружи — обычный Embeddings: синхронные embed_* блокируют только вызывающий поток,
+aembed_* ждут результат, не занимая event loop.
+"""
+import asyncio
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+from app.utils.inference_pool import InferenceProcessPool
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_WINDOW_MS = 5.0
+DEFAULT_MAX_BATCH = 64
+
+
+@dataclass
+class _Request:
+    texts: List[str]
+    future: Future = field(default_factory=Future)
+
+
+class ProcessPoolEmbeddings(Embeddings):
+    def __init__(self, factory: Callable[[], Embeddings], workers: int = 2, batch_window_ms: float = DEFAULT_BATCH_WINDOW_MS, max_batch_size: int = DEFAULT_MAX_BATCH, name: str = "embeddings"):
+        self.batch_window_ms = batch_window_ms
+        self.max_batch_size = max_batch_size
+        self.pool = InferenceProcessPool(factory, workers=workers, name=name)
+        # Счетчики для логов и тестов: сколько пачек ушло в воркеры и сколько в них было текстов
+        self.batches = 0
+        self.texts = 0
+        self._queue: "queue.Queue[Optional[_Request]]" = queue.Queue()
+        self._dispatcher = threading.Thread(target=self._dispatch, name=f"{name}-dispatcher", daemon=True)
+        self._dispatcher.start()
+
+    def _enqueue(self, texts: List[str]) -> List[Future]:
+        requests = [_Request(texts[i:i + self.max_batch_size]) for i in range(0, len(texts), self.max_batch_size)]
+        for request in requests:
+            self._queue.put(request)
+        return [r.future for r in requests]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return [vector for future in self._enqueue(list(texts)) for vector in future.result()]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        parts = await asyncio.gather(*(asyncio.wrap_future(f) for f in self._enqueue(list(texts))))
+        return [vector for part in parts for vector in part]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+    def _dispatch(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch, size = [first], len(first.texts)
+            deadline = time.monotonic() + self.batch_window_ms / 1000
+            while size < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if request is None:
+                    self._queue.put(None)
+                    break
+                if size + len(request.texts) > self.max_batch_size:
+                    # Не влезает — уходит текущая пачка, запрос открывает следующую
+                    self._submit(batch)
+                    batch, size = [], 0
+                    deadline = time.monotonic() + self.batch_window_ms / 1000
+                batch.append(request)
+                size += len(request.texts)
+            self._submit(batch)
+
+    def _submit(self, batch: List[_Request]):
+        texts = [text for request in batch for text in request.texts]
+        self.batches += 1
+        self.texts += len(texts)
+        try:
+            future = self.pool.submit("embed_documents", texts)
+        except Exception as e:
+            for request in batch:
+                request.future.set_exception(e)
+            return
+
+        def resolve(done: Future):
+            error = done.exception()
+            if error is not None:
+                logger.error(f"[Embeddings] Ошибка эмбеддингов в пуле процессов ({len(texts)} текстов): {error}")
+                for request in batch:
+                    request.future.set_exception(error)
+                return
+            vectors, offset = done.result(), 0
+            for request in batch:
+                request.future.set_result(vectors[offset:offset + len(request.texts)])
+                offset += len(request.texts)
+
+        future.add_done_callback(resolve)
+
+    def close(self):
+        self._queue.put(None)
+        self.pool.shutdown()
+
+
+_POOLS: Dict[Any, ProcessPoolEmbeddings] = {}
+_pools_lock = threading.Lock()
+
+
+def get_process_pool_embeddings(key: Any, factory: Callable[[], Embeddings], workers: int, batch_window_ms: float, max_batch_size: int) -> ProcessPoolEmbeddings:
+    """Один пул на модель на процесс: все тенанты с локальными эмбеддингами делят воркеров."""
+    with _pools_lock:
+        if key not in _POOLS:
+            _POOLS[key] = ProcessPoolEmbeddings(factory, workers=workers, batch_window_ms=batch_window_ms, max_batch_size=max_batch_size, name=f"embeddings-{key[0]}")
+        return _POOLS[key]
@@ -0,0 +1,66 @@
+"""
+Один эмбеддинг сообщения на ход для всех узлов графа.
+
+Маршрутизатор (локальный классификатор интента) и ретривер работают параллельно и эмбеддят
+одно и то же сообщение. QueryVectorMemo оборачивает эмбеддинги бота: одновременные embed_query
+с одинаковым текстом ждут один вызов модели, а готовый вектор живет ttl_seconds — его же берет
+запись решения LLM в лог классификатора. embed_documents (индексация) идет в модель напрямую.
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import List, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+DEFAULT_TTL_SECONDS = 30.0
+DEFAULT_MAX_ITEMS = 256
+
+
+class QueryVectorMemo(Embeddings):
+    def __init__(self, embeddings: Embeddings, max_items: int = DEFAULT_MAX_ITEMS, ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        self.embeddings = embeddings
+        self.max_items = max_items
+        self.ttl_seconds = ttl_seconds
+        self._items: "OrderedDict[str, Tuple[float, Future]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        now = time.monotonic()
+        with self._lock:
+            item = self._items.get(text)
+            if item and (item[0] > now or not item[1].done()):
+                self._items.move_to_end(text)
+                self.hits += 1
+                future, owner = item[1], False
+            else:
+                future, owner = Future(), True
+                self._items[text] = (now + self.ttl_seconds, future)
+                self._items.move_to_end(text)
+                self.misses += 1
+                while len(self._items) > self.max_items:
+                    self._items.popitem(last=False)
+        if not owner:
+            return future.result()
+
+        try:
+            vector = self.embeddings.embed_query(text)
+        except BaseException as e:
+            # Ошибку получают и ждущие, но следующий запрос снова пойдет в модель
+            with self._lock:
+                if self._items.get(text, (0.0, None))[1] is future:
+                    del self._items[text]
+            future.set_exception(e)
+            raise
+        future.set_result(vector)
+        return vector
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await asyncio.to_thread(self.embed_query, text)
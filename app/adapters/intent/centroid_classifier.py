@@ -0,0 +1,309 @@
+"""
+Локальный классификатор интента (sales / support / unknown) вместо LLM-маршрутизатора.
+
+Ближайший центроид по эмбеддингам бота: центроид интента — нормированное среднее эмбеддингов
+его примеров. Примеры — из конфига бота (intent_router.examples) плюс решения LLM-маршрутизатора,
+которые граф записывает, когда классификатор не уверен (Redis `intent:log:{bot_id}`, если задан
+REDIS_URL, иначе в памяти процесса).
+
+Классификатор держит суммы нормированных векторов и счетчики по интентам: решение LLM сразу
+добавляется в сумму своего интента, центроиды пересчитываются без обращения к модели. Вектор
+решения пишется в лог вместе с текстом (float16, base64), поэтому переобучение раз в refit_every
+решений (окно последних max_logged и решения других процессов) эмбеддит только примеры конфига —
+один раз за жизнь процесса. Обучение идет фоновой задачей: пока центроидов нет, classify
+возвращает None и маршрутизирует LLM. Решения, записанные после снимка лога для обучения,
+добавляются к новым суммам при их подмене, а не теряются до следующего переобучения. Вектор сообщения классификатор берет из эмбеддингов бота,
+общих с ретривером (QueryVectorMemo): параллельный поиск по базе знаний не эмбеддит его второй раз.
+
+Уверенность — отрыв лучшего центроида от второго; ниже min_margin (или при сходстве ниже
+min_similarity) граф спрашивает LLM. Оценка качества: benchmarks/eval_intent_router.py.
+"""
+import asyncio
+import base64
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field, replace
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from app.core.models.intent import IntentPrediction
+from app.core.ports.intent import IntentClassifier
+from app.adapters.retriever.cache import get_sync_redis
+from app.adapters.retriever.mmr import normalize_rows
+
+logger = logging.getLogger(__name__)
+
+INTENT_LOG_KEY = "intent:log:{bot_id}"
+INTENTS = ("sales", "support", "unknown")
+# Пауза перед повтором упавшего обучения (модель эмбеддингов недоступна и т.п.)
+FIT_RETRY_SECONDS = 60.0
+
+# (текст, интент, нормированный вектор или None — тогда вектор посчитает модель)
+Sample = Tuple[str, str, Optional[np.ndarray]]
+
+
+def encode_vector(vector) -> str:
+    return base64.b64encode(np.asarray(vector, dtype=np.float16).tobytes()).decode("ascii")
+
+
+def decode_vector(raw: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(raw), dtype=np.float16).astype(np.float32)
+
+
+@dataclass(frozen=True)
+class IntentRouterConfig:
+    min_margin: float = 0.08
+    min_similarity: float = 0.3
+    # Сколько последних решений LLM брать в обучение и хранить в логе
+    max_logged: int = 5000
+    refit_every: int = 50
+    examples: Dict[str, List[str]] = field(default_factory=dict)
+
+
+def resolve_intent_router(config: Union[None, bool, Dict[str, Any]]) -> Optional[IntentRouterConfig]:
+    """Ключ intent_router в конфиге бота: True/False или {enabled, min_margin, min_similarity, examples, ...}."""
+    if config is None:
+        config = {"enabled": os.getenv("INTENT_ROUTER_ENABLED", "true").lower() in ("true", "1", "t")}
+    elif isinstance(config, bool):
+        config = {"enabled": config}
+    if not config.get("enabled", True):
+        return None
+    return replace(IntentRouterConfig(), **{k: v for k, v in config.items() if k in IntentRouterConfig.__dataclass_fields__})
+
+
+class DecisionLog:
+    """Решения LLM-маршрутизатора: Redis-список (общий для процессов) или список в памяти."""
+    def __init__(self, bot_id: str, max_items: int, redis_client=None):
+        self.key = INTENT_LOG_KEY.format(bot_id=bot_id)
+        self.max_items = max_items
+        self.redis = redis_client
+        self._local: List[Sample] = []
+
+    def append(self, text: str, intent: str, vector: Optional[np.ndarray] = None):
+        if self.redis is not None:
+            item = {"text": text, "intent": intent}
+            if vector is not None:
+                item["v"] = encode_vector(vector)
+            try:
+                pipe = self.redis.pipeline()
+                pipe.lpush(self.key, json.dumps(item, ensure_ascii=False))
+                pipe.ltrim(self.key, 0, self.max_items - 1)
+                pipe.execute()
+                return
+            except Exception as e:
+                logger.warning(f"[IntentRouter] Не удалось записать решение в Redis: {e}")
+        self._local.append((text, intent, vector))
+        del self._local[:-self.max_items]
+
+    def load(self) -> List[Tuple[str, str]]:
+        return [(text, intent) for text, intent, _ in self.load_samples()]
+
+    def load_samples(self) -> List[Sample]:
+        """Решения с векторами; у записей старого формата (без "v") вектор None."""
+        if self.redis is not None:
+            try:
+                items = [json.loads(raw) for raw in self.redis.lrange(self.key, 0, self.max_items - 1)]
+                return [(item["text"], item["intent"], decode_vector(item["v"]) if item.get("v") else None) for item in items]
+            except Exception as e:
+                logger.warning(f"[IntentRouter] Не удалось прочитать лог решений из Redis: {e}")
+        return list(self._local)
+
+
+def _add(sums: Dict[str, np.ndarray], counts: Dict[str, int], intent: str, vector) -> None:
+    sums[intent] = sums[intent] + vector if intent in sums else np.array(vector, dtype=np.float32)
+    counts[intent] = counts.get(intent, 0) + 1
+
+
+class CentroidIntentClassifier(IntentClassifier):
+    def __init__(self, bot_id: str, embeddings_provider: Callable[[], Any], config: IntentRouterConfig, log: Optional[DecisionLog] = None):
+        self.bot_id = bot_id
+        # Эмбеддинги бота берутся лениво: локальная модель не грузится на старте
+        self.embeddings_provider = embeddings_provider
+        self.config = config
+        self.log = log or DecisionLog(bot_id, config.max_logged, get_sync_redis())
+        self._labels: List[str] = []
+        self._centroids: Optional[np.ndarray] = None
+        # Суммы нормированных векторов и число примеров по интентам: центроиды без модели
+        self._sums: Dict[str, np.ndarray] = {}
+        self._counts: Dict[str, int] = {}
+        # Суммы, счетчики и центроиды меняют и обучение (в потоке), и record (в event loop)
+        self._lock = threading.Lock()
+        # Запись в лог и снимок лога для обучения не перемежаются: решение попадает либо
+        # в снимок, либо в _pending, которые обучение добавит к новым суммам
+        self._log_lock = threading.Lock()
+        self._pending: Optional[List[Tuple[str, np.ndarray]]] = None
+        # Векторы примеров из конфига: эмбеддятся один раз, переобучение берет их отсюда
+        self._example_vectors: Dict[str, np.ndarray] = {}
+        # Вектор последнего классифицированного сообщения: запись решения LLM не эмбеддит его снова
+        self._last: Optional[Tuple[str, np.ndarray]] = None
+        self._stale = True
+        self._recorded = 0
+        self._fit_task: Optional[asyncio.Task] = None
+        self._retry_at = 0.0
+
+    def training_set(self) -> List[Sample]:
+        examples = [(text, intent, self._example_vectors.get(text)) for intent, texts in self.config.examples.items() for text in texts]
+        return examples + self.log.load_samples()
+
+    def snapshot(self) -> List[Sample]:
+        """Обучающая выборка; решения, записанные после нее, копятся до подмены сумм в fit."""
+        with self._log_lock:
+            with self._lock:
+                self._pending = []
+            return self.training_set()
+
+    def fit(self, samples: Sequence[Sample]):
+        """
+        Пересчитывает суммы и центроиды (синхронно). В модель одним вызовом идут только тексты
+        без вектора: примеры конфига при первом обучении и записи лога старого формата.
+        """
+        self._stale = False
+        samples = [(text, intent, vector) for text, intent, vector in samples if intent in INTENTS and text.strip()]
+        labels = sorted({intent for _, intent, _ in samples})
+        if len(labels) < 2:
+            logger.info(f"[IntentRouter] {self.bot_id}: мало размеченных примеров ({len(samples)}), маршрутизирует LLM.")
+            self._swap({}, {})
+            return
+
+        vectors = [vector for _, _, vector in samples]
+        self._embed_missing(samples, vectors, [i for i, vector in enumerate(vectors) if vector is None])
+        # Векторы другой размерности — из лога, записанного прежней моделью эмбеддингов
+        dim = next((len(vector) for vector in self._example_vectors.values()), None)
+        outdated = [i for i, vector in enumerate(vectors) if dim and len(vector) != dim]
+        if outdated:
+            logger.info(f"[IntentRouter] {self.bot_id}: {len(outdated)} решений в логе от другой модели эмбеддингов, пересчитываю.")
+            self._embed_missing(samples, vectors, outdated)
+
+        sums: Dict[str, np.ndarray] = {}
+        counts: Dict[str, int] = {}
+        for (_, intent, _), vector in zip(samples, vectors):
+            _add(sums, counts, intent, vector)
+        self._swap(sums, counts)
+        logger.info(f"[IntentRouter] {self.bot_id}: центроиды по {len(samples)} примерам ({', '.join(f'{l}: {counts[l]}' for l in self._labels)})")
+
+    def _embed_missing(self, samples: List[Sample], vectors: List[Optional[np.ndarray]], indices: List[int]):
+        if not indices:
+            return
+        examples = {text for texts in self.config.examples.values() for text in texts}
+        embedded = normalize_rows(np.asarray(self.embeddings_provider().embed_documents([samples[i][0] for i in indices]), dtype=np.float32))
+        for i, vector in zip(indices, embedded):
+            vectors[i] = vector
+            if samples[i][0] in examples:
+                self._example_vectors[samples[i][0]] = vector
+
+    def _swap(self, sums: Dict[str, np.ndarray], counts: Dict[str, int]):
+        """Подменяет суммы, добавив решения, записанные после снимка лога."""
+        with self._log_lock, self._lock:
+            if sums:
+                for intent, vector in self._pending or []:
+                    _add(sums, counts, intent, vector)
+            self._pending = None
+            self._sums, self._counts = sums, counts
+            self._update_centroids()
+
+    def _update_centroids(self):
+        labels = sorted(label for label, count in self._counts.items() if count)
+        if len(labels) < 2:
+            self._labels, self._centroids = [], None
+            return
+        self._centroids = normalize_rows(np.stack([self._sums[label] / self._counts[label] for label in labels]))
+        self._labels = labels
+
+    def predict_vector(self, vector) -> Optional[IntentPrediction]:
+        with self._lock:
+            labels, centroids = self._labels, self._centroids
+        if centroids is None:
+            return None
+        query = normalize_rows(np.asarray(vector, dtype=np.float32).reshape(1, -1))[0]
+        similarities = centroids @ query
+        order = np.argsort(-similarities)
+        best = float(similarities[order[0]])
+        margin = best - float(similarities[order[1]])
+        return IntentPrediction(
+            intent=labels[int(order[0])],
+            confidence=margin,
+            confident=best >= self.config.min_similarity and margin >= self.config.min_margin,
+        )
+
+    def _schedule_fit(self) -> Optional[asyncio.Task]:
+        """Запускает обучение фоновой задачей (если оно еще не идет); ход его не ждет."""
+        if self._fit_task is None or self._fit_task.done():
+            if time.monotonic() < self._retry_at:
+                return None
+            self._stale = False
+            self._fit_task = asyncio.create_task(self._refit())
+        return self._fit_task
+
+    async def _refit(self):
+        try:
+            samples = await asyncio.to_thread(self.snapshot)
+            await asyncio.to_thread(self.fit, samples)
+        except Exception as e:
+            with self._lock:
+                self._pending = None
+            self._retry_at = time.monotonic() + FIT_RETRY_SECONDS
+            logger.error(f"[IntentRouter] {self.bot_id}: ошибка обучения, повтор через {FIT_RETRY_SECONDS:g} с: {e}")
+
+    async def warm_up(self):
+        """Обучает классификатор и дожидается центроидов (скрипты, тесты; граф не ждет)."""
+        task = self._schedule_fit()
+        if task is not None:
+            await task
+
+    async def _embed(self, text: str) -> np.ndarray:
+        embeddings = self.embeddings_provider()
+        if hasattr(embeddings, "aembed_query"):
+            vector = await embeddings.aembed_query(text)
+        else:
+            vector = await asyncio.to_thread(embeddings.embed_query, text)
+        return normalize_rows(np.asarray(vector, dtype=np.float32).reshape(1, -1))[0]
+
+    async def classify(self, text: str) -> Optional[IntentPrediction]:
+        if self._stale:
+            self._schedule_fit()
+        if self._centroids is None:
+            return None
+
+        vector = await self._embed(text)
+        self._last = (text, vector)
+        return self.predict_vector(vector)
+
+    async def record(self, text: str, intent: str) -> None:
+        vector = None
+        if self._last is not None and self._last[0] == text:
+            vector = self._last[1]
+        else:
+            try:
+                vector = await self._embed(text)
+            except Exception as e:
+                # Запись без вектора: его посчитает следующее переобучение
+                logger.warning(f"[IntentRouter] {self.bot_id}: не удалось получить вектор решения: {e}")
+        await asyncio.to_thread(self._remember, text, intent, vector)
+        self._recorded += 1
+        if self._recorded % self.config.refit_every == 0:
+            self._stale = True
+            self._schedule_fit()
+
+    def _remember(self, text: str, intent: str, vector: Optional[np.ndarray]):
+        """Пишет решение в лог и сразу добавляет в суммы (и в _pending, если идет обучение)."""
+        with self._log_lock:
+            self.log.append(text, intent, vector)
+            if vector is None or intent not in INTENTS:
+                return
+            with self._lock:
+                if self._pending is not None:
+                    self._pending.append((intent, vector))
+                if self._counts:
+                    _add(self._sums, self._counts, intent, vector)
+                    self._update_centroids()
+
+
+def create_intent_classifier(bot_id: str, embeddings_provider: Callable[[], Any], config: Union[None, bool, Dict[str, Any]]) -> Optional[CentroidIntentClassifier]:
+    router_config = resolve_intent_router(config)
+    if router_config is None:
+        return None
+    return CentroidIntentClassifier(bot_id, embeddings_provider, router_config)
@@ -1,3 +1,4 @@
+import functools
 import logging
 import os
 import tempfile
@@ -156,3 +157,9 @@ class LangChainLLMAdapter(LLMClient):
             except Exception:
                 pass
         return True
+
+
+@functools.lru_cache(maxsize=None)
+def get_llm_adapter(api_key: str, base_url: str, model_name: str = "gpt-4o-mini") -> LangChainLLMAdapter:
+    """Один адаптер (и пул HTTP-соединений) на модель на процесс: боты с одной моделью его делят."""
+    return LangChainLLMAdapter(api_key=api_key, base_url=base_url, model_name=model_name)
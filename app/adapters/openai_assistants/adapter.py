@@ -1,17 +1,60 @@
 import logging
 import asyncio
-from typing import Optional, List, Dict, Any
-from openai import AsyncOpenAI
+import time
+import uuid
+from typing import Optional, List, Dict, Any, AsyncIterator, Awaitable, Tuple
+import httpx
+from openai import AsyncOpenAI, APIConnectionError, APIError, APIStatusError
+
+from app.utils.metrics import get_metrics
 
 logger = logging.getLogger("OpenAIAssistantsAdapter")
 logger.setLevel(logging.INFO)
 
+ERROR_REPLY = "Извините, произошла ошибка при генерации ответа."
+# Статусы рана, пока он еще не закончился
+ACTIVE_STATUSES = ("queued", "in_progress", "cancelling")
+# Ран закончился без ответа (requires_action — ассистенту нужны наши функции, их у ботов нет)
+FAILED_STATUSES = ("failed", "cancelled", "expired", "incomplete", "requires_action")
+# Поллинг (запасной путь): первая проверка через 100 мс, дальше интервал растет до 2 с
+POLL_INITIAL_SECONDS = 0.1
+POLL_BACKOFF = 1.5
+POLL_MAX_SECONDS = 2.0
+RUN_BUCKETS = (0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+
+class AssistantsRunError(Exception):
+    """Ран ассистента не завершился успешно (failed/expired/...) или не уложился в таймаут."""
+
+
+def _is_transport_error(error: Exception) -> bool:
+    """
+    Обрыв соединения, таймаут (APITimeoutError — подкласс APIConnectionError) или 5xx: стоит
+    дождаться ответа поллингом. 4xx (неверный запрос, ключ, тред не найден, 429) поллинг не исправит.
+    """
+    if isinstance(error, APIStatusError):
+        return error.status_code >= 500
+    return isinstance(error, (APIConnectionError, httpx.TransportError))
+
+
+def _message_text(message) -> str:
+    return "".join(part.text.value for part in message.content if part.type == "text")
+
+
 class OpenAIAssistantsAdapter:
     """
     Адаптер для работы с OpenAI Assistants API (v2).
     Позволяет создавать ботов, загружать им файлы (базы знаний) и вести диалоги (Threads).
+
+    Ответ ассистента читается из стрима рана (runs.create(stream=True)): дельты текста приходят
+    по мере генерации, итоговое сообщение — событием thread.message.completed, без поллинга и
+    отдельного messages.list. Сообщение пользователя уходит в том же запросе (additional_messages).
+    Если стрим недоступен (streaming=False, прокси без SSE, обрыв соединения) — поллинг рана
+    с растущим интервалом от 100 мс. Ран помечается turn_id в metadata: если стрим упал до
+    того, как мы узнали id рана, ран находится по метке, а не создается (и сообщение не
+    отправляется) повторно. Весь ход ограничен run_timeout_seconds.
     """
-    def __init__(self, api_key: str, base_url: Optional[str] = None):
+    def __init__(self, api_key: str, base_url: Optional[str] = None, streaming: bool = True, run_timeout_seconds: float = 60.0):
         # Если base_url передан (например, для proxyapi.ru), используем его
         kwargs = {
             "api_key": api_key,
@@ -21,6 +64,8 @@ class OpenAIAssistantsAdapter:
             kwargs["base_url"] = base_url
             
         self.client = AsyncOpenAI(**kwargs)
+        self.streaming = streaming
+        self.run_timeout_seconds = run_timeout_seconds
         logger.info("[Init] OpenAIAssistantsAdapter инициализирован.")
 
     async def create_assistant(self, name: str, instructions: str, model: str = "gpt-4o-mini", file_ids: List[str] = None) -> str:
@@ -96,40 +141,156 @@ class OpenAIAssistantsAdapter:
         thread = await self.client.beta.threads.create()
         return thread.id
 
+    async def delete_thread(self, thread_id: str) -> None:
+        """Удаляет тред (брошенные сессии виджета, см. thread_pool.py)."""
+        await self.client.beta.threads.delete(thread_id)
+
     async def send_message_and_get_response(self, thread_id: str, assistant_id: str, message: str) -> str:
         """
-        Отправляет сообщение в тред, запускает ассистента и ждет ответ.
+        Отправляет сообщение в тред, запускает ассистента и возвращает его ответ целиком.
         """
-        # 1. Добавляем сообщение пользователя в тред
-        await self.client.beta.threads.messages.create(
-            thread_id=thread_id,
-            role="user",
-            content=message
-        )
-        
-        # 2. Запускаем ассистента
-        run = await self.client.beta.threads.runs.create(
+        final, deltas = None, []
+        try:
+            async for kind, text in self._run(thread_id, assistant_id, message):
+                if kind == "message":
+                    final = text
+                else:
+                    deltas.append(text)
+        except AssistantsRunError as e:
+            logger.error(f"[Assistants] {e}")
+            return ERROR_REPLY
+        return final if final is not None else "".join(deltas)
+
+    async def stream_response(self, thread_id: str, assistant_id: str, message: str) -> AsyncIterator[str]:
+        """
+        То же, но ответ отдается кусками по мере генерации (для SSE).
+        При поллинге ответ приходит одним куском. Ошибка рана — AssistantsRunError.
+        """
+        sent = ""
+        async for kind, text in self._run(thread_id, assistant_id, message):
+            if kind == "delta":
+                sent += text
+                yield text
+            elif text.startswith(sent) and len(text) > len(sent):
+                # Итоговое сообщение: досылаем то, что не пришло дельтами (например, после обрыва стрима)
+                yield text[len(sent):]
+                sent = text
+
+    async def _run(self, thread_id: str, assistant_id: str, message: str) -> AsyncIterator[Tuple[str, str]]:
+        """Ход ассистента: ("delta", кусок текста) по мере генерации и ("message", весь ответ) в конце."""
+        deadline = time.monotonic() + self.run_timeout_seconds
+        started = time.perf_counter()
+        turn_id = uuid.uuid4().hex
+        mode, run, answered = "stream", None, False
+        try:
+            if self.streaming:
+                try:
+                    async for kind, value in self._stream_run(thread_id, assistant_id, message, turn_id, deadline):
+                        if kind == "run":
+                            run = value
+                        else:
+                            answered = answered or kind == "message"
+                            yield kind, value
+                except (APIError, httpx.HTTPError) as e:
+                    # Ошибки транспорта (обрыв SSE: ReadError, RemoteProtocolError) и 5xx — дальше поллингом
+                    if not _is_transport_error(e):
+                        raise
+                    logger.warning(f"[Assistants] Стрим рана недоступен ({e.__class__.__name__}: {e}), переходим на поллинг")
+                    mode = "poll"
+                    if run is None:
+                        # Запрос мог дойти до сервера: ищем свой ран, чтобы не отправить сообщение дважды
+                        run = await self._find_run(thread_id, turn_id, deadline)
+            else:
+                mode = "poll"
+
+            if not answered:
+                if run is None:
+                    run = await self._within(deadline, self.client.beta.threads.runs.create(
+                        thread_id=thread_id,
+                        assistant_id=assistant_id,
+                        additional_messages=[{"role": "user", "content": message}],
+                        metadata={"turn_id": turn_id},
+                    ))
+                run = await self._poll_run(thread_id, run, deadline)
+                if run.status != "completed":
+                    raise AssistantsRunError(f"Ран {run.id} завершился со статусом {run.status}: {run.last_error}")
+                messages = await self._within(deadline, self.client.beta.threads.messages.list(
+                    thread_id=thread_id, run_id=run.id, order="desc", limit=1
+                ))
+                yield "message", _message_text(messages.data[0])
+        except asyncio.TimeoutError:
+            if run is not None:
+                await self._cancel_run(thread_id, run.id)
+            self._observe(started, mode, "timeout")
+            raise AssistantsRunError(f"Ассистент {assistant_id} не ответил за {self.run_timeout_seconds:g} с")
+        except (AssistantsRunError, APIError, httpx.HTTPError):
+            self._observe(started, mode, "error")
+            raise
+        self._observe(started, mode, "ok")
+
+    async def _stream_run(self, thread_id: str, assistant_id: str, message: str, turn_id: str, deadline: float) -> AsyncIterator[Tuple[str, Any]]:
+        """События стрима: ("run", ран) при смене статуса, ("delta", текст), ("message", итоговый текст)."""
+        stream = await self._within(deadline, self.client.beta.threads.runs.create(
             thread_id=thread_id,
-            assistant_id=assistant_id
-        )
-        
-        # 3. Ждем завершения (поллинг)
-        # В реальном проде лучше использовать Streaming, но для простоты пока поллинг
-        while run.status in ['queued', 'in_progress', 'cancelling']:
-            await asyncio.sleep(1)
-            run = await self.client.beta.threads.runs.retrieve(
-                thread_id=thread_id,
-                run_id=run.id
-            )
-            
-        if run.status == 'completed':
-            # 4. Получаем ответ
-            messages = await self.client.beta.threads.messages.list(
-                thread_id=thread_id
-            )
-            # Первое сообщение в списке - это последний ответ ассистента
-            latest_message = messages.data[0]
-            return latest_message.content[0].text.value
-        else:
-            logger.error(f"Ошибка выполнения Run: {run.status}, {run.last_error}")
-            return "Извините, произошла ошибка при генерации ответа."
+            assistant_id=assistant_id,
+            additional_messages=[{"role": "user", "content": message}],
+            metadata={"turn_id": turn_id},
+            stream=True,
+        ))
+        events = stream.__aiter__()
+        try:
+            while True:
+                try:
+                    event = await self._within(deadline, events.__anext__())
+                except StopAsyncIteration:
+                    return
+                if event.event == "thread.message.delta":
+                    for part in event.data.delta.content or []:
+                        if part.type == "text" and part.text and part.text.value:
+                            yield "delta", part.text.value
+                elif event.event == "thread.message.completed":
+                    yield "message", _message_text(event.data)
+                elif event.event.startswith("thread.run.") and not event.event.startswith("thread.run.step."):
+                    yield "run", event.data
+                    if event.data.status in FAILED_STATUSES:
+                        raise AssistantsRunError(f"Ран {event.data.id} завершился со статусом {event.data.status}: {event.data.last_error}")
+                elif event.event == "error":
+                    raise AssistantsRunError(f"Ошибка в стриме рана: {event.data}")
+        finally:
+            await stream.close()
+
+    async def _find_run(self, thread_id: str, turn_id: str, deadline: float):
+        """Последний ран треда, если это ран нашего хода (по metadata.turn_id), иначе None."""
+        runs = await self._within(deadline, self.client.beta.threads.runs.list(thread_id=thread_id, order="desc", limit=1))
+        for run in runs.data:
+            if (run.metadata or {}).get("turn_id") == turn_id:
+                logger.info(f"[Assistants] Ран {run.id} был создан до обрыва стрима, дожидаемся его")
+                return run
+        return None
+
+    async def _poll_run(self, thread_id: str, run, deadline: float):
+        """Ждет завершения рана: проверки через 100 мс, 150 мс, 225 мс ... не реже раза в 2 с."""
+        delay = POLL_INITIAL_SECONDS
+        while run.status in ACTIVE_STATUSES:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise asyncio.TimeoutError()
+            await asyncio.sleep(min(delay, remaining))
+            delay = min(delay * POLL_BACKOFF, POLL_MAX_SECONDS)
+            run = await self._within(deadline, self.client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run.id))
+        return run
+
+    @staticmethod
+    async def _within(deadline: float, awaitable: Awaitable):
+        """await с остатком общего таймаута хода."""
+        return await asyncio.wait_for(awaitable, max(0.0, deadline - time.monotonic()))
+
+    async def _cancel_run(self, thread_id: str, run_id: str):
+        try:
+            await self.client.beta.threads.runs.cancel(run_id, thread_id=thread_id)
+        except Exception as e:
+            logger.warning(f"[Assistants] Не удалось отменить ран {run_id}: {e}")
+
+    @staticmethod
+    def _observe(started: float, mode: str, result: str):
+        get_metrics().observe("assistants_run_seconds", time.perf_counter() - started, buckets=RUN_BUCKETS, mode=mode, result=result)
@@ -0,0 +1,208 @@
+"""
+Пул заранее созданных тредов Assistants API для сессий виджета (боты asst_*).
+
+Тред не привязан к ассистенту, поэтому пул один на процесс для всех ботов. Тред выдается на
+/api/chat/init (или на первом сообщении старой сессии) без обращения к OpenAI, а пул
+добирается в фоне — первое сообщение не ждет threads.create.
+
+Выданный тред арендуется сессией на lease_seconds (TTL сессии). Когда аренда истекла,
+фоновый проход проверяет стейт сессии: сессия жива и тред все еще ее — аренда продлевается,
+иначе (сессия истекла по TTL или переинициализирована с новым тредом) тред удаляется в OpenAI.
+Аренды хранятся в Redis (sorted set, общий для реплик api.py), без Redis — в памяти процесса.
+
+Невыданные треды тоже арендуются — за владельцем pool:idle:<id процесса>. Живой процесс продлевает
+их на каждом проходе, а после падения реплики аренды истекают, и проход любой реплики их удаляет.
+"""
+import asyncio
+import logging
+import time
+import uuid
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.core.ports.conversation import ConversationStore
+
+logger = logging.getLogger(__name__)
+
+LEASES_KEY = "assistants:thread_leases"
+IDLE_OWNER_PREFIX = "pool:idle:"
+DEFAULT_SWEEP_INTERVAL_SECONDS = 60.0
+DEFAULT_REFILL_CONCURRENCY = 4
+
+
+class ThreadLeases:
+    """Аренды тредов: член `thread_id|session_key`, score — когда аренда истекает."""
+    def __init__(self, redis_client=None):
+        self.redis = redis_client
+        self._local: Dict[str, float] = {}
+
+    @staticmethod
+    def _member(thread_id: str, session_key: str) -> str:
+        return f"{thread_id}|{session_key}"
+
+    async def lease(self, thread_id: str, session_key: str, expires_at: float):
+        await self.lease_many([thread_id], session_key, expires_at)
+
+    async def lease_many(self, thread_ids: Iterable[str], session_key: str, expires_at: float):
+        """Одна аренда на несколько тредов владельца (одним ZADD)."""
+        members = {self._member(thread_id, session_key): expires_at for thread_id in thread_ids}
+        if not members:
+            return
+        if self.redis is not None:
+            await self.redis.zadd(LEASES_KEY, members)
+        else:
+            self._local.update(members)
+
+    async def release(self, thread_id: str, session_key: str):
+        member = self._member(thread_id, session_key)
+        if self.redis is not None:
+            await self.redis.zrem(LEASES_KEY, member)
+        else:
+            self._local.pop(member, None)
+
+    async def take_expired(self, now: float, limit: int = 100) -> List[Tuple[str, str]]:
+        """Забирает истекшие аренды. ZREM решает, какая из реплик обработает аренду."""
+        if self.redis is not None:
+            members = await self.redis.zrangebyscore(LEASES_KEY, "-inf", now, start=0, num=limit)
+            taken = [member for member in members if await self.redis.zrem(LEASES_KEY, member)]
+        else:
+            taken = [member for member, expires_at in self._local.items() if expires_at <= now][:limit]
+            for member in taken:
+                del self._local[member]
+        return [tuple(member.split("|", 1)) for member in taken]
+
+
+class AssistantsThreadPool:
+    """
+    Фоновый воркер (start/stop, как KnowledgeBaseWatcher): держит size готовых тредов.
+    Пополнение идет параллельно, не больше refill_concurrency threads.create одновременно.
+    """
+    def __init__(
+        self,
+        assistants_adapter,
+        conversations: ConversationStore,
+        redis_client=None,
+        size: int = 4,
+        lease_seconds: float = 20 * 60,
+        sweep_interval: float = DEFAULT_SWEEP_INTERVAL_SECONDS,
+        refill_concurrency: int = DEFAULT_REFILL_CONCURRENCY,
+    ):
+        self.adapter = assistants_adapter
+        self.conversations = conversations
+        self.leases = ThreadLeases(redis_client)
+        self.size = size
+        self.lease_seconds = lease_seconds
+        self.sweep_interval = sweep_interval
+        self.refill_concurrency = max(1, refill_concurrency)
+        self.is_running = False
+        # Владелец аренд невыданных тредов этого процесса
+        self.idle_owner = f"{IDLE_OWNER_PREFIX}{uuid.uuid4().hex}"
+        self._idle: List[str] = []
+        self._wanted = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def idle(self) -> int:
+        return len(self._idle)
+
+    async def acquire(self, session_key: str) -> str:
+        """Тред для сессии: из пула, а если пул пуст — создается сразу."""
+        if self._idle:
+            thread_id = self._idle.pop()
+            self.hits += 1
+            await self.leases.release(thread_id, self.idle_owner)
+        else:
+            thread_id = await self.adapter.create_thread()
+            self.misses += 1
+        self._wanted.set()
+        await self.leases.lease(thread_id, session_key, time.time() + self.lease_seconds)
+        return thread_id
+
+    async def refill(self):
+        while self.is_running and len(self._idle) < self.size:
+            missing = min(self.size - len(self._idle), self.refill_concurrency)
+            results = await asyncio.gather(*(self._add_idle() for _ in range(missing)), return_exceptions=True)
+            errors = [r for r in results if isinstance(r, Exception)]
+            if errors:
+                # Созданные треды уже в пуле; повтор — на следующем проходе воркера
+                raise errors[0]
+
+    async def _add_idle(self):
+        thread_id = await self.adapter.create_thread()
+        if not self.is_running:
+            # Пул закрыли, пока тред создавался
+            await self.adapter.delete_thread(thread_id)
+            return
+        await self.leases.lease(thread_id, self.idle_owner, time.time() + self.lease_seconds)
+        self._idle.append(thread_id)
+
+    async def sweep(self, now: Optional[float] = None) -> int:
+        """
+        Продлевает аренды живых сессий и своих невыданных тредов, удаляет треды истекших сессий
+        и невыданные треды упавших процессов. Возвращает число удаленных.
+        """
+        now = time.time() if now is None else now
+        await self.leases.lease_many(list(self._idle), self.idle_owner, now + self.lease_seconds)
+        deleted = 0
+        for thread_id, session_key in await self.leases.take_expired(now):
+            if session_key.startswith(IDLE_OWNER_PREFIX):
+                if session_key == self.idle_owner and thread_id in self._idle:
+                    await self.leases.lease(thread_id, session_key, now + self.lease_seconds)
+                    continue
+            else:
+                _, state = await self.conversations.load(session_key)
+                if state.get("thread_id") == thread_id:
+                    await self.leases.lease(thread_id, session_key, now + self.lease_seconds)
+                    continue
+            try:
+                await self.adapter.delete_thread(thread_id)
+                deleted += 1
+            except Exception as e:
+                logger.warning(f"[ThreadPool] Не удалось удалить тред {thread_id}: {e}")
+        if deleted:
+            logger.info(f"[ThreadPool] Удалено брошенных тредов: {deleted}")
+        return deleted
+
+    async def start(self):
+        self.is_running = True
+        await self._run()
+
+    async def _run(self):
+        logger.info(f"[ThreadPool] Пул тредов Assistants API: {self.size}, аренда {self.lease_seconds:g} с")
+        next_sweep = time.monotonic() + self.sweep_interval
+        while self.is_running:
+            self._wanted.clear()
+            try:
+                await self.refill()
+                if time.monotonic() >= next_sweep:
+                    next_sweep = time.monotonic() + self.sweep_interval
+                    await self.sweep()
+            except Exception as e:
+                logger.error(f"[ThreadPool] Ошибка пополнения пула: {e}", exc_info=True)
+            try:
+                await asyncio.wait_for(self._wanted.wait(), max(0.0, next_sweep - time.monotonic()))
+            except asyncio.TimeoutError:
+                pass
+
+    def ensure_started(self):
+        """Запускает воркер в фоне, если он еще не запущен (пул поднимается с первым ботом asst_*)."""
+        if self._task is None or self._task.done():
+            # is_running — до первого шага задачи, чтобы stop() сразу после запуска не потерялся
+            self.is_running = True
+            self._task = asyncio.create_task(self._run(), name="assistants_thread_pool")
+
+    def stop(self):
+        self.is_running = False
+        self._wanted.set()
+
+    async def close(self):
+        """Останавливает воркер и удаляет невыданные треды."""
+        self.stop()
+        idle, self._idle = self._idle, []
+        for thread_id in idle:
+            try:
+                await self.adapter.delete_thread(thread_id)
+                await self.leases.release(thread_id, self.idle_owner)
+            except Exception as e:
+                logger.warning(f"[ThreadPool] Не удалось удалить тред {thread_id}: {e}")
@@ -0,0 +1,96 @@
+"""
+Микробатчинг поиска: одиночные aretrieve от конкурентных обработчиков (разбор накопившихся
+вопросов, отзывов, чатов), пришедшие в пределах max_wait_ms, уходят в базовый ретривер
+одним retrieve_many — один вызов эмбеддингов и один пакетный запрос в векторную базу.
+"""
+import asyncio
+import logging
+import os
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+from app.core.ports.retriever import KnowledgeRetriever, RetrieverDecorator
+from app.core.models.chunk import RetrievedChunk
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WAIT_MS = 5.0
+DEFAULT_MAX_BATCH_SIZE = 32
+
+
+class BatchingRetriever(RetrieverDecorator):
+    """
+    Декоратор ретривера. Синхронные retrieve/retrieve_many проходят насквозь,
+    батчатся только aretrieve из event loop. Пачка отправляется по таймеру или при max_batch_size.
+    """
+    def __init__(self, base: KnowledgeRetriever, max_wait_ms: float = DEFAULT_MAX_WAIT_MS, max_batch_size: int = DEFAULT_MAX_BATCH_SIZE):
+        super().__init__(base)
+        self.max_wait_ms = max_wait_ms
+        self.max_batch_size = max_batch_size
+        self._pending: List[Tuple[str, int, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._running: Set[asyncio.Task] = set()
+        self.batches = 0
+        self.queries = 0
+
+    def retrieve(self, query: str, k: int = 6) -> List[RetrievedChunk]:
+        return self.base.retrieve(query, k=k)
+
+    def retrieve_many(self, queries: List[str], k: int = 6) -> List[List[RetrievedChunk]]:
+        return self.base.retrieve_many(queries, k=k)
+
+    async def aretrieve(self, query: str, k: int = 6) -> List[RetrievedChunk]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((query, k, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.max_wait_ms / 1000, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+        task = asyncio.get_running_loop().create_task(self._run(pending))
+        # Держим ссылку на задачу, иначе ее может собрать GC
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _run(self, pending: List[Tuple[str, int, asyncio.Future]]):
+        by_k: Dict[int, List[Tuple[str, asyncio.Future]]] = defaultdict(list)
+        for query, k, future in pending:
+            by_k[k].append((query, future))
+
+        for k, items in by_k.items():
+            self.batches += 1
+            self.queries += len(items)
+            if len(items) > 1:
+                logger.info(f"[RetrievalBatcher] Пакет из {len(items)} запросов (k={k})")
+            try:
+                results = await asyncio.to_thread(self.base.retrieve_many, [query for query, _ in items], k)
+            except Exception as e:
+                logger.error(f"[RetrievalBatcher] Ошибка пакетного поиска: {e}")
+                results = [e] * len(items)
+
+            for (_, future), result in zip(items, results):
+                if future.done():
+                    # Вызывающий уже отменил ожидание (таймаут, отмена задачи)
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+
+def with_batching(retriever: KnowledgeRetriever, max_wait_ms: Optional[float] = None) -> KnowledgeRetriever:
+    """RETRIEVAL_BATCH_WAIT_MS=0 выключает микробатчинг."""
+    if max_wait_ms is None:
+        max_wait_ms = float(os.getenv("RETRIEVAL_BATCH_WAIT_MS", DEFAULT_MAX_WAIT_MS))
+    if max_wait_ms <= 0:
+        return retriever
+    return BatchingRetriever(retriever, max_wait_ms=max_wait_ms, max_batch_size=int(os.getenv("RETRIEVAL_BATCH_SIZE", DEFAULT_MAX_BATCH_SIZE)))
@@ -0,0 +1,252 @@
+"""
+Кэш результатов поиска по базе знаний.
+
+Ключ: (коллекция, версия базы знаний, нормализованный запрос, k). Версия — хэш всех
+chunk_id + content_hash, ее записывает путь пересборки (индексатор, теневая пересборка,
+откат) локально и в Redis `kb:version:{collection}`. После пересборки версия меняется,
+и старые записи кэша просто перестают находиться.
+
+Уровни: LRU в памяти процесса + опционально Redis (REDIS_URL), общий для main.py, api.py и Chainlit.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.core.ports.retriever import KnowledgeRetriever, RetrieverDecorator
+from app.core.models.chunk import RetrievedChunk
+
+logger = logging.getLogger(__name__)
+
+KB_VERSION_KEY = "kb:version:{collection}"
+CACHE_KEY = "retrieval:{collection}:{version}:{k}:{query_hash}"
+
+_redis_client = None
+_redis_lock = threading.Lock()
+
+
+def get_sync_redis():
+    """Общий синхронный клиент Redis (ретриверы синхронные) или None, если REDIS_URL не задан."""
+    global _redis_client
+    url = os.getenv("REDIS_URL")
+    if not url:
+        return None
+    with _redis_lock:
+        if _redis_client is None:
+            import redis
+            _redis_client = redis.Redis.from_url(url, decode_responses=True, socket_timeout=0.5, socket_connect_timeout=0.5)
+        return _redis_client
+
+
+def normalize_query(query: str) -> str:
+    """'Не включается   приставка?!' -> 'не включается приставка'."""
+    text = query.lower().replace("ё", "е")
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+def compute_kb_version(hashes: Dict[str, Optional[str]]) -> str:
+    """Версия базы знаний: хэш от набора (chunk_id, content_hash), не зависит от порядка."""
+    digest = hashlib.sha256()
+    for chunk_id in sorted(hashes):
+        digest.update(f"{chunk_id}:{hashes[chunk_id]}\n".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+class KnowledgeBaseVersions:
+    """
+    Реестр версий баз знаний. Локальные значения + Redis, чтобы пересборка в одном процессе
+    (или скриптом rebuild_qdrant_knowledge.py) инвалидировала кэш во всех остальных.
+    Версию из Redis перечитываем не чаще раза в refresh_seconds.
+    """
+    def __init__(self, redis_client=None, refresh_seconds: float = 2.0):
+        self.redis = redis_client
+        self.refresh_seconds = refresh_seconds
+        self._versions: Dict[str, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, collection: str, version: str):
+        with self._lock:
+            self._versions[collection] = (version, time.monotonic())
+        if self.redis is not None:
+            try:
+                self.redis.set(KB_VERSION_KEY.format(collection=collection), version)
+            except Exception as e:
+                logger.warning(f"[RetrievalCache] Не удалось записать версию {collection} в Redis: {e}")
+        logger.info(f"[RetrievalCache] Версия базы знаний {collection}: {version}")
+
+    def get(self, collection: str) -> Optional[str]:
+        with self._lock:
+            version, checked_at = self._versions.get(collection, (None, 0.0))
+        if self.redis is None or time.monotonic() - checked_at < self.refresh_seconds:
+            return version
+
+        try:
+            version = self.redis.get(KB_VERSION_KEY.format(collection=collection)) or version
+        except Exception as e:
+            logger.warning(f"[RetrievalCache] Redis недоступен, использую локальную версию {collection}: {e}")
+        if version is not None:
+            with self._lock:
+                self._versions[collection] = (version, time.monotonic())
+        return version
+
+
+_kb_versions: Optional[KnowledgeBaseVersions] = None
+
+
+def get_kb_versions() -> KnowledgeBaseVersions:
+    global _kb_versions
+    if _kb_versions is None:
+        _kb_versions = KnowledgeBaseVersions(redis_client=get_sync_redis())
+    return _kb_versions
+
+
+class RetrievalCache:
+    """
+    LRU в памяти + опциональный Redis. Значение — список чанков; наружу отдается и внутрь
+    кладется копия списка, чтобы декораторы выше (отсечение, реранкинг) не меняли кэш.
+    """
+    def __init__(self, max_size: int = 1024, ttl_seconds: int = 3600, redis_client=None):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.redis = redis_client
+        self._items: "OrderedDict[str, Tuple[float, List[RetrievedChunk]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(collection: str, version: str, query: str, k: int) -> str:
+        query_hash = hashlib.sha1(normalize_query(query).encode("utf-8")).hexdigest()
+        return CACHE_KEY.format(collection=collection, version=version, k=k, query_hash=query_hash)
+
+    def get(self, key: str) -> Optional[List[RetrievedChunk]]:
+        with self._lock:
+            item = self._items.get(key)
+            if item and item[0] > time.monotonic():
+                self._items.move_to_end(key)
+                self.hits += 1
+                return list(item[1])
+
+        chunks = self._get_from_redis(key)
+        with self._lock:
+            if chunks is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        self._put_local(key, chunks)
+        return list(chunks)
+
+    def put(self, key: str, chunks: List[RetrievedChunk]):
+        self._put_local(key, chunks)
+        if self.redis is not None:
+            try:
+                payload = json.dumps([{"content": c.content, "score": c.score, "metadata": c.metadata} for c in chunks], ensure_ascii=False)
+                self.redis.setex(key, self.ttl_seconds, payload)
+            except Exception as e:
+                logger.warning(f"[RetrievalCache] Не удалось записать в Redis: {e}")
+
+    def _put_local(self, key: str, chunks: List[RetrievedChunk]):
+        with self._lock:
+            self._items[key] = (time.monotonic() + self.ttl_seconds, list(chunks))
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def _get_from_redis(self, key: str) -> Optional[List[RetrievedChunk]]:
+        if self.redis is None:
+            return None
+        try:
+            payload = self.redis.get(key)
+        except Exception as e:
+            logger.warning(f"[RetrievalCache] Redis недоступен: {e}")
+            return None
+        if not payload:
+            return None
+        return [RetrievedChunk(content=c["content"], score=c["score"], metadata=c["metadata"]) for c in json.loads(payload)]
+
+
+def _decorator_chain(retriever: KnowledgeRetriever) -> List[KnowledgeRetriever]:
+    chain = [retriever]
+    while isinstance(chain[-1], RetrieverDecorator):
+        chain.append(chain[-1].base)
+    return chain
+
+
+class CachedRetriever(RetrieverDecorator):
+    """
+    Декоратор ретривера: на попадании не нужны ни эмбеддинг запроса, ни поиск в векторной базе.
+    Пока версия базы знаний неизвестна, кэш не используется.
+    """
+    def __init__(self, base: KnowledgeRetriever, collection: str, cache: RetrievalCache, version_provider: Optional[Callable[[], Optional[str]]] = None):
+        super().__init__(base)
+        self.collection = collection
+        self.cache = cache
+        self.version_provider = version_provider or (lambda: get_kb_versions().get(collection))
+        # Цепочка декораторов в ключе: с реранкингом/отсечением и без них результаты разные
+        self.chain = "+".join(type(r).__name__ for r in _decorator_chain(base))
+
+    def _key(self, version: str, query: str, k: int) -> str:
+        return RetrievalCache.make_key(f"{self.collection}/{self.chain}", version, query, k)
+
+    def retrieve(self, query: str, k: int = 6) -> List[RetrievedChunk]:
+        version = self.version_provider()
+        if version is None:
+            return self.base.retrieve(query, k=k)
+
+        key = self._key(version, query, k)
+        chunks = self.cache.get(key)
+        if chunks is not None:
+            return chunks
+
+        chunks = self.base.retrieve(query, k=k)
+        # Пустой результат может быть ошибкой поиска — такое не кэшируем
+        if chunks:
+            self.cache.put(key, chunks)
+        return chunks
+
+    def retrieve_many(self, queries: List[str], k: int = 6) -> List[List[RetrievedChunk]]:
+        version = self.version_provider()
+        if version is None:
+            return self.base.retrieve_many(queries, k=k)
+
+        keys = [self._key(version, query, k) for query in queries]
+        results: List[Optional[List[RetrievedChunk]]] = [self.cache.get(key) for key in keys]
+        misses = [i for i, chunks in enumerate(results) if chunks is None]
+        if misses:
+            # В базовый ретривер уходят только промахи, одной пачкой
+            for i, chunks in zip(misses, self.base.retrieve_many([queries[i] for i in misses], k=k)):
+                results[i] = chunks
+                if chunks:
+                    self.cache.put(keys[i], chunks)
+        return results
+
+
+_shared_cache: Optional[RetrievalCache] = None
+
+
+def get_retrieval_cache() -> Optional[RetrievalCache]:
+    """Общий кэш процесса; RETRIEVAL_CACHE_SIZE=0 выключает кэширование."""
+    global _shared_cache
+    max_size = int(os.getenv("RETRIEVAL_CACHE_SIZE", "1024"))
+    if max_size <= 0:
+        return None
+    if _shared_cache is None:
+        _shared_cache = RetrievalCache(
+            max_size=max_size,
+            ttl_seconds=int(os.getenv("RETRIEVAL_CACHE_TTL", "3600")),
+            redis_client=get_sync_redis(),
+        )
+    return _shared_cache
+
+
+def with_cache(retriever: KnowledgeRetriever, collection: str, version_provider: Optional[Callable[[], Optional[str]]] = None) -> KnowledgeRetriever:
+    cache = get_retrieval_cache()
+    if cache is None:
+        return retriever
+    return CachedRetriever(retriever, collection, cache, version_provider=version_provider)
@@ -0,0 +1,346 @@
+import logging
+import re
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+from qdrant_client import QdrantClient
+from redis.exceptions import LockError, RedisError
+from qdrant_client.http.models import (
+    CreateAlias,
+    CreateAliasOperation,
+    DeleteAlias,
+    DeleteAliasOperation,
+    PointStruct,
+)
+
+from app.adapters.retriever.cache import compute_kb_version, get_kb_versions, get_sync_redis
+from app.adapters.retriever.faq_index import faq_collection_name
+from app.adapters.retriever.index_profiles import IndexProfile, resolve_index_profile
+from app.adapters.retriever.kb_indexer import QdrantKnowledgeIndexer, build_chunks, plan_changes, split_knowledge_base
+
+logger = logging.getLogger(__name__)
+
+VERSION_SEPARATOR = "__v"
+REBUILD_LOCK_KEY = "kb:rebuild:{alias}"
+# Redis-блокировка живет lock_seconds и продлевается, пока сборка идет (упавший процесс ее не держит)
+DEFAULT_REBUILD_LOCK_SECONDS = 60.0
+# Сколько ждать чужую сборку: полная пересборка большой базы с эмбеддингом занимает минуты
+DEFAULT_REBUILD_WAIT_SECONDS = 30 * 60.0
+
+_local_locks: Dict[str, threading.Lock] = {}
+_local_locks_guard = threading.Lock()
+
+
+class RebuildLockedError(RuntimeError):
+    """Пересборку алиаса дольше wait_seconds держит другой процесс."""
+
+
+def _local_lock(alias: str) -> threading.Lock:
+    with _local_locks_guard:
+        return _local_locks.setdefault(alias, threading.Lock())
+
+
+class VersionedCollection:
+    """
+    Коллекция базы знаний за алиасом Qdrant.
+
+    Адаптеры всегда читают по имени `alias` (например, smart_bot_knowledge), а данные лежат
+    в версионированных коллекциях `{alias}__v{n}`. Полная пересборка пишет в новую теневую
+    версию, проверяет ее и атомарно переключает алиас — живой поиск не видит пустую
+    или недозаполненную коллекцию. Предыдущая версия остается для мгновенного отката.
+
+    Сборка, перезагрузка и откат одного алиаса идут по одной за раз во всех процессах
+    (см. rebuild_lock): main.py и api.py следят за одними и теми же базами знаний.
+    """
+    def __init__(
+        self,
+        client: QdrantClient,
+        alias: str,
+        keep_versions: int = 2,
+        index_profile: Optional[IndexProfile] = None,
+        redis_client=None,
+        lock_seconds: float = DEFAULT_REBUILD_LOCK_SECONDS,
+        wait_seconds: float = DEFAULT_REBUILD_WAIT_SECONDS,
+    ):
+        self.client = client
+        self.alias = alias
+        self.keep_versions = max(2, keep_versions)
+        self.index_profile = resolve_index_profile(index_profile)
+        self.redis = redis_client or get_sync_redis()
+        self.lock_seconds = lock_seconds
+        self.wait_seconds = wait_seconds
+        self._version_re = re.compile(rf"^{re.escape(alias)}{VERSION_SEPARATOR}(\d+)$")
+
+    @contextmanager
+    def rebuild_lock(self) -> Iterator[None]:
+        """
+        Без блокировки два процесса, перезагружающие один алиас, достраивают или удаляют
+        (не сошелся счетчик в _verify) чужую недостроенную версию и наперегонки переключают алиас.
+        Держит блокировку в процессе и Redis-блокировку `kb:rebuild:{alias}` (redis-py Lock:
+        SET NX PX + снятие Lua-скриптом), которую фоновый поток продлевает до конца сборки.
+        Без REDIS_URL защищен только текущий процесс — наблюдатель стоит включать в одном.
+        """
+        with _local_lock(self.alias):
+            if self.redis is None:
+                yield
+                return
+
+            # thread_local=False: токен блокировки нужен и потоку продления
+            lock = self.redis.lock(REBUILD_LOCK_KEY.format(alias=self.alias), timeout=self.lock_seconds, sleep=0.5, blocking_timeout=self.wait_seconds, thread_local=False)
+            try:
+                acquired = lock.acquire()
+            except RedisError as e:
+                logger.warning(f"[Collections] Redis недоступен ({e}), {self.alias} пересобираю без межпроцессной блокировки.")
+                yield
+                return
+            if not acquired:
+                raise RebuildLockedError(f"Пересборку {self.alias} держит другой процесс дольше {self.wait_seconds:g} с")
+
+            stop = threading.Event()
+            heartbeat = threading.Thread(target=self._extend_lock, args=(lock, stop), name=f"kb-rebuild-lock-{self.alias}", daemon=True)
+            heartbeat.start()
+            try:
+                yield
+            finally:
+                stop.set()
+                heartbeat.join()
+                try:
+                    lock.release()
+                except (LockError, RedisError) as e:
+                    logger.warning(f"[Collections] Блокировка пересборки {self.alias} истекла до конца сборки: {e}")
+
+    def _extend_lock(self, lock, stop: threading.Event):
+        while not stop.wait(self.lock_seconds / 3):
+            try:
+                lock.reacquire()
+            except (LockError, RedisError) as e:
+                logger.warning(f"[Collections] Не удалось продлить блокировку пересборки {self.alias}: {e}")
+                return
+
+    def version_name(self, version: int) -> str:
+        return f"{self.alias}{VERSION_SEPARATOR}{version}"
+
+    def versions(self) -> List[int]:
+        names = [c.name for c in self.client.get_collections().collections]
+        return sorted(int(m.group(1)) for m in map(self._version_re.match, names) if m)
+
+    def active_collection(self) -> Optional[str]:
+        for alias in self.client.get_aliases().aliases:
+            if alias.alias_name == self.alias:
+                return alias.collection_name
+        return None
+
+    def _is_legacy_collection(self) -> bool:
+        """Старая схема: физическая коллекция с именем алиаса (до перехода на версии)."""
+        return any(c.name == self.alias for c in self.client.get_collections().collections)
+
+    def _next_version_name(self) -> str:
+        versions = self.versions()
+        return self.version_name((versions[-1] if versions else 0) + 1)
+
+    def create_empty(self, vector_size: int) -> str:
+        """Создает пустую версию и вешает на нее алиас (фолбэк, если собрать базу не удалось)."""
+        with self.rebuild_lock():
+            name = self._next_version_name()
+            self.client.create_collection(collection_name=name, vectors_config=self.index_profile.vectors_config(vector_size))
+            self.switch_to(name)
+            return name
+
+    def rebuild(self, knowledge_base_path: str, embeddings, smoke_queries: Optional[List[str]] = None, seed_from: Optional[str] = None) -> str:
+        """
+        Собирает новую версию коллекции, проверяет ее и переключает на нее алиас.
+        Если прошлая сборка оборвалась (429, падение процесса), ее версия продолжается:
+        уже загруженные чанки повторно не эмбеддятся.
+        seed_from: коллекция, из которой копируются векторы неизмененных чанков (см. reload).
+        """
+        with self.rebuild_lock():
+            return self._rebuild(knowledge_base_path, embeddings, smoke_queries, seed_from)
+
+    def _rebuild(self, knowledge_base_path: str, embeddings, smoke_queries: Optional[List[str]] = None, seed_from: Optional[str] = None) -> str:
+        shadow = self._unfinished_version()
+        if shadow:
+            logger.info(f"[Collections] Продолжаю недостроенную теневую коллекцию {shadow} для {self.alias}...")
+        else:
+            shadow = self._next_version_name()
+            logger.info(f"[Collections] Сборка теневой коллекции {shadow} для {self.alias}...")
+
+        chunks = build_chunks(split_knowledge_base(knowledge_base_path))
+        indexer = QdrantKnowledgeIndexer(self.client, shadow, embeddings, index_profile=self.index_profile)
+        try:
+            if seed_from:
+                self._copy_unchanged(seed_from, shadow, chunks)
+            plan = indexer.sync(knowledge_base_path, record_version=False)
+        except Exception:
+            logger.error(f"[Collections] Сборка {shadow} прервана, следующий запуск продолжит ее. Алиас не переключаю.")
+            raise
+
+        try:
+            self._verify(shadow, len(chunks), embeddings, smoke_queries or self._default_smoke_queries(chunks))
+        except Exception:
+            logger.error(f"[Collections] Теневая коллекция {shadow} не прошла проверку, алиас не переключаю.")
+            self._delete_version(shadow)
+            raise
+
+        self.switch_to(shadow)
+        get_kb_versions().record(self.alias, plan.kb_version)
+        self._cleanup_old_versions()
+        return shadow
+
+    def reload(self, knowledge_base_path: str, embeddings) -> Optional[str]:
+        """
+        Горячая перезагрузка после правки базы знаний: новая версия собирается инкрементально
+        (векторы неизмененных чанков копируются из активной версии, эмбеддятся только новые
+        и измененные), затем та же проверка и атомарное переключение алиаса, что и в rebuild.
+        Запросы, уже начатые на старой версии, дочитывают ее — она остается для отката.
+        Возвращает имя новой активной версии или None, если база знаний не изменилась
+        (в том числе когда ту же правку, пока мы ждали блокировку, уже собрал другой процесс).
+        """
+        with self.rebuild_lock():
+            return self._reload(knowledge_base_path, embeddings)
+
+    def _reload(self, knowledge_base_path: str, embeddings) -> Optional[str]:
+        active = self.active_collection()
+        if active is None:
+            return self._rebuild(knowledge_base_path, embeddings)
+
+        chunks = build_chunks(split_knowledge_base(knowledge_base_path))
+        plan = plan_changes(chunks, QdrantKnowledgeIndexer(self.client, active, embeddings=None).stored_hashes())
+        if plan.is_empty:
+            logger.info(f"[Collections] {self.alias}: база знаний не изменилась, версию не пересобираю.")
+            get_kb_versions().record(self.alias, plan.kb_version)
+            return None
+
+        logger.info(f"[Collections] Горячая перезагрузка {self.alias} ({plan.summary()})")
+        return self._rebuild(knowledge_base_path, embeddings, seed_from=active)
+
+    def _copy_unchanged(self, source: str, target: str, chunks, batch_size: int = 256):
+        """Копирует в target точки source, чей content_hash совпадает с новым текстом чанка."""
+        wanted = {d.metadata["chunk_id"]: d.metadata["content_hash"] for d in chunks}
+        if not self.client.collection_exists(target):
+            vector_size = self.client.get_collection(source).config.params.vectors.size
+            self.client.create_collection(collection_name=target, vectors_config=self.index_profile.vectors_config(vector_size))
+
+        copied = 0
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=source,
+                limit=batch_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=True,
+            )
+            reusable = [
+                PointStruct(id=p.id, vector=p.vector, payload=p.payload)
+                for p in points
+                if wanted.get(str(p.id)) is not None
+                and wanted[str(p.id)] == ((p.payload or {}).get("metadata") or {}).get("content_hash")
+            ]
+            if reusable:
+                self.client.upsert(collection_name=target, points=reusable)
+                copied += len(reusable)
+            if offset is None:
+                break
+        logger.info(f"[Collections] {target}: скопировано {copied} неизмененных чанков из {source}")
+        self._copy_faq(source, target, batch_size)
+
+    def _copy_faq(self, source: str, target: str, batch_size: int = 256):
+        """Переносит FAQ-индекс source в target: неизмененные заголовки не переэмбеддятся, лишнее уберет FaqIndexBuilder."""
+        source_faq, target_faq = faq_collection_name(source), faq_collection_name(target)
+        if not self.client.collection_exists(source_faq):
+            return
+        if not self.client.collection_exists(target_faq):
+            self.client.create_collection(collection_name=target_faq, vectors_config=self.client.get_collection(source_faq).config.params.vectors)
+
+        offset = None
+        while True:
+            points, offset = self.client.scroll(collection_name=source_faq, limit=batch_size, offset=offset, with_payload=True, with_vectors=True)
+            if points:
+                self.client.upsert(collection_name=target_faq, points=[PointStruct(id=p.id, vector=p.vector, payload=p.payload) for p in points])
+            if offset is None:
+                return
+
+    def _unfinished_version(self) -> Optional[str]:
+        """Версия новее активной — недостроенная (или не переключенная) прошлая сборка."""
+        active = self.active_collection()
+        match = self._version_re.match(active) if active else None
+        active_version = int(match.group(1)) if match else 0
+        newer = [v for v in self.versions() if v > active_version]
+        return self.version_name(newer[-1]) if newer else None
+
+    def rollback(self) -> str:
+        """
+        Переключает алиас на предыдущую версию коллекции и удаляет версии новее нее.
+        Иначе откаченная версия выглядела бы недостроенной сборкой: следующий rebuild
+        достроил бы ее и вернул алиас на плохую версию.
+        """
+        with self.rebuild_lock():
+            return self._rollback()
+
+    def _rollback(self) -> str:
+        active = self.active_collection()
+        match = self._version_re.match(active) if active else None
+        previous = [v for v in self.versions() if match and v < int(match.group(1))]
+        if not previous:
+            raise RuntimeError(f"Нет предыдущей версии для отката алиаса {self.alias}")
+
+        target = self.version_name(previous[-1])
+        self.switch_to(target)
+        for version in self.versions():
+            if version > previous[-1]:
+                logger.info(f"[Collections] Удаляю откаченную версию {self.version_name(version)}")
+                self._delete_version(self.version_name(version))
+        hashes = QdrantKnowledgeIndexer(self.client, target, embeddings=None).stored_hashes()
+        get_kb_versions().record(self.alias, compute_kb_version(hashes))
+        return target
+
+    def switch_to(self, collection_name: str):
+        """Атомарно перевешивает алиас (delete + create в одном запросе)."""
+        if self._is_legacy_collection():
+            # Алиас не может совпадать с именем коллекции, поэтому старую коллекцию удаляем.
+            # Это единственный момент, когда поиск на доли секунды может не найти коллекцию.
+            logger.warning(f"[Collections] Миграция: удаляю старую коллекцию {self.alias}, дальше работаем через алиас.")
+            self._delete_version(self.alias)
+
+        operations = []
+        if self.active_collection():
+            operations.append(DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=self.alias)))
+        operations.append(CreateAliasOperation(create_alias=CreateAlias(collection_name=collection_name, alias_name=self.alias)))
+        self.client.update_collection_aliases(change_aliases_operations=operations)
+        logger.info(f"[Collections] Алиас {self.alias} -> {collection_name}")
+
+    def _verify(self, collection_name: str, expected_count: int, embeddings, smoke_queries: List[str]):
+        count = self.client.count(collection_name, exact=True).count
+        if count != expected_count:
+            raise RuntimeError(f"В {collection_name} {count} точек, ожидалось {expected_count}")
+
+        for query in smoke_queries:
+            points = self.client.query_points(
+                collection_name=collection_name,
+                query=embeddings.embed_query(query),
+                limit=1,
+                search_params=self.index_profile.search_params(),
+            ).points
+            if not points:
+                raise RuntimeError(f"Smoke-запрос '{query}' ничего не нашел в {collection_name}")
+        logger.info(f"[Collections] {collection_name}: {count} точек, smoke-запросов пройдено: {len(smoke_queries)}")
+
+    @staticmethod
+    def _default_smoke_queries(chunks, limit: int = 3) -> List[str]:
+        questions = [d.metadata["question"] for d in chunks if d.metadata.get("question")]
+        return questions[:limit] or [d.page_content[:200] for d in chunks[:1]]
+
+    def _cleanup_old_versions(self):
+        active = self.active_collection()
+        stale = [self.version_name(v) for v in self.versions()][:-self.keep_versions]
+        for name in stale:
+            if name != active:
+                logger.info(f"[Collections] Удаляю устаревшую версию {name}")
+                self._delete_version(name)
+
+    def _delete_version(self, name: str):
+        """Удаляет коллекцию вместе с ее FAQ-индексом."""
+        for collection in (name, faq_collection_name(name)):
+            if self.client.collection_exists(collection):
+                self.client.delete_collection(collection)
@@ -1,92 +1,50 @@
 import os
 import logging
 from typing import List, Optional
-from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.document_loaders import TextLoader
-from langchain.text_splitter import MarkdownHeaderTextSplitter, RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
+import numpy as np
 
 from app.core.ports.retriever import KnowledgeRetriever
 from app.core.models.chunk import RetrievedChunk
+from app.adapters.embeddings.factory import calibrate_score, create_embeddings, embedding_model_name, resolve_provider, score_calibration
+from app.adapters.retriever.faiss_store import NativeFaissStore, migrate_legacy_index, sync_native_index
+from app.adapters.retriever.mmr import maximal_marginal_relevance, DEFAULT_FETCH_K, DEFAULT_LAMBDA_MULT
 
 logger = logging.getLogger(__name__)
 
 class FAISSRetrieverAdapter(KnowledgeRetriever):
-    def __init__(self, index_path: str, knowledge_base_path: str, openai_api_key: Optional[str] = None, openai_api_base: Optional[str] = None):
+    def __init__(self, index_path: str, knowledge_base_path: str, openai_api_key: Optional[str] = None, openai_api_base: Optional[str] = None, fetch_k: int = DEFAULT_FETCH_K, lambda_mult: float = DEFAULT_LAMBDA_MULT):
         self.index_path = index_path
         self.knowledge_base_path = knowledge_base_path
         self.openai_api_key = openai_api_key
         self.openai_api_base = openai_api_base
+        self.fetch_k = fetch_k
+        self.lambda_mult = lambda_mult
         
-        self.embeddings = self._get_embeddings()
+        self.embedding_model = embedding_model_name(resolve_provider(openai_api_key))
+        self.score_calibration = score_calibration(self.embedding_model)
+        self.embeddings = create_embeddings(openai_api_key, openai_api_base)
         self.vector_store = self._load_or_create_index()
 
-    def _get_embeddings(self):
-        # Логика выбора эмбеддингов (как в старом коде)
-        provider = (os.getenv("EMBEDDINGS_PROVIDER") or "openai").strip().lower()
-        
-        # Если нет ключа OpenAI, принудительно используем локальные
-        if not self.openai_api_key and provider == "openai":
-            logger.warning("[FAISSAdapter] Нет OpenAI API Key. Переключаюсь на локальные эмбеддинги.")
-            provider = "local"
-
-        if provider == "local":
-            model_name = os.getenv("LOCAL_EMBEDDING_MODEL", "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
-            logger.info(f"[FAISSAdapter] Использую локальные эмбеддинги: {model_name}")
-            return HuggingFaceEmbeddings(model_name=model_name)
-        
-        model_name = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")
-        logger.info(f"[FAISSAdapter] Использую OpenAI эмбеддинги: {model_name}")
-        return OpenAIEmbeddings(
-            model=model_name, 
-            openai_api_key=self.openai_api_key, 
-            base_url=self.openai_api_base
-        )
-
-    def _load_or_create_index(self):
-        # 1. Попытка загрузить
-        if os.path.exists(self.index_path) and os.path.isdir(self.index_path):
+    def _load_or_create_index(self) -> Optional[NativeFaissStore]:
+        # 1. Попытка загрузить: индекс мапится в память, pickle читается только при однократной миграции
+        if os.path.isdir(self.index_path):
             try:
-                logger.info(f"[FAISSAdapter] Загрузка индекса из {self.index_path}...")
-                return FAISS.load_local(
-                    self.index_path, 
-                    self.embeddings, 
-                    allow_dangerous_deserialization=True
-                )
+                migrate_legacy_index(self.index_path, self.embeddings, self.embedding_model)
+                if NativeFaissStore.exists(self.index_path):
+                    logger.info(f"[FAISSAdapter] Загрузка индекса из {self.index_path}...")
+                    return NativeFaissStore.open(self.index_path)
             except Exception as e:
                 logger.error(f"[FAISSAdapter] Ошибка загрузки индекса: {e}. Буду пересобирать.")
         
         # 2. Пересборка
         return self._rebuild_index()
 
-    def _rebuild_index(self):
+    def _rebuild_index(self) -> Optional[NativeFaissStore]:
         logger.info("[FAISSAdapter] Начало сборки индекса...")
         try:
-            loader = TextLoader(self.knowledge_base_path, encoding='utf-8')
-            documents = loader.load()
-            
-            headers_to_split_on = [
-                ("#", "product"),
-                ("##", "category"),
-                ("###", "subcategory"),
-                ("####", "question"),
-            ]
-            markdown_splitter = MarkdownHeaderTextSplitter(headers_to_split_on=headers_to_split_on, strip_headers=False)
-            docs = markdown_splitter.split_text(documents[0].page_content)
-            
-            if not docs:
-                # Fallback если маркдаун не сработал
-                text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-                docs = text_splitter.split_documents(documents)
-
-            logger.info(f"[FAISSAdapter] Создание векторов для {len(docs)} чанков...")
-            vector_store = FAISS.from_documents(docs, self.embeddings)
-            
-            # Сохраняем
-            vector_store.save_local(self.index_path)
-            logger.info(f"[FAISSAdapter] Индекс сохранен в {self.index_path}")
-            return vector_store
+            store, plan = sync_native_index(self.index_path, self.knowledge_base_path, self.embeddings, embedding_model=self.embedding_model)
+            logger.info(f"[FAISSAdapter] Индекс сохранен в {self.index_path} ({plan.summary()})")
+            return store
             
         except Exception as e:
             logger.critical(f"[FAISSAdapter] Критическая ошибка при создании индекса: {e}", exc_info=True)
@@ -101,20 +59,42 @@ class FAISSRetrieverAdapter(KnowledgeRetriever):
 
         # Используем MMR для разнообразия
         try:
-            docs = self.vector_store.max_marginal_relevance_search(
-                query, 
-                k=k, 
-                fetch_k=20, 
-                lambda_mult=0.7
-            )
-            
-            # Конвертируем в наш формат RetrievedChunk
-            return [
-                RetrievedChunk(
-                    content=doc.page_content,
-                    metadata=doc.metadata
-                ) for doc in docs
-            ]
+            query_vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+            return self._search_mmr(query_vector, k)
         except Exception as e:
             logger.error(f"[FAISSAdapter] Ошибка поиска: {e}")
             return []
+
+    def retrieve_many(self, queries: List[str], k: int = 6) -> List[List[RetrievedChunk]]:
+        if not self.vector_store:
+            logger.error("[FAISSAdapter] Векторное хранилище не инициализировано.")
+            return [[] for _ in queries]
+
+        # Эмбеддинги всех запросов одним вызовом, сам поиск локальный и дешевый
+        try:
+            query_vectors = np.asarray(self.embeddings.embed_documents(list(queries)), dtype=np.float32)
+            return [self._search_mmr(vector, k) for vector in query_vectors]
+        except Exception as e:
+            logger.error(f"[FAISSAdapter] Ошибка пакетного поиска: {e}")
+            return [[] for _ in queries]
+
+    def _search_mmr(self, query_vector: np.ndarray, k: int) -> List[RetrievedChunk]:
+        ids = self.vector_store.search(query_vector, max(self.fetch_k, k))
+        if not ids:
+            return []
+
+        # Векторы кандидатов достаем из самого индекса одной пачкой
+        matrix = self.vector_store.vectors(ids)
+        selected, relevance = maximal_marginal_relevance(query_vector, matrix, k=k, lambda_mult=self.lambda_mult)
+
+        chunks = []
+        for i in selected:
+            # Из сайдкара читаются только выбранные чанки
+            content, metadata = self.vector_store.chunk(ids[i])
+            metadata["cosine"] = float(relevance[i])
+            chunks.append(RetrievedChunk(
+                content=content,
+                score=calibrate_score(float(relevance[i]), self.score_calibration),
+                metadata=metadata
+            ))
+        return chunks
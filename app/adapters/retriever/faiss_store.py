@@ -0,0 +1,227 @@
+"""
+Нативный формат локального FAISS-индекса (без pickle).
+
+Каталог индекса:
+  index.faiss    — сырой индекс FAISS (IndexFlatIP), читается через IO_FLAG_MMAP:
+                   векторы не копируются в память процесса и делятся между процессами через page cache;
+  chunks.jsonl   — тексты и metadata чанков, строка i соответствует id i в индексе;
+  offsets.npy    — байтовые смещения строк chunks.jsonl (n + 1 значение), читается через mmap;
+  manifest.json  — версия формата, размерность, модель эмбеддингов, chunk_id + content_hash по строкам
+                   и sha256 файлов.
+
+Старый формат LangChain (index.faiss + index.pkl) один раз конвертируется при открытии.
+"""
+import hashlib
+import json
+import logging
+import mmap
+import os
+import shutil
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from app.adapters.embeddings.factory import embedding_dimension
+from app.adapters.retriever.kb_indexer import IndexPlan, build_chunks, content_hash, plan_changes, split_knowledge_base
+from app.adapters.retriever.mmr import normalize_rows
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+INDEX_FILE = "index.faiss"
+CHUNKS_FILE = "chunks.jsonl"
+OFFSETS_FILE = "offsets.npy"
+MANIFEST_FILE = "manifest.json"
+LEGACY_PICKLE_FILE = "index.pkl"
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class NativeFaissStore:
+    """Индекс FAISS + JSONL-сайдкар с таблицей смещений. Только чтение; запись — через write()."""
+    def __init__(self, path: str, index, offsets: np.ndarray, chunks_map: Optional[mmap.mmap], manifest: Dict):
+        self.path = path
+        self.index = index
+        self.offsets = offsets
+        self._chunks_map = chunks_map
+        self.manifest = manifest
+
+    @property
+    def chunk_ids(self) -> List[str]:
+        return [row[0] for row in self.manifest["chunks"]]
+
+    def stored_hashes(self) -> Dict[str, Optional[str]]:
+        return {chunk_id: chunk_hash for chunk_id, chunk_hash in self.manifest["chunks"]}
+
+    def __len__(self) -> int:
+        return len(self.manifest["chunks"])
+
+    def chunk(self, i: int) -> Tuple[str, Dict]:
+        """(page_content, metadata) строки i: читаем только ее байты из mmap."""
+        row = json.loads(self._chunks_map[int(self.offsets[i]):int(self.offsets[i + 1])])
+        return row["page_content"], row["metadata"]
+
+    def search(self, query_vector: np.ndarray, n: int) -> List[int]:
+        if not len(self):
+            return []
+        query = normalize_rows(np.asarray(query_vector, dtype=np.float32).reshape(1, -1))
+        _, ids = self.index.search(query, min(n, len(self)))
+        return [int(i) for i in ids[0] if i != -1]
+
+    def vectors(self, ids: Sequence[int]) -> np.ndarray:
+        return self.index.reconstruct_batch(np.asarray(ids, dtype=np.int64))
+
+    @classmethod
+    def exists(cls, path: str) -> bool:
+        return os.path.exists(os.path.join(path, MANIFEST_FILE))
+
+    @classmethod
+    def open(cls, path: str, verify: bool = False) -> "NativeFaissStore":
+        import faiss
+
+        with open(os.path.join(path, MANIFEST_FILE), encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"Неподдерживаемая версия формата индекса: {manifest.get('format_version')}")
+        if verify:
+            for name, expected in manifest["files"].items():
+                if _file_sha256(os.path.join(path, name)) != expected:
+                    raise ValueError(f"Файл индекса {name} поврежден (sha256 не совпадает с manifest.json)")
+
+        index_path = os.path.join(path, INDEX_FILE)
+        try:
+            index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except Exception as e:
+            logger.warning(f"[FaissStore] mmap недоступен для {index_path} ({e}), читаю индекс целиком.")
+            index = faiss.read_index(index_path)
+
+        offsets = np.load(os.path.join(path, OFFSETS_FILE), mmap_mode="r")
+        chunks_map = None
+        if os.path.getsize(os.path.join(path, CHUNKS_FILE)) > 0:
+            with open(os.path.join(path, CHUNKS_FILE), "rb") as f:
+                chunks_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        logger.info(f"[FaissStore] Открыт индекс {path}: {len(manifest['chunks'])} чанков, dim={manifest['dim']}")
+        return cls(path, index, offsets, chunks_map, manifest)
+
+    @staticmethod
+    def write(path: str, vectors: np.ndarray, docs: Sequence[Document], embedding_model: Optional[str] = None, dim: Optional[int] = None):
+        """
+        Пишет индекс в соседний временный каталог и подменяет им старый,
+        чтобы читатели никогда не видели наполовину записанные файлы.
+        Для пустой базы знаний размерность не вывести из векторов — ее передают в dim.
+        """
+        import faiss
+
+        if not len(docs):
+            if dim is None:
+                raise ValueError("Для пустого индекса нужна размерность dim")
+            vectors = np.zeros((0, dim), dtype=np.float32)
+        # Нормализуем: скалярное произведение в IndexFlatIP = косинусная близость
+        vectors = np.ascontiguousarray(normalize_rows(np.asarray(vectors, dtype=np.float32)))
+        tmp_path = f"{path}.tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+
+        index = faiss.IndexFlatIP(vectors.shape[1])
+        if len(vectors):
+            index.add(vectors)
+        faiss.write_index(index, os.path.join(tmp_path, INDEX_FILE))
+
+        offsets = [0]
+        with open(os.path.join(tmp_path, CHUNKS_FILE), "wb") as f:
+            for doc in docs:
+                line = json.dumps({"page_content": doc.page_content, "metadata": doc.metadata}, ensure_ascii=False).encode("utf-8") + b"\n"
+                f.write(line)
+                offsets.append(offsets[-1] + len(line))
+        np.save(os.path.join(tmp_path, OFFSETS_FILE), np.asarray(offsets, dtype=np.int64))
+
+        manifest = {
+            "format_version": FORMAT_VERSION,
+            "dim": int(vectors.shape[1]),
+            "embedding_model": embedding_model,
+            "chunks": [[d.metadata["chunk_id"], d.metadata.get("content_hash")] for d in docs],
+            "files": {name: _file_sha256(os.path.join(tmp_path, name)) for name in (INDEX_FILE, CHUNKS_FILE, OFFSETS_FILE)},
+        }
+        with open(os.path.join(tmp_path, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+
+        old_path = f"{path}.old"
+        shutil.rmtree(old_path, ignore_errors=True)
+        if os.path.exists(path):
+            os.rename(path, old_path)
+        os.rename(tmp_path, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+        logger.info(f"[FaissStore] Индекс записан в {path}: {len(docs)} чанков")
+
+
+def migrate_legacy_index(path: str, embeddings, embedding_model: Optional[str] = None) -> bool:
+    """Однократная конвертация формата LangChain (index.pkl) в нативный. True, если конвертировали."""
+    if NativeFaissStore.exists(path) or not os.path.exists(os.path.join(path, LEGACY_PICKLE_FILE)):
+        return False
+
+    from langchain_community.vectorstores import FAISS
+
+    logger.warning(f"[FaissStore] Найден старый pickle-формат в {path}, конвертирую в нативный (один раз)...")
+    legacy = FAISS.load_local(path, embeddings, allow_dangerous_deserialization=True)
+    docs = []
+    for i in range(legacy.index.ntotal):
+        doc_id = legacy.index_to_docstore_id[i]
+        doc = legacy.docstore.search(doc_id)
+        metadata = dict(doc.metadata)
+        metadata.setdefault("chunk_id", doc_id)
+        metadata.setdefault("content_hash", content_hash(doc.page_content))
+        docs.append(Document(page_content=doc.page_content, metadata=metadata))
+
+    vectors = legacy.index.reconstruct_n(0, legacy.index.ntotal) if docs else np.zeros((0, legacy.index.d), dtype=np.float32)
+    NativeFaissStore.write(path, vectors, docs, embedding_model=embedding_model)
+    return True
+
+
+def _index_dimension(current: Optional[NativeFaissStore], embeddings, embedding_model: Optional[str]) -> int:
+    """Размерность без векторов чанков: из манифеста, из таблицы моделей или пробным embed_query."""
+    if current is not None:
+        return int(current.manifest["dim"])
+    return embedding_dimension(embedding_model) or len(embeddings.embed_query("dimension probe"))
+
+
+def sync_native_index(path: str, knowledge_base_path: str, embeddings, dry_run: bool = False, full: bool = False, embedding_model: Optional[str] = None) -> Tuple[Optional[NativeFaissStore], IndexPlan]:
+    """
+    Инкрементально синхронизирует нативный индекс с knowledge_base.md: эмбеддим только новые
+    и измененные чанки, векторы остальных берем из текущего индекса. Возвращает (store, plan).
+    """
+    current = NativeFaissStore.open(path) if NativeFaissStore.exists(path) and not full else None
+    chunks = build_chunks(split_knowledge_base(knowledge_base_path))
+    plan = plan_changes(chunks, current.stored_hashes() if current else {})
+    logger.info(f"[FaissStore] {path}: {plan.summary()}")
+
+    if dry_run or (plan.is_empty and current is not None):
+        return current, plan
+
+    reused = {}
+    if current is not None:
+        upsert_ids = {d.metadata["chunk_id"] for d in plan.to_upsert}
+        keep_rows = [i for i, chunk_id in enumerate(current.chunk_ids) if chunk_id not in upsert_ids]
+        if keep_rows:
+            reused = dict(zip((current.chunk_ids[i] for i in keep_rows), current.vectors(keep_rows)))
+
+    fresh = {}
+    if plan.to_upsert:
+        new_vectors = embeddings.embed_documents([d.page_content for d in plan.to_upsert])
+        fresh = {d.metadata["chunk_id"]: np.asarray(v, dtype=np.float32) for d, v in zip(plan.to_upsert, new_vectors)}
+
+    if not chunks:
+        # Пустая база знаний (или без разделов): пустой индекс нужной размерности
+        logger.warning(f"[FaissStore] В {knowledge_base_path} нет чанков, индекс {path} будет пустым")
+        NativeFaissStore.write(path, [], [], embedding_model=embedding_model, dim=_index_dimension(current, embeddings, embedding_model))
+        return NativeFaissStore.open(path), plan
+
+    vectors = [fresh.get(d.metadata["chunk_id"], reused.get(d.metadata["chunk_id"])) for d in chunks]
+    NativeFaissStore.write(path, np.vstack(vectors), chunks, embedding_model=embedding_model)
+    return NativeFaissStore.open(path), plan
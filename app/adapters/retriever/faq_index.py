@@ -0,0 +1,242 @@
+"""
+FAQ-индекс по заголовкам вопросов базы знаний.
+
+Большая часть вопросов клиентов почти дословно совпадает с заголовком `### Вопрос: ...`
+(или `####`). Индекс строится при индексации: для каждого чанка-вопроса хранится эмбеддинг
+заголовка и нормализованный текст. При поиске сначала проверяется точное совпадение
+нормализованного текста (без эмбеддинга), затем близость к эмбеддингам заголовков. При
+уверенном совпадении ретривер отдает ровно одну секцию, без MMR.
+
+Хранится в соседней коллекции Qdrant `{коллекция}__faq` (для версионированных баз — рядом
+с конкретной версией `{alias}__v{n}__faq`), поэтому переключение алиаса и откат подменяют
+FAQ вместе с чанками. Адаптер держит индекс в памяти и перечитывает его при смене версии базы.
+"""
+import hashlib
+import logging
+import re
+from dataclasses import dataclass, field, replace
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+from langchain_core.documents import Document
+from qdrant_client import QdrantClient
+from qdrant_client.http.models import Distance, PointIdsList, PointStruct, VectorParams
+
+from app.adapters.retriever.cache import normalize_query
+
+logger = logging.getLogger(__name__)
+
+FAQ_SUFFIX = "__faq"
+QUESTION_PREFIX = re.compile(r"^\s*вопрос\s*[:.\-–—]\s*", re.IGNORECASE)
+# Секция с готовым (согласованным) ответом для маркетплейсов, см. KB_STRUCTURE.md
+APPROVED_ANSWER_MARKER = re.compile(r"^\s*Готовый ответ\s*:\s*", re.IGNORECASE | re.MULTILINE)
+
+
+def faq_collection_name(collection_name: str) -> str:
+    return f"{collection_name}{FAQ_SUFFIX}"
+
+
+def physical_collection(client: QdrantClient, name: str) -> str:
+    """Имя физической коллекции за алиасом (или само имя, если это не алиас)."""
+    for alias in client.get_aliases().aliases:
+        if alias.alias_name == name:
+            return alias.collection_name
+    return name
+
+
+def question_header(doc: Document) -> Optional[str]:
+    """
+    Текст вопроса секции: заголовок `####` (metadata question) или `### Вопрос: ...`,
+    без префикса 'Вопрос:'. None — секция не является вопросом FAQ.
+    """
+    header = doc.metadata.get("question")
+    if not header:
+        header = next((h for h in (doc.metadata.get("subcategory"), doc.metadata.get("category")) if h and QUESTION_PREFIX.match(h)), None)
+    if not header:
+        return None
+    return QUESTION_PREFIX.sub("", header).strip() or None
+
+
+def normalize_question(text: str) -> str:
+    """'Вопрос: Как подключить пульт?' -> 'как подключить пульт'."""
+    return normalize_query(QUESTION_PREFIX.sub("", text))
+
+
+def approved_answer(content: str) -> Optional[str]:
+    """Текст после 'Готовый ответ:' до конца секции (его можно отправить без генерации)."""
+    match = APPROVED_ANSWER_MARKER.search(content)
+    if not match:
+        return None
+    return content[match.end():].strip() or None
+
+
+def question_hash(question: str) -> str:
+    return hashlib.sha256(question.encode("utf-8")).hexdigest()
+
+
+@dataclass(frozen=True)
+class FaqConfig:
+    # Порог косинуса запроса к заголовку (сырое значение модели, не калиброванное:
+    # калибровка насыщается к 1.0 уже на обычных релевантных чанках)
+    min_similarity: float = 0.85
+    # Отрыв от второго по близости заголовка: два похожих вопроса — не уверенное совпадение
+    min_margin: float = 0.05
+    # Отвечать готовым ответом без генерации (только маркетплейсы, см. AnswerQuestionUseCase)
+    direct_answers: bool = False
+
+
+def resolve_faq_config(config: Union[None, bool, Dict[str, Any]]) -> Optional[FaqConfig]:
+    """Ключ faq в конфиге тенанта: True/False или {enabled, min_similarity, min_margin, direct_answers}. По умолчанию включен."""
+    if config is None:
+        config = {}
+    elif isinstance(config, bool):
+        config = {"enabled": config}
+    if not config.get("enabled", True):
+        return None
+    return replace(FaqConfig(), **{k: v for k, v in config.items() if k in FaqConfig.__dataclass_fields__})
+
+
+@dataclass
+class FaqEntry:
+    question: str
+    content: str
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    approved_answer: Optional[str] = None
+
+
+@dataclass
+class FaqMatch:
+    entry: FaqEntry
+    similarity: float
+    exact: bool = False
+
+
+class FaqIndex:
+    """FAQ в памяти процесса: хэш-таблица нормализованных вопросов + матрица эмбеддингов заголовков."""
+    def __init__(self, entries: List[FaqEntry], vectors: Optional[np.ndarray] = None):
+        self.entries = entries
+        self._by_text: Dict[str, int] = {}
+        for i, entry in enumerate(entries):
+            self._by_text.setdefault(normalize_question(entry.question), i)
+        self._matrix = None
+        if vectors is not None and len(vectors):
+            matrix = np.asarray(vectors, dtype=np.float32)
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            self._matrix = matrix / np.where(norms == 0, 1.0, norms)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def lookup(self, query: str) -> Optional[FaqMatch]:
+        """Точное совпадение нормализованного текста — без эмбеддинга запроса."""
+        i = self._by_text.get(normalize_question(query))
+        return FaqMatch(self.entries[i], similarity=1.0, exact=True) if i is not None else None
+
+    def nearest(self, query_vector, config: FaqConfig) -> Optional[FaqMatch]:
+        if self._matrix is None:
+            return None
+        vector = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return None
+        similarities = self._matrix @ (vector / norm)
+        order = np.argsort(-similarities)
+        best = float(similarities[order[0]])
+        runner_up = float(similarities[order[1]]) if len(order) > 1 else -1.0
+        if best < config.min_similarity or best - runner_up < config.min_margin:
+            return None
+        return FaqMatch(self.entries[int(order[0])], similarity=best)
+
+    @classmethod
+    def load(cls, client: QdrantClient, collection_name: str) -> "FaqIndex":
+        """Читает FAQ-коллекцию для collection_name (алиас разрешается в физическую коллекцию)."""
+        name = faq_collection_name(physical_collection(client, collection_name))
+        if not client.collection_exists(name):
+            logger.info(f"[FAQ] Коллекции {name} нет, FAQ-поиск выключен до следующей сборки базы знаний.")
+            return cls([])
+
+        entries, vectors = [], []
+        offset = None
+        while True:
+            points, offset = client.scroll(collection_name=name, limit=256, offset=offset, with_payload=True, with_vectors=True)
+            for p in points:
+                payload = p.payload or {}
+                entries.append(FaqEntry(
+                    question=payload.get("question", ""),
+                    content=payload.get("page_content", ""),
+                    metadata=payload.get("metadata") or {},
+                    approved_answer=payload.get("approved_answer"),
+                ))
+                vectors.append(p.vector)
+            if offset is None:
+                break
+        logger.info(f"[FAQ] {name}: загружено {len(entries)} вопросов.")
+        return cls(entries, np.asarray(vectors, dtype=np.float32) if vectors else None)
+
+
+class FaqIndexBuilder:
+    """
+    Инкрементальная сборка FAQ-коллекции при индексации: эмбеддятся только новые и
+    переформулированные заголовки, у остальных обновляется payload (текст ответа).
+    """
+    def __init__(self, client: QdrantClient, collection_name: str, embeddings):
+        self.client = client
+        self.collection_name = faq_collection_name(physical_collection(client, collection_name))
+        self.embeddings = embeddings
+
+    def _stored(self) -> Dict[str, Any]:
+        if not self.client.collection_exists(self.collection_name):
+            return {}
+        stored = {}
+        offset = None
+        while True:
+            points, offset = self.client.scroll(collection_name=self.collection_name, limit=256, offset=offset, with_payload=True, with_vectors=True)
+            for p in points:
+                stored[str(p.id)] = p
+            if offset is None:
+                return stored
+
+    def sync(self, chunks: List[Document]) -> int:
+        """Возвращает число заэмбеддженных заголовков."""
+        entries = {}
+        for doc in chunks:
+            question = question_header(doc)
+            if question and doc.metadata["chunk_id"] not in entries:
+                entries[doc.metadata["chunk_id"]] = (question, doc)
+
+        stored = self._stored()
+        to_embed, points = [], []
+        for chunk_id, (question, doc) in entries.items():
+            payload = {
+                "question": question,
+                "question_hash": question_hash(question),
+                "page_content": doc.page_content,
+                "metadata": doc.metadata,
+                "approved_answer": approved_answer(doc.page_content),
+            }
+            previous = stored.get(chunk_id)
+            if previous is not None and (previous.payload or {}).get("question_hash") == payload["question_hash"]:
+                if previous.payload != payload:
+                    points.append(PointStruct(id=chunk_id, vector=previous.vector, payload=payload))
+            else:
+                to_embed.append((chunk_id, payload))
+
+        if to_embed:
+            vectors = self.embeddings.embed_documents([payload["question"] for _, payload in to_embed])
+            self._ensure_collection(len(vectors[0]))
+            points.extend(PointStruct(id=chunk_id, vector=vector, payload=payload) for (chunk_id, payload), vector in zip(to_embed, vectors))
+        if points:
+            self._ensure_collection(len(points[0].vector))
+            self.client.upsert(collection_name=self.collection_name, points=points)
+
+        removed = [point_id for point_id in stored if point_id not in entries]
+        if removed:
+            self.client.delete(collection_name=self.collection_name, points_selector=PointIdsList(points=removed))
+
+        logger.info(f"[FAQ] {self.collection_name}: вопросов {len(entries)}, заэмбеддено {len(to_embed)}, обновлено {len(points) - len(to_embed)}, удалено {len(removed)}")
+        return len(to_embed)
+
+    def _ensure_collection(self, vector_size: int):
+        if not self.client.collection_exists(self.collection_name):
+            # Коллекция маленькая (сотни заголовков): без квантизации и on_disk из профиля
+            self.client.create_collection(collection_name=self.collection_name, vectors_config=VectorParams(size=vector_size, distance=Distance.COSINE))
@@ -0,0 +1,129 @@
+import json
+import logging
+import math
+from dataclasses import dataclass, replace
+from typing import Any, Dict, Optional, Union
+
+from qdrant_client.http.models import (
+    BinaryQuantization,
+    BinaryQuantizationConfig,
+    Disabled,
+    Distance,
+    HnswConfigDiff,
+    QuantizationSearchParams,
+    ScalarQuantization,
+    ScalarQuantizationConfig,
+    ScalarType,
+    SearchParams,
+    VectorParams,
+    VectorParamsDiff,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HNSW_M = 16  # дефолт Qdrant, нужен для оценки памяти
+
+
+@dataclass(frozen=True)
+class IndexProfile:
+    """
+    Профиль индекса коллекции Qdrant: квантизация, хранение оригинальных векторов и HNSW.
+    Задается в конфиге тенанта (`index_profile`) названием пресета или словарем параметров.
+    """
+    name: str = "default"
+    quantization: Optional[str] = None  # None | "int8" | "binary"
+    always_ram: bool = True             # квантованные векторы держим в RAM
+    on_disk: bool = False               # оригинальные float32 векторы на диске (mmap)
+    m: Optional[int] = None
+    ef_construct: Optional[int] = None
+    hnsw_ef: Optional[int] = None
+    oversampling: float = 2.0
+    rescore: bool = True
+
+    def hnsw_config(self) -> Optional[HnswConfigDiff]:
+        if self.m is None and self.ef_construct is None:
+            return None
+        return HnswConfigDiff(m=self.m, ef_construct=self.ef_construct)
+
+    def quantization_config(self):
+        if self.quantization == "int8":
+            return ScalarQuantization(scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=self.always_ram))
+        if self.quantization == "binary":
+            return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=self.always_ram))
+        return None
+
+    def vectors_config(self, size: int) -> VectorParams:
+        return VectorParams(
+            size=size,
+            distance=Distance.COSINE,
+            on_disk=self.on_disk or None,
+            hnsw_config=self.hnsw_config(),
+            quantization_config=self.quantization_config(),
+        )
+
+    def search_params(self) -> Optional[SearchParams]:
+        if self.quantization is None and self.hnsw_ef is None:
+            return None
+        quantization = None
+        if self.quantization:
+            quantization = QuantizationSearchParams(rescore=self.rescore, oversampling=self.oversampling)
+        return SearchParams(hnsw_ef=self.hnsw_ef, quantization=quantization)
+
+    def apply(self, client, collection_name: str):
+        """Применяет профиль к существующей коллекции (Qdrant перестроит индекс в фоне)."""
+        client.update_collection(
+            collection_name=collection_name,
+            vectors_config={"": VectorParamsDiff(on_disk=self.on_disk)},
+            hnsw_config=self.hnsw_config(),
+            quantization_config=self.quantization_config() or Disabled.DISABLED,
+        )
+        logger.info(f"[IndexProfile] Профиль '{self.name}' применен к {collection_name}.")
+
+    def estimated_ram_bytes(self, points: int, dim: int) -> int:
+        """Грубая оценка RAM коллекции: векторы в памяти + граф HNSW (без payload)."""
+        total = 0 if self.on_disk else points * dim * 4
+        if self.quantization == "int8" and self.always_ram:
+            total += points * dim
+        elif self.quantization == "binary" and self.always_ram:
+            total += points * math.ceil(dim / 8)
+        # Нулевой уровень HNSW хранит до 2*m связей по 4 байта на точку
+        total += points * 2 * (self.m or DEFAULT_HNSW_M) * 4
+        return total
+
+
+INDEX_PROFILES: Dict[str, IndexProfile] = {
+    # Как раньше: float32 в RAM, HNSW по умолчанию
+    "default": IndexProfile(),
+    # int8 в RAM, оригиналы на диске для рескоринга (~4x меньше памяти на векторы)
+    "compact": IndexProfile(name="compact", quantization="int8", on_disk=True, oversampling=2.0),
+    # Бинарная квантизация (~32x), нужна размерность >= 1024 (OpenAI эмбеддинги) и больший оверсемплинг
+    "binary": IndexProfile(name="binary", quantization="binary", on_disk=True, oversampling=3.0),
+    # Маленькие базы знаний: разреженный граф, но точный поиск за счет большого ef
+    "small_kb": IndexProfile(name="small_kb", m=8, ef_construct=64, hnsw_ef=128),
+}
+
+
+def resolve_index_profile(config: Union[None, str, Dict[str, Any], IndexProfile]) -> IndexProfile:
+    """
+    Превращает значение `index_profile` из конфига тенанта в IndexProfile.
+    Допустимо: None, имя пресета, словарь параметров (опционально с ключом "preset" как базой)
+    или тот же словарь JSON-строкой (из переменной окружения).
+    """
+    if isinstance(config, str) and config.strip().startswith("{"):
+        config = json.loads(config)
+    if config is None:
+        return INDEX_PROFILES["default"]
+    if isinstance(config, IndexProfile):
+        return config
+    if isinstance(config, str):
+        if config not in INDEX_PROFILES:
+            logger.warning(f"[IndexProfile] Неизвестный профиль '{config}', использую default.")
+            return INDEX_PROFILES["default"]
+        return INDEX_PROFILES[config]
+
+    params = dict(config)
+    base = INDEX_PROFILES.get(params.pop("preset", "default"), INDEX_PROFILES["default"])
+    known = {k: v for k, v in params.items() if k in IndexProfile.__dataclass_fields__}
+    if len(known) != len(params):
+        logger.warning(f"[IndexProfile] Пропускаю неизвестные параметры: {sorted(set(params) - set(known))}")
+    return replace(base, name=known.pop("name", "custom"), **known)
@@ -0,0 +1,203 @@
+"""
+Массовая загрузка чанков в Qdrant: конкурентные эмбеддинги с учетом rate limit
+и потоковые пакетные upsert-ы.
+
+  чанки -> батчи по токенам -> N параллельных aembed_documents (429 -> пауза для всех + ретрай)
+        -> upsert пачками по мере готовности
+
+Чекпоинт — сама коллекция: каждый upsert сохраняет content_hash чанков в payload, поэтому
+после падения повторный запуск планирует изменения заново (plan_changes) и догружает
+только то, чего в коллекции еще нет. Теневая пересборка продолжает недостроенную версию.
+"""
+import asyncio
+import logging
+import re
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, Iterable, List, Optional
+
+from langchain_core.documents import Document
+from qdrant_client import QdrantClient
+from qdrant_client.http.models import PointStruct
+
+from app.utils.retry import RetryPolicy, async_retry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BATCH_TOKENS = 20000   # лимит OpenAI — 300k токенов и 2048 текстов на запрос
+DEFAULT_MAX_BATCH_ITEMS = 256
+DEFAULT_CONCURRENCY = 4
+DEFAULT_UPSERT_BATCH = 128
+EMBEDDING_RETRY_POLICY = RetryPolicy(max_attempts=6, base_delay_s=1.0, max_delay_s=60.0)
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    # Загружаем один раз на процесс (и один раз запоминаем неудачу, например без сети)
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Токены для эмбеддингов (tiktoken, если доступен, иначе ~4 символа на токен)."""
+    encoding = _encoding()
+    return len(encoding.encode(text)) if encoding is not None else len(text) // 4 + 1
+
+
+def batch_by_tokens(docs: Iterable[Document], max_tokens: int = DEFAULT_MAX_BATCH_TOKENS, max_items: int = DEFAULT_MAX_BATCH_ITEMS) -> List[List[Document]]:
+    """Режет чанки на батчи так, чтобы в каждом было не больше max_tokens токенов и max_items текстов."""
+    batches, current, current_tokens = [], [], 0
+    for doc in docs:
+        tokens = count_tokens(doc.page_content)
+        if current and (current_tokens + tokens > max_tokens or len(current) >= max_items):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(doc)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+# Для ошибок без status_code (обертки поверх HTTP-клиента): 429 рядом с rate limit / too many
+_RATE_LIMIT_MESSAGE = re.compile(r"\b429\b.*(rate|too many)", re.IGNORECASE)
+
+
+def is_rate_limit_error(exc: BaseException) -> bool:
+    status = getattr(exc, "status_code", None) or getattr(getattr(exc, "response", None), "status_code", None)
+    if status is not None:
+        return status == 429
+    return type(exc).__name__ == "RateLimitError" or bool(_RATE_LIMIT_MESSAGE.search(str(exc)))
+
+
+def is_retryable_embedding_error(exc: BaseException) -> bool:
+    status = getattr(exc, "status_code", None) or getattr(getattr(exc, "response", None), "status_code", None)
+    if status is not None:
+        return status == 429 or status >= 500
+    # Сетевые ошибки/таймауты без HTTP-статуса тоже ретраим
+    return isinstance(exc, (TimeoutError, ConnectionError)) or type(exc).__name__ in {"APIConnectionError", "APITimeoutError", "RateLimitError"}
+
+
+@dataclass
+class IngestionStats:
+    total: int = 0
+    embedded: int = 0
+    batches: int = 0
+    rate_limited: int = 0
+    seconds: float = 0.0
+
+    def summary(self) -> str:
+        return (
+            f"чанков: {self.total}, заэмбеддено: {self.embedded}, "
+            f"батчей: {self.batches}, 429: {self.rate_limited}, за {self.seconds:.1f} с"
+        )
+
+
+class EmbeddingIngestionPipeline:
+    """
+    Конкурентная загрузка чанков в коллекцию Qdrant (формат payload как у QdrantKnowledgeIndexer).
+    Коллекцию создает ensure_collection(vector_size) по первому готовому батчу.
+    """
+    def __init__(
+        self,
+        client: QdrantClient,
+        collection_name: str,
+        embeddings,
+        ensure_collection: Optional[Callable[[int], None]] = None,
+        max_batch_tokens: int = DEFAULT_MAX_BATCH_TOKENS,
+        max_concurrency: int = DEFAULT_CONCURRENCY,
+        upsert_batch_size: int = DEFAULT_UPSERT_BATCH,
+        retry_policy: RetryPolicy = EMBEDDING_RETRY_POLICY,
+    ):
+        self.client = client
+        self.collection_name = collection_name
+        self.embeddings = embeddings
+        self.ensure_collection = ensure_collection
+        self.max_batch_tokens = max_batch_tokens
+        self.max_concurrency = max_concurrency
+        self.upsert_batch_size = upsert_batch_size
+        self.retry_policy = retry_policy
+        self._cooldown_until = 0.0
+        self._collection_ready = False
+
+    async def run(self, docs: List[Document]) -> IngestionStats:
+        started = time.monotonic()
+        stats = IngestionStats(total=len(docs))
+        batches = batch_by_tokens(docs, self.max_batch_tokens)
+        stats.batches = len(batches)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        logger.info(f"[Ingestion] {self.collection_name}: {len(docs)} чанков в {len(batches)} батчах, параллельно {self.max_concurrency}.")
+
+        async def embed(batch: List[Document]):
+            async with semaphore:
+                vectors = await async_retry(
+                    lambda: self._embed_batch(batch, stats),
+                    policy=self.retry_policy,
+                    retry_on=(Exception,),
+                    is_retryable=is_retryable_embedding_error,
+                )
+                return batch, vectors
+
+        tasks = [asyncio.create_task(embed(b)) for b in batches]
+        try:
+            # Upsert-им по мере готовности батчей, не дожидаясь всех эмбеддингов
+            for finished in asyncio.as_completed(tasks):
+                batch, vectors = await finished
+                await asyncio.to_thread(self._upsert, batch, vectors)
+                stats.embedded += len(batch)
+                logger.info(f"[Ingestion] {self.collection_name}: {stats.embedded}/{stats.total}")
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+
+        stats.seconds = time.monotonic() - started
+        logger.info(f"[Ingestion] {self.collection_name}: готово ({stats.summary()})")
+        return stats
+
+    async def _embed_batch(self, batch: List[Document], stats: IngestionStats) -> List[List[float]]:
+        # После 429 ждут все воркеры, а не только тот, кто его получил
+        delay = self._cooldown_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        texts = [d.page_content for d in batch]
+        try:
+            if hasattr(self.embeddings, "aembed_documents"):
+                return await self.embeddings.aembed_documents(texts)
+            return await asyncio.to_thread(self.embeddings.embed_documents, texts)
+        except Exception as e:
+            if is_rate_limit_error(e):
+                stats.rate_limited += 1
+                retry_after = self._retry_after_seconds(e)
+                self._cooldown_until = max(self._cooldown_until, time.monotonic() + retry_after)
+                logger.warning(f"[Ingestion] Rate limit (429), пауза {retry_after:.1f} с для всех запросов.")
+            raise
+
+    @staticmethod
+    def _retry_after_seconds(exc: BaseException) -> float:
+        headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+        try:
+            return float(headers.get("retry-after", 2.0))
+        except (TypeError, ValueError):
+            return 2.0
+
+    def _upsert(self, batch: List[Document], vectors: List[List[float]]):
+        if not self._collection_ready and self.ensure_collection is not None:
+            self.ensure_collection(len(vectors[0]))
+            self._collection_ready = True
+        for start in range(0, len(batch), self.upsert_batch_size):
+            self.client.upsert(
+                collection_name=self.collection_name,
+                points=[
+                    PointStruct(
+                        id=doc.metadata["chunk_id"],
+                        vector=vector,
+                        payload={"page_content": doc.page_content, "metadata": doc.metadata},
+                    )
+                    for doc, vector in zip(batch[start:start + self.upsert_batch_size], vectors[start:start + self.upsert_batch_size])
+                ],
+            )
@@ -0,0 +1,224 @@
+import asyncio
+import hashlib
+import logging
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from langchain_core.documents import Document
+from langchain_community.document_loaders import TextLoader
+from langchain.text_splitter import MarkdownHeaderTextSplitter, RecursiveCharacterTextSplitter
+from qdrant_client import QdrantClient
+from qdrant_client.http.models import PointIdsList
+
+from app.adapters.retriever.cache import compute_kb_version, get_kb_versions
+from app.adapters.retriever.faq_index import FaqIndexBuilder
+from app.adapters.retriever.index_profiles import IndexProfile, resolve_index_profile
+from app.adapters.retriever.ingestion import DEFAULT_CONCURRENCY, DEFAULT_MAX_BATCH_TOKENS, EmbeddingIngestionPipeline, count_tokens
+
+logger = logging.getLogger(__name__)
+
+# Та же схема заголовков, что и в адаптерах (см. KB_STRUCTURE.md)
+HEADERS_TO_SPLIT_ON = [
+    ("#", "product"),
+    ("##", "category"),
+    ("###", "subcategory"),
+    ("####", "question"),
+]
+
+# Пространство имен для стабильных UUID чанков (Qdrant принимает только UUID или int)
+CHUNK_NAMESPACE = uuid.UUID("6f1d3c1e-8a52-4c43-9b6e-3f0f1c2a7d11")
+
+
+def split_knowledge_base(knowledge_base_path: str) -> List[Document]:
+    """Загружает Markdown базы знаний и режет его по заголовкам (с фолбэком на RecursiveCharacterTextSplitter)."""
+    loader = TextLoader(knowledge_base_path, encoding='utf-8')
+    documents = loader.load()
+
+    markdown_splitter = MarkdownHeaderTextSplitter(headers_to_split_on=HEADERS_TO_SPLIT_ON, strip_headers=False)
+    docs = markdown_splitter.split_text(documents[0].page_content)
+
+    if not docs:
+        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
+        docs = text_splitter.split_documents(documents)
+    return docs
+
+
+def header_path(doc: Document) -> str:
+    """Путь заголовков чанка: 'Продукт / Категория / Подкатегория / Вопрос'."""
+    parts = [doc.metadata.get(key) for _, key in HEADERS_TO_SPLIT_ON]
+    return " / ".join(p for p in parts if p)
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def build_chunks(docs: List[Document]) -> List[Document]:
+    """
+    Проставляет чанкам стабильные chunk_id (из пути заголовков) и content_hash.
+    Если один и тот же путь заголовков встречается несколько раз, различаем их порядковым номером.
+    Если заголовков нет (фолбэк-сплиттер), ID зависит от содержимого.
+    """
+    seen = Counter()
+    for doc in docs:
+        path = header_path(doc) or content_hash(doc.page_content)
+        occurrence = seen[path]
+        seen[path] += 1
+        doc.metadata["chunk_id"] = str(uuid.uuid5(CHUNK_NAMESPACE, f"{path}#{occurrence}"))
+        doc.metadata["content_hash"] = content_hash(doc.page_content)
+    return docs
+
+
+def estimate_tokens(texts: List[str]) -> int:
+    """Оценка количества токенов для эмбеддингов."""
+    return sum(count_tokens(t) for t in texts)
+
+
+@dataclass
+class IndexPlan:
+    to_upsert: List[Document] = field(default_factory=list)
+    to_delete: List[str] = field(default_factory=list)
+    unchanged: int = 0
+    added: int = 0
+    changed: int = 0
+    kb_version: Optional[str] = None
+    # Все чанки базы знаний (нужны FAQ-индексу, который строится по полному списку вопросов)
+    chunks: List[Document] = field(default_factory=list, repr=False)
+
+    @property
+    def estimated_tokens(self) -> int:
+        return estimate_tokens([d.page_content for d in self.to_upsert])
+
+    @property
+    def is_empty(self) -> bool:
+        return not self.to_upsert and not self.to_delete
+
+    def summary(self) -> str:
+        return (
+            f"новых: {self.added}, измененных: {self.changed}, удаленных: {len(self.to_delete)}, "
+            f"без изменений: {self.unchanged}, ~токенов на эмбеддинги: {self.estimated_tokens}"
+        )
+
+
+def plan_changes(chunks: List[Document], stored_hashes: Dict[str, Optional[str]]) -> IndexPlan:
+    """Сравнивает новые чанки с тем, что уже лежит в индексе (chunk_id -> content_hash)."""
+    plan = IndexPlan(kb_version=compute_kb_version({d.metadata["chunk_id"]: d.metadata["content_hash"] for d in chunks}), chunks=chunks)
+    new_ids = set()
+    for doc in chunks:
+        chunk_id = doc.metadata["chunk_id"]
+        new_ids.add(chunk_id)
+        if chunk_id not in stored_hashes:
+            plan.added += 1
+            plan.to_upsert.append(doc)
+        elif stored_hashes[chunk_id] != doc.metadata["content_hash"]:
+            plan.changed += 1
+            plan.to_upsert.append(doc)
+        else:
+            plan.unchanged += 1
+
+    # Всё, чего больше нет в базе знаний (включая старые точки без content_hash), удаляем
+    plan.to_delete = [point_id for point_id in stored_hashes if point_id not in new_ids]
+    return plan
+
+
+def _run_sync(coro):
+    """Запускает корутину из синхронного кода (в том числе если в потоке уже крутится event loop)."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coro).result()
+
+
+class QdrantKnowledgeIndexer:
+    """
+    Инкрементальная индексация knowledge_base.md в Qdrant.
+    Эмбеддим только новые/измененные чанки, удаляем исчезнувшие.
+    Формат payload совместим с QdrantVectorStore (page_content + metadata).
+    """
+    def __init__(self, client: QdrantClient, collection_name: str, embeddings, batch_size: int = 64, index_profile: Optional[IndexProfile] = None, build_faq: bool = True):
+        self.client = client
+        self.collection_name = collection_name
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        self.index_profile = resolve_index_profile(index_profile)
+        # Рядом с коллекцией поддерживается FAQ-индекс по заголовкам вопросов (см. faq_index.py)
+        self.build_faq = build_faq
+
+    def stored_hashes(self) -> Dict[str, Optional[str]]:
+        if not self.client.collection_exists(self.collection_name):
+            return {}
+
+        hashes = {}
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=self.collection_name,
+                limit=256,
+                offset=offset,
+                with_payload=["metadata"],
+                with_vectors=False,
+            )
+            for p in points:
+                metadata = (p.payload or {}).get("metadata") or {}
+                hashes[str(p.id)] = metadata.get("content_hash")
+            if offset is None:
+                return hashes
+
+    def plan(self, knowledge_base_path: str) -> IndexPlan:
+        chunks = build_chunks(split_knowledge_base(knowledge_base_path))
+        return plan_changes(chunks, self.stored_hashes())
+
+    def sync(self, knowledge_base_path: str, dry_run: bool = False, record_version: bool = True) -> IndexPlan:
+        """record_version: записать версию базы знаний (инвалидирует кэш поиска по этой коллекции)."""
+        plan = self.plan(knowledge_base_path)
+        logger.info(f"[KBIndexer] {self.collection_name}: {plan.summary()}")
+
+        if dry_run:
+            return plan
+        if self.build_faq:
+            # До пустого плана: FAQ досоздается и для коллекций, собранных до его появления
+            FaqIndexBuilder(self.client, self.collection_name, self.embeddings).sync(plan.chunks)
+        if plan.is_empty:
+            if record_version:
+                get_kb_versions().record(self.collection_name, plan.kb_version)
+            return plan
+
+        if plan.to_upsert:
+            stats = _run_sync(self._pipeline().run(plan.to_upsert))
+            logger.info(f"[KBIndexer] {self.collection_name}: {stats.summary()}")
+
+        if plan.to_delete:
+            self.client.delete(
+                collection_name=self.collection_name,
+                points_selector=PointIdsList(points=plan.to_delete),
+            )
+
+        logger.info(f"[KBIndexer] Коллекция {self.collection_name} синхронизирована.")
+        if record_version:
+            get_kb_versions().record(self.collection_name, plan.kb_version)
+        return plan
+
+    def _pipeline(self) -> EmbeddingIngestionPipeline:
+        return EmbeddingIngestionPipeline(
+            self.client,
+            self.collection_name,
+            self.embeddings,
+            ensure_collection=self._ensure_collection,
+            max_batch_tokens=int(os.getenv("EMBEDDING_BATCH_TOKENS", DEFAULT_MAX_BATCH_TOKENS)),
+            max_concurrency=int(os.getenv("EMBEDDING_CONCURRENCY", DEFAULT_CONCURRENCY)),
+            upsert_batch_size=self.batch_size,
+        )
+
+    def _ensure_collection(self, vector_size: int):
+        if not self.client.collection_exists(self.collection_name):
+            logger.info(f"[KBIndexer] Создаю коллекцию {self.collection_name} (dim={vector_size}, профиль {self.index_profile.name})...")
+            self.client.create_collection(
+                collection_name=self.collection_name,
+                vectors_config=self.index_profile.vectors_config(vector_size),
+            )
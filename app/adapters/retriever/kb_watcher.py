@@ -0,0 +1,130 @@
+"""
+Горячая перезагрузка баз знаний: следим за knowledge_base_path тенантов и после правки
+пересобираем индекс в фоне, не перезапуская процесс.
+
+Файлы опрашиваются по mtime/размеру, а не через inotify: события файловой системы не всегда
+доходят через bind-mount в Docker. Перезагрузка запускается, когда файл не менялся
+debounce_seconds (редактор может сохранять файл в несколько приемов), и только если
+изменилось содержимое. Сама перезагрузка идет в отдельном потоке, чтобы не блокировать event loop.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POLL_INTERVAL_SECONDS = 2.0
+DEFAULT_DEBOUNCE_SECONDS = 3.0
+
+
+def _file_signature(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _file_digest(path: str) -> Optional[str]:
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+@dataclass
+class _WatchedFile:
+    path: str
+    callbacks: List[Callable[[], object]] = field(default_factory=list)
+    signature: Optional[Tuple[int, int]] = None
+    digest: Optional[str] = None
+    # Содержимое, которое сейчас перезагружается: становится digest только после успешной перезагрузки
+    pending_digest: Optional[str] = None
+    changed_at: Optional[float] = None
+    reloading: Optional[asyncio.Task] = None
+
+
+class KnowledgeBaseWatcher:
+    """Фоновый воркер (start/stop, как воркеры каналов): один на процесс, файлов может быть много."""
+    def __init__(self, poll_interval: float = DEFAULT_POLL_INTERVAL_SECONDS, debounce_seconds: float = DEFAULT_DEBOUNCE_SECONDS):
+        self.poll_interval = poll_interval
+        self.debounce_seconds = debounce_seconds
+        self.is_running = False
+        self._files: Dict[str, _WatchedFile] = {}
+
+    def watch(self, path: str, on_change: Callable[[], object]):
+        """Регистрирует синхронный колбэк перезагрузки (например, QdrantRetrieverAdapter.reload_knowledge_base)."""
+        key = os.path.abspath(path)
+        watched = self._files.get(key)
+        if watched is None:
+            watched = self._files[key] = _WatchedFile(path=key, signature=_file_signature(key), digest=_file_digest(key))
+        watched.callbacks.append(on_change)
+
+    def due_files(self, now: Optional[float] = None) -> List[str]:
+        """
+        Один шаг опроса: отмечает изменившиеся файлы и возвращает те, что успокоились
+        и действительно поменяли содержимое. Перезагружаемые прямо сейчас пропускаются до следующего шага.
+        """
+        now = time.monotonic() if now is None else now
+        due = []
+        for watched in self._files.values():
+            signature = _file_signature(watched.path)
+            if signature != watched.signature:
+                watched.signature = signature
+                watched.changed_at = now
+                continue
+            if watched.changed_at is None or now - watched.changed_at < self.debounce_seconds:
+                continue
+            if watched.reloading is not None and not watched.reloading.done():
+                continue
+
+            watched.changed_at = None
+            digest = _file_digest(watched.path)
+            if digest is None or digest == watched.digest:
+                # Файл удален на время сохранения или изменился только mtime
+                continue
+            watched.pending_digest = digest
+            due.append(watched.path)
+        return due
+
+    async def start(self):
+        self.is_running = True
+        logger.info(f"[KBWatcher] Слежу за базами знаний: {', '.join(self._files) or 'нет файлов'}")
+        while self.is_running:
+            try:
+                for path in self.due_files():
+                    watched = self._files[path]
+                    watched.reloading = asyncio.create_task(self._reload(watched), name=f"kb_reload:{os.path.basename(path)}")
+            except Exception as e:
+                logger.error(f"[KBWatcher] Ошибка опроса файлов: {e}", exc_info=True)
+            await asyncio.sleep(self.poll_interval)
+
+    def stop(self):
+        self.is_running = False
+
+    async def _reload(self, watched: _WatchedFile):
+        """
+        Вызывает колбэки. Изменение считается учтенным, только если все колбэки отработали
+        без ошибки и вернули истину; иначе (429 при эмбеддинге, индекс еще собирается)
+        перезагрузка повторится через debounce_seconds.
+        """
+        logger.info(f"[KBWatcher] {watched.path} изменен, перезагружаю индекс...")
+        started = time.monotonic()
+        digest, ok = watched.pending_digest, True
+        for callback in watched.callbacks:
+            try:
+                ok = bool(await asyncio.to_thread(callback)) and ok
+            except Exception as e:
+                logger.error(f"[KBWatcher] Ошибка перезагрузки {watched.path}: {e}", exc_info=True)
+                ok = False
+        if ok:
+            watched.digest = digest
+        else:
+            watched.changed_at = time.monotonic()
+            logger.warning(f"[KBWatcher] {watched.path}: перезагрузка не удалась, повторю через {self.debounce_seconds:g} с")
+        logger.info(f"[KBWatcher] {watched.path}: перезагрузка заняла {time.monotonic() - started:.1f} с")
@@ -0,0 +1,57 @@
+from typing import List, Tuple
+
+import numpy as np
+
+# Параметры MMR по умолчанию (раньше были захардкожены в вызовах max_marginal_relevance_search)
+DEFAULT_K = 6
+DEFAULT_FETCH_K = 20
+DEFAULT_LAMBDA_MULT = 0.7  # 0.5 - макс. разнообразие, 1.0 - макс. точность. 0.7 - баланс.
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-нормализация строк матрицы. Нулевые строки остаются нулевыми."""
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0.0] = 1.0
+    return matrix / norms
+
+
+def maximal_marginal_relevance(
+    query_vector: np.ndarray,
+    candidate_vectors: np.ndarray,
+    k: int = DEFAULT_K,
+    lambda_mult: float = DEFAULT_LAMBDA_MULT,
+) -> Tuple[List[int], np.ndarray]:
+    """
+    Векторизованный MMR над матрицей кандидатов (n x dim).
+
+    Считаем одну матрицу косинусных сходств кандидатов между собой и поддерживаем
+    для каждого кандидата максимум сходства с уже выбранными (обновляется за O(n) на шаг).
+
+    Возвращает индексы выбранных кандидатов (в порядке выбора) и косинусное сходство
+    каждого кандидата с запросом — его мы отдаем наружу как score.
+    """
+    n = len(candidate_vectors)
+    if n == 0 or k <= 0:
+        return [], np.empty(0, dtype=np.float32)
+
+    candidates = normalize_rows(np.asarray(candidate_vectors, dtype=np.float32))
+    query = normalize_rows(np.asarray(query_vector, dtype=np.float32).reshape(1, -1))[0]
+
+    relevance = candidates @ query
+    pairwise = candidates @ candidates.T
+
+    first = int(np.argmax(relevance))
+    selected = [first]
+    max_similarity = pairwise[first].copy()
+    available = np.ones(n, dtype=bool)
+    available[first] = False
+
+    for _ in range(min(k, n) - 1):
+        scores = lambda_mult * relevance - (1.0 - lambda_mult) * max_similarity
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(max_similarity, pairwise[best], out=max_similarity)
+
+    return selected, relevance
@@ -1,56 +1,91 @@
 import os
 import logging
+import threading
 import time
-from typing import List, Optional
-from langchain_qdrant import QdrantVectorStore
+from typing import Any, Dict, List, Optional, Union
+import numpy as np
 from qdrant_client import QdrantClient
-from qdrant_client.http.models import Distance, VectorParams
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.document_loaders import TextLoader
-from langchain.text_splitter import MarkdownHeaderTextSplitter, RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
+from qdrant_client.http.models import QueryRequest
+from tenacity import retry, stop_after_attempt, wait_exponential
 
 from app.core.ports.retriever import KnowledgeRetriever
 from app.core.models.chunk import RetrievedChunk
+from app.adapters.embeddings.factory import calibrate_score, create_embeddings, embedding_dimension, embedding_model_name, resolve_provider, score_calibration
+from app.adapters.embeddings.query_memo import QueryVectorMemo
+from app.adapters.retriever.cache import compute_kb_version, get_kb_versions
+from app.adapters.retriever.collection_versions import VersionedCollection
+from app.adapters.retriever.faq_index import FaqIndex, FaqMatch, resolve_faq_config
+from app.adapters.retriever.index_profiles import IndexProfile, resolve_index_profile
+from app.adapters.retriever.kb_indexer import QdrantKnowledgeIndexer
+from app.adapters.retriever.mmr import maximal_marginal_relevance, DEFAULT_FETCH_K, DEFAULT_LAMBDA_MULT
+from app.utils.metrics import get_metrics
 
 logger = logging.getLogger(__name__)
 
 class QdrantRetrieverAdapter(KnowledgeRetriever):
-    def __init__(self, collection_name: str, knowledge_base_path: str, openai_api_key: Optional[str] = None, openai_api_base: Optional[str] = None):
+    """
+    Ретривер по коллекции Qdrant. Конструктор не ходит в сеть: коллекция привязывается
+    при первом запросе (или в фоне через start_background_init), а если ее нет —
+    собирается в фоновом потоке. Пока коллекция не готова, retrieve отдает пустой контекст.
+    """
+    def __init__(self, collection_name: str, knowledge_base_path: str, openai_api_key: Optional[str] = None, openai_api_base: Optional[str] = None, fetch_k: int = DEFAULT_FETCH_K, lambda_mult: float = DEFAULT_LAMBDA_MULT, index_profile: Union[None, str, Dict[str, Any], IndexProfile] = None, faq: Union[None, bool, Dict[str, Any]] = None):
         self.collection_name = collection_name
         self.knowledge_base_path = knowledge_base_path
         self.openai_api_key = openai_api_key
         self.openai_api_base = openai_api_base
+        self.fetch_k = fetch_k
+        self.lambda_mult = lambda_mult
+        # Квантизация / on_disk / HNSW коллекции из конфига тенанта (см. index_profiles.py)
+        self.index_profile = resolve_index_profile(index_profile)
+        # Прямой поиск по заголовкам вопросов (ключ faq в конфиге тенанта, см. faq_index.py)
+        self.faq = resolve_faq_config(faq)
+        self._faq_index: Optional[FaqIndex] = None
+        self._faq_version: Optional[str] = None
+        self._faq_lock = threading.Lock()
         
         # Получаем URL Qdrant из окружения. Внутри Docker-сети это будет http://qdrant:6333
         self.qdrant_url = os.getenv("QDRANT_URL", "http://localhost:6333")
         
-        self.embeddings = self._get_embeddings()
-        
-        # Инициализируем клиент с ретраями на случай, если контейнер Qdrant еще поднимается
-        self.client = self._connect_with_retry()
-        self.vector_store = self._init_collection_and_store()
+        # Эмбеддинги создаются при первом обращении (локальная модель грузится долго)
+        self.embedding_provider = resolve_provider(openai_api_key)
+        self.embedding_model = embedding_model_name(self.embedding_provider)
+        self.score_calibration = score_calibration(self.embedding_model)
+        self._embeddings = None
+        self._embeddings_lock = threading.Lock()
 
-    def _get_embeddings(self):
-        provider = (os.getenv("EMBEDDINGS_PROVIDER") or "openai").strip().lower()
-        
-        if not self.openai_api_key and provider == "openai":
-            logger.warning("[QdrantAdapter] Нет OpenAI API Key. Переключаюсь на локальные эмбеддинги.")
-            provider = "local"
-
-        if provider == "local":
-            model_name = os.getenv("LOCAL_EMBEDDING_MODEL", "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
-            logger.info(f"[QdrantAdapter] Использую локальные эмбеддинги: {model_name}")
-            return HuggingFaceEmbeddings(model_name=model_name)
-        
-        model_name = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")
-        logger.info(f"[QdrantAdapter] Использую OpenAI эмбеддинги: {model_name}")
-        return OpenAIEmbeddings(
-            model=model_name, 
-            openai_api_key=self.openai_api_key, 
-            base_url=self.openai_api_base
-        )
+        # Клиент не подключается в конструкторе, первый HTTP-запрос будет при привязке коллекции
+        self.client = QdrantClient(url=self.qdrant_url, timeout=10.0, check_compatibility=False)
+        self._bind_lock = threading.Lock()
+        self._ready = False
+        self._build_thread: Optional[threading.Thread] = None
+        self._reload_lock = threading.Lock()
+        self.last_error: Optional[str] = None
+
+    @property
+    def embeddings(self):
+        if self._embeddings is None:
+            with self._embeddings_lock:
+                if self._embeddings is None:
+                    # Вектор сообщения общий для ретривера и классификатора интента (см. query_memo.py)
+                    self._embeddings = QueryVectorMemo(create_embeddings(self.openai_api_key, self.openai_api_base, provider=self.embedding_provider))
+        return self._embeddings
+
+    @property
+    def is_ready(self) -> bool:
+        return self._ready
+
+    def status(self) -> Dict[str, Any]:
+        """Состояние для /health."""
+        return {
+            "collection": self.collection_name,
+            "ready": self._ready,
+            "building": bool(self._build_thread and self._build_thread.is_alive()),
+            "error": self.last_error,
+        }
+
+    def start_background_init(self):
+        """Привязывает коллекцию в фоне (с ретраями подключения), не блокируя старт сервиса."""
+        threading.Thread(target=self._ensure_collection, kwargs={"wait_for_qdrant": True}, name=f"qdrant-init-{self.collection_name}", daemon=True).start()
 
     # Декоратор tenacity: пытаемся подключиться до 7 раз, с экспоненциальной задержкой (от 2 до 10 секунд)
     @retry(
@@ -58,95 +93,248 @@ class QdrantRetrieverAdapter(KnowledgeRetriever):
         wait=wait_exponential(multiplier=2, min=2, max=10),
         reraise=True
     )
-    def _connect_with_retry(self) -> QdrantClient:
-        logger.info(f"[QdrantAdapter] Попытка подключения к Qdrant по адресу {self.qdrant_url}...")
-        client = QdrantClient(url=self.qdrant_url, timeout=10.0)
-        # Делаем тестовый запрос, чтобы убедиться, что база реально отвечает
-        client.get_collections()
-        logger.info("[QdrantAdapter] Успешное подключение к Qdrant!")
-        return client
-
-    def _init_collection_and_store(self):
-        # Проверяем, существует ли коллекция
-        collections = self.client.get_collections().collections
-        collection_exists = any(c.name == self.collection_name for c in collections)
-        
-        # Узнаем размерность эмбеддингов, создав тестовый вектор
-        test_embedding = self.embeddings.embed_query("test")
-        vector_size = len(test_embedding)
-
-        if not collection_exists:
-            logger.info(f"[QdrantAdapter] Коллекция {self.collection_name} не найдена. Создаю новую...")
-            self.client.create_collection(
-                collection_name=self.collection_name,
-                vectors_config=VectorParams(size=vector_size, distance=Distance.COSINE),
-            )
-            
-            # Загружаем данные из текущего knowledge_base.md
-            self._rebuild_index()
-        else:
-            logger.info(f"[QdrantAdapter] Подключение к существующей коллекции {self.collection_name}.")
+    def _collection_exists_with_retry(self) -> bool:
+        logger.info(f"[QdrantAdapter] Проверка коллекции {self.collection_name} в Qdrant по адресу {self.qdrant_url}...")
+        return self.client.collection_exists(self.collection_name)
 
-        return QdrantVectorStore(
-            client=self.client,
-            collection_name=self.collection_name,
-            embedding=self.embeddings,
-        )
+    def _ensure_collection(self, wait_for_qdrant: bool = False) -> bool:
+        if self._ready:
+            return True
+        # На пути запроса не ждем: привязкой уже может заниматься фоновый поток
+        if not self._bind_lock.acquire(blocking=wait_for_qdrant):
+            return False
+        try:
+            if self._ready or (self._build_thread and self._build_thread.is_alive()):
+                return self._ready
+            try:
+                # Проверяем, существует ли коллекция (или алиас на версионированную коллекцию)
+                exists = self._collection_exists_with_retry() if wait_for_qdrant else self.client.collection_exists(self.collection_name)
+            except Exception as e:
+                self.last_error = f"Qdrant недоступен: {e}"
+                logger.error(f"[QdrantAdapter] {self.last_error}")
+                return False
+
+            if exists:
+                logger.info(f"[QdrantAdapter] Подключение к существующей коллекции {self.collection_name}.")
+                self.last_error = None
+                self._ready = True
+                return True
+
+            logger.info(f"[QdrantAdapter] Коллекция {self.collection_name} не найдена. Собираю первую версию в фоне...")
+            self._build_thread = threading.Thread(target=self._build_first_version, name=f"qdrant-build-{self.collection_name}", daemon=True)
+            self._build_thread.start()
+            return False
+        finally:
+            self._bind_lock.release()
+
+    def _build_first_version(self):
+        # Загружаем данные из текущего knowledge_base.md
+        if not self.rebuild_collection():
+            try:
+                VersionedCollection(self.client, self.collection_name, index_profile=self.index_profile).create_empty(self._vector_size())
+            except Exception as e:
+                self.last_error = f"Не удалось создать коллекцию: {e}"
+                logger.critical(f"[QdrantAdapter] {self.last_error}", exc_info=True)
+                return
+        self.last_error = None
+        self._ready = True
+
+    def _vector_size(self) -> int:
+        # Размерность из таблицы моделей; пробный запрос к модели — только для неизвестных
+        return embedding_dimension(self.embedding_model) or len(self.embeddings.embed_query("dimension"))
 
     def _rebuild_index(self):
-        logger.info("[QdrantAdapter] Начало загрузки документов в базу...")
+        logger.info("[QdrantAdapter] Синхронизация базы знаний с коллекцией...")
         try:
-            loader = TextLoader(self.knowledge_base_path, encoding='utf-8')
-            documents = loader.load()
-            
-            headers_to_split_on = [
-                ("#", "product"),
-                ("##", "category"),
-                ("###", "subcategory"),
-                ("####", "question"),
-            ]
-            markdown_splitter = MarkdownHeaderTextSplitter(headers_to_split_on=headers_to_split_on, strip_headers=False)
-            docs = markdown_splitter.split_text(documents[0].page_content)
-            
-            if not docs:
-                text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-                docs = text_splitter.split_documents(documents)
-
-            logger.info(f"[QdrantAdapter] Создание векторов для {len(docs)} чанков...")
-            
-            # В Qdrant мы просто добавляем документы через LangChain обертку
-            QdrantVectorStore.from_documents(
-                docs,
-                self.embeddings,
-                url=self.qdrant_url,
-                collection_name=self.collection_name,
-                force_recreate=True # Пересоздаем коллекцию при ребилде
-            )
-            logger.info("[QdrantAdapter] Документы успешно загружены в Qdrant.")
+            # Инкрементально: эмбеддим только новые/измененные чанки, удаляем исчезнувшие
+            indexer = QdrantKnowledgeIndexer(self.client, self.collection_name, self.embeddings, index_profile=self.index_profile)
+            plan = indexer.sync(self.knowledge_base_path)
+            logger.info(f"[QdrantAdapter] Документы успешно загружены в Qdrant ({plan.summary()}).")
             
         except Exception as e:
             logger.critical(f"[QdrantAdapter] Критическая ошибка при загрузке документов: {e}", exc_info=True)
 
+    def rebuild_collection(self) -> bool:
+        """
+        Полная пересборка без простоя: новая версия {name}__v{n} собирается в тени,
+        проверяется и подменяет текущую через алиас. Живые запросы читают старую версию до переключения.
+        """
+        try:
+            VersionedCollection(self.client, self.collection_name, index_profile=self.index_profile).rebuild(self.knowledge_base_path, self.embeddings)
+            return True
+        except Exception as e:
+            logger.critical(f"[QdrantAdapter] Ошибка полной пересборки {self.collection_name}: {e}", exc_info=True)
+            return False
+
+    def reload_knowledge_base(self) -> bool:
+        """
+        Горячая перезагрузка после правки knowledge_base_path (вызывает KnowledgeBaseWatcher):
+        инкрементальная сборка новой версии и атомарное переключение алиаса.
+        Длительность пишется в метрику kb_reload_seconds.
+        """
+        if not self._ready:
+            logger.info(f"[QdrantAdapter] {self.collection_name} еще собирается, перезагрузка не нужна.")
+            return False
+
+        with self._reload_lock:
+            started = time.perf_counter()
+            result = "error"
+            try:
+                switched_to = VersionedCollection(self.client, self.collection_name, index_profile=self.index_profile).reload(self.knowledge_base_path, self.embeddings)
+                result = "swapped" if switched_to else "unchanged"
+                return True
+            except Exception as e:
+                logger.error(f"[QdrantAdapter] Ошибка горячей перезагрузки {self.collection_name}: {e}", exc_info=True)
+                return False
+            finally:
+                elapsed = time.perf_counter() - started
+                get_metrics().observe("kb_reload_seconds", elapsed, collection=self.collection_name, result=result)
+                logger.info(f"[QdrantAdapter] Перезагрузка {self.collection_name}: {result} за {elapsed:.2f} с")
+
+    def kb_version(self) -> Optional[str]:
+        """
+        Версия базы знаний для кэша поиска. Обычно ее записывает пересборка; если коллекция
+        собиралась до запуска процесса и в Redis версии нет, считаем ее один раз по payload.
+        """
+        if not self._ready:
+            return None
+        versions = get_kb_versions()
+        version = versions.get(self.collection_name)
+        if version is None:
+            try:
+                hashes = QdrantKnowledgeIndexer(self.client, self.collection_name, self.embeddings).stored_hashes()
+                version = compute_kb_version(hashes)
+                versions.record(self.collection_name, version)
+            except Exception as e:
+                logger.warning(f"[QdrantAdapter] Не удалось определить версию базы знаний: {e}")
+        return version
+
     def retrieve(self, query: str, k: int = 6) -> List[RetrievedChunk]:
-        if not self.vector_store:
-            logger.error("[QdrantAdapter] Векторное хранилище не инициализировано.")
+        if not self._ensure_collection():
+            logger.warning(f"[QdrantAdapter] Коллекция {self.collection_name} еще не готова, отвечаю без контекста.")
             return []
 
         try:
-            # QdrantVectorStore поддерживает MMR
-            docs = self.vector_store.max_marginal_relevance_search(
-                query, 
-                k=k, 
-                fetch_k=20, 
-                lambda_mult=0.7
-            )
-            
-            return [
-                RetrievedChunk(
-                    content=doc.page_content,
-                    metadata=doc.metadata
-                ) for doc in docs
-            ]
+            # Точное совпадение с заголовком вопроса не требует даже эмбеддинга запроса
+            match = self._faq_match(query)
+            if match:
+                return [self._faq_chunk(query, match)]
+            query_vector = self.embeddings.embed_query(query)
+            match = self._faq_match(query, query_vector)
+            if match:
+                return [self._faq_chunk(query, match)]
+            return self._search_mmr(query_vector, k)
         except Exception as e:
             logger.error(f"[QdrantAdapter] Ошибка поиска: {e}")
-            return []
\ No newline at end of file
+            return []
+
+    def retrieve_many(self, queries: List[str], k: int = 6) -> List[List[RetrievedChunk]]:
+        """Пачка запросов за два round trip: один embed_documents и один query_batch_points."""
+        if not queries:
+            return []
+        if not self._ensure_collection():
+            logger.warning(f"[QdrantAdapter] Коллекция {self.collection_name} еще не готова, отвечаю без контекста.")
+            return [[] for _ in queries]
+
+        try:
+            results: List[Optional[List[RetrievedChunk]]] = [None] * len(queries)
+            for i, query in enumerate(queries):
+                match = self._faq_match(query)
+                if match:
+                    results[i] = [self._faq_chunk(query, match)]
+
+            pending = [i for i, r in enumerate(results) if r is None]
+            query_vectors = self.embeddings.embed_documents([queries[i] for i in pending]) if pending else []
+            search = []
+            for i, vector in zip(pending, query_vectors):
+                match = self._faq_match(queries[i], vector)
+                if match:
+                    results[i] = [self._faq_chunk(queries[i], match)]
+                else:
+                    search.append((i, vector))
+
+            if search:
+                responses = self.client.query_batch_points(
+                    collection_name=self.collection_name,
+                    requests=[
+                        QueryRequest(
+                            query=vector,
+                            limit=max(self.fetch_k, k),
+                            params=self.index_profile.search_params(),
+                            with_payload=True,
+                            with_vector=True,
+                        )
+                        for _, vector in search
+                    ],
+                )
+                for (i, vector), response in zip(search, responses):
+                    results[i] = self._select_mmr(vector, response.points, k)
+            return results
+        except Exception as e:
+            logger.error(f"[QdrantAdapter] Ошибка пакетного поиска ({len(queries)} запросов): {e}")
+            return [[] for _ in queries]
+
+    def faq_index(self) -> Optional[FaqIndex]:
+        """FAQ-индекс в памяти; перечитывается из Qdrant при смене версии базы знаний."""
+        if self.faq is None:
+            return None
+        version = self.kb_version()
+        if self._faq_index is None or version != self._faq_version:
+            with self._faq_lock:
+                if self._faq_index is None or version != self._faq_version:
+                    try:
+                        self._faq_index = FaqIndex.load(self.client, self.collection_name)
+                    except Exception as e:
+                        logger.warning(f"[QdrantAdapter] Не удалось загрузить FAQ-индекс {self.collection_name}: {e}")
+                        self._faq_index = FaqIndex([])
+                    self._faq_version = version
+        return self._faq_index
+
+    def _faq_match(self, query: str, query_vector: Optional[List[float]] = None) -> Optional[FaqMatch]:
+        index = self.faq_index()
+        if not index:
+            return None
+        if query_vector is None:
+            return index.lookup(query)
+        return index.nearest(query_vector, self.faq)
+
+    def _faq_chunk(self, query: str, match: FaqMatch) -> RetrievedChunk:
+        logger.info(f"[QdrantAdapter] FAQ: '{query[:60]}' -> '{match.entry.question[:60]}' ({'точное совпадение' if match.exact else f'косинус {match.similarity:.2f}'}), MMR пропущен.")
+        metadata = dict(match.entry.metadata)
+        metadata.update(cosine=match.similarity, faq_match=True, approved_answer=match.entry.approved_answer)
+        return RetrievedChunk(
+            content=match.entry.content,
+            score=1.0 if match.exact else calibrate_score(match.similarity, self.score_calibration),
+            metadata=metadata
+        )
+
+    def _search_mmr(self, query_vector: List[float], k: int) -> List[RetrievedChunk]:
+        # Один запрос в Qdrant: кандидаты сразу с векторами и payload, MMR считаем сами на NumPy
+        points = self.client.query_points(
+            collection_name=self.collection_name,
+            query=query_vector,
+            limit=max(self.fetch_k, k),
+            search_params=self.index_profile.search_params(),
+            with_payload=True,
+            with_vectors=True,
+        ).points
+        return self._select_mmr(query_vector, points, k)
+
+    def _select_mmr(self, query_vector: List[float], points, k: int) -> List[RetrievedChunk]:
+        if not points:
+            return []
+
+        matrix = np.asarray([p.vector for p in points], dtype=np.float32)
+        selected, relevance = maximal_marginal_relevance(np.asarray(query_vector), matrix, k=k, lambda_mult=self.lambda_mult)
+
+        chunks = []
+        for i in selected:
+            payload = points[i].payload or {}
+            metadata = dict(payload.get("metadata") or {})
+            metadata["cosine"] = float(relevance[i])
+            chunks.append(RetrievedChunk(
+                content=payload.get("page_content", ""),
+                score=calibrate_score(float(relevance[i]), self.score_calibration),
+                metadata=metadata
+            ))
+        return chunks
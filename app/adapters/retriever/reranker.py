@@ -0,0 +1,249 @@
+"""
+Реранкинг кандидатов кросс-энкодером на CPU.
+
+Модель — небольшой мультиязычный кросс-энкодер в ONNX (желательно int8), например
+cross-encoder/mmarco-mMiniLMv2-L12-H384-v1. Экспорт и квантизация:
+
+  optimum-cli export onnx --model cross-encoder/mmarco-mMiniLMv2-L12-H384-v1 models/reranker
+  optimum-cli onnxruntime quantize --onnx_model models/reranker --avx2 -o models/reranker-int8
+
+В каталоге модели должны лежать model.onnx (или model_quantized.onnx) и tokenizer.json.
+Зависимости onnxruntime и tokenizers опциональны: без них реранкинг просто выключен.
+С RERANK_WORKERS > 0 модель работает в пуле процессов (см. app/utils/inference_pool.py).
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from app.core.ports.retriever import KnowledgeRetriever, RetrieverDecorator
+from app.core.models.chunk import RetrievedChunk
+from app.utils.inference_pool import InferenceProcessPool
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CANDIDATES = 30
+DEFAULT_TOP_N = 4
+DEFAULT_MIN_TOP_N = 2
+DEFAULT_THRESHOLD = 0.3
+DEFAULT_LATENCY_BUDGET_MS = 300.0
+
+
+def chunk_key(chunk: RetrievedChunk) -> str:
+    """Ключ чанка для кэша: chunk_id из индексатора, иначе хэш текста."""
+    metadata = chunk.metadata or {}
+    return metadata.get("chunk_id") or hashlib.sha1(chunk.content.encode("utf-8")).hexdigest()
+
+
+class CrossEncoderReranker:
+    """
+    Кросс-энкодер (query, chunk) -> релевантность 0..1 на onnxruntime.
+    Пары считаются батчами, оценки кэшируются в LRU по (query, chunk_id).
+    Потокобезопасен: сессия ONNX Runtime допускает параллельный run, кэш под локом.
+    """
+    def __init__(self, model_path: str, max_length: int = 512, batch_size: int = 16, cache_size: int = 4096, num_threads: Optional[int] = None):
+        self.model_path = model_path
+        self.max_length = max_length
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Оценка стоимости одной пары (EMA), нужна для решения «успеваем ли в бюджет»
+        self.ms_per_pair: Optional[float] = None
+        self._load(num_threads)
+
+    def _load(self, num_threads: Optional[int]):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_file = next(
+            (os.path.join(self.model_path, name) for name in ("model_quantized.onnx", "model.onnx")
+             if os.path.exists(os.path.join(self.model_path, name))),
+            self.model_path,
+        )
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = num_threads or int(os.getenv("RERANK_THREADS", "2"))
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_file, sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(self.model_path, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=self.max_length)
+        self.tokenizer.enable_padding()
+        logger.info(f"[Reranker] Загружен кросс-энкодер {model_file}")
+
+    def _predict(self, query: str, texts: Sequence[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch([(query, text) for text in texts])
+        feeds = {
+            "input_ids": np.asarray([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.asarray([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.asarray([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        logits = self.session.run(None, {k: v for k, v in feeds.items() if k in self.input_names})[0]
+        return 1.0 / (1.0 + np.exp(-logits.reshape(len(texts), -1)[:, 0]))
+
+    def uncached_count(self, query: str, chunks: Sequence[RetrievedChunk]) -> int:
+        with self._lock:
+            return sum((query, chunk_key(c)) not in self._cache for c in chunks)
+
+    def estimate_ms(self, query: str, chunks: Sequence[RetrievedChunk]) -> float:
+        """Сколько займет реранкинг (0, пока нет замеров — первый вызов всегда пробуем)."""
+        return (self.ms_per_pair or 0.0) * self.uncached_count(query, chunks)
+
+    def score(self, query: str, chunks: Sequence[RetrievedChunk]) -> List[float]:
+        keys = [(query, chunk_key(c)) for c in chunks]
+        with self._lock:
+            scores = {key: self._cache[key] for key in keys if key in self._cache}
+            for key in scores:
+                self._cache.move_to_end(key)
+
+        pending = [(key, c.content) for key, c in zip(keys, chunks) if key not in scores]
+        if pending:
+            start = time.perf_counter()
+            batches = [pending[i:i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+            for batch, values in zip(batches, self._predict_batches(query, [[text for _, text in batch] for batch in batches])):
+                for (key, _), value in zip(batch, values):
+                    scores[key] = float(value)
+            self._record_cost((time.perf_counter() - start) * 1000 / len(pending))
+
+            with self._lock:
+                for key, _ in pending:
+                    self._cache[key] = scores[key]
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        return [scores[key] for key in keys]
+
+    def _predict_batches(self, query: str, batches: List[List[str]]) -> List[Sequence[float]]:
+        return [self._predict(query, texts) for texts in batches]
+
+    def _record_cost(self, ms_per_pair: float, alpha: float = 0.2):
+        self.ms_per_pair = ms_per_pair if self.ms_per_pair is None else (1 - alpha) * self.ms_per_pair + alpha * ms_per_pair
+
+
+class PooledCrossEncoderReranker(CrossEncoderReranker):
+    """
+    Кросс-энкодер в пуле процессов (RERANK_WORKERS > 0): батчи пар одного запроса считаются
+    параллельно в разных воркерах. Кэш оценок и учет бюджета задержки — в основном процессе.
+    """
+    # Класс модели, которую создает каждый воркер
+    model_class = CrossEncoderReranker
+
+    def __init__(self, model_path: str, workers: int = 2, **kwargs):
+        self.workers = workers
+        super().__init__(model_path, **kwargs)
+
+    def _load(self, num_threads: Optional[int]):
+        factory = partial(self.model_class, self.model_path, max_length=self.max_length, batch_size=self.batch_size, num_threads=num_threads)
+        self.pool = InferenceProcessPool(factory, workers=self.workers, name="reranker")
+        # Пробный вызов: модель грузится в воркерах сейчас, ошибка загрузки видна сразу (get_reranker выключит реранкинг)
+        self.pool.call("_predict_batches", "", [])
+
+    def _predict(self, query: str, texts: Sequence[str]) -> np.ndarray:
+        return self.pool.call("_predict", query, list(texts))
+
+    def _predict_batches(self, query: str, batches: List[List[str]]) -> List[Sequence[float]]:
+        futures = [self.pool.submit("_predict", query, texts) for texts in batches]
+        return [future.result() for future in futures]
+
+
+class RerankingRetriever(RetrieverDecorator):
+    """
+    Декоратор ретривера: берет ~30 кандидатов, реранжирует кросс-энкодером и оставляет
+    top_n лучших с оценкой не ниже threshold (но не меньше min_top_n).
+    Если до дедлайна не успеваем, отдает кандидатов в исходном порядке без реранкинга.
+    """
+    def __init__(self, base: KnowledgeRetriever, reranker: CrossEncoderReranker, candidates: int = DEFAULT_CANDIDATES, top_n: int = DEFAULT_TOP_N, min_top_n: int = DEFAULT_MIN_TOP_N, threshold: float = DEFAULT_THRESHOLD, latency_budget_ms: float = DEFAULT_LATENCY_BUDGET_MS):
+        super().__init__(base)
+        self.reranker = reranker
+        self.candidates = candidates
+        self.top_n = top_n
+        self.min_top_n = min(min_top_n, top_n)
+        self.threshold = threshold
+        self.latency_budget_ms = latency_budget_ms
+
+    def retrieve(self, query: str, k: int = 6) -> List[RetrievedChunk]:
+        start = time.perf_counter()
+        candidates = self.base.retrieve(query, k=max(self.candidates, k))
+        return self._rerank(query, candidates, k, start)
+
+    def retrieve_many(self, queries: List[str], k: int = 6) -> List[List[RetrievedChunk]]:
+        # Кандидаты для всех запросов одним проходом базового ретривера, бюджет — на каждый запрос
+        start = time.perf_counter()
+        batches = self.base.retrieve_many(queries, k=max(self.candidates, k))
+        return [self._rerank(query, candidates, k, start) for query, candidates in zip(queries, batches)]
+
+    def _rerank(self, query: str, candidates: List[RetrievedChunk], k: int, start: float) -> List[RetrievedChunk]:
+        if len(candidates) <= self.min_top_n:
+            return candidates
+
+        remaining_ms = self.latency_budget_ms - (time.perf_counter() - start) * 1000
+        estimate_ms = self.reranker.estimate_ms(query, candidates)
+        if estimate_ms > remaining_ms:
+            logger.info(f"[Reranker] Пропускаю реранкинг: нужно ~{estimate_ms:.0f} мс, осталось {remaining_ms:.0f} мс.")
+            return candidates[:k]
+
+        try:
+            scores = self.reranker.score(query, candidates)
+        except Exception as e:
+            logger.error(f"[Reranker] Ошибка реранкинга, отдаю кандидатов как есть: {e}")
+            return candidates[:k]
+
+        ranked = sorted(zip(scores, candidates), key=lambda pair: pair[0], reverse=True)
+        keep = [pair for i, pair in enumerate(ranked[:min(self.top_n, k)]) if i < self.min_top_n or pair[0] >= self.threshold]
+
+        result = []
+        for score, chunk in keep:
+            metadata = dict(chunk.metadata or {})
+            metadata["retrieval_score"] = chunk.score
+            result.append(RetrievedChunk(content=chunk.content, score=score, metadata=metadata))
+        return result
+
+
+_RERANKERS: Dict[str, Optional[CrossEncoderReranker]] = {}
+_RERANKERS_LOCK = threading.Lock()
+
+
+def get_reranker(model_path: str) -> Optional[CrossEncoderReranker]:
+    """Одна модель на процесс для всех тенантов; None, если модель или зависимости недоступны."""
+    with _RERANKERS_LOCK:
+        if model_path not in _RERANKERS:
+            try:
+                workers = int(os.getenv("RERANK_WORKERS", "0"))
+                _RERANKERS[model_path] = PooledCrossEncoderReranker(model_path, workers=workers) if workers > 0 else CrossEncoderReranker(model_path)
+            except Exception as e:
+                logger.warning(f"[Reranker] Кросс-энкодер {model_path} недоступен, реранкинг выключен: {e}")
+                _RERANKERS[model_path] = None
+        return _RERANKERS[model_path]
+
+
+def with_reranking(retriever: KnowledgeRetriever, rerank_config: Union[None, bool, Dict[str, Any]]) -> KnowledgeRetriever:
+    """
+    Оборачивает ретривер реранкингом по конфигу тенанта (`rerank`):
+    True/False или словарь {enabled, model_path, candidates, top_n, min_top_n, threshold, latency_budget_ms}.
+    """
+    if isinstance(rerank_config, bool) or rerank_config is None:
+        rerank_config = {"enabled": bool(rerank_config)}
+    if not rerank_config.get("enabled", True):
+        return retriever
+
+    model_path = rerank_config.get("model_path") or os.getenv("RERANK_MODEL_PATH", "models/reranker-int8")
+    reranker = get_reranker(model_path)
+    if reranker is None:
+        return retriever
+
+    return RerankingRetriever(
+        retriever,
+        reranker,
+        candidates=rerank_config.get("candidates", DEFAULT_CANDIDATES),
+        top_n=rerank_config.get("top_n", DEFAULT_TOP_N),
+        min_top_n=rerank_config.get("min_top_n", DEFAULT_MIN_TOP_N),
+        threshold=rerank_config.get("threshold", DEFAULT_THRESHOLD),
+        latency_budget_ms=rerank_config.get("latency_budget_ms", DEFAULT_LATENCY_BUDGET_MS),
+    )
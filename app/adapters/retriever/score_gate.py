@@ -0,0 +1,111 @@
+"""
+Динамический top-k по оценкам: вместо фиксированных k=6 чанков в промпт идут только уверенные.
+
+Чанк отбрасывается, если его калиброванная оценка ниже min_score или больше чем на max_drop
+ниже лучшего чанка; оставшиеся обрезаются по бюджету токенов контекста. Пустой результат —
+сигнал "нет уверенного совпадения": use case выбирает короткий промпт без контекста.
+
+Пороги подобраны на калиброванной шкале би-энкодера. После реранкинга оценки — сигмоида
+кросс-энкодера, и отбор уже сделал сам реранкер (threshold, не меньше min_top_n чанков),
+поэтому для таких результатов действуют отдельные rerank_min_score / rerank_max_drop
+(по умолчанию выключены) и бюджет токенов. Гейт включается ключом score_gate в конфиге
+тенанта или SCORE_GATE_ENABLED для всех.
+"""
+import logging
+import os
+from dataclasses import dataclass, replace
+from typing import Any, Dict, List, Optional, Union
+
+from app.core.ports.retriever import KnowledgeRetriever, RetrieverDecorator
+from app.core.models.chunk import RetrievedChunk
+from app.adapters.retriever.ingestion import count_tokens
+from app.utils.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+CHUNK_BUCKETS = (0, 1, 2, 3, 4, 6, 8)
+TOKEN_BUCKETS = (0, 100, 250, 500, 1000, 1500, 2000, 4000)
+
+
+@dataclass(frozen=True)
+class ScoreGate:
+    min_score: float = 0.35
+    max_drop: float = 0.25
+    max_context_tokens: int = 1500
+    # Пороги для оценок кросс-энкодера; None — довериться отбору реранкера
+    rerank_min_score: Optional[float] = None
+    rerank_max_drop: Optional[float] = None
+
+    def apply(self, chunks: List[RetrievedChunk]) -> List[RetrievedChunk]:
+        if not chunks:
+            return []
+        if is_reranked(chunks):
+            min_score, max_drop = self.rerank_min_score, self.rerank_max_drop
+        else:
+            min_score, max_drop = self.min_score, self.max_drop
+        top = max(c.score for c in chunks)
+        if min_score is not None and top < min_score:
+            return []
+
+        kept, tokens = [], 0
+        # Порядок (MMR или реранкинг) сохраняем, фильтруем по оценке
+        for chunk in chunks:
+            if (min_score is not None and chunk.score < min_score) or (max_drop is not None and top - chunk.score > max_drop):
+                continue
+            chunk_tokens = count_tokens(chunk.content)
+            if kept and tokens + chunk_tokens > self.max_context_tokens:
+                break
+            kept.append(chunk)
+            tokens += chunk_tokens
+        return kept
+
+
+def is_reranked(chunks: List[RetrievedChunk]) -> bool:
+    """Оценки от кросс-энкодера: RerankingRetriever сохраняет исходную оценку в metadata["retrieval_score"]."""
+    return all("retrieval_score" in (c.metadata or {}) for c in chunks)
+
+
+def resolve_score_gate(config: Union[None, bool, Dict[str, Any]]) -> Optional[ScoreGate]:
+    """
+    Ключ score_gate в конфиге тенанта: True/False или {enabled, min_score, max_drop, max_context_tokens,
+    rerank_min_score, rerank_max_drop}. Без ключа гейт выключен, если не задан SCORE_GATE_ENABLED.
+    """
+    if config is None:
+        config = {"enabled": os.getenv("SCORE_GATE_ENABLED", "false").lower() in ("true", "1", "t")}
+    elif isinstance(config, bool):
+        config = {"enabled": config}
+    if not config.get("enabled", True):
+        return None
+    return replace(ScoreGate(), **{k: v for k, v in config.items() if k in ScoreGate.__dataclass_fields__})
+
+
+class ScoreGatedRetriever(RetrieverDecorator):
+    """Декоратор ретривера: отсекает неуверенные чанки и пишет размер контекста в метрики."""
+    def __init__(self, base: KnowledgeRetriever, gate: ScoreGate, collection: str = ""):
+        super().__init__(base)
+        self.gate = gate
+        self.collection = collection
+
+    def retrieve(self, query: str, k: int = 6) -> List[RetrievedChunk]:
+        return self._gate(query, self.base.retrieve(query, k=k))
+
+    def retrieve_many(self, queries: List[str], k: int = 6) -> List[List[RetrievedChunk]]:
+        return [self._gate(query, chunks) for query, chunks in zip(queries, self.base.retrieve_many(queries, k=k))]
+
+    def _gate(self, query: str, chunks: List[RetrievedChunk]) -> List[RetrievedChunk]:
+        kept = self.gate.apply(chunks)
+        if chunks and not kept:
+            logger.info(f"[ScoreGate] Нет уверенного совпадения для '{query[:60]}' (лучшая оценка {max(c.score for c in chunks):.2f}).")
+        elif len(kept) < len(chunks):
+            logger.info(f"[ScoreGate] Оставлено {len(kept)} из {len(chunks)} чанков.")
+        metrics = get_metrics()
+        metrics.observe("retrieval_context_chunks", len(kept), buckets=CHUNK_BUCKETS, collection=self.collection)
+        metrics.observe("retrieval_context_tokens", sum(count_tokens(c.content) for c in kept), buckets=TOKEN_BUCKETS, collection=self.collection)
+        return kept
+
+
+def with_score_gate(retriever: KnowledgeRetriever, gate_config: Union[None, bool, Dict[str, Any]] = None, collection: str = "") -> KnowledgeRetriever:
+    gate = resolve_score_gate(gate_config)
+    if gate is None:
+        return retriever
+    return ScoreGatedRetriever(retriever, gate, collection=collection)
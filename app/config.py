@@ -17,6 +17,8 @@ def load_config():
         "ozon_api_key": os.getenv("OZON_API_KEY"),
         "qdrant_collection": os.getenv("QDRANT_COLLECTION", "smart_bot_knowledge"),
         "knowledge_base_path": "knowledge_base.md",
+        # Профиль индекса Qdrant: default | compact | binary | small_kb или JSON с параметрами
+        "index_profile": os.getenv("QDRANT_INDEX_PROFILE", "default"),
         "telegram_enabled": bool(os.getenv("TELETHON_API_ID") and os.getenv("TELETHON_API_HASH"))
     }
     
@@ -86,6 +88,17 @@ def load_config():
         "TELEGRAM_MESSAGE_DELAY_SECONDS": int(os.getenv("TELEGRAM_MESSAGE_DELAY_SECONDS", 2)),
         "OZON_CHECK_INTERVAL_SECONDS": int(os.getenv("OZON_CHECK_INTERVAL_SECONDS", 300)),
         "OZON_CHAT_POLLING_INTERVAL_SECONDS": int(os.getenv("OZON_CHAT_POLLING_INTERVAL_SECONDS", 60)),
+        # Сколько вопросов/отзывов/чатов из одной выборки обрабатывать параллельно
+        "MARKETPLACE_CONCURRENCY": int(os.getenv("MARKETPLACE_CONCURRENCY", 4)),
+        # Горячая перезагрузка баз знаний при правке knowledge_base_path (см. kb_watcher.py)
+        "KB_WATCH_ENABLED": os.getenv("KB_WATCH_ENABLED", "false").lower() in ('true', '1', 't'),
+        "KB_WATCH_INTERVAL_SECONDS": float(os.getenv("KB_WATCH_INTERVAL_SECONDS", 2)),
+        "KB_WATCH_DEBOUNCE_SECONDS": float(os.getenv("KB_WATCH_DEBOUNCE_SECONDS", 3)),
+        # Боты Assistants API (asst_*): стриминг рана (иначе поллинг) и общий предел ожидания ответа
+        "ASSISTANTS_STREAMING": os.getenv("ASSISTANTS_STREAMING", "true").lower() in ('true', '1', 't'),
+        "ASSISTANTS_RUN_TIMEOUT_SECONDS": float(os.getenv("ASSISTANTS_RUN_TIMEOUT_SECONDS", 60)),
+        # Сколько готовых тредов держать для новых сессий виджета (0 — создавать на первом сообщении)
+        "ASSISTANTS_THREAD_POOL_SIZE": int(os.getenv("ASSISTANTS_THREAD_POOL_SIZE", 4)),
         "LANGFUSE_PUBLIC_KEY": os.getenv("LANGFUSE_PUBLIC_KEY"),
         "LANGFUSE_SECRET_KEY": os.getenv("LANGFUSE_SECRET_KEY"),
         "LANGFUSE_HOST": os.getenv("LANGFUSE_HOST", "https://cloud.langfuse.com"),
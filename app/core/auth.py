@@ -1,8 +1,29 @@
+"""
+Авторизация админки: bcrypt-хэши паролей и JWT.
+
+bcrypt намеренно медленный (~0.1-0.3 с CPU на хэш), поэтому в async-эндпоинтах хэширование и
+проверка идут через hash_password/check_password — в отдельном ограниченном пуле потоков
+(PASSWORD_HASH_WORKERS), а не на event loop: шторм логинов не тормозит /api/chat.
+bcrypt отпускает GIL, так что потоков достаточно; размер пула ограничивает долю CPU под логины.
+
+TokenUserCache — LRU «токен → пользователь»: повторные запросы с тем же токеном не декодируют
+JWT и не ходят в БД. Запись живет не дольше TTL и не дольше exp самого токена. В кэше лежит
+CurrentUser (id и клеймы токена), а не ORM-объект: отвязанный от сессии User падает на ленивых
+атрибутах. Изменение или удаление пользователя через ORM сбрасывает его записи (track_user_changes);
+в других процессах запись доживает до TTL.
+"""
+import asyncio
 import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+from sqlalchemy import event
 
 # В реальности SECRET_KEY нужно хранить в .env
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-super-secret-key-for-nextbot-admin")
@@ -11,12 +32,25 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7 # 7 дней
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+_hash_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("PASSWORD_HASH_WORKERS", "2")),
+    thread_name_prefix="password-hash",
+)
+
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+async def hash_password(password: str) -> str:
+    """get_password_hash в пуле хэширования (не блокирует event loop)."""
+    return await asyncio.get_running_loop().run_in_executor(_hash_executor, get_password_hash, password)
+
+async def check_password(plain_password: str, hashed_password: str) -> bool:
+    """verify_password в пуле хэширования (не блокирует event loop)."""
+    return await asyncio.get_running_loop().run_in_executor(_hash_executor, verify_password, plain_password, hashed_password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -33,3 +67,71 @@ def decode_access_token(token: str):
         return payload
     except JWTError:
         return None
+
+
+@dataclass(frozen=True)
+class CurrentUser:
+    """Пользователь запроса: id из БД и клеймы токена. Не ORM-объект — безопасно держать в кэше."""
+    id: int
+    email: str
+    token_exp: Optional[float] = None
+
+
+class TokenUserCache:
+    """LRU в памяти процесса: токен → CurrentUser (до min(exp токена, ttl_seconds))."""
+    def __init__(self, max_size: int = 4096, ttl_seconds: int = 300):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._items: "OrderedDict[str, Tuple[float, CurrentUser]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str) -> Optional[CurrentUser]:
+        with self._lock:
+            item = self._items.get(token)
+            if item and item[0] > time.time():
+                self._items.move_to_end(token)
+                self.hits += 1
+                return item[1]
+            if item:
+                del self._items[token]
+            self.misses += 1
+            return None
+
+    def put(self, token: str, user: CurrentUser):
+        expires_at = time.time() + self.ttl_seconds
+        if user.token_exp is not None:
+            expires_at = min(expires_at, user.token_exp)
+        with self._lock:
+            self._items[token] = (expires_at, user)
+            self._items.move_to_end(token)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def invalidate(self, user_id: int):
+        """Сбрасывает все токены пользователя (смена пароля или email, удаление)."""
+        with self._lock:
+            for token in [t for t, (_, user) in self._items.items() if user.id == user_id]:
+                del self._items[token]
+
+
+token_user_cache = TokenUserCache(
+    max_size=int(os.getenv("TOKEN_CACHE_SIZE", "4096")),
+    ttl_seconds=int(os.getenv("TOKEN_CACHE_TTL_SECONDS", "300")),
+)
+
+
+def track_user_changes(user_model, cache: Optional[TokenUserCache] = None):
+    """
+    Подписывает кэш на UPDATE/DELETE модели пользователя (ORM flush): токены измененного
+    или удаленного пользователя перестают приниматься сразу, а не по истечении TTL.
+    Массовые update()/delete() мимо ORM событий не дают — после них нужен явный invalidate.
+    """
+    cache = cache or token_user_cache
+
+    def drop_cached_tokens(mapper, connection, user):
+        cache.invalidate(user.id)
+
+    event.listen(user_model, "after_update", drop_cached_tokens)
+    event.listen(user_model, "after_delete", drop_cached_tokens)
@@ -5,6 +5,33 @@ BOTS_REGISTRY: Dict[str, Dict[str, Any]] = {
         "name": "Связь",
         "collection_name": "messenger_knowledge",
         "greeting": "Привет! 👋 Есть вопросы по мессенджеру и его настройке? Не стесняйся, спрашивай, я помогу!",
+        # Локальная маршрутизация по эмбеддингам: LLM-маршрутизатор только при неуверенности (см. centroid_classifier.py)
+        "intent_router": {
+            "examples": {
+                "sales": [
+                    "Сколько стоит лицензия?",
+                    "Какие есть тарифы для компании на 200 человек?",
+                    "Чем вы лучше Telegram и Slack?",
+                    "Можно ли установить мессенджер на наш сервер?",
+                    "Как купить мессенджер для организации?",
+                    "Есть ли пробный период?",
+                ],
+                "support": [
+                    "Не могу войти в аккаунт",
+                    "Не приходят уведомления на телефон",
+                    "Как настроить двухфакторную аутентификацию?",
+                    "Сообщения не отправляются, висят с часиками",
+                    "Как добавить сотрудника в группу?",
+                    "Приложение вылетает при запуске",
+                ],
+                "unknown": [
+                    "Привет",
+                    "Здравствуйте",
+                    "Спасибо",
+                    "Ок",
+                ],
+            },
+        },
         "prompts": {
             "router": """Ты — маршрутизатор. Проанализируй сообщение пользователя и верни ОДНО слово:
 - 'sales' (если он спрашивает про цены, тарифы, покупку, отличия от конкурентов, преимущества)
@@ -34,6 +61,32 @@ BOTS_REGISTRY: Dict[str, Dict[str, Any]] = {
         "name": "NextBot",
         "collection_name": "smart_bot_knowledge",
         "greeting": "Привет! Я ИИ-ассистент NextBot. Готов ответить на вопросы о создании умных ботов для вашего бизнеса.",
+        "intent_router": {
+            "examples": {
+                "sales": [
+                    "Сколько стоит создать бота?",
+                    "Какие интеграции вы поддерживаете?",
+                    "Хочу бота для своего магазина на Wildberries",
+                    "Можно ли подключить бота к CRM?",
+                    "Чем ваш бот лучше обычного конструктора?",
+                    "Есть ли аналитика диалогов?",
+                ],
+                "support": [
+                    "Бот перестал отвечать клиентам",
+                    "Как обновить базу знаний бота?",
+                    "Бот отвечает не по теме",
+                    "Не работает интеграция с Telegram",
+                    "Ошибка при загрузке файла базы знаний",
+                    "Как поменять приветствие бота?",
+                ],
+                "unknown": [
+                    "Привет",
+                    "Добрый день",
+                    "Спасибо",
+                    "Понятно",
+                ],
+            },
+        },
         "prompts": {
             "router": """Ты — маршрутизатор. Проанализируй сообщение пользователя и верни ОДНО слово:
 - 'sales' (если он спрашивает про цены, создание бота, интеграции, преимущества)
@@ -1,13 +1,16 @@
 import os
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, ForeignKey
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base, relationship
 from datetime import datetime
 
-DATABASE_URL = "sqlite:///./smart_bot.db"
+# Асинхронный драйвер: запросы авторизации не блокируют event loop api.py
+# (sqlite+aiosqlite по умолчанию, в проде — postgresql+asyncpg://...)
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./smart_bot.db")
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+engine = create_async_engine(DATABASE_URL)
+# expire_on_commit=False: объекты остаются читаемыми после commit без повторного запроса
+SessionLocal = async_sessionmaker(engine, expire_on_commit=False)
 
 Base = declarative_base()
 
@@ -32,12 +35,11 @@ class UserBot(Base):
 
     owner = relationship("User", back_populates="bots")
 
-# Создаем таблицы, если их нет
-Base.metadata.create_all(bind=engine)
+async def init_db():
+    """Создает таблицы, если их нет (вызывается на старте api.py)."""
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
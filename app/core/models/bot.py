@@ -0,0 +1,22 @@
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from app.core.ports.llm import LLMClient
+from app.core.ports.retriever import KnowledgeRetriever
+from app.core.ports.intent import IntentClassifier
+
+@dataclass(frozen=True)
+class BotRuntime:
+    """Все, чем боты отличаются друг от друга; передается в общий граф при вызове как context (context_schema графа, в узлах — runtime.context)."""
+    name: str
+    # Модель агентов (ответ клиенту)
+    llm: LLMClient
+    retriever: KnowledgeRetriever
+    prompts: Dict[str, str] = field(default_factory=dict)
+    # Модель маршрутизатора; по умолчанию та же, что у агентов
+    router_llm: Optional[LLMClient] = None
+    intent_classifier: Optional[IntentClassifier] = None
+
+    @property
+    def router(self) -> LLMClient:
+        return self.router_llm or self.llm
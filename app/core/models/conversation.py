@@ -0,0 +1,40 @@
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+
+CLIENT = "client"
+BOT = "bot"
+# Префиксы реплик в промптах и в старом формате истории (список строк)
+ROLE_PREFIXES = {CLIENT: "Клиент: ", BOT: "Бот: "}
+
+@dataclass(frozen=True)
+class Turn:
+    role: str # 'client' или 'bot'
+    text: str
+    created_at: float = field(default_factory=time.time)
+
+    def __str__(self) -> str:
+        return f"{ROLE_PREFIXES[self.role]}{self.text}"
+
+    def to_message(self) -> BaseMessage:
+        return HumanMessage(content=self.text) if self.role == CLIENT else AIMessage(content=self.text)
+
+    @classmethod
+    def parse(cls, line: str) -> Optional["Turn"]:
+        """Реплика из старого формата "Клиент: ..."/"Бот: ..." (миграция сохраненных историй)."""
+        for role, prefix in ROLE_PREFIXES.items():
+            if line.startswith(prefix):
+                return cls(role, line[len(prefix):])
+        return None
+
+def client_turn(text: str) -> Turn:
+    return Turn(CLIENT, text)
+
+def bot_turn(text: str) -> Turn:
+    return Turn(BOT, text)
+
+def to_messages(turns: Optional[List[Turn]], question: str) -> List[BaseMessage]:
+    """История + текущий вопрос в сообщения LangChain для графов."""
+    return [turn.to_message() for turn in turns or []] + [HumanMessage(content=question)]
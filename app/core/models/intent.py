@@ -0,0 +1,9 @@
+from dataclasses import dataclass
+
+@dataclass
+class IntentPrediction:
+    intent: str
+    # Отрыв лучшего интента от второго (косинус к центроидам)
+    confidence: float = 0.0
+    # Можно ли доверять без LLM-маршрутизатора (порог задает классификатор)
+    confident: bool = False
@@ -0,0 +1,28 @@
+from typing import Any, Dict, List, Optional, Protocol, Tuple
+from app.core.models.conversation import Turn
+
+class ConversationStore(Protocol):
+    """Хранилище диалогов: реплики только дописываются, читается окно последних max_turns.
+
+    Кроме реплик у диалога есть небольшой стейт (шаг онбординга, thread_id Assistants и т.п.):
+    load/save читают и пишут их вместе — бэкенды делают это за одно обращение.
+    """
+
+    async def append(self, conversation_id: str, turns: List[Turn]) -> None:
+        """Дописывает реплики в конец диалога (старые за пределами окна отбрасываются)."""
+        ...
+
+    async def window(self, conversation_id: str) -> List[Turn]:
+        """Последние реплики диалога, от старых к новым."""
+        ...
+
+    async def load(self, conversation_id: str) -> Tuple[List[Turn], Dict[str, Any]]:
+        """Окно реплик и стейт диалога."""
+        ...
+
+    async def save(self, conversation_id: str, turns: List[Turn], state: Optional[Dict[str, Any]] = None, reset: bool = False) -> None:
+        """Дописывает реплики и обновляет поля стейта; reset — начать диалог заново."""
+        ...
+
+    async def clear(self, conversation_id: str) -> None:
+        ...
@@ -0,0 +1,11 @@
+from typing import Protocol, Optional
+from app.core.models.intent import IntentPrediction
+
+class IntentClassifier(Protocol):
+    async def classify(self, text: str) -> Optional[IntentPrediction]:
+        """Интент сообщения (sales / support / unknown) или None, если классификатор еще не обучен."""
+        ...
+
+    async def record(self, text: str, intent: str) -> None:
+        """Запоминает решение LLM-маршрутизатора как размеченный пример для дообучения."""
+        ...
@@ -1,3 +1,4 @@
+import asyncio
 from typing import Protocol, List
 from app.core.models.chunk import RetrievedChunk
 
@@ -5,3 +6,19 @@ class KnowledgeRetriever(Protocol):
     def retrieve(self, query: str, k: int = 6) -> List[RetrievedChunk]:
         """Ищет релевантные куски в базе знаний."""
         ...
+
+    def retrieve_many(self, queries: List[str], k: int = 6) -> List[List[RetrievedChunk]]:
+        """Поиск сразу по нескольким запросам (по списку результатов на запрос). Адаптеры делают это за один проход."""
+        return [self.retrieve(query, k=k) for query in queries]
+
+    async def aretrieve(self, query: str, k: int = 6) -> List[RetrievedChunk]:
+        """Поиск из async-кода без блокировки event loop."""
+        return await asyncio.to_thread(self.retrieve, query, k)
+
+
+class RetrieverDecorator(KnowledgeRetriever):
+    """Слой поверх другого ретривера (кэш, реранкинг, отсечение, батчинг); base — следующий слой цепочки."""
+    base: KnowledgeRetriever
+
+    def __init__(self, base: KnowledgeRetriever):
+        self.base = base
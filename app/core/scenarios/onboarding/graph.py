@@ -1,8 +1,9 @@
 import logging
-from typing import TypedDict, Annotated, Sequence, Dict, Any, Optional
-from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage
+from typing import TypedDict, Annotated, Sequence, Dict, Any, List, Optional
+from langchain_core.messages import BaseMessage, AIMessage, SystemMessage
 from langgraph.graph import StateGraph, END
 from app.core.ports.llm import LLMClient
+from app.core.models.conversation import Turn, to_messages
 from app.adapters.openai_assistants.adapter import OpenAIAssistantsAdapter
 import operator
 import json
@@ -189,19 +190,11 @@ class OnboardingScenarioGraph:
                 "step": "collect_knowledge" # Возвращаемся на шаг назад
             }
 
-    async def execute(self, question: str, history: list = None, state_dict: dict = None) -> dict:
+    async def execute(self, question: str, history: Optional[List[Turn]] = None, state_dict: dict = None) -> dict:
         """Главный метод для вызова из API"""
         logger.info(f"[Onboarding] Запуск графа. Вопрос: '{question}'")
         
-        messages = []
-        if history:
-            for h in history:
-                if h.startswith("Клиент: "):
-                    messages.append(HumanMessage(content=h.replace("Клиент: ", "")))
-                elif h.startswith("Бот: "):
-                    messages.append(AIMessage(content=h.replace("Бот: ", "")))
-                    
-        messages.append(HumanMessage(content=question))
+        messages = to_messages(history, question)
         
         # Восстанавливаем стейт из сессии
         initial_state = {
@@ -0,0 +1,88 @@
+"""
+Легкий исполнитель линейных сценариев — альтернатива LangGraph для горячего пути.
+
+Сценарий — последовательность этапов: Stage (узлы этапа идут параллельно) или Branch (один
+узел, выбранный по состоянию). Узлы — те же функции, что и в графе LangGraph: принимают
+состояние (доступ state["key"]) и runtime с полем context (BotRuntime). Обновления узлов
+сливаются в dataclass-состояние: списки дописываются, остальные поля заменяются.
+
+Нет каналов, редьюсеров, чекпоинтов и копирования состояния на каждом шаге — ход стоит
+только сами узлы. Сравнение накладных расходов: benchmarks/bench_graph_executor.py.
+"""
+import asyncio
+import functools
+import inspect
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Union
+
+Node = Callable[..., Union[Dict[str, Any], Awaitable[Dict[str, Any]]]]
+
+
+@dataclass(frozen=True)
+class PipelineRuntime:
+    """Аналог langgraph.runtime.Runtime: узлам нужен только context."""
+    context: Any
+
+
+class PipelineState:
+    """Базовый класс dataclass-состояний: узлы читают его как dict (state["messages"])."""
+    def __getitem__(self, key: str) -> Any:
+        return getattr(self, key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key, default)
+
+    def apply(self, update: Dict[str, Any]):
+        for key, value in update.items():
+            current = getattr(self, key)
+            if isinstance(current, list):
+                current.extend(value)
+            else:
+                setattr(self, key, value)
+
+
+@dataclass
+class Stage:
+    """Узлы этапа запускаются одновременно; этап завершается, когда готовы все."""
+    nodes: Dict[str, Node]
+
+
+@dataclass
+class Branch:
+    """Выбор одного узла по состоянию (аналог add_conditional_edges)."""
+    selector: Callable[[Any], str]
+    routes: Dict[str, Node]
+
+
+@functools.lru_cache(maxsize=None)
+def _wants_runtime(node: Node) -> bool:
+    return "runtime" in inspect.signature(node).parameters
+
+
+class LinearPipeline:
+    def __init__(self, name: str, steps: List[Union[Stage, Branch]]):
+        self.name = name
+        self.steps = steps
+
+    @staticmethod
+    async def _call(node: Node, state: PipelineState, runtime: PipelineRuntime) -> Dict[str, Any]:
+        if _wants_runtime(node):
+            result = node(state, runtime=runtime)
+        else:
+            result = node(state)
+        if inspect.isawaitable(result):
+            result = await result
+        return result or {}
+
+    async def ainvoke(self, state: PipelineState, context: Any = None) -> PipelineState:
+        runtime = PipelineRuntime(context)
+        for step in self.steps:
+            if isinstance(step, Branch):
+                updates = [await self._call(step.routes[step.selector(state)], state, runtime)]
+            elif len(step.nodes) == 1:
+                updates = [await self._call(next(iter(step.nodes.values())), state, runtime)]
+            else:
+                updates = await asyncio.gather(*(self._call(node, state, runtime) for node in step.nodes.values()))
+            for update in updates:
+                state.apply(update)
+        return state
@@ -0,0 +1,42 @@
+"""
+Замер длительности узлов графов сценариев: метрика graph_node_seconds{graph,node}
+(GET /metrics в api.py) и строка в лог. По ней видно, что стоит на критическом пути хода.
+"""
+import functools
+import inspect
+import logging
+import time
+from typing import Any, Callable
+
+from app.utils.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+NODE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def timed_node(graph: str, node: str, fn: Callable[..., Any]) -> Callable[..., Any]:
+    """Оборачивает узел графа (sync или async) замером времени."""
+    def observe(started: float):
+        elapsed = time.perf_counter() - started
+        get_metrics().observe("graph_node_seconds", elapsed, buckets=NODE_BUCKETS, graph=graph, node=node)
+        logger.info(f"[{graph}] Узел {node}: {elapsed * 1000:.0f} мс")
+
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                observe(started)
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            observe(started)
+    return wrapper
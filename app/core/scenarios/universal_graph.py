@@ -1,9 +1,20 @@
+import functools
 import logging
-from typing import TypedDict, Annotated, Sequence, Dict, Any
-from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage
-from langgraph.graph import StateGraph, END
+import os
+import time
+from dataclasses import dataclass, field
+from typing import TypedDict, Annotated, Sequence, Dict, Any, List, Optional
+from langchain_core.messages import BaseMessage, AIMessage, SystemMessage
+from langgraph.graph import StateGraph, START, END
+from langgraph.runtime import Runtime
 from app.core.ports.llm import LLMClient
 from app.core.ports.retriever import KnowledgeRetriever
+from app.core.ports.intent import IntentClassifier
+from app.core.models.bot import BotRuntime
+from app.core.models.conversation import Turn, to_messages
+from app.core.scenarios.pipeline import Branch, LinearPipeline, PipelineState, Stage
+from app.core.scenarios.timing import NODE_BUCKETS, timed_node
+from app.utils.metrics import get_metrics
 import operator
 
 # Настройка логгера для этого модуля
@@ -16,159 +27,193 @@ class AgentState(TypedDict):
     intent: str # 'sales', 'support', или 'unknown'
     context: str # Найденная информация из базы знаний
 
-# 2. Создаем универсальный класс-сценарий
-class UniversalScenarioGraph:
-    def __init__(self, llm: LLMClient, retriever: KnowledgeRetriever, bot_config: Dict[str, Any]):
-        self.llm = llm
-        self.retriever = retriever
-        self.bot_config = bot_config
-        self.prompts = bot_config.get("prompts", {})
-        self.graph = self._build_graph()
-        logger.info(f"[Init] Универсальный граф для бота '{self.bot_config.get('name')}' инициализирован.")
-
-    def _build_graph(self):
-        workflow = StateGraph(AgentState)
-
-        # Добавляем узлы
-        workflow.add_node("router", self.route_intent)
-        workflow.add_node("retrieve_context", self.retrieve_knowledge)
-        workflow.add_node("sales_agent", self.sales_response)
-        workflow.add_node("support_agent", self.support_response)
-
-        # Определяем стартовую точку
-        workflow.set_entry_point("router")
-
-        # Добавляем условные переходы
-        workflow.add_conditional_edges(
-            "router",
-            lambda state: state["intent"],
-            {
-                "sales": "retrieve_context",
-                "support": "retrieve_context",
-                "unknown": "retrieve_context" # По умолчанию идем искать инфу
-            }
-        )
-
-        # После поиска контекста решаем, какому агенту отдать
-        workflow.add_conditional_edges(
-            "retrieve_context",
-            lambda state: state["intent"],
-            {
-                "sales": "sales_agent",
-                "support": "support_agent",
-                "unknown": "support_agent" # По умолчанию отдаем в поддержку
-            }
-        )
-
-        # Завершаем граф после ответа
-        workflow.add_edge("sales_agent", END)
-        workflow.add_edge("support_agent", END)
-
-        return workflow.compile()
-
-    async def route_intent(self, state: AgentState):
-        """Определяет, чего хочет пользователь: купить или решить проблему."""
-        last_message = state["messages"][-1].content
-        logger.info(f"[Router] Анализирую сообщение: '{last_message}'")
-        
-        prompt_template = self.prompts.get("router", "Ты маршрутизатор. Верни 'unknown'. Сообщение: {last_message}")
-        prompt = prompt_template.format(last_message=last_message)
-        
-        try:
-            response = await self.llm.generate(prompt)
-            intent = response.strip().lower()
-            
-            if "sales" in intent: intent = "sales"
-            elif "support" in intent: intent = "support"
-            else: intent = "unknown"
-            
-            logger.info(f"[Router] Определен интент: {intent}")
-            return {"intent": intent}
-        except Exception as e:
-            logger.error(f"[Router] Ошибка при определении интента: {e}")
-            return {"intent": "unknown"}
-
-    def retrieve_knowledge(self, state: AgentState):
-        """Ищет информацию в Qdrant."""
-        last_message = state["messages"][-1].content
-        logger.info(f"[Retriever] Ищу информацию в Qdrant по запросу: '{last_message}'")
-        
-        try:
-            chunks = self.retriever.retrieve(query=last_message)
-            
-            if not chunks:
-                logger.warning("[Retriever] Ничего не найдено в базе знаний.")
-                context = "В базе знаний нет информации по этому вопросу."
-            else:
-                context = "\n\n".join([c.content for c in chunks])
-                logger.info(f"[Retriever] Успешно найдено {len(chunks)} фрагментов контекста.")
-                
-            return {"context": context}
-        except Exception as e:
-            logger.error(f"[Retriever] Ошибка при поиске в Qdrant: {e}")
-            return {"context": "Ошибка доступа к базе знаний."}
+# То же состояние для легкого исполнителя (pipeline.py)
+@dataclass
+class TurnState(PipelineState):
+    messages: List[BaseMessage] = field(default_factory=list)
+    intent: str = ""
+    context: str = ""
 
-    async def sales_response(self, state: AgentState):
-        """Агент по продажам."""
-        logger.info("[SalesAgent] Генерация ответа агентом по продажам...")
-        context = state["context"]
-        
-        sys_prompt_template = self.prompts.get("sales", "Ты продавец. Отвечай вежливо.\n\nИнформация:\n{context}")
-        sys_prompt = sys_prompt_template.format(context=context)
+# Исполнитель по умолчанию; бот переопределяет ключом executor в конфиге
+DEFAULT_EXECUTOR = os.getenv("SCENARIO_EXECUTOR", "langgraph")
 
-        messages = [SystemMessage(content=sys_prompt)]
-        for msg in state["messages"]:
-            messages.append(msg)
-            
-        try:
-            response = await self.llm.generate(messages)
-            logger.info("[SalesAgent] Ответ успешно сгенерирован.")
-            return {"messages": [AIMessage(content=response)]}
-        except Exception as e:
-            logger.error(f"[SalesAgent] Ошибка генерации ответа: {e}")
-            return {"messages": [AIMessage(content="Извините, произошла техническая ошибка при формировании ответа.")]}
+# 2. Узлы графа: все, что зависит от бота (промпты, ретривер, модели), берется из runtime.context
+async def route_intent(state: AgentState, runtime: Runtime[BotRuntime]):
+    """Определяет, чего хочет пользователь: купить или решить проблему."""
+    bot = runtime.context
+    last_message = state["messages"][-1].content
+    logger.info(f"[Router] {bot.name}: анализирую сообщение: '{last_message}'")
 
-    async def support_response(self, state: AgentState):
-        """Агент технической поддержки."""
-        logger.info("[SupportAgent] Генерация ответа агентом техподдержки...")
-        context = state["context"]
-        
-        sys_prompt_template = self.prompts.get("support", "Ты техподдержка. Помоги клиенту.\n\nИнформация:\n{context}")
-        sys_prompt = sys_prompt_template.format(context=context)
-
-        messages = [SystemMessage(content=sys_prompt)]
-        for msg in state["messages"]:
-            messages.append(msg)
-            
+    if bot.intent_classifier:
         try:
-            response = await self.llm.generate(messages)
-            logger.info("[SupportAgent] Ответ успешно сгенерирован.")
-            return {"messages": [AIMessage(content=response)]}
+            prediction = await bot.intent_classifier.classify(last_message)
+            if prediction and prediction.confident:
+                logger.info(f"[Router] Интент по эмбеддингам: {prediction.intent} (отрыв {prediction.confidence:.2f}), LLM не нужен")
+                return {"intent": prediction.intent}
         except Exception as e:
-            logger.error(f"[SupportAgent] Ошибка генерации ответа: {e}")
-            return {"messages": [AIMessage(content="Извините, произошла техническая ошибка при формировании ответа.")]}
+            logger.error(f"[Router] Ошибка локального классификатора, спрашиваю LLM: {e}")
+
+    prompt_template = bot.prompts.get("router", "Ты маршрутизатор. Верни 'unknown'. Сообщение: {last_message}")
+    prompt = prompt_template.format(last_message=last_message)
+
+    try:
+        response = await bot.router.generate(prompt)
+        intent = response.strip().lower()
+
+        if "sales" in intent: intent = "sales"
+        elif "support" in intent: intent = "support"
+        else: intent = "unknown"
+
+        logger.info(f"[Router] Определен интент: {intent}")
+        if bot.intent_classifier:
+            # Решение LLM — размеченный пример для дообучения классификатора
+            await bot.intent_classifier.record(last_message, intent)
+        return {"intent": intent}
+    except Exception as e:
+        logger.error(f"[Router] Ошибка при определении интента: {e}")
+        return {"intent": "unknown"}
+
+async def retrieve_knowledge(state: AgentState, runtime: Runtime[BotRuntime]):
+    """Ищет информацию в Qdrant."""
+    last_message = state["messages"][-1].content
+    logger.info(f"[Retriever] Ищу информацию в Qdrant по запросу: '{last_message}'")
+
+    try:
+        chunks = await runtime.context.retriever.aretrieve(query=last_message)
+
+        if not chunks:
+            logger.warning("[Retriever] Ничего не найдено в базе знаний.")
+            context = "В базе знаний нет информации по этому вопросу."
+        else:
+            context = "\n\n".join([c.content for c in chunks])
+            logger.info(f"[Retriever] Успешно найдено {len(chunks)} фрагментов контекста.")
+
+        return {"context": context}
+    except Exception as e:
+        logger.error(f"[Retriever] Ошибка при поиске в Qdrant: {e}")
+        return {"context": "Ошибка доступа к базе знаний."}
+
+def select_agent(state: AgentState):
+    """Точка сборки после параллельных router и retrieve_context (состояние не меняет)."""
+    return {}
+
+async def _agent_response(state: AgentState, bot: BotRuntime, role: str, default_prompt: str, tag: str):
+    sys_prompt = bot.prompts.get(role, default_prompt).format(context=state["context"])
+    messages = [SystemMessage(content=sys_prompt)] + list(state["messages"])
+
+    try:
+        response = await bot.llm.generate(messages)
+        logger.info(f"[{tag}] Ответ успешно сгенерирован.")
+        return {"messages": [AIMessage(content=response)]}
+    except Exception as e:
+        logger.error(f"[{tag}] Ошибка генерации ответа: {e}")
+        return {"messages": [AIMessage(content="Извините, произошла техническая ошибка при формировании ответа.")]}
+
+async def sales_response(state: AgentState, runtime: Runtime[BotRuntime]):
+    """Агент по продажам."""
+    logger.info("[SalesAgent] Генерация ответа агентом по продажам...")
+    return await _agent_response(state, runtime.context, "sales", "Ты продавец. Отвечай вежливо.\n\nИнформация:\n{context}", "SalesAgent")
+
+async def support_response(state: AgentState, runtime: Runtime[BotRuntime]):
+    """Агент технической поддержки."""
+    logger.info("[SupportAgent] Генерация ответа агентом техподдержки...")
+    return await _agent_response(state, runtime.context, "support", "Ты техподдержка. Помоги клиенту.\n\nИнформация:\n{context}", "SupportAgent")
+
+def _route_agent(state) -> str:
+    return state["intent"]
+
+def build_graph():
+    workflow = StateGraph(AgentState, context_schema=BotRuntime)
+
+    # Добавляем узлы (с замером времени каждого, метрика graph_node_seconds)
+    workflow.add_node("router", timed_node("UniversalGraph", "router", route_intent))
+    workflow.add_node("retrieve_context", timed_node("UniversalGraph", "retrieve_context", retrieve_knowledge))
+    workflow.add_node("select_agent", select_agent)
+    workflow.add_node("sales_agent", timed_node("UniversalGraph", "sales_agent", sales_response))
+    workflow.add_node("support_agent", timed_node("UniversalGraph", "support_agent", support_response))
+
+    # Поиск идет по последнему сообщению и от интента не зависит: маршрутизатор (LLM)
+    # и поиск в базе знаний стартуют одновременно, ход стоит max(router, retrieve), а не сумму
+    workflow.add_edge(START, "router")
+    workflow.add_edge(START, "retrieve_context")
+    # select_agent ждет оба узла
+    workflow.add_edge(["router", "retrieve_context"], "select_agent")
+
+    # Когда есть и интент, и контекст, решаем, какому агенту отдать
+    workflow.add_conditional_edges(
+        "select_agent",
+        _route_agent,
+        {
+            "sales": "sales_agent",
+            "support": "support_agent",
+            "unknown": "support_agent" # По умолчанию отдаем в поддержку
+        }
+    )
+
+    # Завершаем граф после ответа
+    workflow.add_edge("sales_agent", END)
+    workflow.add_edge("support_agent", END)
+
+    return workflow.compile()
+
+@functools.lru_cache(maxsize=None)
+def get_universal_graph():
+    """Граф компилируется один раз на процесс и общий для всех ботов."""
+    logger.info("[Init] Универсальный граф скомпилирован.")
+    return build_graph()
+
+def build_pipeline() -> LinearPipeline:
+    """Тот же сценарий без LangGraph: router и retrieve_context параллельно, затем агент по интенту."""
+    return LinearPipeline("UniversalGraph", [
+        Stage({
+            "router": timed_node("UniversalGraph", "router", route_intent),
+            "retrieve_context": timed_node("UniversalGraph", "retrieve_context", retrieve_knowledge),
+        }),
+        Branch(_route_agent, {
+            "sales": timed_node("UniversalGraph", "sales_agent", sales_response),
+            "support": timed_node("UniversalGraph", "support_agent", support_response),
+            "unknown": timed_node("UniversalGraph", "support_agent", support_response),
+        }),
+    ])
+
+@functools.lru_cache(maxsize=None)
+def get_universal_pipeline() -> LinearPipeline:
+    return build_pipeline()
+
+# 3. Бот — это только его BotRuntime: создание стоит O(1), граф не компилируется
+class UniversalScenarioGraph:
+    def __init__(self, llm: LLMClient, retriever: KnowledgeRetriever, bot_config: Dict[str, Any], intent_classifier: Optional[IntentClassifier] = None, router_llm: Optional[LLMClient] = None):
+        self.bot = BotRuntime(
+            name=bot_config.get("name", "bot"),
+            llm=llm,
+            retriever=retriever,
+            prompts=bot_config.get("prompts", {}),
+            router_llm=router_llm,
+            # Локальный классификатор интента; LLM-маршрутизатор — только если он не уверен
+            intent_classifier=intent_classifier,
+        )
+        self.executor = bot_config.get("executor", DEFAULT_EXECUTOR)
+        self.graph = get_universal_graph()
+        self.pipeline = get_universal_pipeline() if self.executor == "pipeline" else None
 
-    async def execute(self, question: str, history: list = None, session_id: str = "default") -> str:
+    async def execute(self, question: str, history: Optional[List[Turn]] = None, session_id: str = "default") -> str:
         """Главный метод для вызова из API"""
-        logger.info(f"[Execute] Запуск графа. Вопрос: '{question}'. Длина истории: {len(history) if history else 0}")
-        
-        messages = []
-        if history:
-            for h in history:
-                if h.startswith("Клиент: "):
-                    messages.append(HumanMessage(content=h.replace("Клиент: ", "")))
-                elif h.startswith("Бот: "):
-                    messages.append(AIMessage(content=h.replace("Бот: ", "")))
-                    
-        messages.append(HumanMessage(content=question))
+        logger.info(f"[Execute] {self.bot.name}: запуск графа. Вопрос: '{question}'. Длина истории: {len(history) if history else 0}")
+        messages = to_messages(history, question)
         
         try:
-            initial_state = {"messages": messages, "intent": "", "context": ""}
-            # Убираем config с Langfuse из вызова графа, так как он вызывает ошибку
-            final_state = await self.graph.ainvoke(initial_state)
+            started = time.perf_counter()
+            if self.pipeline:
+                final_state = await self.pipeline.ainvoke(TurnState(messages=messages), context=self.bot)
+            else:
+                initial_state = {"messages": messages, "intent": "", "context": ""}
+                # Убираем config с Langfuse из вызова графа, так как он вызывает ошибку
+                final_state = await self.graph.ainvoke(initial_state, context=self.bot)
             
             result = final_state["messages"][-1].content
-            logger.info("[Execute] Граф успешно завершил работу.")
+            elapsed = time.perf_counter() - started
+            get_metrics().observe("graph_turn_seconds", elapsed, buckets=NODE_BUCKETS, graph="UniversalGraph", executor=self.executor)
+            logger.info(f"[Execute] Граф успешно завершил работу за {elapsed * 1000:.0f} мс.")
             return result
         except Exception as e:
             logger.error(f"[Execute] Критическая ошибка при выполнении графа: {e}", exc_info=True)
@@ -2,16 +2,22 @@ from typing import Union, List, Optional
 from dataclasses import dataclass
 from app.core.ports.llm import LLMClient
 from app.core.ports.retriever import KnowledgeRetriever
+from app.core.models.conversation import Turn
 from app.prompts.qa_prompt import build_qa_prompt
 import logging
 
+# Сколько последних сообщений истории оставлять в промпте, если в базе знаний ничего уверенного не нашлось
+NO_MATCH_HISTORY_MESSAGES = 4
+# Источники (вопросы покупателей на маркетплейсах), где допустим готовый ответ из FAQ без генерации
+DIRECT_ANSWER_SOURCES = ("wb", "ozon_question")
+
 @dataclass
 class AnswerQuestionUseCase:
     llm: LLMClient
     retriever: KnowledgeRetriever
     client_config: Optional[dict] = None
     
-    async def execute(self, user_id: Union[int, str], question: str, history: Optional[List[str]] = None, source: str = "telegram", image_base64: Optional[str] = None, brand_context: Optional[str] = None) -> str:
+    async def execute(self, user_id: Union[int, str], question: str, history: Optional[List[Union[Turn, str]]] = None, source: str = "telegram", image_base64: Optional[str] = None, brand_context: Optional[str] = None) -> str:
         """
         Главный сценарий:
         1. Распознавание картинки и переписывание запроса в поисковый (схлопнуто в 1 запрос для скорости).
@@ -23,7 +29,7 @@ class AnswerQuestionUseCase:
             history = []
 
         # Передаем в контекст последние 10 сообщений диалога
-        history_text = "\n".join(history[-10:]) if history else "Нет истории"
+        history_text = "\n".join(map(str, history[-10:])) if history else "Нет истории"
 
         # 1. Распознавание картинки и переписывание запроса (Context Enrichment)
         
@@ -138,12 +144,19 @@ class AnswerQuestionUseCase:
             chunks = []
             logging.info("[UseCase] В запросе нет конкретной проблемы, поиск в базе знаний пропущен.")
         else:
-            chunks = self.retriever.retrieve(query=search_query)
+            chunks = await self.retriever.aretrieve(query=search_query)
         
         if not chunks:
-            logging.warning("[UseCase] Ничего не найдено в базе знаний.")
+            # Нет уверенного совпадения (ретривер отсек слабые чанки): короткий промпт —
+            # без контекста и с укороченной историей, отвечать по фактам все равно не из чего
+            logging.warning("[UseCase] Нет уверенного совпадения в базе знаний, использую короткий промпт.")
             context = "Нет доступной информации в базе знаний."
+            history_text = "\n".join(map(str, history[-NO_MATCH_HISTORY_MESSAGES:])) if history else "Нет истории"
         else:
+            direct_answer = self._approved_answer(chunks, source)
+            if direct_answer:
+                logging.info("[UseCase] Уверенное совпадение с FAQ, отправляю готовый ответ без генерации.")
+                return direct_answer
             context = "\n\n".join([c.content for c in chunks])
             logging.info(f"[UseCase] Найдено {len(chunks)} фрагментов.")
 
@@ -159,3 +172,18 @@ class AnswerQuestionUseCase:
         except Exception as e:
             logging.error(f"[UseCase] Ошибка LLM: {e}", exc_info=True)
             return "К сожалению, произошла техническая ошибка при генерации ответа."
+
+    def _approved_answer(self, chunks, source: str) -> Optional[str]:
+        """
+        Готовый ответ секции FAQ ('Готовый ответ:' в базе знаний), если ретривер нашел ровно ее
+        по заголовку вопроса, источник — вопрос с маркетплейса и тенант включил faq.direct_answers.
+        """
+        faq_config = (self.client_config or {}).get("faq")
+        if not isinstance(faq_config, dict) or not faq_config.get("direct_answers"):
+            return None
+        if source not in DIRECT_ANSWER_SOURCES or len(chunks) != 1:
+            return None
+        metadata = chunks[0].metadata or {}
+        if not metadata.get("faq_match"):
+            return None
+        return metadata.get("approved_answer")
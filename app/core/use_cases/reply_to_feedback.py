@@ -53,7 +53,7 @@ class ReplyToFeedbackUseCase:
                 search_query = review_text
                 
             if search_query.lower() not in ["нет конкретной проблемы", "нет конкретной проблемы.", ""]:
-                chunks = self.retriever.retrieve(query=search_query)
+                chunks = await self.retriever.aretrieve(query=search_query)
                 
                 if chunks:
                     context = "\n\n".join([c.content for c in chunks])
@@ -0,0 +1,59 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Iterable, Optional, TypeVar
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+# Пауза между публикациями ответов в API маркетплейса (как в исходных последовательных циклах)
+DEFAULT_POST_INTERVAL_SECONDS = 2.0
+
+
+async def run_bounded(items: Iterable[T], handler: Callable[[T], Awaitable[object]], limit: int, log_prefix: str = "[Worker]") -> None:
+    """
+    Обрабатывает элементы пачки параллельно, но не больше limit одновременно.
+    Ошибка одного элемента логируется и не прерывает остальные.
+    """
+    semaphore = asyncio.Semaphore(max(1, limit))
+
+    async def guarded(item: T):
+        async with semaphore:
+            try:
+                await handler(item)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"{log_prefix} Ошибка обработки элемента: {e}", exc_info=True)
+
+    await asyncio.gather(*(guarded(item) for item in items))
+
+
+class PostThrottle:
+    """
+    Очередь публикаций одного аккаунта маркетплейса: run_bounded параллелит поиск и генерацию,
+    а сами отправки идут по одной и не чаще раза в min_interval секунд (отсчет от конца
+    предыдущей отправки). Один экземпляр на аккаунт, общий для всех его воркеров.
+    """
+    def __init__(self, min_interval: float = DEFAULT_POST_INTERVAL_SECONDS):
+        self.min_interval = min_interval
+        self._lock = asyncio.Lock()
+        self._last_post: Optional[float] = None
+
+    async def __aenter__(self):
+        await self._lock.acquire()
+        if self._last_post is not None:
+            delay = self._last_post + self.min_interval - time.monotonic()
+            if delay > 0:
+                try:
+                    await asyncio.sleep(delay)
+                except BaseException:
+                    # Отмена во время паузы: __aexit__ не вызовется, очередь освобождаем сами
+                    self._lock.release()
+                    raise
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._last_post = time.monotonic()
+        self._lock.release()
@@ -0,0 +1,52 @@
+"""
+Пул процессов для CPU-инференса (локальные эмбеддинги, кросс-энкодер реранкинга).
+
+Каждый воркер один раз создает модель через factory (в initializer) и дальше выполняет
+методы модели. Инференс идет на всех ядрах и не делит GIL с event loop бота, в котором
+крутятся воркеры Telegram/WB/Ozon всех тенантов.
+
+factory должна сериализоваться pickle: функция уровня модуля, класс или functools.partial от них.
+Процессы стартуют через spawn — безопасно для процесса с потоками и event loop.
+"""
+import atexit
+import logging
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+_worker_model = None
+
+
+def _init_worker(factory: Callable[[], Any]):
+    global _worker_model
+    _worker_model = factory()
+
+
+def _call_in_worker(method: str, args: tuple) -> Any:
+    return getattr(_worker_model, method)(*args)
+
+
+class InferenceProcessPool:
+    def __init__(self, factory: Callable[[], Any], workers: int = 2, name: str = "inference"):
+        self.workers = workers
+        self.name = name
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(factory,),
+        )
+        atexit.register(self.shutdown)
+        logger.info(f"[InferencePool] {name}: запущено процессов: {workers}")
+
+    def submit(self, method: str, *args) -> Future:
+        """Вызывает model.<method>(*args) в одном из воркеров."""
+        return self._executor.submit(_call_in_worker, method, args)
+
+    def call(self, method: str, *args) -> Any:
+        return self.submit(method, *args).result()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
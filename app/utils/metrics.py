@@ -0,0 +1,68 @@
+"""
+Простые метрики процесса без внешних зависимостей: гистограммы значений (обычно длительностей
+в секундах) с метками. Снимок отдается эндпоинтом /metrics в api.py.
+"""
+import threading
+from typing import Dict, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS: Tuple[float, ...] = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.bucket_counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.last: Optional[float] = None
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+        self.last = value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.bucket_counts[i] += 1
+
+    def snapshot(self) -> Dict:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 4),
+            "avg": round(self.sum / self.count, 4) if self.count else None,
+            "max": round(self.max, 4),
+            "last": round(self.last, 4) if self.last is not None else None,
+            # Кумулятивные корзины, как в Prometheus: le_N — сколько значений <= N
+            "buckets": {f"le_{bound:g}": n for bound, n in zip(self.buckets, self.bucket_counts)},
+        }
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._histograms: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], Histogram] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, value: float, buckets: Optional[Sequence[float]] = None, **labels: str):
+        """buckets — границы корзин для не-длительностей (учитываются при первом наблюдении метрики)."""
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets or DEFAULT_BUCKETS)
+            histogram.observe(value)
+
+    def snapshot(self) -> Dict[str, list]:
+        """{имя метрики: [{"labels": {...}, "count": ..., ...}, ...]}"""
+        result: Dict[str, list] = {}
+        with self._lock:
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                result.setdefault(name, []).append({"labels": dict(labels), **histogram.snapshot()})
+        return result
+
+
+_registry = MetricsRegistry()
+
+
+def get_metrics() -> MetricsRegistry:
+    return _registry
@@ -0,0 +1,99 @@
+"""
+Накладные расходы исполнителя сценария на ход: LangGraph против LinearPipeline (pipeline.py).
+
+LLM и ретривер мгновенные, так что время хода — это сам исполнитель и обвязка узлов
+(логи, timed_node одинаковые у обоих). Меряется:
+  - время хода на одном потоке (последовательные ходы), мкс;
+  - пропускная способность при --concurrency одновременных ходах, ходов/с;
+  - выделенная память за ход (tracemalloc), КБ.
+
+Использование:
+  python benchmarks/bench_graph_executor.py --turns 2000 --concurrency 50 --history 10
+"""
+import argparse
+import asyncio
+import logging
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from app.core.models.chunk import RetrievedChunk
+from app.core.models.conversation import BOT, CLIENT, Turn
+from app.core.ports.llm import LLMClient
+from app.core.ports.retriever import KnowledgeRetriever
+from app.core.scenarios.universal_graph import UniversalScenarioGraph
+
+
+class _InstantLLM(LLMClient):
+    async def generate(self, prompt):
+        return "sales" if isinstance(prompt, str) else "ответ"
+
+
+class _InstantRetriever(KnowledgeRetriever):
+    def retrieve(self, query, k=6):
+        return [RetrievedChunk(content="контекст", score=0.9)]
+
+    async def aretrieve(self, query, k=6):
+        return self.retrieve(query, k)
+
+
+def make_bot(executor: str) -> UniversalScenarioGraph:
+    return UniversalScenarioGraph(_InstantLLM(), _InstantRetriever(), {"name": "bench", "prompts": {}, "executor": executor})
+
+
+async def sequential(bot: UniversalScenarioGraph, history, turns: int) -> float:
+    await bot.execute("вопрос", history)  # прогрев
+    started = time.perf_counter()
+    for _ in range(turns):
+        await bot.execute("вопрос", history)
+    return (time.perf_counter() - started) / turns * 1e6
+
+
+async def concurrent(bot: UniversalScenarioGraph, history, turns: int, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def turn():
+        async with semaphore:
+            await bot.execute("вопрос", history)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(turn() for _ in range(turns)))
+    return turns / (time.perf_counter() - started)
+
+
+async def allocated_per_turn(bot: UniversalScenarioGraph, history, turns: int) -> float:
+    tracemalloc.start()
+    total = 0
+    for _ in range(turns):
+        snapshot = tracemalloc.take_snapshot()
+        await bot.execute("вопрос", history)
+        total += sum(stat.size_diff for stat in tracemalloc.take_snapshot().compare_to(snapshot, "filename") if stat.size_diff > 0)
+    tracemalloc.stop()
+    return total / turns / 1024
+
+
+async def main(args):
+    # Логи узлов одинаковы у обоих исполнителей и только зашумляют замер
+    logging.disable(logging.CRITICAL)
+    history = [Turn(CLIENT if i % 2 == 0 else BOT, f"сообщение {i}") for i in range(args.history)]
+
+    print(f"Ходов: {args.turns}, история: {args.history} сообщений, параллельно: {args.concurrency}")
+    print(f"{'Исполнитель':<12} {'мкс/ход':>10} {'ходов/с':>10} {'КБ/ход':>8}")
+    for executor in ("langgraph", "pipeline"):
+        bot = make_bot(executor)
+        per_turn = await sequential(bot, history, args.turns)
+        throughput = await concurrent(bot, history, args.turns, args.concurrency)
+        allocated = await allocated_per_turn(bot, history, args.alloc_turns)
+        print(f"{executor:<12} {per_turn:>10.0f} {throughput:>10.0f} {allocated:>8.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Накладные расходы LangGraph и LinearPipeline на ход")
+    parser.add_argument("--turns", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--history", type=int, default=10, help="Сообщений в истории сессии")
+    parser.add_argument("--alloc-turns", type=int, default=50, help="Ходов для замера памяти (tracemalloc медленный)")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,127 @@
+"""
+Бенчмарк профилей индекса Qdrant (квантизация / on_disk / HNSW).
+
+Для каждого профиля создается временная коллекция с теми же векторами, после чего
+сравниваются recall@k относительно точного поиска (exact=True без квантизации),
+задержка запроса (среднее и p95) и оценка RAM на векторы + граф HNSW.
+
+Векторы берутся из живой коллекции (--source) или генерируются (кластеры, похожие на
+эмбеддинги базы знаний). Нужен настоящий сервер Qdrant: в режиме :memory: клиент ищет
+перебором и игнорирует квантизацию и HNSW.
+
+Использование:
+  python benchmarks/bench_index_profiles.py --source smart_bot_knowledge
+  python benchmarks/bench_index_profiles.py --points 20000 --dim 1536 --profiles default compact binary
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from qdrant_client import QdrantClient
+from qdrant_client.http.models import CollectionStatus, PointStruct, QuantizationSearchParams, SearchParams
+
+from app.adapters.retriever.index_profiles import INDEX_PROFILES, resolve_index_profile
+
+PREFIX = "bench_profile_"
+EXACT = SearchParams(exact=True, quantization=QuantizationSearchParams(ignore=True))
+
+
+def load_vectors(client: QdrantClient, source: str, limit: int) -> np.ndarray:
+    vectors, offset = [], None
+    while len(vectors) < limit:
+        points, offset = client.scroll(source, limit=256, offset=offset, with_payload=False, with_vectors=True)
+        vectors.extend(p.vector for p in points)
+        if offset is None:
+            break
+    return np.asarray(vectors[:limit], dtype=np.float32)
+
+
+def synthetic_vectors(points: int, dim: int, clusters: int = 50) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(clusters, dim))
+    labels = rng.integers(0, clusters, size=points)
+    return (centers[labels] + rng.normal(scale=0.6, size=(points, dim))).astype(np.float32)
+
+
+def make_queries(vectors: np.ndarray, count: int) -> np.ndarray:
+    # Запросы близки к документам, но не совпадают с ними (как перефразированный вопрос)
+    rng = np.random.default_rng(1)
+    base = vectors[rng.integers(0, len(vectors), size=count)]
+    scale = float(np.std(vectors)) * 0.5
+    return (base + rng.normal(scale=scale, size=base.shape)).astype(np.float32)
+
+
+def fill_collection(client: QdrantClient, name: str, profile, vectors: np.ndarray, batch_size: int = 256):
+    if client.collection_exists(name):
+        client.delete_collection(name)
+    client.create_collection(collection_name=name, vectors_config=profile.vectors_config(vectors.shape[1]))
+    for start in range(0, len(vectors), batch_size):
+        batch = vectors[start:start + batch_size]
+        client.upsert(name, points=[PointStruct(id=start + i, vector=v.tolist()) for i, v in enumerate(batch)], wait=True)
+
+    # Ждем, пока оптимизатор построит HNSW и квантованные векторы
+    while client.get_collection(name).status != CollectionStatus.GREEN:
+        time.sleep(0.5)
+
+
+def search_ids(client: QdrantClient, name: str, queries: np.ndarray, k: int, search_params):
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        points = client.query_points(name, query=query.tolist(), limit=k, search_params=search_params).points
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append([p.id for p in points])
+    return results, latencies
+
+
+def recall_at_k(approx, exact, k: int) -> float:
+    return float(np.mean([len(set(a) & set(e)) / k for a, e in zip(approx, exact)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк профилей индекса Qdrant")
+    parser.add_argument("--url", default=os.getenv("QDRANT_URL", "http://localhost:6333"))
+    parser.add_argument("--source", help="Взять векторы из существующей коллекции (или алиаса)")
+    parser.add_argument("--points", type=int, default=10000, help="Размер выборки / синтетической коллекции")
+    parser.add_argument("--dim", type=int, default=1536, help="Размерность синтетических векторов")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=20, help="k для recall (по умолчанию = fetch_k адаптера)")
+    parser.add_argument("--profiles", nargs="+", default=list(INDEX_PROFILES), help="Пресеты или JSON-профили")
+    parser.add_argument("--keep", action="store_true", help="Не удалять временные коллекции")
+    args = parser.parse_args()
+
+    client = QdrantClient(url=args.url, timeout=60.0)
+    vectors = load_vectors(client, args.source, args.points) if args.source else synthetic_vectors(args.points, args.dim)
+    queries = make_queries(vectors, args.queries)
+    print(f"🔹 {len(vectors)} векторов, dim={vectors.shape[1]}, запросов: {len(queries)}, k={args.k}")
+
+    exact = None
+    baseline_ram = None
+    print(f"{'профиль':<12} {'recall@k':>9} {'ср., мс':>9} {'p95, мс':>9} {'RAM, МБ':>9} {'экономия':>9}")
+    for raw in args.profiles:
+        profile = resolve_index_profile(raw)
+        name = f"{PREFIX}{profile.name}"
+        fill_collection(client, name, profile, vectors)
+
+        if exact is None:
+            exact, _ = search_ids(client, name, queries, args.k, EXACT)
+        found, latencies = search_ids(client, name, queries, args.k, profile.search_params())
+
+        ram = profile.estimated_ram_bytes(len(vectors), vectors.shape[1])
+        baseline_ram = baseline_ram or ram
+        print(
+            f"{profile.name:<12} {recall_at_k(found, exact, args.k):>9.3f} {np.mean(latencies):>9.2f} "
+            f"{np.percentile(latencies, 95):>9.2f} {ram / 2**20:>9.1f} {baseline_ram / ram:>8.1f}x"
+        )
+        if not args.keep:
+            client.delete_collection(name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Микро-бенчмарк MMR: текущий путь LangChain против нашего векторизованного MMR.
+
+Сравниваются два уровня:
+  1. Только алгоритм: langchain_qdrant._utils.maximal_marginal_relevance (списки + цикл)
+     против app.adapters.retriever.mmr.maximal_marginal_relevance (одна матрица сходств).
+  2. Полный поиск по in-memory Qdrant: QdrantVectorStore.max_marginal_relevance_search_by_vector
+     против QdrantRetrieverAdapter._search_mmr.
+
+Использование:
+  python benchmarks/bench_mmr.py --dim 1536 --points 2000 --repeat 200
+"""
+import argparse
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from langchain_core.embeddings import Embeddings
+from langchain_qdrant import QdrantVectorStore
+from langchain_qdrant._utils import maximal_marginal_relevance as langchain_mmr
+from qdrant_client import QdrantClient
+from qdrant_client.http.models import Distance, PointStruct, VectorParams
+
+from app.adapters.retriever.index_profiles import resolve_index_profile
+from app.adapters.retriever.mmr import maximal_marginal_relevance
+from app.adapters.retriever.qdrant_adapter import QdrantRetrieverAdapter
+
+COLLECTION = "bench_mmr"
+
+
+class _ZeroEmbeddings(Embeddings):
+    """QdrantVectorStore при создании проверяет размерность, поэтому отдаем нулевые векторы."""
+    def __init__(self, dim: int):
+        self.dim = dim
+
+    def embed_documents(self, texts):
+        return [[0.0] * self.dim for _ in texts]
+
+    def embed_query(self, text):
+        return [0.0] * self.dim
+
+
+def _timeit(fn, repeat: int) -> float:
+    fn()  # прогрев
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def bench_algorithm(dim: int, fetch_k: int, k: int, repeat: int):
+    rng = np.random.default_rng(0)
+    query = rng.normal(size=dim).astype(np.float32)
+    # LangChain получает кандидатов из Qdrant как списки Python
+    candidates_list = rng.normal(size=(fetch_k, dim)).astype(np.float32).tolist()
+
+    lc_ms = _timeit(lambda: langchain_mmr(query, candidates_list, k=k, lambda_mult=0.7), repeat)
+    np_ms = _timeit(lambda: maximal_marginal_relevance(query, np.asarray(candidates_list, dtype=np.float32), k=k, lambda_mult=0.7), repeat)
+    return lc_ms, np_ms
+
+
+def bench_search(dim: int, points: int, fetch_k: int, k: int, repeat: int):
+    rng = np.random.default_rng(1)
+    client = QdrantClient(":memory:")
+    client.create_collection(COLLECTION, vectors_config=VectorParams(size=dim, distance=Distance.COSINE))
+    vectors = rng.normal(size=(points, dim)).astype(np.float32)
+    client.upsert(COLLECTION, points=[
+        PointStruct(id=str(uuid.uuid4()), vector=v.tolist(), payload={"page_content": f"chunk {i}", "metadata": {}})
+        for i, v in enumerate(vectors)
+    ])
+    query = rng.normal(size=dim).astype(np.float32).tolist()
+
+    store = QdrantVectorStore(client=client, collection_name=COLLECTION, embedding=_ZeroEmbeddings(dim))
+    adapter = QdrantRetrieverAdapter.__new__(QdrantRetrieverAdapter)
+    adapter.client = client
+    adapter.collection_name = COLLECTION
+    adapter.fetch_k = fetch_k
+    adapter.lambda_mult = 0.7
+    adapter.index_profile = resolve_index_profile(None)
+
+    lc_ms = _timeit(lambda: store.max_marginal_relevance_search_by_vector(query, k=k, fetch_k=fetch_k, lambda_mult=0.7), repeat)
+    np_ms = _timeit(lambda: adapter._search_mmr(query, k), repeat)
+    return lc_ms, np_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк MMR")
+    parser.add_argument("--dim", type=int, default=1536, help="Размерность эмбеддингов")
+    parser.add_argument("--points", type=int, default=2000, help="Размер коллекции для полного поиска")
+    parser.add_argument("--fetch-k", type=int, default=20)
+    parser.add_argument("--k", type=int, default=6)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"🔹 dim={args.dim}, fetch_k={args.fetch_k}, k={args.k}, repeat={args.repeat}")
+
+    lc_ms, np_ms = bench_algorithm(args.dim, args.fetch_k, args.k, args.repeat)
+    print(f"Алгоритм MMR:   LangChain {lc_ms:.3f} мс | NumPy {np_ms:.3f} мс | x{lc_ms / np_ms:.1f}")
+
+    lc_ms, np_ms = bench_search(args.dim, args.points, args.fetch_k, args.k, max(1, args.repeat // 4))
+    print(f"Поиск + MMR:    LangChain {lc_ms:.3f} мс | Adapter {np_ms:.3f} мс | x{lc_ms / np_ms:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Микро-бенчмарк хранения сессий виджета в Redis: старая схема против RedisConversationStore.
+
+  legacy — как было в api.py: GET истории (JSON-массив строк) + GET `state:` на чтение,
+           SETEX всей истории + SETEX стейта на запись (4 обращения, история целиком туда и обратно);
+  store  — список + хэш: LRANGE + HGETALL одним пайплайном, RPUSH/LTRIM/HSET/EXPIRE одной транзакцией.
+
+Для каждой длины сессии (реплик в истории к началу хода) меряются обращения к Redis за ход,
+байты запросов и ответов за ход и время хода (чтение + запись). Нужен живой Redis (REDIS_URL).
+
+Использование:
+  REDIS_URL=redis://localhost:6379 python benchmarks/bench_session_store.py --turns 200 --lengths 2 10 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import redis.asyncio as redis
+
+from app.core.models.conversation import bot_turn, client_turn
+from app.adapters.conversation.redis_store import RedisConversationStore
+
+TTL_SECONDS = 20 * 60
+MAX_TURNS = 20
+QUESTION = "Подскажите, пожалуйста, как подключить пульт к приставке, если индикатор не мигает?"
+ANSWER = "Зажмите кнопки OK и VOL+ на пять секунд, затем наведите пульт на приставку и дождитесь сообщения о сопряжении."
+
+
+def payload_size(value) -> int:
+    if value is None:
+        return 0
+    if isinstance(value, (bytes, str)):
+        return len(value.encode("utf-8") if isinstance(value, str) else value)
+    if isinstance(value, dict):
+        return sum(payload_size(k) + payload_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(payload_size(v) for v in value)
+    return len(str(value))
+
+
+class Tracer:
+    """Считает обращения к Redis (команда или пайплайн = одно) и байты запросов/ответов."""
+    def __init__(self, client):
+        self.round_trips = self.bytes_out = self.bytes_in = 0
+        execute_command, pipeline = client.execute_command, client.pipeline
+
+        async def traced_command(*args, **options):
+            result = await execute_command(*args, **options)
+            self.round_trips += 1
+            self.bytes_out += payload_size(args)
+            self.bytes_in += payload_size(result)
+            return result
+
+        def traced_pipeline(*args, **kwargs):
+            pipe = pipeline(*args, **kwargs)
+            execute = pipe.execute
+
+            async def traced_execute(*a, **kw):
+                self.bytes_out += sum(payload_size(command[0]) for command in pipe.command_stack)
+                result = await execute(*a, **kw)
+                self.round_trips += 1
+                self.bytes_in += payload_size(result)
+                return result
+
+            pipe.execute = traced_execute
+            return pipe
+
+        client.execute_command = traced_command
+        client.pipeline = traced_pipeline
+
+    def reset(self):
+        self.round_trips = self.bytes_out = self.bytes_in = 0
+
+
+async def legacy_turn(client, key: str):
+    data = await client.get(key)
+    history = json.loads(data) if data else []
+    state_raw = await client.get(f"state:{key}")
+    state = json.loads(state_raw) if state_raw else {}
+    history = (history + [f"Клиент: {QUESTION}", f"Бот: {ANSWER}"])[-MAX_TURNS:]
+    await client.setex(name=key, time=TTL_SECONDS, value=json.dumps(history))
+    await client.setex(name=f"state:{key}", time=TTL_SECONDS, value=json.dumps(state or {"step": "collect_name"}))
+
+
+async def store_turn(store: RedisConversationStore, key: str):
+    history, state = await store.load(key)
+    await store.save(key, [client_turn(QUESTION), bot_turn(ANSWER)], state=None if state else {"step": "collect_name"})
+
+
+async def seed_legacy(client, key: str, length: int):
+    history = [f"Клиент: {QUESTION}" if i % 2 == 0 else f"Бот: {ANSWER}" for i in range(length)]
+    await client.setex(name=key, time=TTL_SECONDS, value=json.dumps(history))
+
+
+async def seed_store(store: RedisConversationStore, key: str, length: int):
+    turns = [client_turn(QUESTION) if i % 2 == 0 else bot_turn(ANSWER) for i in range(length)]
+    await store.save(key, turns, state={"step": "collect_name"}, reset=True)
+
+
+async def measure(tracer: Tracer, turn, seed, key: str, length: int, turns: int):
+    total, rt, out, inn = 0.0, 0, 0, 0
+    for _ in range(turns):
+        # Каждый ход начинается с сессии заданной длины: замер не зависит от роста истории
+        await seed(key, length)
+        tracer.reset()
+        started = time.perf_counter()
+        await turn(key)
+        total += time.perf_counter() - started
+        rt, out, inn = rt + tracer.round_trips, out + tracer.bytes_out, inn + tracer.bytes_in
+    return total / turns * 1000, rt / turns, out / turns, inn / turns
+
+
+async def main(args):
+    client = redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379"), decode_responses=True)
+    try:
+        await client.ping()
+    except Exception as e:
+        print(f"Redis недоступен: {e}")
+        return
+    tracer = Tracer(client)
+    store = RedisConversationStore(client, max_turns=MAX_TURNS, ttl_seconds=TTL_SECONDS)
+
+    print(f"{'История':>8} {'Схема':<8} {'мс/ход':>8} {'обращений':>10} {'байт →':>8} {'байт ←':>8}")
+    for length in args.lengths:
+        legacy_key, store_key = f"bench:legacy:{length}", f"bench:store:{length}"
+        rows = {
+            "legacy": await measure(tracer, lambda k: legacy_turn(client, k), lambda k, n: seed_legacy(client, k, n), legacy_key, length, args.turns),
+            "store": await measure(tracer, lambda k: store_turn(store, k), lambda k, n: seed_store(store, k, n), store_key, length, args.turns),
+        }
+        for name, (ms, rt, out, inn) in rows.items():
+            print(f"{length:>8} {name:<8} {ms:>8.2f} {rt:>10.1f} {out:>8.0f} {inn:>8.0f}")
+        await client.delete(legacy_key, f"state:{legacy_key}")
+        await store.clear(store_key)
+    await client.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Обращения к Redis и байты на ход: старая схема сессий против списка + хэша")
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--lengths", type=int, nargs="+", default=[2, 10, 20])
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,114 @@
+"""
+Офлайн-оценка локального классификатора интента против решений LLM-маршрутизатора.
+
+Эталон — решения LLM, которые граф пишет в лог (Redis `intent:log:{bot_id}`), или размеченный
+JSONL-файл ({"text": ..., "intent": ...} в строке). Классификатор обучается на примерах из конфига
+бота и обучающей части эталона, на отложенной части считаются:
+  - согласие с LLM на всех сообщениях и только на уверенных (их граф не отправит в LLM);
+  - покрытие — доля сообщений, для которых LLM-маршрутизатор больше не вызывается;
+  - задержка классификации (эмбеддинг запроса + центроиды), p50/p95;
+  - с --llm: задержка самого LLM-маршрутизатора на тех же сообщениях (платно).
+
+Использование:
+  python benchmarks/eval_intent_router.py --bot svyaz_main
+  python benchmarks/eval_intent_router.py --bot next_bot_main --dataset intents.jsonl --min-margin 0.05 --llm
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from dataclasses import replace
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from dotenv import load_dotenv
+
+from app.config import load_config
+from app.core.config.bots_registry import BOTS_REGISTRY
+from app.adapters.embeddings.factory import create_embeddings
+from app.adapters.intent.centroid_classifier import CentroidIntentClassifier, DecisionLog, resolve_intent_router
+from app.adapters.retriever.cache import get_sync_redis
+
+
+def load_dataset(bot_id: str, path: str, max_items: int) -> List[Tuple[str, str]]:
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            return [(item["text"], item["intent"]) for item in map(json.loads, filter(str.strip, f))]
+    return DecisionLog(bot_id, max_items, get_sync_redis()).load()
+
+
+def percentile(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+async def llm_latencies(bot_config: Dict, texts: List[str], cfg: Dict) -> List[float]:
+    from app.adapters.llm.langchain_adapter import LangChainLLMAdapter
+
+    llm = LangChainLLMAdapter(api_key=cfg.get("OPENAI_API_KEY"), base_url=cfg.get("OPENAI_API_BASE"), model_name=cfg.get("OPENAI_MODEL_NAME", "gpt-4o-mini"))
+    template = bot_config.get("prompts", {}).get("router", "Сообщение: {last_message}")
+    latencies = []
+    for text in texts:
+        started = time.perf_counter()
+        await llm.generate(template.format(last_message=text))
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+async def evaluate(args):
+    load_dotenv()
+    cfg = load_config()
+    bot_config = BOTS_REGISTRY[args.bot]
+    config = resolve_intent_router(bot_config.get("intent_router")) or resolve_intent_router(True)
+    if args.min_margin is not None:
+        config = replace(config, min_margin=args.min_margin)
+
+    dataset = load_dataset(args.bot, args.dataset, config.max_logged)
+    if not dataset:
+        print("Нет эталонных решений: укажите --dataset или накопите лог решений LLM в Redis.")
+        return
+    random.Random(42).shuffle(dataset)
+    split = int(len(dataset) * (1 - args.holdout))
+    train, test = dataset[:split], dataset[split:]
+
+    embeddings = create_embeddings(cfg.get("OPENAI_API_KEY"), cfg.get("OPENAI_API_BASE"))
+    classifier = CentroidIntentClassifier(args.bot, lambda: embeddings, config, log=DecisionLog(args.bot, 0))
+    classifier.fit(classifier.training_set() + [(text, intent, None) for text, intent in train])
+
+    latencies, agree, confident, confident_agree = [], 0, 0, 0
+    for text, expected in test:
+        started = time.perf_counter()
+        prediction = await classifier.classify(text)
+        latencies.append((time.perf_counter() - started) * 1000)
+        if prediction is None:
+            continue
+        agree += prediction.intent == expected
+        if prediction.confident:
+            confident += 1
+            confident_agree += prediction.intent == expected
+
+    n = len(test)
+    print(f"Бот {args.bot}: обучение {len(train)} (+{sum(map(len, config.examples.values()))} из конфига), проверка {n}, min_margin {config.min_margin}")
+    print(f"  Согласие с LLM (все):       {agree / n:.1%}")
+    print(f"  Согласие с LLM (уверенные): {confident_agree / confident:.1%}" if confident else "  Уверенных предсказаний нет")
+    print(f"  Покрытие без LLM:           {confident / n:.1%}")
+    print(f"  Задержка классификатора:    p50 {percentile(latencies, 50):.1f} мс, p95 {percentile(latencies, 95):.1f} мс")
+
+    if args.llm:
+        llm_ms = await llm_latencies(bot_config, [text for text, _ in test], cfg)
+        print(f"  Задержка LLM-маршрутизатора: p50 {percentile(llm_ms, 50):.0f} мс, p95 {percentile(llm_ms, 95):.0f} мс")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Оценка локального классификатора интента")
+    parser.add_argument("--bot", required=True, choices=sorted(BOTS_REGISTRY))
+    parser.add_argument("--dataset", default="", help="JSONL с полями text и intent (по умолчанию — лог решений LLM из Redis)")
+    parser.add_argument("--holdout", type=float, default=0.3, help="Доля эталона на проверку")
+    parser.add_argument("--min-margin", type=float, default=None, help="Переопределить порог уверенности")
+    parser.add_argument("--llm", action="store_true", help="Замерить и LLM-маршрутизатор (платно)")
+    asyncio.run(evaluate(parser.parse_args()))
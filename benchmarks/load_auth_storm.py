@@ -0,0 +1,79 @@
+"""
+Нагрузочный тест: задержка чата виджета во время шторма логинов.
+
+К запущенному api.py идет поток запросов чата (по умолчанию /api/chat/init — без LLM, так что
+его задержка — это event loop и хранилище сессий), сначала в тишине, затем параллельно с
+--storm одновременными /api/auth/login. Пока bcrypt считался прямо на event loop, каждый логин
+останавливал весь сервер на ~0.1-0.3 с и p95 чата рос кратно; с пулом хэширования
+(PASSWORD_HASH_WORKERS) задержка чата под штормом должна остаться на уровне тишины.
+
+Использование:
+  uvicorn api:app --port 8000
+  python benchmarks/load_auth_storm.py --url http://localhost:8000 --requests 300 --storm 20
+  python benchmarks/load_auth_storm.py --endpoint /api/chat --message "Сколько стоит?"  # с LLM
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+import httpx
+
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def chat_latencies(client: httpx.AsyncClient, args) -> list:
+    latencies = []
+    for _ in range(args.requests):
+        payload = {"bot_id": args.bot, "session_id": f"load-{uuid.uuid4().hex[:8]}"}
+        if args.endpoint == "/api/chat":
+            payload["message"] = args.message
+        started = time.perf_counter()
+        response = await client.post(args.endpoint, json=payload)
+        latencies.append((time.perf_counter() - started) * 1000)
+        response.raise_for_status()
+    return latencies
+
+
+async def login_storm(client: httpx.AsyncClient, credentials: dict, stop: asyncio.Event, counter: list):
+    while not stop.is_set():
+        response = await client.post("/api/auth/login", json=credentials)
+        response.raise_for_status()
+        counter[0] += 1
+
+
+def report(name: str, latencies: list):
+    print(f"{name:<10} p50={statistics.median(latencies):7.1f} мс  p95={percentile(latencies, 0.95):7.1f} мс  max={max(latencies):7.1f} мс")
+
+
+async def main(args):
+    credentials = {"email": f"load-{uuid.uuid4().hex[:8]}@example.com", "password": "load-test-password"}
+    limits = httpx.Limits(max_connections=args.storm + 10)
+    async with httpx.AsyncClient(base_url=args.url, timeout=60, limits=limits) as client:
+        (await client.post("/api/auth/register", json=credentials)).raise_for_status()
+
+        report("тишина", await chat_latencies(client, args))
+
+        stop, logins = asyncio.Event(), [0]
+        storm = [asyncio.create_task(login_storm(client, credentials, stop, logins)) for _ in range(args.storm)]
+        started = time.perf_counter()
+        latencies = await chat_latencies(client, args)
+        stop.set()
+        await asyncio.gather(*storm)
+        report("шторм", latencies)
+        print(f"Логинов за время замера: {logins[0]} ({logins[0] / (time.perf_counter() - started):.1f}/с)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Задержка чата виджета под штормом логинов")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--bot", default="svyaz_main")
+    parser.add_argument("--endpoint", default="/api/chat/init", choices=["/api/chat/init", "/api/chat"])
+    parser.add_argument("--message", default="Здравствуйте")
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--storm", type=int, default=20, help="одновременных логинов")
+    asyncio.run(main(parser.parse_args()))
@@ -2,11 +2,17 @@ import os
 import logging
 import chainlit as cl
 from app.config import load_config
-from app.adapters.llm.langchain_adapter import LangChainLLMAdapter
+from app.adapters.llm.langchain_adapter import get_llm_adapter
 from app.adapters.retriever.qdrant_adapter import QdrantRetrieverAdapter
+from app.adapters.retriever.cache import with_cache
+from app.adapters.retriever.score_gate import with_score_gate
+from app.adapters.intent.centroid_classifier import create_intent_classifier
+from app.adapters.conversation.factory import create_conversation_store
+from app.core.config.bots_registry import BOTS_REGISTRY
+from app.core.models.conversation import client_turn, bot_turn
 
-# Импортируем наш новый граф
-from app.core.scenarios.messenger_graph import MessengerScenarioGraph
+# Универсальный граф: компилируется один раз на процесс, мессенджер — бот svyaz_main из реестра
+from app.core.scenarios.universal_graph import UniversalScenarioGraph
 
 # Настраиваем логирование для Chainlit
 logger = logging.getLogger("ChainlitApp")
@@ -15,35 +21,50 @@ logger.setLevel(logging.INFO)
 # Загружаем конфиг
 cfg = load_config()
 
-@cl.on_chat_start
-async def start():
-    logger.info("[Chainlit] Новая сессия начата. Инициализация...")
-    try:
-        # Инициализируем адаптеры
-        llm_adapter = LangChainLLMAdapter(
-            api_key=cfg.get("OPENAI_API_KEY"),
-            base_url=cfg.get("OPENAI_API_BASE"),
-            model_name=cfg.get("OPENAI_MODEL_NAME", "gpt-4o-mini")
-        )
-        logger.info("[Chainlit] LLM Adapter инициализирован.")
-        
-        # Подключаем новую базу знаний мессенджера
-        retriever_adapter = QdrantRetrieverAdapter(
-            collection_name="messenger_knowledge",
+BOT_ID = "svyaz_main"
+_scenario_graph = None
+# История сессий: окно последних 10 реплик (по умолчанию в памяти процесса, см. CONVERSATION_STORE)
+conversations = create_conversation_store(os.getenv("CONVERSATION_STORE", "memory"), max_turns=10)
+
+def get_scenario_graph() -> UniversalScenarioGraph:
+    """Бот мессенджера собирается один раз на процесс и общий для всех сессий."""
+    global _scenario_graph
+    if _scenario_graph is None:
+        bot_config = BOTS_REGISTRY[BOT_ID]
+        models = bot_config.get("models", {})
+        default_model = cfg.get("OPENAI_MODEL_NAME", "gpt-4o-mini")
+
+        # Подключаем базу знаний мессенджера
+        qdrant_adapter = QdrantRetrieverAdapter(
+            collection_name=bot_config["collection_name"],
             knowledge_base_path="messenger_kb.md",
             openai_api_key=cfg.get("OPENAI_API_KEY"),
-            openai_api_base=cfg.get("OPENAI_API_BASE")
+            openai_api_base=cfg.get("OPENAI_API_BASE"),
+            index_profile=bot_config.get("index_profile"),
+            faq=bot_config.get("faq")
         )
+        # Кэш поиска общий для всех сессий процесса (и для api.py/main.py через Redis)
+        retriever_adapter = with_score_gate(qdrant_adapter, bot_config.get("score_gate"), qdrant_adapter.collection_name)
+        retriever_adapter = with_cache(retriever_adapter, qdrant_adapter.collection_name, qdrant_adapter.kb_version)
         logger.info("[Chainlit] Retriever Adapter инициализирован.")
-        
-        # Создаем Граф-сценарий вместо старого UseCase
-        scenario_graph = MessengerScenarioGraph(llm_adapter, retriever_adapter)
-        
-        # Сохраняем в сессию пользователя
-        cl.user_session.set("scenario_graph", scenario_graph)
-        cl.user_session.set("chat_history", [])
-        logger.info("[Chainlit] Граф сохранен в сессию.")
-        
+
+        _scenario_graph = UniversalScenarioGraph(
+            get_llm_adapter(cfg.get("OPENAI_API_KEY"), cfg.get("OPENAI_API_BASE"), models.get("agent") or default_model),
+            retriever_adapter,
+            bot_config,
+            intent_classifier=create_intent_classifier(BOT_ID, lambda: qdrant_adapter.embeddings, bot_config.get("intent_router")),
+            router_llm=get_llm_adapter(cfg.get("OPENAI_API_KEY"), cfg.get("OPENAI_API_BASE"), models.get("router") or default_model),
+        )
+    return _scenario_graph
+
+@cl.on_chat_start
+async def start():
+    logger.info("[Chainlit] Новая сессия начата. Инициализация...")
+    try:
+        get_scenario_graph()
+        # В сессии только ее идентификатор: граф, адаптеры и история — общие
+        cl.user_session.set("conversation_id", f"chainlit:{cl.user_session.get('id')}")
+
         msg = cl.Message(content="Привет! 👋 Я — ИИ-ассистент мессенджера «Связь». Я могу рассказать о преимуществах нашего защищенного корпоративного мессенджера или помочь с техническими вопросами. Что вас интересует?")
         await msg.send()
     except Exception as e:
@@ -54,34 +75,30 @@ async def start():
 @cl.on_message
 async def main(message: cl.Message):
     logger.info(f"[Chainlit] Получено сообщение: '{message.content}'")
-    
-    # Получаем Граф из сессии
-    scenario_graph = cl.user_session.get("scenario_graph")
-    history = cl.user_session.get("chat_history", [])
-    
-    if not scenario_graph:
-        logger.warning("[Chainlit] Сессия устарела (scenario_graph не найден).")
+
+    conversation_id = cl.user_session.get("conversation_id")
+
+    if conversation_id is None:
+        logger.warning("[Chainlit] Сессия устарела (conversation_id не найден).")
         msg = cl.Message(content="Сессия устарела. Пожалуйста, обновите страницу (F5) или нажмите 'New Chat'.")
         await msg.send()
         return
-        
+
     msg = cl.Message(content="")
     await msg.send()
-    
+
     # Вызываем логику графа
     try:
         logger.info("[Chainlit] Передаю запрос в граф...")
-        response = await scenario_graph.execute(
-            question=message.content, 
-            history=history
+        response = await get_scenario_graph().execute(
+            question=message.content,
+            history=await conversations.window(conversation_id)
         )
         logger.info(f"[Chainlit] Получен ответ от графа: '{response[:50]}...'")
-        
-        # Обновляем историю
-        history.append(f"Клиент: {message.content}")
-        history.append(f"Бот: {response}")
-        cl.user_session.set("chat_history", history[-10:])
-        
+
+        # Дописываем ход в историю
+        await conversations.append(conversation_id, [client_turn(message.content), bot_turn(response)])
+
         msg.content = response
         await msg.update()
     except Exception as e:
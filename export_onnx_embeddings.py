@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Экспорт модели локальных эмбеддингов в ONNX с int8-квантизацией (для EMBEDDINGS_PROVIDER=onnx).
+
+1. Экспорт LOCAL_EMBEDDING_MODEL (по умолчанию paraphrase-multilingual-MiniLM-L12-v2) в ONNX через optimum.
+2. Динамическая int8-квантизация (веса int8, активации квантуются на лету) -> model_quantized.onnx.
+3. Проверка паритета с HuggingFaceEmbeddings на tests/golden_questions.json: векторы должны
+   остаться совместимыми с уже собранными коллекциями, иначе скрипт завершается с ошибкой.
+
+Нужны optimum[onnxruntime] и sentence-transformers — только на машине, где делается экспорт;
+боту в рантайме достаточно onnxruntime и tokenizers.
+
+Использование:
+  python export_onnx_embeddings.py --output models/minilm-onnx
+  python export_onnx_embeddings.py --output models/minilm-onnx --arch avx512_vnni --min-cosine 0.98
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+
+from dotenv import load_dotenv
+
+from app.adapters.embeddings.factory import DEFAULT_LOCAL_MODEL
+from app.adapters.embeddings.onnx_embeddings import OnnxEmbeddings, embedding_parity
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - [%(levelname)s] - %(message)s")
+logger = logging.getLogger(__name__)
+
+GOLDEN_QUESTIONS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tests", "golden_questions.json")
+
+
+def export(model_name: str, output: str, arch: str):
+    from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    from transformers import AutoTokenizer
+
+    with tempfile.TemporaryDirectory() as fp32_dir:
+        logger.info(f"Экспорт {model_name} в ONNX...")
+        ORTModelForFeatureExtraction.from_pretrained(model_name, export=True).save_pretrained(fp32_dir)
+        # Быстрый токенизатор сохраняет tokenizer.json — его читает библиотека tokenizers в рантайме
+        AutoTokenizer.from_pretrained(model_name, use_fast=True).save_pretrained(fp32_dir)
+
+        logger.info(f"Квантизация в int8 ({arch})...")
+        quantization = getattr(AutoQuantizationConfig, arch)(is_static=False, per_channel=False)
+        ORTQuantizer.from_pretrained(fp32_dir).quantize(save_dir=output, quantization_config=quantization)
+        shutil.copy(os.path.join(fp32_dir, "tokenizer.json"), os.path.join(output, "tokenizer.json"))
+
+    size_mb = os.path.getsize(os.path.join(output, "model_quantized.onnx")) / 1024 / 1024
+    logger.info(f"Готово: {output}/model_quantized.onnx ({size_mb:.0f} МБ)")
+
+
+def check_parity(model_name: str, output: str, min_cosine: float) -> bool:
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+
+    with open(GOLDEN_QUESTIONS_PATH, "r", encoding="utf-8") as f:
+        questions = json.load(f)
+
+    report = embedding_parity(HuggingFaceEmbeddings(model_name=model_name), OnnxEmbeddings(output), questions)
+    logger.info(
+        f"Паритет на {len(questions)} золотых вопросах: косинус min {report['min_cosine']:.4f}, "
+        f"средний {report['mean_cosine']:.4f}, совпадение ближайших соседей {report['neighbour_agreement']:.0%}"
+    )
+    return report["min_cosine"] >= min_cosine
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Экспорт локальной модели эмбеддингов в ONNX int8")
+    parser.add_argument("--model", default=os.getenv("LOCAL_EMBEDDING_MODEL", DEFAULT_LOCAL_MODEL))
+    parser.add_argument("--output", default=os.getenv("ONNX_EMBEDDING_MODEL_PATH", "models/minilm-onnx"))
+    parser.add_argument("--arch", default="avx2", choices=["avx2", "avx512", "avx512_vnni", "arm64"], help="Набор инструкций CPU сервера для квантизации")
+    parser.add_argument("--min-cosine", type=float, default=0.98, help="Минимальный косинус ONNX-вектора к исходному на каждом золотом вопросе")
+    parser.add_argument("--skip-parity", action="store_true")
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok=True)
+    export(args.model, args.output, args.arch)
+    if not args.skip_parity and not check_parity(args.model, args.output, args.min_cosine):
+        logger.error("Паритет не пройден: векторы ONNX-модели несовместимы с текущими коллекциями.")
+        sys.exit(1)
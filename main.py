@@ -15,6 +15,11 @@ from app.core.use_cases.reply_to_feedback import ReplyToFeedbackUseCase
 # Adapters
 from app.adapters.llm.langchain_adapter import LangChainLLMAdapter
 from app.adapters.retriever.qdrant_adapter import QdrantRetrieverAdapter
+from app.adapters.retriever.reranker import with_reranking
+from app.adapters.retriever.cache import with_cache
+from app.adapters.retriever.score_gate import with_score_gate
+from app.adapters.retriever.batching import with_batching
+from app.adapters.retriever.kb_watcher import KnowledgeBaseWatcher
 from app.adapters.channels.telegram_adapter import TelegramAdapter
 from app.adapters.channels.wildberries.client import WBClient
 from app.adapters.channels.wildberries.worker import WBQuestionsWorker, WBFeedbacksWorker, WBChatWorker
@@ -23,6 +28,8 @@ from app.adapters.channels.ozon.worker import OzonQuestionsWorker
 from app.adapters.channels.ozon.reviews_worker import OzonReviewsWorker
 from app.adapters.channels.ozon.chat_worker import OzonChatWorker
 from app.adapters.db.database_adapter import DatabaseAdapter
+from app.adapters.conversation.factory import create_conversation_store
+from app.utils.concurrency import PostThrottle
 
 # Telegram Client (старый, но рабочий)
 from app.telegram.client import create_telegram_client
@@ -68,11 +75,23 @@ async def main():
     # Database (общий)
     db_adapter = DatabaseAdapter(db_path="sessions/smart_bot.db")
 
+    # История диалогов каналов (Telegram, чаты WB): Redis при REDIS_URL, иначе SQLite (см. CONVERSATION_STORE)
+    conversation_redis = None
+    if os.getenv("REDIS_URL"):
+        import redis.asyncio as redis
+        conversation_redis = redis.from_url(os.getenv("REDIS_URL"), decode_responses=True)
+    conversations = create_conversation_store(redis_client=conversation_redis)
+
     # Список всех запущенных воркеров и задач
     all_workers = []
     all_tasks = []
     all_clients = [] # Для Telegram
 
+    # Горячая перезагрузка баз знаний (один наблюдатель на все клиенты)
+    kb_watcher = None
+    if cfg.get("KB_WATCH_ENABLED"):
+        kb_watcher = KnowledgeBaseWatcher(cfg.get("KB_WATCH_INTERVAL_SECONDS"), cfg.get("KB_WATCH_DEBOUNCE_SECONDS"))
+
     # Итерация по клиентам и инициализация их воркеров
     clients_cfg = cfg.get("CLIENTS", [])
     logging.info(f"[Main] Найдено конфигураций клиентов: {len(clients_cfg)}")
@@ -91,12 +110,27 @@ async def main():
         logging.info(f"[Main] Инициализация клиента: {client_name} ({client_id})...")
 
         # Специфичный для клиента Retriever
-        retriever = QdrantRetrieverAdapter(
+        qdrant_adapter = QdrantRetrieverAdapter(
             collection_name=client.get("qdrant_collection", f"kb_{client_id}"),
             knowledge_base_path=client.get("knowledge_base_path", "knowledge_base.md"),
             openai_api_key=cfg.get("OPENAI_API_KEY"),
-            openai_api_base=cfg.get("OPENAI_API_BASE")
+            openai_api_base=cfg.get("OPENAI_API_BASE"),
+            index_profile=client.get("index_profile"),
+            # Прямой ответ секцией FAQ при совпадении с заголовком вопроса (ключ faq в конфиге клиента)
+            faq=client.get("faq")
         )
+        # Коллекция привязывается (и при необходимости собирается) в фоне, старт не ждет Qdrant
+        qdrant_adapter.start_background_init()
+        if kb_watcher:
+            kb_watcher.watch(qdrant_adapter.knowledge_base_path, qdrant_adapter.reload_knowledge_base)
+        # Опциональный реранкинг кросс-энкодером (ключ rerank в конфиге клиента)
+        retriever = with_reranking(qdrant_adapter, client.get("rerank"))
+        # Динамический top-k: в промпт идут только уверенные чанки (ключ score_gate в конфиге клиента)
+        retriever = with_score_gate(retriever, client.get("score_gate"), qdrant_adapter.collection_name)
+        # Кэш результатов поиска (LRU + Redis), сбрасывается сменой версии базы знаний
+        retriever = with_cache(retriever, qdrant_adapter.collection_name, qdrant_adapter.kb_version)
+        # Конкурентные поиски (пачка вопросов/чатов) объединяются в один embed + один пакетный запрос к Qdrant
+        retriever = with_batching(retriever)
 
         # Специфичные для клиента Use Cases
         answer_use_case = AnswerQuestionUseCase(llm=llm_adapter, retriever=retriever, client_config=client)
@@ -110,9 +144,12 @@ async def main():
             
             check_interval = cfg.get("WB_CHECK_INTERVAL_SECONDS", 300)
             
-            w_q = WBQuestionsWorker(wb_client, answer_use_case, check_interval, ignore_older_than_days=30)
-            w_f = WBFeedbacksWorker(wb_client, feedback_use_case, check_interval, ignore_older_than_days=30)
-            w_c = WBChatWorker(wb_client, answer_use_case, cfg.get("WB_CHAT_POLLING_INTERVAL_SECONDS", 15))
+            concurrency = cfg.get("MARKETPLACE_CONCURRENCY", 4)
+            # Вопросы и отзывы публикуются от одного аккаунта WB: общая очередь отправок
+            wb_posts = PostThrottle()
+            w_q = WBQuestionsWorker(wb_client, answer_use_case, check_interval, ignore_older_than_days=30, concurrency=concurrency, post_throttle=wb_posts)
+            w_f = WBFeedbacksWorker(wb_client, feedback_use_case, check_interval, ignore_older_than_days=30, concurrency=concurrency, post_throttle=wb_posts)
+            w_c = WBChatWorker(wb_client, answer_use_case, cfg.get("WB_CHAT_POLLING_INTERVAL_SECONDS", 15), conversations=conversations)
             
             all_workers.extend([w_q, w_f, w_c])
             all_tasks.append(asyncio.create_task(w_q.start(), name=f"wb_q_{client_id}"))
@@ -130,7 +167,7 @@ async def main():
             
             w_q = OzonQuestionsWorker(ozon_client, answer_use_case, db_adapter, check_interval)
             w_r = OzonReviewsWorker(ozon_client, feedback_use_case, db_adapter, check_interval)
-            w_c = OzonChatWorker(ozon_client, db_adapter, answer_use_case, cfg.get("OZON_CHAT_POLLING_INTERVAL_SECONDS", 60))
+            w_c = OzonChatWorker(ozon_client, db_adapter, answer_use_case, cfg.get("OZON_CHAT_POLLING_INTERVAL_SECONDS", 60), concurrency=cfg.get("MARKETPLACE_CONCURRENCY", 4))
             
             all_workers.extend([w_q, w_r, w_c])
             all_tasks.append(asyncio.create_task(w_q.start(), name=f"oz_q_{client_id}"))
@@ -148,9 +185,13 @@ async def main():
                     api_id=t_id,
                     api_hash=t_hash
                 )
-                telegram_adapter = TelegramAdapter(t_client, answer_use_case, cfg.get("TELEGRAM_MESSAGE_DELAY_SECONDS", 2))
+                telegram_adapter = TelegramAdapter(t_client, answer_use_case, cfg.get("TELEGRAM_MESSAGE_DELAY_SECONDS", 2), conversations=conversations)
                 all_clients.append(t_client)
 
+    if kb_watcher:
+        all_workers.append(kb_watcher)
+        all_tasks.append(asyncio.create_task(kb_watcher.start(), name="kb_watcher"))
+
     # 6. Основной цикл
     async def shutdown():
         nonlocal cleanup_started
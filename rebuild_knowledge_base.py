@@ -1,10 +1,11 @@
 import os
+import sys
+import argparse
 import logging
-import shutil
 from dotenv import load_dotenv
-from langchain_community.vectorstores import FAISS
 from langchain_openai import OpenAIEmbeddings
-from langchain_community.document_loaders import UnstructuredMarkdownLoader
+
+from app.adapters.retriever.faiss_store import migrate_legacy_index, sync_native_index
 
 # Загружаем переменные окружения из .env файла
 load_dotenv()
@@ -14,45 +15,53 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - [%(levelname)s] -
 KNOWLEDGE_BASE_PATH = "knowledge_base.md"
 FAISS_INDEX_PATH = "faiss_index"
 
-def rebuild_faiss_index():
+def rebuild_faiss_index(dry_run: bool = False, full: bool = False):
     """
-    Полностью перестраивает векторный индекс FAISS из файла knowledge_base.md.
+    Обновляет векторный индекс FAISS из файла knowledge_base.md.
+    По умолчанию инкрементально: переэмбеддятся только новые/измененные чанки.
+    Индекс пишется в нативном формате (index.faiss + chunks.jsonl + offsets.npy + manifest.json).
     """
     if not os.path.exists(KNOWLEDGE_BASE_PATH):
         logging.error(f"Файл базы знаний не найден по пути: {KNOWLEDGE_BASE_PATH}")
         return
 
-    logging.info("Начало перестройки индекса FAISS...")
+    logging.info("Начало обновления индекса FAISS...")
 
     try:
-        # 1. Загрузка и разделение документа
-        logging.info(f"Загрузка данных из {KNOWLEDGE_BASE_PATH}...")
-        loader = UnstructuredMarkdownLoader(KNOWLEDGE_BASE_PATH)
-        docs = loader.load_and_split()
-        logging.info(f"Документ успешно загружен и разделен на {len(docs)} частей.")
-
-        # 2. Создание эмбеддингов
-        logging.info("Инициализация модели эмбеддингов OpenAI...")
-        embeddings = OpenAIEmbeddings()
-
-        # 3. Удаление старого индекса, если он существует
-        if os.path.exists(FAISS_INDEX_PATH):
-            logging.warning(f"Удаление старой директории индекса: {FAISS_INDEX_PATH}")
-            shutil.rmtree(FAISS_INDEX_PATH)
-
-        # 4. Создание и сохранение нового индекса
-        logging.info("Создание нового векторного индекса FAISS...")
-        db = FAISS.from_documents(docs, embeddings)
-        db.save_local(FAISS_INDEX_PATH)
-        logging.info(f"Новый индекс успешно создан и сохранен в {FAISS_INDEX_PATH}.")
+        model_name = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")
+        logging.info(f"Инициализация модели эмбеддингов OpenAI ({model_name})...")
+        embeddings = OpenAIEmbeddings(model=model_name)
+
+        if full and not dry_run:
+            logging.warning(f"Полная пересборка индекса {FAISS_INDEX_PATH}: все чанки будут переэмбеддены.")
+        elif os.path.isdir(FAISS_INDEX_PATH) and not dry_run:
+            # Старый pickle-формат LangChain конвертируется один раз, без повторных эмбеддингов
+            migrate_legacy_index(FAISS_INDEX_PATH, embeddings, model_name)
+
+        _, plan = sync_native_index(FAISS_INDEX_PATH, KNOWLEDGE_BASE_PATH, embeddings, dry_run=dry_run, full=full, embedding_model=model_name)
+
+        if dry_run:
+            logging.info(f"DRY RUN: {plan.summary()}")
+            return
+        if plan.is_empty:
+            logging.info("Изменений нет, индекс актуален.")
+            return
+
+        logging.info(f"Индекс успешно обновлен и сохранен в {FAISS_INDEX_PATH}. {plan.summary()}")
 
     except Exception as e:
         logging.error(f"Произошла ошибка во время перестройки индекса: {e}", exc_info=True)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Обновление индекса FAISS")
+    parser.add_argument("--dry-run", action="store_true", help="Только показать, что изменится, и оценку токенов")
+    parser.add_argument("--full", action="store_true", help="Переэмбеддить все чанки и перезаписать индекс")
+    args = parser.parse_args()
+
     # Проверяем наличие ключа API OpenAI перед запуском
-    if not os.getenv("OPENAI_API_KEY"):
+    if not os.getenv("OPENAI_API_KEY") and not args.dry_run:
         print("Ошибка: Переменная окружения OPENAI_API_KEY не установлена.")
         print("Пожалуйста, создайте файл .env или установите переменную перед запуском.")
-    else:
-        rebuild_faiss_index()
+        sys.exit(1)
+
+    rebuild_faiss_index(dry_run=args.dry_run, full=args.full)
@@ -1,14 +1,24 @@
 #!/usr/bin/env python3
 """
-Скрипт пересборки базы знаний в Qdrant.
+Скрипт обновления базы знаний в Qdrant.
 Запускайте после внесения изменений в knowledge_base.md.
 
+По умолчанию обновление инкрементальное: эмбеддятся только новые/измененные чанки,
+удаленные из базы знаний чанки удаляются из коллекции.
+
+--full собирает новую версию коллекции ({name}__v{n}) в тени и переключает на нее алиас
+только после проверки, так что боты продолжают отвечать во время пересборки.
+--rollback возвращает алиас на предыдущую версию.
+--apply-profile применяет профиль индекса (QDRANT_INDEX_PROFILE: имя пресета или JSON)
+к живой коллекции без пересборки; новые версии коллекции создаются сразу с ним.
+
 Использование:
-  Локально:  python rebuild_qdrant_knowledge.py
+  Локально:  python rebuild_qdrant_knowledge.py [--dry-run] [--full] [--rollback] [--apply-profile]
   В Docker:  docker compose exec bot python rebuild_qdrant_knowledge.py
 """
 import os
 import sys
+import argparse
 import logging
 from dotenv import load_dotenv
 
@@ -20,66 +30,67 @@ logger = logging.getLogger(__name__)
 KNOWLEDGE_BASE_PATH = os.getenv("KB_PATH", "knowledge_base.md")
 COLLECTION_NAME = os.getenv("QDRANT_COLLECTION", "smart_bot_knowledge")
 QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
+INDEX_PROFILE = os.getenv("QDRANT_INDEX_PROFILE", "default")
 
 
-def rebuild_qdrant_index():
-    """Пересоздаёт коллекцию в Qdrant и загружает данные из knowledge_base.md."""
+def rebuild_qdrant_index(dry_run: bool = False, full: bool = False, rollback: bool = False, apply_profile: bool = False):
+    """Синхронизирует коллекцию в Qdrant с knowledge_base.md."""
     if not os.path.exists(KNOWLEDGE_BASE_PATH):
         logger.error(f"Файл базы знаний не найден: {KNOWLEDGE_BASE_PATH}")
         sys.exit(1)
 
-    api_key = os.getenv("OPENAI_API_KEY")
-    api_base = os.getenv("OPENAI_API_BASE")
-    if not api_key:
-        logger.error("OPENAI_API_KEY не задан. Добавьте его в .env")
-        sys.exit(1)
-
-    logger.info("Загрузка данных из %s...", KNOWLEDGE_BASE_PATH)
-    from langchain_community.document_loaders import TextLoader
-    from langchain.text_splitter import MarkdownHeaderTextSplitter, RecursiveCharacterTextSplitter
     from langchain_openai import OpenAIEmbeddings
-    from langchain_qdrant import QdrantVectorStore
     from qdrant_client import QdrantClient
-    from qdrant_client.http.models import Distance, VectorParams
+    from app.adapters.retriever.collection_versions import VersionedCollection
+    from app.adapters.retriever.index_profiles import resolve_index_profile
+    from app.adapters.retriever.kb_indexer import QdrantKnowledgeIndexer
+
+    logger.info("Подключение к Qdrant по адресу %s...", QDRANT_URL)
+    client = QdrantClient(url=QDRANT_URL, timeout=30.0)
+    profile = resolve_index_profile(INDEX_PROFILE)
 
-    loader = TextLoader(KNOWLEDGE_BASE_PATH, encoding="utf-8")
-    documents = loader.load()
+    if apply_profile:
+        profile.apply(client, VersionedCollection(client, COLLECTION_NAME).active_collection() or COLLECTION_NAME)
+        return
 
-    headers_to_split_on = [
-        ("#", "product"),
-        ("##", "category"),
-        ("###", "subcategory"),
-        ("####", "question"),
-    ]
-    markdown_splitter = MarkdownHeaderTextSplitter(headers_to_split_on=headers_to_split_on, strip_headers=False)
-    docs = markdown_splitter.split_text(documents[0].page_content)
+    if rollback:
+        target = VersionedCollection(client, COLLECTION_NAME).rollback()
+        logger.info("Алиас %s переключен обратно на %s", COLLECTION_NAME, target)
+        return
 
-    if not docs:
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-        docs = text_splitter.split_documents(documents)
+    api_key = os.getenv("OPENAI_API_KEY")
+    api_base = os.getenv("OPENAI_API_BASE")
+    if not api_key and not dry_run:
+        logger.error("OPENAI_API_KEY не задан. Добавьте его в .env")
+        sys.exit(1)
 
-    logger.info("Создание эмбеддингов для %d чанков...", len(docs))
-    embeddings = OpenAIEmbeddings(openai_api_key=api_key, base_url=api_base)
+    # Та же модель, что и в QdrantRetrieverAdapter, иначе векторы запросов и документов несовместимы
+    model_name = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")
+    embeddings = OpenAIEmbeddings(model=model_name, openai_api_key=api_key or "dry-run", base_url=api_base)
 
-    logger.info("Подключение к Qdrant по адресу %s...", QDRANT_URL)
-    client = QdrantClient(url=QDRANT_URL, timeout=30.0)
+    if full and not dry_run:
+        logger.info("Полная пересборка %s через теневую коллекцию...", COLLECTION_NAME)
+        shadow = VersionedCollection(client, COLLECTION_NAME, index_profile=profile).rebuild(KNOWLEDGE_BASE_PATH, embeddings)
+        logger.info("База знаний пересобрана: алиас %s -> %s", COLLECTION_NAME, shadow)
+        return
 
-    # Удаляем старую коллекцию, если есть
-    collections = client.get_collections().collections
-    if any(c.name == COLLECTION_NAME for c in collections):
-        logger.info("Удаление старой коллекции %s...", COLLECTION_NAME)
-        client.delete_collection(COLLECTION_NAME)
+    indexer = QdrantKnowledgeIndexer(client, COLLECTION_NAME, embeddings, index_profile=profile)
+    plan = indexer.sync(KNOWLEDGE_BASE_PATH, dry_run=dry_run)
 
-    logger.info("Загрузка документов в Qdrant (force_recreate=True)...")
-    QdrantVectorStore.from_documents(
-        docs,
-        embeddings,
-        url=QDRANT_URL,
-        collection_name=COLLECTION_NAME,
-        force_recreate=True,
-    )
-    logger.info("База знаний успешно обновлена в Qdrant!")
+    if dry_run:
+        logger.info("DRY RUN (%s): %s", COLLECTION_NAME, plan.summary())
+    elif plan.is_empty:
+        logger.info("Изменений нет, коллекция %s актуальна.", COLLECTION_NAME)
+    else:
+        logger.info("База знаний успешно обновлена в Qdrant! %s", plan.summary())
 
 
 if __name__ == "__main__":
-    rebuild_qdrant_index()
+    parser = argparse.ArgumentParser(description="Обновление базы знаний в Qdrant")
+    parser.add_argument("--dry-run", action="store_true", help="Только показать, что изменится, и оценку токенов")
+    parser.add_argument("--full", action="store_true", help="Переэмбеддить все чанки в новую версию коллекции и переключить алиас")
+    parser.add_argument("--rollback", action="store_true", help="Вернуть алиас на предыдущую версию коллекции")
+    parser.add_argument("--apply-profile", action="store_true", help="Применить QDRANT_INDEX_PROFILE к живой коллекции")
+    args = parser.parse_args()
+
+    rebuild_qdrant_index(dry_run=args.dry_run, full=args.full, rollback=args.rollback, apply_profile=args.apply_profile)
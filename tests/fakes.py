@@ -0,0 +1,42 @@
+"""
+Общие фейки для тестов (tests/ не пакет: импорт `from fakes import ...` работает, потому что
+pytest и unittest кладут каталог тестов в sys.path).
+"""
+import zlib
+
+import numpy as np
+
+
+class LengthEmbeddings:
+    """
+    Детерминированные эмбеддинги [длина текста, 1.0, 0.5]. Считают вызовы embed_documents (calls),
+    отправленные в них тексты (embedded, texts) и вызовы embed_query (queries).
+    """
+    def __init__(self):
+        self.embedded = 0
+        self.calls = 0
+        self.queries = 0
+        self.texts = []
+
+    def _vector(self, text):
+        return [float(len(text)), 1.0, 0.5]
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        self.embedded += len(texts)
+        self.texts.extend(texts)
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text):
+        self.queries += 1
+        return self._vector(text)
+
+
+class WordHashEmbeddings(LengthEmbeddings):
+    """Мешок слов, захэшированный в 64 измерения: похожие вопросы близки по косинусу."""
+    def _vector(self, text):
+        vector = np.zeros(64, dtype=np.float32)
+        for word in text.lower().split():
+            vector[zlib.crc32(word.strip("?:.,#").encode("utf-8")) % 64] += 1.0
+        vector[0] += 0.01
+        return vector.tolist()
@@ -0,0 +1,223 @@
+import asyncio
+import time
+import unittest
+from types import SimpleNamespace
+
+import httpx
+from openai import APIConnectionError, BadRequestError, InternalServerError, RateLimitError
+
+from app.adapters.openai_assistants.adapter import ERROR_REPLY, AssistantsRunError, OpenAIAssistantsAdapter
+
+
+def text_part(value):
+    return SimpleNamespace(type="text", text=SimpleNamespace(value=value))
+
+
+def run_event(name, run_id="run_1"):
+    status = {"created": "queued"}.get(name, name)
+    return SimpleNamespace(event=f"thread.run.{name}", data=SimpleNamespace(id=run_id, status=status, last_error=None))
+
+
+def delta_event(value):
+    return SimpleNamespace(event="thread.message.delta", data=SimpleNamespace(delta=SimpleNamespace(content=[text_part(value)])))
+
+
+def message_event(value):
+    return SimpleNamespace(event="thread.message.completed", data=SimpleNamespace(content=[text_part(value)]))
+
+
+class FakeStream:
+    def __init__(self, events, delay=0.0, fail_after=None, error=None):
+        self.events, self.delay, self.fail_after = events, delay, fail_after
+        self.error = error or APIConnectionError(request=httpx.Request("POST", "https://api.openai.com"))
+        self.closed = False
+
+    async def __aiter__(self):
+        for i, event in enumerate(self.events):
+            if i == self.fail_after:
+                raise self.error
+            await asyncio.sleep(self.delay)
+            yield event
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeRuns:
+    """Ран завершается на polls_until-й проверке; stream — что вернуть на stream=True (или исключение)."""
+    def __init__(self, stream=None, polls_until=3):
+        self.stream = stream
+        self.polls_until = polls_until
+        self.created, self.retrieved, self.cancelled = [], [], []
+        # Раны, которые видит сервер (runs.list)
+        self.server_runs = []
+
+    async def create(self, thread_id, assistant_id, additional_messages, metadata, stream=False):
+        self.created.append({"stream": stream, "messages": additional_messages})
+        if stream:
+            if isinstance(self.stream, Exception):
+                raise self.stream
+            return self.stream
+        run = SimpleNamespace(id=f"run_{len(self.created)}", status="queued", last_error=None, metadata=metadata)
+        self.server_runs.insert(0, run)
+        return run
+
+    async def list(self, thread_id, order, limit):
+        return SimpleNamespace(data=self.server_runs[:limit])
+
+    async def retrieve(self, thread_id, run_id):
+        self.retrieved.append(time.perf_counter())
+        status = "completed" if len(self.retrieved) >= self.polls_until else "in_progress"
+        return SimpleNamespace(id=run_id, status=status, last_error=None)
+
+    async def cancel(self, run_id, thread_id):
+        self.cancelled.append(run_id)
+
+
+class FakeMessages:
+    def __init__(self):
+        self.listed = []
+
+    async def list(self, thread_id, run_id, order, limit):
+        self.listed.append(run_id)
+        return SimpleNamespace(data=[SimpleNamespace(content=[text_part("ответ из списка")])])
+
+
+def make_adapter(runs, streaming=True, timeout=5.0):
+    adapter = OpenAIAssistantsAdapter(api_key="test", streaming=streaming, run_timeout_seconds=timeout)
+    messages = FakeMessages()
+    adapter.client = SimpleNamespace(beta=SimpleNamespace(threads=SimpleNamespace(runs=runs, messages=messages)))
+    return adapter, messages
+
+
+class TestAssistantsStreaming(unittest.IsolatedAsyncioTestCase):
+
+    async def test_final_message_comes_from_stream(self):
+        """Тест: один запрос на ход — сообщение пользователя уходит в additional_messages, ответ берется из стрима."""
+        stream = FakeStream([run_event("created"), run_event("in_progress"), delta_event("Здравствуйте"), delta_event("!"), message_event("Здравствуйте!"), run_event("completed")])
+        runs = FakeRuns(stream=stream)
+        adapter, messages = make_adapter(runs)
+
+        reply = await adapter.send_message_and_get_response("thread_1", "asst_1", "привет")
+
+        self.assertEqual(reply, "Здравствуйте!")
+        self.assertEqual(runs.created, [{"stream": True, "messages": [{"role": "user", "content": "привет"}]}])
+        self.assertEqual((runs.retrieved, messages.listed), ([], []))
+        self.assertTrue(stream.closed)
+
+    async def test_token_stream(self):
+        runs = FakeRuns(stream=FakeStream([run_event("created"), delta_event("Здрав"), delta_event("ствуйте"), message_event("Здравствуйте"), run_event("completed")]))
+        adapter, _ = make_adapter(runs)
+        chunks = [chunk async for chunk in adapter.stream_response("thread_1", "asst_1", "привет")]
+        self.assertEqual(chunks, ["Здрав", "ствуйте"])
+
+    async def test_failed_run_in_stream(self):
+        runs = FakeRuns(stream=FakeStream([run_event("created"), run_event("failed")]))
+        adapter, _ = make_adapter(runs)
+        self.assertEqual(await adapter.send_message_and_get_response("thread_1", "asst_1", "привет"), ERROR_REPLY)
+
+
+class TestAssistantsPollingFallback(unittest.IsolatedAsyncioTestCase):
+
+    async def test_polling_starts_fast_and_backs_off(self):
+        """Тест: без стрима первая проверка рана через ~100 мс, интервалы растут."""
+        runs = FakeRuns(polls_until=4)
+        adapter, messages = make_adapter(runs, streaming=False)
+
+        started = time.perf_counter()
+        reply = await adapter.send_message_and_get_response("thread_1", "asst_1", "привет")
+
+        self.assertEqual(reply, "ответ из списка")
+        self.assertEqual(messages.listed, ["run_1"])
+        gaps = [b - a for a, b in zip([started] + runs.retrieved, runs.retrieved)]
+        self.assertLess(gaps[0], 0.3)
+        self.assertGreater(gaps[-1], gaps[0])
+
+    async def test_stream_unavailable_falls_back_to_polling(self):
+        runs = FakeRuns(stream=APIConnectionError(request=httpx.Request("POST", "https://api.openai.com")), polls_until=1)
+        adapter, _ = make_adapter(runs)
+
+        self.assertEqual(await adapter.send_message_and_get_response("thread_1", "asst_1", "привет"), "ответ из списка")
+        self.assertEqual([c["stream"] for c in runs.created], [True, False])
+
+    async def test_broken_stream_polls_existing_run(self):
+        """Тест: обрыв стрима после создания рана — ран дожидается поллингом, новый не создается, хвост ответа досылается."""
+        stream = FakeStream([run_event("created"), delta_event("ответ "), delta_event("из")], fail_after=2)
+        runs = FakeRuns(stream=stream, polls_until=1)
+        adapter, _ = make_adapter(runs)
+
+        chunks = [chunk async for chunk in adapter.stream_response("thread_1", "asst_1", "привет")]
+
+        self.assertEqual("".join(chunks), "ответ из списка")
+        self.assertEqual(len(runs.created), 1)
+
+    async def test_transport_error_in_stream_falls_back_to_polling(self):
+        """Тест: обрыв SSE на уровне httpx (ReadError) — тоже поллинг, а не ошибка хода."""
+        stream = FakeStream([run_event("created"), delta_event("от")], fail_after=1, error=httpx.ReadError("connection reset"))
+        runs = FakeRuns(stream=stream, polls_until=1)
+        adapter, _ = make_adapter(runs)
+
+        self.assertEqual(await adapter.send_message_and_get_response("thread_1", "asst_1", "привет"), "ответ из списка")
+        self.assertEqual(len(runs.created), 1)
+
+    async def test_run_accepted_before_stream_broke_is_not_recreated(self):
+        """Тест: сервер принял ран, но стрим оборвался до первого события — ран находится по turn_id, сообщение не дублируется."""
+        runs = FakeRuns(polls_until=1)
+
+        async def accepted_then_broken(thread_id, assistant_id, additional_messages, metadata, stream=False):
+            runs.server_runs.insert(0, SimpleNamespace(id="run_accepted", status="in_progress", last_error=None, metadata=metadata))
+            raise httpx.RemoteProtocolError("peer closed connection")
+
+        adapter, messages = make_adapter(runs)
+        runs.create = accepted_then_broken
+
+        self.assertEqual(await adapter.send_message_and_get_response("thread_1", "asst_1", "привет"), "ответ из списка")
+        self.assertEqual(messages.listed, ["run_accepted"])
+
+    async def test_client_error_is_not_retried_by_polling(self):
+        """Тест: 4xx (429, неверный запрос) не переводит ход на поллинг — ран не создается второй раз."""
+        for error_class, status in ((RateLimitError, 429), (BadRequestError, 400)):
+            request = httpx.Request("POST", "https://api.openai.com")
+            error = error_class("ошибка клиента", response=httpx.Response(status, request=request), body=None)
+            runs = FakeRuns(stream=error, polls_until=1)
+            adapter, messages = make_adapter(runs)
+
+            with self.assertRaises(error_class):
+                await adapter.send_message_and_get_response("thread_1", "asst_1", "привет")
+            self.assertEqual(len(runs.created), 1)
+            self.assertEqual(messages.listed, [])
+
+    async def test_server_error_falls_back_to_polling(self):
+        """Тест: 5xx на старте стрима — поллинг, как при обрыве соединения."""
+        request = httpx.Request("POST", "https://api.openai.com")
+        error = InternalServerError("bad gateway", response=httpx.Response(502, request=request), body=None)
+        runs = FakeRuns(stream=error, polls_until=1)
+        adapter, _ = make_adapter(runs)
+
+        self.assertEqual(await adapter.send_message_and_get_response("thread_1", "asst_1", "привет"), "ответ из списка")
+        self.assertEqual([c["stream"] for c in runs.created], [True, False])
+
+    async def test_previous_turn_run_is_not_reused(self):
+        """Тест: последний ран треда от прошлого хода — не наш, создается новый."""
+        runs = FakeRuns(stream=APIConnectionError(request=httpx.Request("POST", "https://api.openai.com")), polls_until=1)
+        runs.server_runs.append(SimpleNamespace(id="run_old", status="completed", last_error=None, metadata={"turn_id": "прошлый"}))
+        adapter, messages = make_adapter(runs)
+
+        await adapter.send_message_and_get_response("thread_1", "asst_1", "привет")
+        self.assertEqual([c["stream"] for c in runs.created], [True, False])
+        self.assertNotEqual(messages.listed, ["run_old"])
+
+    async def test_timeout_cancels_run(self):
+        runs = FakeRuns(polls_until=10_000)
+        adapter, _ = make_adapter(runs, streaming=False, timeout=0.3)
+
+        started = time.perf_counter()
+        with self.assertRaises(AssistantsRunError):
+            async for _ in adapter.stream_response("thread_1", "asst_1", "привет"):
+                pass
+        self.assertLess(time.perf_counter() - started, 0.6)
+        self.assertEqual(runs.cancelled, ["run_1"])
+
+
+if __name__ == '__main__':
+    unittest.main()
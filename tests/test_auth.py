@@ -0,0 +1,106 @@
+import asyncio
+import time
+import unittest
+
+from sqlalchemy import Column, Integer, String, create_engine
+from sqlalchemy.orm import Session, declarative_base
+
+try:
+    from app.core import auth
+    HAS_AUTH_DEPS = True
+except ImportError:
+    HAS_AUTH_DEPS = False
+
+
+@unittest.skipUnless(HAS_AUTH_DEPS, "python-jose/passlib не установлены")
+class TestPasswordHashing(unittest.IsolatedAsyncioTestCase):
+
+    async def test_hash_round_trip(self):
+        hashed = await auth.hash_password("секрет")
+        self.assertTrue(await auth.check_password("секрет", hashed))
+        self.assertFalse(await auth.check_password("не тот", hashed))
+
+    async def test_event_loop_stays_responsive_during_login_storm(self):
+        """Тест: пока идут bcrypt-проверки, event loop обслуживает другие корутины без задержек."""
+        hashed = auth.get_password_hash("секрет")
+        ticks = []
+
+        async def heartbeat():
+            while True:
+                ticks.append(time.perf_counter())
+                await asyncio.sleep(0.01)
+
+        beat = asyncio.create_task(heartbeat())
+        await asyncio.gather(*(auth.check_password("секрет", hashed) for _ in range(8)))
+        beat.cancel()
+
+        gaps = [b - a for a, b in zip(ticks, ticks[1:])]
+        self.assertGreater(len(gaps), 3)
+        self.assertLess(max(gaps), 0.1)
+
+
+@unittest.skipUnless(HAS_AUTH_DEPS, "python-jose/passlib не установлены")
+class TestTokenUserCache(unittest.TestCase):
+
+    def test_lru_eviction(self):
+        cache = auth.TokenUserCache(max_size=2, ttl_seconds=60)
+        cache.put("a", auth.CurrentUser(id=1, email="a@x"))
+        cache.put("b", auth.CurrentUser(id=2, email="b@x"))
+        cache.get("a")
+        cache.put("c", auth.CurrentUser(id=3, email="c@x"))
+
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a").email, "a@x")
+
+    def test_entry_expires_with_token(self):
+        """Тест: запись не переживает exp токена, даже если TTL кэша больше."""
+        cache = auth.TokenUserCache(ttl_seconds=60)
+        cache.put("t", auth.CurrentUser(id=1, email="a@x", token_exp=time.time() - 1))
+        self.assertIsNone(cache.get("t"))
+
+    def test_invalidate_user(self):
+        cache = auth.TokenUserCache()
+        cache.put("t1", auth.CurrentUser(id=1, email="a@x"))
+        cache.put("t2", auth.CurrentUser(id=2, email="b@x"))
+        cache.invalidate(1)
+        self.assertIsNone(cache.get("t1"))
+        self.assertIsNotNone(cache.get("t2"))
+
+    def test_user_changes_drop_cached_tokens(self):
+        """Тест: UPDATE и DELETE пользователя через ORM сразу сбрасывают его токены в кэше."""
+        Base = declarative_base()
+
+        class User(Base):
+            __tablename__ = "users"
+            id = Column(Integer, primary_key=True)
+            email = Column(String)
+
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        cache = auth.TokenUserCache()
+        auth.track_user_changes(User, cache)
+
+        with Session(engine) as db:
+            alice, bob = User(id=1, email="a@x"), User(id=2, email="b@x")
+            db.add_all([alice, bob])
+            db.commit()
+            cache.put("t1", auth.CurrentUser(id=1, email="a@x"))
+            cache.put("t2", auth.CurrentUser(id=2, email="b@x"))
+
+            alice.email = "new@x"
+            db.commit()
+            self.assertIsNone(cache.get("t1"))
+            self.assertIsNotNone(cache.get("t2"))
+
+            db.delete(bob)
+            db.commit()
+            self.assertIsNone(cache.get("t2"))
+
+    def test_token_round_trip(self):
+        token = auth.create_access_token({"sub": "a@x"})
+        self.assertEqual(auth.decode_access_token(token)["sub"], "a@x")
+        self.assertIsNone(auth.decode_access_token(token + "x"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from qdrant_client import QdrantClient
+
+from app.core.models.chunk import RetrievedChunk
+from app.core.ports.retriever import KnowledgeRetriever
+from app.adapters.retriever.batching import BatchingRetriever
+from app.adapters.retriever.cache import CachedRetriever, RetrievalCache
+from app.adapters.retriever.collection_versions import VersionedCollection
+from app.adapters.retriever.qdrant_adapter import QdrantRetrieverAdapter
+
+from fakes import LengthEmbeddings
+
+KB = """#### Как подключить пульт?
+Ответ: зажмите OK на 5 секунд.
+
+#### Нужен ли интернет?
+Ответ: да, для онлайн-каналов.
+
+#### Есть ли гарантия?
+Ответ: 12 месяцев.
+"""
+
+
+class RecordingRetriever(KnowledgeRetriever):
+    """Фейковый ретривер: запоминает пачки, пришедшие в retrieve_many."""
+    def __init__(self):
+        self.batches = []
+
+    def retrieve(self, query, k=6):
+        return self.retrieve_many([query], k=k)[0]
+
+    def retrieve_many(self, queries, k=6):
+        self.batches.append((list(queries), k))
+        return [[RetrievedChunk(content=f"ответ на {q}", score=1.0)] for q in queries]
+
+
+class TestBatchingRetriever(unittest.IsolatedAsyncioTestCase):
+
+    async def test_concurrent_calls_share_one_batch(self):
+        """Тест: одновременные aretrieve уходят в базовый ретривер одной пачкой, ответы не путаются."""
+        base = RecordingRetriever()
+        retriever = BatchingRetriever(base, max_wait_ms=20)
+
+        results = await asyncio.gather(*(retriever.aretrieve(f"вопрос {i}") for i in range(5)))
+
+        self.assertEqual(len(base.batches), 1)
+        self.assertEqual(len(base.batches[0][0]), 5)
+        self.assertEqual([r[0].content for r in results], [f"ответ на вопрос {i}" for i in range(5)])
+
+    async def test_batches_split_by_k_and_size(self):
+        """Тест: разные k — разные пачки; при max_batch_size пачка уходит сразу."""
+        base = RecordingRetriever()
+        retriever = BatchingRetriever(base, max_wait_ms=20, max_batch_size=2)
+
+        await asyncio.gather(retriever.aretrieve("a", k=3), retriever.aretrieve("b", k=3), retriever.aretrieve("c", k=6))
+
+        self.assertEqual(sorted((len(q), k) for q, k in base.batches), [(1, 6), (2, 3)])
+
+    async def test_errors_reach_every_caller(self):
+        """Тест: ошибка пакетного поиска пробрасывается всем ожидающим."""
+        class BrokenRetriever(RecordingRetriever):
+            def retrieve_many(self, queries, k=6):
+                raise RuntimeError("Qdrant недоступен")
+
+        retriever = BatchingRetriever(BrokenRetriever(), max_wait_ms=5)
+        results = await asyncio.gather(retriever.aretrieve("a"), retriever.aretrieve("b"), return_exceptions=True)
+        self.assertTrue(all(isinstance(r, RuntimeError) for r in results))
+
+
+class TestRetrieveMany(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.NamedTemporaryFile("w", suffix=".md", delete=False, encoding="utf-8")
+        tmp.write(KB)
+        tmp.close()
+        self.addCleanup(os.remove, tmp.name)
+
+        with patch.dict(os.environ, {"QDRANT_URL": "http://127.0.0.1:1"}):
+            self.adapter = QdrantRetrieverAdapter(collection_name="kb", knowledge_base_path=tmp.name)
+        self.adapter.client = QdrantClient(":memory:")
+        self.embeddings = LengthEmbeddings()
+        self.adapter._embeddings = self.embeddings
+        VersionedCollection(self.adapter.client, "kb").rebuild(tmp.name, self.embeddings)
+        self.adapter._ready = True
+
+    def test_qdrant_retrieve_many_matches_single_queries(self):
+        """Тест: пакетный поиск дает те же чанки, что и поиск по одному, за один вызов эмбеддингов."""
+        queries = ["пульт", "интернет нужен?", "гарантия на приставку"]
+        self.embeddings.calls = 0
+        batched = self.adapter.retrieve_many(queries, k=2)
+        self.assertEqual(self.embeddings.calls, 1)
+
+        single = [self.adapter.retrieve(q, k=2) for q in queries]
+        self.assertEqual([[c.content for c in r] for r in batched], [[c.content for c in r] for r in single])
+
+    def test_cached_retrieve_many_only_sends_misses(self):
+        """Тест: кэш отдает попадания сам, в базовый ретривер уходят только промахи."""
+        base = RecordingRetriever()
+        cached = CachedRetriever(base, "kb", RetrievalCache(), version_provider=lambda: "v1")
+        cached.retrieve("пульт")
+
+        results = cached.retrieve_many(["пульт", "интернет"])
+
+        self.assertEqual(base.batches[-1], (["интернет"], 6))
+        self.assertEqual([r[0].content for r in results], ["ответ на пульт", "ответ на интернет"])
+
+
+if __name__ == '__main__':
+    unittest.main()
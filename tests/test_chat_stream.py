@@ -0,0 +1,67 @@
+import asyncio
+import unittest
+
+from app.adapters.conversation.memory_store import MemoryConversationStore
+from app.adapters.conversation.turn_lock import SessionTurnGuard
+
+try:
+    import api
+    HAS_API_DEPS = True
+except ImportError:
+    HAS_API_DEPS = False
+
+
+class FakeAssistants:
+    """Стрим ответа ассистента кусками с задержкой; считает запущенные раны."""
+    def __init__(self):
+        self.runs = 0
+
+    async def stream_response(self, thread_id, assistant_id, message):
+        self.runs += 1
+        for part in ("Здравствуйте", ", чем ", "помочь?"):
+            await asyncio.sleep(0.02)
+            yield part
+
+
+@unittest.skipUnless(HAS_API_DEPS, "зависимости api.py не установлены")
+class TestChatStreamDuplicates(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.assistants = FakeAssistants()
+        self.saved = (api.assistants_adapter, api.conversations, api.turn_guard, api.thread_pool)
+        api.assistants_adapter = self.assistants
+        api.conversations = MemoryConversationStore()
+        api.turn_guard = SessionTurnGuard()
+        api.thread_pool = None
+
+    def tearDown(self):
+        api.assistants_adapter, api.conversations, api.turn_guard, api.thread_pool = self.saved
+
+    async def stream(self, client_message_id):
+        async def create_thread():
+            return "thread_1"
+        api.assistants_adapter.create_thread = create_thread
+        request = api.ChatRequest(bot_id="asst_test", message="привет", session_id="s1", client_message_id=client_message_id)
+        response = await api.chat_stream_endpoint(request)
+        return "".join([chunk async for chunk in response.body_iterator])
+
+    async def test_retried_message_is_not_answered_twice(self):
+        """Тест: повтор того же client_message_id по стриму (в том числе одновременный) не запускает второй ран."""
+        first, second = await asyncio.gather(self.stream("m1"), self.stream("m1"))
+        third = await self.stream("m1")
+
+        self.assertEqual(self.assistants.runs, 1)
+        for body in (first, second, third):
+            self.assertIn('event: done\ndata: {"reply": "Здравствуйте, чем помочь?"}', body)
+
+        history, _ = await api.conversations.load("session:asst_test:s1")
+        self.assertEqual(len(history), 2)
+
+    async def test_new_message_starts_new_run(self):
+        await self.stream("m1")
+        await self.stream("m2")
+        self.assertEqual(self.assistants.runs, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,163 @@
+import os
+import tempfile
+import unittest
+from qdrant_client import QdrantClient
+from qdrant_client.http.models import Distance, PointStruct, VectorParams
+
+from app.adapters.retriever.collection_versions import RebuildLockedError, VersionedCollection
+
+from fakes import LengthEmbeddings
+
+KB_TEXT = """# Продукт: ТВ-Приставки NEXT
+
+#### Как подключить пульт?
+Ответ: зажмите OK на 5 секунд.
+
+#### Нужен ли интернет?
+Ответ: да, для онлайн-каналов.
+"""
+
+
+class BrokenQueryEmbeddings(LengthEmbeddings):
+    def embed_query(self, text):
+        raise RuntimeError("embedding API недоступен")
+
+    def embed_documents(self, texts):
+        return [LengthEmbeddings.embed_query(self, t) for t in texts]
+
+
+class FakeRedis:
+    """Ключи блокировок как в Redis: занятый другим процессом ключ не захватывается."""
+    def __init__(self, held=()):
+        self.held = set(held)
+        self.history = []
+
+    def lock(self, name, **kwargs):
+        return FakeRedisLock(self, name)
+
+
+class FakeRedisLock:
+    def __init__(self, redis, name):
+        self.redis = redis
+        self.name = name
+
+    def acquire(self):
+        if self.name in self.redis.held:
+            return False
+        self.redis.held.add(self.name)
+        self.redis.history.append(("acquire", self.name))
+        return True
+
+    def reacquire(self):
+        return True
+
+    def release(self):
+        self.redis.held.discard(self.name)
+        self.redis.history.append(("release", self.name))
+
+
+class TestVersionedCollection(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.NamedTemporaryFile("w", suffix=".md", delete=False, encoding="utf-8")
+        self.tmp.write(KB_TEXT)
+        self.tmp.close()
+        self.client = QdrantClient(":memory:")
+        self.collection = VersionedCollection(self.client, "kb")
+
+    def tearDown(self):
+        os.remove(self.tmp.name)
+
+    def test_rebuild_switches_alias_and_keeps_previous(self):
+        """Тест: каждая пересборка создает новую версию, алиас переключается, прошлая версия остается."""
+        self.assertEqual(self.collection.rebuild(self.tmp.name, LengthEmbeddings()), "kb__v1")
+        self.assertEqual(self.collection.rebuild(self.tmp.name, LengthEmbeddings()), "kb__v2")
+
+        self.assertEqual(self.collection.active_collection(), "kb__v2")
+        self.assertEqual(self.collection.versions(), [1, 2])
+        self.assertEqual(self.client.count("kb").count, 2)
+
+    def test_rollback(self):
+        """Тест: откат возвращает алиас на предыдущую версию."""
+        self.collection.rebuild(self.tmp.name, LengthEmbeddings())
+        self.collection.rebuild(self.tmp.name, LengthEmbeddings())
+
+        self.assertEqual(self.collection.rollback(), "kb__v1")
+        self.assertEqual(self.collection.active_collection(), "kb__v1")
+        self.assertEqual(self.collection.versions(), [1])
+
+    def test_rebuild_after_rollback_does_not_resume_rolled_back_version(self):
+        """Тест: после отката следующая сборка — новая версия, а не достройка откаченной."""
+        self.collection.rebuild(self.tmp.name, LengthEmbeddings())
+        self.collection.rebuild(self.tmp.name, LengthEmbeddings())
+        # Плохая точка в откатываемой версии
+        self.client.upsert("kb__v2", points=[PointStruct(id=999, vector=[1.0, 1.0, 1.0], payload={"page_content": "плохо"})])
+        self.collection.rollback()
+
+        self.assertEqual(self.collection.rebuild(self.tmp.name, LengthEmbeddings()), "kb__v2")
+        self.assertEqual(self.client.count("kb").count, 2)
+        self.assertEqual(self.client.retrieve("kb__v2", ids=[999]), [])
+
+    def test_old_versions_are_cleaned_up(self):
+        for _ in range(4):
+            self.collection.rebuild(self.tmp.name, LengthEmbeddings())
+        self.assertEqual(self.collection.versions(), [3, 4])
+
+    def test_failed_verification_keeps_live_alias(self):
+        """Тест: если теневая версия не прошла smoke-запросы, алиас остается на живой версии."""
+        self.collection.rebuild(self.tmp.name, LengthEmbeddings())
+
+        with self.assertRaises(RuntimeError):
+            self.collection.rebuild(self.tmp.name, BrokenQueryEmbeddings())
+
+        self.assertEqual(self.collection.active_collection(), "kb__v1")
+        self.assertEqual(self.collection.versions(), [1])
+
+    def test_migrates_legacy_collection(self):
+        """Тест: старая физическая коллекция с именем алиаса заменяется алиасом."""
+        self.client.create_collection("kb", vectors_config=VectorParams(size=3, distance=Distance.COSINE))
+        self.client.upsert("kb", points=[PointStruct(id=1, vector=[1.0, 0.0, 0.0])])
+
+        self.collection.rebuild(self.tmp.name, LengthEmbeddings())
+
+        self.assertEqual(self.collection.active_collection(), "kb__v1")
+        self.assertEqual(self.client.count("kb").count, 2)
+
+class TestRebuildLock(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.NamedTemporaryFile("w", suffix=".md", delete=False, encoding="utf-8")
+        self.tmp.write(KB_TEXT)
+        self.tmp.close()
+        self.addCleanup(os.remove, self.tmp.name)
+        self.client = QdrantClient(":memory:")
+
+    def test_rebuild_holds_distributed_lock(self):
+        """Тест: сборка и откат берут Redis-блокировку kb:rebuild:{alias} и снимают ее."""
+        redis = FakeRedis()
+        collection = VersionedCollection(self.client, "kb", redis_client=redis)
+        collection.rebuild(self.tmp.name, LengthEmbeddings())
+        collection.rebuild(self.tmp.name, LengthEmbeddings())
+        collection.rollback()
+
+        self.assertEqual(redis.history, [("acquire", "kb:rebuild:kb"), ("release", "kb:rebuild:kb")] * 3)
+        self.assertEqual(redis.held, set())
+
+    def test_reload_waits_for_other_process(self):
+        """Тест: пока другой процесс собирает версию, перезагрузка не трогает теневую коллекцию и алиас."""
+        VersionedCollection(self.client, "kb").rebuild(self.tmp.name, LengthEmbeddings())
+        # Другой процесс начал сборку kb__v2 и держит блокировку
+        self.client.create_collection("kb__v2", vectors_config=VectorParams(size=3, distance=Distance.COSINE))
+        collection = VersionedCollection(self.client, "kb", redis_client=FakeRedis(held={"kb:rebuild:kb"}))
+
+        with open(self.tmp.name, "a", encoding="utf-8") as f:
+            f.write("\n#### Какая гарантия?\nОтвет: 12 месяцев.\n")
+        with self.assertRaises(RebuildLockedError):
+            collection.reload(self.tmp.name, LengthEmbeddings())
+
+        self.assertEqual(collection.active_collection(), "kb__v1")
+        self.assertEqual(self.client.count("kb__v2").count, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+import os
+import tempfile
+import unittest
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from app.core.models.conversation import BOT, CLIENT, Turn, bot_turn, client_turn, to_messages
+from app.adapters.conversation.memory_store import MemoryConversationStore
+from app.adapters.conversation.redis_store import RedisConversationStore, dump_turn, load_turn
+from app.adapters.conversation.sqlite_store import SqliteConversationStore
+
+
+def dialog(n):
+    return [client_turn(f"вопрос {i}") if i % 2 == 0 else bot_turn(f"ответ {i}") for i in range(n)]
+
+
+class StoreContract:
+    """Общие проверки для всех бэкендов (make_store задают наследники)."""
+
+    async def test_append_and_window(self):
+        store = self.make_store(max_turns=4)
+        await store.append("c1", dialog(2))
+        await store.append("c1", [client_turn("еще вопрос")])
+
+        window = await store.window("c1")
+        self.assertEqual([str(t) for t in window], ["Клиент: вопрос 0", "Бот: ответ 1", "Клиент: еще вопрос"])
+        self.assertEqual(await store.window("другой"), [])
+
+    async def test_window_is_bounded(self):
+        """Тест: хранится только окно последних max_turns реплик."""
+        store = self.make_store(max_turns=4)
+        for _ in range(5):
+            await store.append("c1", dialog(2))
+        await store.append("c1", [bot_turn("последний")])
+
+        window = await store.window("c1")
+        self.assertEqual(len(window), 4)
+        self.assertEqual(window[-1].text, "последний")
+        self.assertEqual(window[0].role, BOT)
+
+    async def test_load_and_save_state(self):
+        """Тест: стейт читается вместе с историей, поля обновляются по одному, reset начинает заново."""
+        store = self.make_store(max_turns=4)
+        await store.save("c1", [bot_turn("привет")], state={"step": "collect_name"})
+        await store.save("c1", dialog(2), state={"bot_name": "Ромашка", "thread_id": None})
+
+        history, state = await store.load("c1")
+        self.assertEqual(len(history), 3)
+        self.assertEqual(state, {"step": "collect_name", "bot_name": "Ромашка", "thread_id": None})
+
+        await store.save("c1", [bot_turn("снова привет")], reset=True)
+        history, state = await store.load("c1")
+        self.assertEqual([t.text for t in history], ["снова привет"])
+        self.assertEqual(state, {})
+
+    async def test_clear(self):
+        store = self.make_store(max_turns=4)
+        await store.append("c1", dialog(2))
+        await store.clear("c1")
+        self.assertEqual(await store.window("c1"), [])
+
+
+class TestMemoryStore(StoreContract, unittest.IsolatedAsyncioTestCase):
+
+    def make_store(self, max_turns):
+        return MemoryConversationStore(max_turns=max_turns)
+
+    async def test_least_recent_conversations_are_evicted(self):
+        store = MemoryConversationStore(max_turns=4, max_conversations=2)
+        await store.append("a", dialog(1))
+        await store.append("b", dialog(1))
+        await store.append("a", dialog(1))
+        await store.append("c", dialog(1))
+
+        self.assertEqual(await store.window("b"), [])
+        self.assertEqual(len(await store.window("a")), 2)
+
+    async def test_ttl(self):
+        store = MemoryConversationStore(max_turns=4, ttl_seconds=0)
+        await store.append("a", dialog(1))
+        self.assertEqual(await store.window("a"), [])
+
+
+class TestSqliteStore(StoreContract, unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "sessions", "conversations.db")
+        self.stores = []
+
+    def tearDown(self):
+        for store in self.stores:
+            store.close()
+        self.tmp.cleanup()
+
+    def make_store(self, max_turns):
+        store = SqliteConversationStore(self.path, max_turns=max_turns)
+        self.stores.append(store)
+        return store
+
+    async def test_history_survives_restart(self):
+        """Тест: история на диске переживает перезапуск процесса."""
+        await self.make_store(max_turns=4).append("wb_chat:1", dialog(2))
+        window = await self.make_store(max_turns=4).window("wb_chat:1")
+        self.assertEqual([t.text for t in window], ["вопрос 0", "ответ 1"])
+
+
+class TestRedisStore(StoreContract, unittest.IsolatedAsyncioTestCase):
+    """Нужен живой Redis (REDIS_URL), иначе тесты пропускаются."""
+
+    async def asyncSetUp(self):
+        url = os.getenv("REDIS_URL")
+        if not url:
+            self.skipTest("REDIS_URL не задан")
+        import redis.asyncio as redis
+        self.redis = redis.from_url(url, decode_responses=True)
+        try:
+            await self.redis.ping()
+        except Exception as e:
+            self.skipTest(f"Redis недоступен: {e}")
+        for conversation_id in ("c1", "другой"):
+            await RedisConversationStore(self.redis).clear(conversation_id)
+
+    async def asyncTearDown(self):
+        await self.redis.aclose()
+
+    def make_store(self, max_turns):
+        return RedisConversationStore(self.redis, max_turns=max_turns, ttl_seconds=60)
+
+
+class TestTurn(unittest.TestCase):
+
+    def test_legacy_format_round_trip(self):
+        self.assertEqual(Turn.parse("Клиент: привет").role, CLIENT)
+        self.assertEqual(Turn.parse("Бот: здравствуйте").text, "здравствуйте")
+        self.assertIsNone(Turn.parse("что-то другое"))
+        self.assertEqual(str(bot_turn("ок")), "Бот: ок")
+
+    def test_compact_redis_format(self):
+        turn = Turn(CLIENT, "цена | со скидкой?", 1718000000.0)
+        self.assertEqual(dump_turn(turn), "c1718000000|цена | со скидкой?")
+        self.assertEqual(load_turn(dump_turn(turn)), turn)
+        # Реплики в JSON, записанные до компактного формата, тоже читаются
+        self.assertEqual(load_turn('{"r": "bot", "t": "ок", "at": 1.0}'), Turn(BOT, "ок", 1.0))
+
+    def test_to_messages(self):
+        messages = to_messages([client_turn("a"), bot_turn("b")], "c")
+        self.assertEqual([type(m) for m in messages], [HumanMessage, AIMessage, HumanMessage])
+        self.assertEqual(messages[-1].content, "c")
+
+
+if __name__ == '__main__':
+    unittest.main()
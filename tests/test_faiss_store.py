@@ -0,0 +1,104 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+try:
+    import faiss  # noqa: F401
+    HAS_FAISS = True
+except ImportError:
+    HAS_FAISS = False
+
+from fakes import WordHashEmbeddings
+
+KB = """#### Как подключить пульт?
+Ответ: зажмите OK на 5 секунд.
+
+#### Нужен ли интернет?
+Ответ: {internet}
+
+#### Какая гарантия?
+Ответ: 12 месяцев.
+"""
+
+
+@unittest.skipUnless(HAS_FAISS, "faiss не установлен")
+class TestNativeFaissStore(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+        self.kb_path = os.path.join(self.dir, "kb.md")
+        self.index_path = os.path.join(self.dir, "faiss_index")
+        self.embeddings = WordHashEmbeddings()
+
+    def _write_kb(self, internet):
+        with open(self.kb_path, "w", encoding="utf-8") as f:
+            f.write(KB.format(internet=internet))
+
+    def test_native_format_roundtrip(self):
+        """Тест: индекс пишется без pickle и читается через mmap с сайдкаром."""
+        from app.adapters.retriever.faiss_store import NativeFaissStore, sync_native_index
+
+        self._write_kb("да, для онлайн-каналов.")
+        sync_native_index(self.index_path, self.kb_path, self.embeddings)
+
+        self.assertEqual(sorted(os.listdir(self.index_path)), ["chunks.jsonl", "index.faiss", "manifest.json", "offsets.npy"])
+        store = NativeFaissStore.open(self.index_path, verify=True)
+        ids = store.search(np.asarray(self.embeddings.embed_query("Какая гарантия?")), 1)
+        content, metadata = store.chunk(ids[0])
+        self.assertIn("12 месяцев", content)
+        self.assertEqual(metadata["question"], "Какая гарантия?")
+
+    def test_incremental_sync_reuses_vectors(self):
+        """Тест: при изменении одного чанка эмбеддится только он, остальные векторы берутся из индекса."""
+        from app.adapters.retriever.faiss_store import sync_native_index
+
+        self._write_kb("да.")
+        sync_native_index(self.index_path, self.kb_path, self.embeddings)
+        self._write_kb("нет, каналы работают и без него.")
+        store, plan = sync_native_index(self.index_path, self.kb_path, self.embeddings)
+
+        self.assertEqual((plan.changed, plan.unchanged), (1, 2))
+        self.assertEqual(self.embeddings.embedded, 4)
+        self.assertEqual(len(store), 3)
+
+    def test_empty_knowledge_base(self):
+        """Тест: пустая база знаний дает пустой индекс (размерность — пробным embed_query), потом наполняется."""
+        from app.adapters.retriever.faiss_store import NativeFaissStore, sync_native_index
+
+        with open(self.kb_path, "w", encoding="utf-8") as f:
+            f.write("")
+        store, plan = sync_native_index(self.index_path, self.kb_path, self.embeddings)
+
+        self.assertEqual(len(store), 0)
+        self.assertEqual(store.manifest["dim"], 64)
+        self.assertEqual(store.search(np.asarray(self.embeddings.embed_query("гарантия")), 3), [])
+
+        self._write_kb("да.")
+        store, plan = sync_native_index(self.index_path, self.kb_path, self.embeddings)
+        self.assertEqual((len(store), plan.added), (3, 3))
+        self.assertEqual(len(NativeFaissStore.open(self.index_path, verify=True)), 3)
+
+    def test_legacy_pickle_index_is_migrated(self):
+        """Тест: старый формат LangChain (index.pkl) конвертируется один раз без переэмбеддинга."""
+        from langchain_community.vectorstores import FAISS
+        from app.adapters.retriever.faiss_store import NativeFaissStore, migrate_legacy_index
+        from app.adapters.retriever.kb_indexer import build_chunks, split_knowledge_base
+
+        self._write_kb("да.")
+        docs = build_chunks(split_knowledge_base(self.kb_path))
+        FAISS.from_documents(docs, self.embeddings, ids=[d.metadata["chunk_id"] for d in docs]).save_local(self.index_path)
+        embedded_before = self.embeddings.embedded
+
+        self.assertTrue(migrate_legacy_index(self.index_path, self.embeddings))
+        self.assertFalse(migrate_legacy_index(self.index_path, self.embeddings))
+        self.assertFalse(os.path.exists(os.path.join(self.index_path, "index.pkl")))
+        self.assertEqual(self.embeddings.embedded, embedded_before)
+        self.assertEqual(NativeFaissStore.open(self.index_path).stored_hashes().keys(), {d.metadata["chunk_id"] for d in docs})
+
+
+if __name__ == '__main__':
+    unittest.main()
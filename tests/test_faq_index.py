@@ -0,0 +1,141 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import numpy as np
+from qdrant_client import QdrantClient
+
+from app.core.models.chunk import RetrievedChunk
+from app.core.ports.llm import LLMClient
+from app.core.ports.retriever import KnowledgeRetriever
+from app.core.use_cases.answer_question import AnswerQuestionUseCase
+from app.adapters.retriever.collection_versions import VersionedCollection
+from app.adapters.retriever.faq_index import FaqConfig, FaqEntry, FaqIndex, FaqIndexBuilder, approved_answer, faq_collection_name
+from app.adapters.retriever.kb_indexer import build_chunks, split_knowledge_base
+from app.adapters.retriever.qdrant_adapter import QdrantRetrieverAdapter
+
+from fakes import WordHashEmbeddings
+
+KB = """# Продукт: Приставки
+
+## Категория: Общие вопросы
+
+### Вопрос: Как подключить пульт?
+Ответ: зажмите OK на 5 секунд.
+
+### Вопрос: Нужен ли интернет для работы приставки?
+Ответ: да, для онлайн-каналов.
+
+### Вопрос: Есть ли гарантия?
+Ответ: 12 месяцев.
+Готовый ответ: Здравствуйте! Гарантия 12 месяцев с даты покупки.
+"""
+
+
+def write_kb(test, text):
+    tmp = tempfile.NamedTemporaryFile("w", suffix=".md", delete=False, encoding="utf-8")
+    tmp.write(text)
+    tmp.close()
+    test.addCleanup(os.remove, tmp.name)
+    return tmp.name
+
+
+class TestFaqIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.kb_path = write_kb(self, KB)
+        with patch.dict(os.environ, {"QDRANT_URL": "http://127.0.0.1:1"}):
+            self.adapter = QdrantRetrieverAdapter(collection_name="kb", knowledge_base_path=self.kb_path, faq={"min_similarity": 0.7})
+        self.adapter.client = QdrantClient(":memory:")
+        self.embeddings = WordHashEmbeddings()
+        self.adapter._embeddings = self.embeddings
+        self.active = VersionedCollection(self.adapter.client, "kb").rebuild(self.kb_path, self.embeddings)
+        self.adapter._ready = True
+
+    def test_built_next_to_versioned_collection(self):
+        """Тест: FAQ-индекс строится рядом с версией коллекции, заголовки — без префикса 'Вопрос:'."""
+        index = FaqIndex.load(self.adapter.client, "kb")
+        self.assertTrue(self.adapter.client.collection_exists(faq_collection_name(self.active)))
+        self.assertEqual(len(index), 3)
+        self.assertIn("Как подключить пульт?", [e.question for e in index.entries])
+
+    def test_exact_header_match_skips_embedding_and_mmr(self):
+        """Тест: дословный вопрос (с другим регистром/пунктуацией) — одна секция без эмбеддинга запроса."""
+        self.adapter.faq_index()
+        self.embeddings.calls = self.embeddings.queries = 0
+
+        chunks = self.adapter.retrieve("как подключить пульт", k=3)
+
+        self.assertEqual(self.embeddings.calls + self.embeddings.queries, 0)
+        self.assertEqual(len(chunks), 1)
+        self.assertIn("зажмите OK", chunks[0].content)
+        self.assertTrue(chunks[0].metadata["faq_match"])
+        self.assertEqual(chunks[0].score, 1.0)
+
+    def test_close_paraphrase_matches_by_header_embedding(self):
+        """Тест: близкая переформулировка находит секцию по эмбеддингу заголовка, далекий запрос идет в MMR."""
+        chunks = self.adapter.retrieve("как подключить пульт к приставке", k=3)
+        self.assertEqual(len(chunks), 1)
+        self.assertIn("зажмите OK", chunks[0].content)
+
+        self.assertGreater(len(self.adapter.retrieve("сколько стоит доставка", k=3)), 1)
+
+    def test_retrieve_many_mixes_faq_hits_and_search(self):
+        results = self.adapter.retrieve_many(["Есть ли гарантия?", "сколько стоит доставка"], k=3)
+        self.assertEqual(results[0][0].metadata["approved_answer"], "Здравствуйте! Гарантия 12 месяцев с даты покупки.")
+        self.assertGreater(len(results[1]), 1)
+
+    def test_ambiguous_headers_are_not_a_match(self):
+        """Тест: два почти одинаково близких заголовка — не уверенное совпадение."""
+        index = FaqIndex([FaqEntry("Как подключить пульт?", ""), FaqEntry("Как подключить пульт к ТВ?", "")], np.array([[1.0, 0.0], [0.99, 0.1]]))
+        self.assertIsNone(index.nearest([1.0, 0.05], FaqConfig(min_similarity=0.5, min_margin=0.05)))
+
+    def test_incremental_sync_embeds_only_changed_headers(self):
+        """Тест: при правке ответа заголовок не переэмбеддится, при новом вопросе — только он."""
+        chunks = build_chunks(split_knowledge_base(write_kb(self, KB.replace("12 месяцев.", "24 месяца.") + "\n### Вопрос: Какой размер приставки?\nОтвет: 82 мм.\n")))
+        self.embeddings.texts = []
+
+        embedded = FaqIndexBuilder(self.adapter.client, "kb", self.embeddings).sync(chunks)
+
+        self.assertEqual(embedded, 1)
+        self.assertEqual(self.embeddings.texts, ["Какой размер приставки?"])
+
+    def test_approved_answer_parsing(self):
+        self.assertEqual(approved_answer("Ответ: да.\nГотовый ответ: Да, конечно.\nСпасибо!"), "Да, конечно.\nСпасибо!")
+        self.assertIsNone(approved_answer("Ответ: да."))
+
+
+class TestDirectAnswer(unittest.IsolatedAsyncioTestCase):
+
+    def make_use_case(self, faq_config):
+        llm = AsyncMock(spec=LLMClient)
+        llm.generate.return_value = "есть ли гарантия"
+        retriever = MagicMock(spec=KnowledgeRetriever)
+        retriever.aretrieve.return_value = [RetrievedChunk(
+            content="### Вопрос: Есть ли гарантия?\nГотовый ответ: Гарантия 12 месяцев.",
+            score=1.0,
+            metadata={"faq_match": True, "approved_answer": "Гарантия 12 месяцев."},
+        )]
+        return llm, AnswerQuestionUseCase(llm=llm, retriever=retriever, client_config={"id": "next", "faq": faq_config})
+
+    async def test_marketplace_question_gets_approved_answer_without_generation(self):
+        """Тест: вопрос с WB при включенных direct_answers — готовый ответ, LLM вызывается только для переписывания."""
+        llm, use_case = self.make_use_case({"direct_answers": True})
+        answer = await use_case.execute(user_id="wb_question_1", question="Гарантия есть?", source="wb")
+        self.assertEqual(answer, "Гарантия 12 месяцев.")
+        self.assertEqual(llm.generate.call_count, 1)
+
+    async def test_other_sources_and_disabled_config_still_generate(self):
+        """Тест: в чатах и без флага ответ генерируется как обычно."""
+        llm, use_case = self.make_use_case({"direct_answers": True})
+        await use_case.execute(user_id="1", question="Гарантия есть?", source="telegram")
+        self.assertEqual(llm.generate.call_count, 2)
+
+        llm, use_case = self.make_use_case(None)
+        await use_case.execute(user_id="wb_question_1", question="Гарантия есть?", source="wb")
+        self.assertEqual(llm.generate.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.http.models import PointStruct
+
+from app.adapters.retriever.index_profiles import INDEX_PROFILES, resolve_index_profile
+
+
+class TestIndexProfiles(unittest.TestCase):
+
+    def test_resolve_presets_and_overrides(self):
+        """Тест: профиль задается именем пресета, словарем или JSON-строкой из окружения."""
+        self.assertIs(resolve_index_profile(None), INDEX_PROFILES["default"])
+        self.assertIs(resolve_index_profile("compact"), INDEX_PROFILES["compact"])
+        self.assertIs(resolve_index_profile("no_such_profile"), INDEX_PROFILES["default"])
+
+        custom = resolve_index_profile({"preset": "compact", "hnsw_ef": 256, "m": 32})
+        self.assertEqual(custom.quantization, "int8")
+        self.assertTrue(custom.on_disk)
+        self.assertEqual((custom.m, custom.hnsw_ef), (32, 256))
+
+        from_env = resolve_index_profile('{"quantization": "binary", "oversampling": 4}')
+        self.assertEqual(from_env.quantization, "binary")
+        self.assertEqual(from_env.oversampling, 4)
+
+    def test_default_profile_keeps_previous_behaviour(self):
+        """Тест: профиль по умолчанию не добавляет квантизацию и параметры поиска."""
+        profile = INDEX_PROFILES["default"]
+        config = profile.vectors_config(1536)
+        self.assertIsNone(config.quantization_config)
+        self.assertIsNone(config.hnsw_config)
+        self.assertIsNone(profile.search_params())
+
+    def test_quantized_profile_search_params(self):
+        """Тест: для квантизованного профиля поиск идет с оверсемплингом и рескорингом."""
+        params = INDEX_PROFILES["compact"].search_params()
+        self.assertTrue(params.quantization.rescore)
+        self.assertEqual(params.quantization.oversampling, 2.0)
+
+    def test_memory_estimate_drops_several_fold(self):
+        """Тест: int8 + on_disk и binary заметно уменьшают оценку RAM."""
+        default = INDEX_PROFILES["default"].estimated_ram_bytes(10000, 1536)
+        self.assertGreater(default / INDEX_PROFILES["compact"].estimated_ram_bytes(10000, 1536), 3)
+        self.assertGreater(default / INDEX_PROFILES["binary"].estimated_ram_bytes(10000, 1536), 10)
+
+    def test_collection_created_with_profile(self):
+        """Тест: коллекция создается с квантизацией профиля, поиск с search_params работает."""
+        client = QdrantClient(":memory:")
+        profile = INDEX_PROFILES["compact"]
+        client.create_collection("kb", vectors_config=profile.vectors_config(4))
+        client.upsert("kb", points=[PointStruct(id=i, vector=np.eye(4)[i].tolist()) for i in range(4)])
+
+        points = client.query_points("kb", query=[1.0, 0.1, 0.0, 0.0], limit=1, search_params=profile.search_params()).points
+        self.assertEqual(points[0].id, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import asyncio
+import unittest
+from langchain_core.documents import Document
+from qdrant_client import QdrantClient
+from qdrant_client.http.models import Distance, VectorParams
+
+from app.adapters.retriever.ingestion import EmbeddingIngestionPipeline, batch_by_tokens, is_rate_limit_error
+from app.utils.retry import RetryPolicy
+
+from fakes import LengthEmbeddings
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+class FlakyEmbeddings(LengthEmbeddings):
+    """Фейковые эмбеддинги: первый вызов отвечает 429, дальше — нормально."""
+    def __init__(self, failures: int = 1):
+        super().__init__()
+        self.failures = failures
+
+    def embed_documents(self, texts):
+        if self.failures > 0:
+            self.failures -= 1
+            raise RateLimitError("429 Too Many Requests")
+        return super().embed_documents(texts)
+
+
+def _docs(n: int):
+    return [Document(page_content=f"Ответ номер {i}", metadata={"chunk_id": i + 1, "content_hash": str(i)}) for i in range(n)]
+
+
+class TestIngestionPipeline(unittest.TestCase):
+
+    def test_batches_respect_item_limit(self):
+        """Батчи не превышают лимит по количеству текстов и сохраняют все чанки."""
+        batches = batch_by_tokens(_docs(10), max_tokens=10_000, max_items=4)
+        self.assertEqual([len(b) for b in batches], [4, 4, 2])
+
+    def test_batches_respect_token_limit(self):
+        """Маленький лимит токенов режет каждый чанк в отдельный батч."""
+        batches = batch_by_tokens(_docs(3), max_tokens=1)
+        self.assertEqual(len(batches), 3)
+
+    def test_rate_limit_detection(self):
+        """429 в тексте ошибки считается лимитом, только если рядом сказано про rate limit."""
+        self.assertTrue(is_rate_limit_error(RateLimitError("лимит")))
+        self.assertTrue(is_rate_limit_error(Exception("Error code: 429 - Rate limit reached for requests")))
+        self.assertFalse(is_rate_limit_error(Exception("chunk 429 не найден")))
+        self.assertFalse(is_rate_limit_error(Exception("context length 14290 tokens exceeds limit")))
+
+    def test_rate_limit_is_retried_and_all_points_upserted(self):
+        """429 ретраится, коллекция создается по первому батчу, в ней оказываются все чанки."""
+        client = QdrantClient(":memory:")
+
+        def ensure_collection(size):
+            client.create_collection("kb_ingest", vectors_config=VectorParams(size=size, distance=Distance.COSINE))
+
+        embeddings = FlakyEmbeddings(failures=1)
+        pipeline = EmbeddingIngestionPipeline(
+            client, "kb_ingest", embeddings,
+            ensure_collection=ensure_collection,
+            max_batch_tokens=20,
+            max_concurrency=2,
+            retry_policy=RetryPolicy(max_attempts=3, base_delay_s=0.0, max_delay_s=0.0),
+        )
+        pipeline._retry_after_seconds = lambda exc: 0.0
+
+        stats = asyncio.run(pipeline.run(_docs(7)))
+
+        self.assertEqual(stats.embedded, 7)
+        self.assertEqual(stats.rate_limited, 1)
+        self.assertEqual(client.count("kb_ingest").count, 7)
+
+    def test_non_retryable_error_propagates(self):
+        """Ошибка авторизации (401) не ретраится и прерывает загрузку."""
+        class AuthError(Exception):
+            status_code = 401
+
+        class BrokenEmbeddings:
+            calls = 0
+
+            def embed_documents(self, texts):
+                BrokenEmbeddings.calls += 1
+                raise AuthError("invalid api key")
+
+        pipeline = EmbeddingIngestionPipeline(QdrantClient(":memory:"), "kb_ingest", BrokenEmbeddings(), max_concurrency=1)
+        with self.assertRaises(AuthError):
+            asyncio.run(pipeline.run(_docs(2)))
+        self.assertEqual(BrokenEmbeddings.calls, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
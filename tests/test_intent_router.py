@@ -0,0 +1,211 @@
+import threading
+import time
+import unittest
+
+from langchain_core.embeddings import Embeddings
+
+from app.core.ports.llm import LLMClient
+from app.core.ports.retriever import KnowledgeRetriever
+from app.core.scenarios.universal_graph import UniversalScenarioGraph
+from app.adapters.embeddings.query_memo import QueryVectorMemo
+from app.adapters.intent.centroid_classifier import (
+    CentroidIntentClassifier, DecisionLog, IntentRouterConfig, resolve_intent_router,
+)
+
+KEYWORDS = ("купить", "цена", "тариф", "не работает", "ошибка", "сломался")
+
+
+class KeywordEmbeddings(Embeddings):
+    """Эмбеддинг — вхождения ключевых слов: продажи и поддержка разносятся по разным осям."""
+    def __init__(self):
+        self.calls = 0
+        self.queries = 0
+
+    def _vector(self, text):
+        text = text.lower()
+        return [1.0 if word in text else 0.0 for word in KEYWORDS] + [0.1]
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text):
+        self.queries += 1
+        return self._vector(text)
+
+
+class CountingLLM(LLMClient):
+    def __init__(self, intent="support"):
+        self.intent = intent
+        self.router_calls = 0
+
+    async def generate(self, prompt):
+        if isinstance(prompt, str):
+            self.router_calls += 1
+            return self.intent
+        return "ответ"
+
+
+class EmptyRetriever(KnowledgeRetriever):
+    def retrieve(self, query, k=6):
+        return []
+
+
+EXAMPLES = {
+    "sales": ["хочу купить приставку", "какая цена тарифа", "купить тариф"],
+    "support": ["интернет не работает", "ошибка при входе", "сломался пульт"],
+}
+
+
+def make_classifier(**overrides):
+    embeddings = KeywordEmbeddings()
+    config = IntentRouterConfig(examples=EXAMPLES, **overrides)
+    return CentroidIntentClassifier("test_bot", lambda: embeddings, config, log=DecisionLog("test_bot", 100)), embeddings
+
+
+class TestCentroidClassifier(unittest.IsolatedAsyncioTestCase):
+
+    async def test_confident_prediction(self):
+        """Тест: сообщение с явными признаками относится к нужному интенту уверенно."""
+        classifier, _ = make_classifier()
+        await classifier.warm_up()
+        prediction = await classifier.classify("сколько стоит тариф, хочу купить")
+        self.assertEqual(prediction.intent, "sales")
+        self.assertTrue(prediction.confident)
+
+        prediction = await classifier.classify("ничего не работает, ошибка")
+        self.assertEqual(prediction.intent, "support")
+        self.assertTrue(prediction.confident)
+
+    async def test_ambiguous_message_is_not_confident(self):
+        """Тест: без признаков отрыв между центроидами мал — решение за LLM."""
+        classifier, _ = make_classifier()
+        await classifier.warm_up()
+        prediction = await classifier.classify("здравствуйте")
+        self.assertFalse(prediction.confident)
+
+    async def test_single_label_is_not_enough(self):
+        """Тест: с одним интентом в примерах классификатор не обучается."""
+        embeddings = KeywordEmbeddings()
+        config = IntentRouterConfig(examples={"sales": EXAMPLES["sales"]})
+        classifier = CentroidIntentClassifier("test_bot", lambda: embeddings, config, log=DecisionLog("test_bot", 100))
+        await classifier.warm_up()
+        self.assertIsNone(await classifier.classify("купить"))
+
+    async def test_classify_does_not_wait_for_fit(self):
+        """Тест: первое сообщение не ждет обучения — None (решает LLM), центроиды считаются в фоне."""
+        classifier, embeddings = make_classifier()
+        self.assertIsNone(await classifier.classify("купить"))
+        self.assertEqual(embeddings.queries, 0)
+
+        await classifier.warm_up()
+        self.assertEqual((await classifier.classify("купить")).intent, "sales")
+
+    async def test_recorded_decisions_need_no_embeddings(self):
+        """Тест: решение LLM сразу сдвигает центроид, вектор берется из classify, переобучение не зовет модель."""
+        classifier, embeddings = make_classifier(refit_every=2)
+        await classifier.warm_up()
+        self.assertEqual(embeddings.calls, 1)
+
+        self.assertFalse((await classifier.classify("здравствуйте")).confident)
+        await classifier.record("здравствуйте", "support")
+        await classifier.record("здравствуйте", "support")
+        self.assertEqual(embeddings.queries, 1)
+        self.assertEqual(classifier._counts["support"], 5)
+
+        await classifier.warm_up()
+        self.assertEqual(embeddings.calls, 1)
+        self.assertEqual(classifier._counts, {"sales": 3, "support": 5})
+        self.assertEqual(len(classifier.training_set()), 8)
+
+    async def test_decision_during_refit_is_kept(self):
+        """Тест: решение, записанное между снимком лога и подменой сумм, не теряется и не считается дважды."""
+        classifier, _ = make_classifier()
+        await classifier.warm_up()
+
+        samples = classifier.snapshot()
+        await classifier.record("купить роутер", "sales")
+        classifier.fit(samples)
+        self.assertEqual(classifier._counts, {"sales": 4, "support": 3})
+
+        classifier.fit(classifier.snapshot())
+        self.assertEqual(classifier._counts, {"sales": 4, "support": 3})
+
+    async def test_log_keeps_vectors(self):
+        """Тест: вектор решения хранится в логе; записи без вектора эмбеддятся при обучении."""
+        embeddings = KeywordEmbeddings()
+        log = DecisionLog("test_bot", 100)
+        log.append("сломался роутер", "support")
+        classifier = CentroidIntentClassifier("test_bot", lambda: embeddings, IntentRouterConfig(examples=EXAMPLES), log=log)
+        await classifier.warm_up()
+        self.assertEqual(classifier._counts["support"], 4)
+
+        await classifier.record("купить роутер", "sales")
+        _, _, vector = log.load_samples()[-1]
+        self.assertEqual(len(vector), len(KEYWORDS) + 1)
+        self.assertEqual(log.load()[-1], ("купить роутер", "sales"))
+
+    def test_resolve_config(self):
+        self.assertIsNone(resolve_intent_router(False))
+        self.assertIsNone(resolve_intent_router({"enabled": False}))
+        config = resolve_intent_router({"min_margin": 0.2, "unknown_key": 1})
+        self.assertEqual(config.min_margin, 0.2)
+
+
+class TestGraphRouting(unittest.IsolatedAsyncioTestCase):
+
+    async def test_confident_intent_skips_llm_router(self):
+        """Тест: уверенный классификатор — граф не вызывает LLM-маршрутизатор."""
+        classifier, _ = make_classifier()
+        await classifier.warm_up()
+        llm = CountingLLM()
+        graph = UniversalScenarioGraph(llm, EmptyRetriever(), {"name": "test", "prompts": {}}, intent_classifier=classifier)
+
+        await graph.execute("хочу купить тариф")
+        self.assertEqual(llm.router_calls, 0)
+
+    async def test_unsure_intent_falls_back_to_llm_and_records(self):
+        """Тест: неуверенный классификатор — решает LLM, решение пишется в лог для дообучения."""
+        classifier, _ = make_classifier()
+        llm = CountingLLM(intent="support")
+        graph = UniversalScenarioGraph(llm, EmptyRetriever(), {"name": "test", "prompts": {}}, intent_classifier=classifier)
+
+        await graph.execute("добрый день")
+        self.assertEqual(llm.router_calls, 1)
+        self.assertEqual(classifier.log.load(), [("добрый день", "support")])
+
+
+class SlowEmbeddings(KeywordEmbeddings):
+    def embed_query(self, text):
+        time.sleep(0.05)
+        return super().embed_query(text)
+
+
+class TestQueryVectorMemo(unittest.TestCase):
+
+    def test_concurrent_queries_share_one_call(self):
+        """Тест: ретривер и классификатор параллельно эмбеддят одно сообщение — модель вызывается один раз."""
+        embeddings = SlowEmbeddings()
+        memo = QueryVectorMemo(embeddings)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(memo.embed_query("купить тариф"))) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(embeddings.queries, 1)
+        self.assertEqual(len({tuple(r) for r in results}), 1)
+        memo.embed_query("другое сообщение")
+        self.assertEqual(embeddings.queries, 2)
+
+    def test_expired_vector_is_recomputed(self):
+        embeddings = KeywordEmbeddings()
+        memo = QueryVectorMemo(embeddings, ttl_seconds=0.0)
+        memo.embed_query("купить")
+        memo.embed_query("купить")
+        self.assertEqual(embeddings.queries, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
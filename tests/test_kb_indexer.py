@@ -0,0 +1,79 @@
+import os
+import tempfile
+import unittest
+from qdrant_client import QdrantClient
+
+from app.adapters.retriever.kb_indexer import QdrantKnowledgeIndexer
+
+from fakes import LengthEmbeddings
+
+KB_TEMPLATE = """# Продукт: ТВ-Приставки NEXT
+
+## Категория: Подключение
+
+#### Как подключить приставку к телевизору?
+Ответ: через HDMI-кабель.
+
+#### Как подключить пульт?
+Ответ: {remote_answer}
+
+## Категория: Интернет
+
+#### Нужен ли интернет?
+Ответ: да, для онлайн-каналов.
+"""
+
+
+class TestIncrementalIndexer(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.NamedTemporaryFile("w", suffix=".md", delete=False, encoding="utf-8")
+        self.tmp.close()
+        self.client = QdrantClient(":memory:")
+        self.embeddings = LengthEmbeddings()
+        self.indexer = QdrantKnowledgeIndexer(self.client, "kb_test", self.embeddings)
+
+    def tearDown(self):
+        os.remove(self.tmp.name)
+
+    def _write_kb(self, text):
+        with open(self.tmp.name, "w", encoding="utf-8") as f:
+            f.write(text)
+
+    def test_only_changed_chunks_are_reembedded(self):
+        """Тест: при правке одного ответа переэмбеддится только один чанк."""
+        self._write_kb(KB_TEMPLATE.format(remote_answer="зажмите OK на 5 секунд."))
+        plan = self.indexer.sync(self.tmp.name)
+        self.assertEqual(plan.added, 3)
+        # 3 чанка + 3 заголовка вопросов для FAQ-индекса
+        self.assertEqual(self.embeddings.embedded, 6)
+
+        self._write_kb(KB_TEMPLATE.format(remote_answer="зажмите OK и VOL- на 5 секунд."))
+        plan = self.indexer.sync(self.tmp.name)
+        self.assertEqual((plan.added, plan.changed, plan.unchanged, len(plan.to_delete)), (0, 1, 2, 0))
+        # Заголовок не менялся — FAQ-индекс его не переэмбеддит
+        self.assertEqual(self.embeddings.embedded, 7)
+        self.assertEqual(self.client.count("kb_test").count, 3)
+
+    def test_removed_chunks_are_deleted(self):
+        """Тест: удаленный из базы вопрос удаляется из коллекции."""
+        self._write_kb(KB_TEMPLATE.format(remote_answer="зажмите OK."))
+        self.indexer.sync(self.tmp.name)
+
+        self._write_kb(KB_TEMPLATE.split("## Категория: Интернет")[0].format(remote_answer="зажмите OK."))
+        plan = self.indexer.sync(self.tmp.name)
+        self.assertEqual(len(plan.to_delete), 1)
+        self.assertEqual(self.client.count("kb_test").count, 2)
+
+    def test_dry_run_does_not_write(self):
+        """Тест: dry-run показывает план, но ничего не эмбеддит и не пишет."""
+        self._write_kb(KB_TEMPLATE.format(remote_answer="зажмите OK."))
+        plan = self.indexer.sync(self.tmp.name, dry_run=True)
+
+        self.assertEqual(plan.added, 3)
+        self.assertGreater(plan.estimated_tokens, 0)
+        self.assertEqual(self.embeddings.embedded, 0)
+        self.assertFalse(self.client.collection_exists("kb_test"))
+
+if __name__ == '__main__':
+    unittest.main()
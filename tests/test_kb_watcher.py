@@ -0,0 +1,157 @@
+import os
+import tempfile
+import time
+import unittest
+from qdrant_client import QdrantClient
+
+from app.adapters.retriever.collection_versions import VersionedCollection
+from app.adapters.retriever.kb_watcher import KnowledgeBaseWatcher
+from app.utils.metrics import get_metrics
+
+from fakes import LengthEmbeddings
+
+KB_TEMPLATE = """# Продукт: ТВ-Приставки NEXT
+
+#### Как подключить пульт?
+Ответ: {remote_answer}
+
+#### Нужен ли интернет?
+Ответ: да, для онлайн-каналов.
+
+#### Есть ли гарантия?
+Ответ: 12 месяцев.
+"""
+
+
+class TestKnowledgeBaseWatcher(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.NamedTemporaryFile("w", suffix=".md", delete=False, encoding="utf-8")
+        tmp.write(KB_TEMPLATE.format(remote_answer="зажмите OK на 5 секунд."))
+        tmp.close()
+        self.addCleanup(os.remove, tmp.name)
+        self.kb_path = tmp.name
+        self.watcher = KnowledgeBaseWatcher(poll_interval=0.1, debounce_seconds=3.0)
+        self.watcher.watch(self.kb_path, lambda: None)
+
+    def _edit(self, text, mtime):
+        with open(self.kb_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.utime(self.kb_path, (mtime, mtime))
+
+    def test_reload_waits_for_debounce(self):
+        """Тест: перезагрузка — только после того, как файл не меняется debounce_seconds."""
+        self._edit(KB_TEMPLATE.format(remote_answer="зажмите HOME."), mtime=1_000)
+        self.assertEqual(self.watcher.due_files(now=100.0), [])
+        self.assertEqual(self.watcher.due_files(now=101.0), [])
+
+        # Повторное сохранение сдвигает окно
+        self._edit(KB_TEMPLATE.format(remote_answer="зажмите HOME и OK."), mtime=1_001)
+        self.assertEqual(self.watcher.due_files(now=102.0), [])
+        self.assertEqual(self.watcher.due_files(now=104.0), [])
+        self.assertEqual(self.watcher.due_files(now=105.5), [os.path.abspath(self.kb_path)])
+        self.assertEqual(self.watcher.due_files(now=120.0), [])
+
+    def test_touch_without_content_change_is_ignored(self):
+        """Тест: изменился только mtime — пересборки нет."""
+        os.utime(self.kb_path, (2_000, 2_000))
+        self.watcher.due_files(now=100.0)
+        self.assertEqual(self.watcher.due_files(now=110.0), [])
+
+
+class TestReloadRetry(unittest.IsolatedAsyncioTestCase):
+
+    async def test_failed_reload_is_retried(self):
+        """Тест: колбэк упал (429) или вернул False — изменение не считается учтенным, перезагрузка повторяется."""
+        tmp = tempfile.NamedTemporaryFile("w", suffix=".md", delete=False, encoding="utf-8")
+        tmp.write(KB_TEMPLATE.format(remote_answer="зажмите OK."))
+        tmp.close()
+        self.addCleanup(os.remove, tmp.name)
+        results = [RuntimeError("429 Too Many Requests"), False, True]
+        calls = []
+
+        def reload():
+            calls.append(1)
+            result = results[len(calls) - 1]
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        watcher = KnowledgeBaseWatcher(debounce_seconds=3.0)
+        watcher.watch(tmp.name, reload)
+        with open(tmp.name, "w", encoding="utf-8") as f:
+            f.write(KB_TEMPLATE.format(remote_answer="зажмите HOME."))
+        os.utime(tmp.name, (1_000, 1_000))
+        watched = watcher._files[os.path.abspath(tmp.name)]
+
+        watcher.due_files(now=0.0)
+        for _ in results:
+            self.assertEqual(watcher.due_files(now=time.monotonic() + 10), [watched.path])
+            await watcher._reload(watched)
+
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(watcher.due_files(now=time.monotonic() + 20), [])
+
+
+class TestIncrementalReload(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.NamedTemporaryFile("w", suffix=".md", delete=False, encoding="utf-8")
+        tmp.close()
+        self.addCleanup(os.remove, tmp.name)
+        self.kb_path = tmp.name
+        self.client = QdrantClient(":memory:")
+        self.collection = VersionedCollection(self.client, "kb")
+
+    def _write_kb(self, remote_answer):
+        with open(self.kb_path, "w", encoding="utf-8") as f:
+            f.write(KB_TEMPLATE.format(remote_answer=remote_answer))
+
+    def test_reload_embeds_only_changed_chunks_and_swaps_alias(self):
+        """Тест: новая версия собирается из старых векторов + эмбеддинги только измененного чанка."""
+        self._write_kb("зажмите OK на 5 секунд.")
+        self.collection.rebuild(self.kb_path, LengthEmbeddings())
+
+        self._write_kb("зажмите HOME и OK на 3 секунды.")
+        embeddings = LengthEmbeddings()
+        self.assertEqual(self.collection.reload(self.kb_path, embeddings), "kb__v2")
+
+        self.assertEqual(embeddings.embedded, 1)
+        self.assertEqual(self.collection.active_collection(), "kb__v2")
+        self.assertEqual(self.client.count("kb").count, 3)
+        # Старая версия остается для запросов, которые уже начались, и для отката
+        self.assertEqual(self.collection.versions(), [1, 2])
+
+    def test_reload_without_changes_keeps_version(self):
+        """Тест: если содержимое не изменилось, новая версия не создается."""
+        self._write_kb("зажмите OK на 5 секунд.")
+        self.collection.rebuild(self.kb_path, LengthEmbeddings())
+
+        embeddings = LengthEmbeddings()
+        self.assertIsNone(self.collection.reload(self.kb_path, embeddings))
+        self.assertEqual(embeddings.embedded, 0)
+        self.assertEqual(self.collection.versions(), [1])
+
+    def test_adapter_reload_records_metric(self):
+        """Тест: перезагрузка через адаптер пишет длительность в kb_reload_seconds."""
+        from unittest.mock import patch
+        from app.adapters.retriever.qdrant_adapter import QdrantRetrieverAdapter
+
+        self._write_kb("зажмите OK на 5 секунд.")
+        with patch.dict(os.environ, {"QDRANT_URL": "http://127.0.0.1:1"}):
+            adapter = QdrantRetrieverAdapter(collection_name="kb_metric", knowledge_base_path=self.kb_path)
+        adapter.client = self.client
+        adapter._embeddings = LengthEmbeddings()
+        VersionedCollection(self.client, "kb_metric").rebuild(self.kb_path, adapter.embeddings)
+        adapter._ready = True
+
+        self._write_kb("зажмите HOME.")
+        self.assertTrue(adapter.reload_knowledge_base())
+
+        series = [s for s in get_metrics().snapshot()["kb_reload_seconds"] if s["labels"]["collection"] == "kb_metric"]
+        self.assertEqual(series[0]["labels"]["result"], "swapped")
+        self.assertEqual(series[0]["count"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import asyncio
+import time
+import unittest
+
+from app.adapters.channels.wildberries.worker import WBFeedbacksWorker, WBQuestionsWorker
+from app.utils.concurrency import PostThrottle
+
+
+class FakeWBClient:
+    """Фейковый клиент WB: запоминает моменты публикаций."""
+    def __init__(self, questions=(), feedbacks=()):
+        self.questions = list(questions)
+        self.feedbacks = list(feedbacks)
+        self.posted_at = []
+
+    async def get_unanswered_questions(self, date_from=None):
+        return self.questions
+
+    async def get_unanswered_feedbacks(self, date_from=None):
+        return self.feedbacks
+
+    async def answer_question(self, id, text):
+        self.posted_at.append(time.monotonic())
+        return True
+
+    async def answer_feedback(self, id, text):
+        self.posted_at.append(time.monotonic())
+        return True
+
+
+class SlowUseCase:
+    """Генерация ответа 0.1 с; считает максимум одновременных генераций."""
+    def __init__(self):
+        self.active = 0
+        self.max_active = 0
+
+    async def execute(self, **kwargs):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(0.1)
+        self.active -= 1
+        return "ответ"
+
+
+def _questions(n):
+    return [{"id": f"q{i}", "text": f"вопрос {i}", "productDetails": {"productName": "Приставка"}} for i in range(n)]
+
+
+class TestPostThrottle(unittest.IsolatedAsyncioTestCase):
+
+    async def test_generation_concurrent_posts_spaced(self):
+        """Тест: ответы генерируются параллельно, а публикуются по одной с паузой min_interval."""
+        client = FakeWBClient(questions=_questions(4))
+        use_case = SlowUseCase()
+        worker = WBQuestionsWorker(client, use_case, concurrency=4, post_throttle=PostThrottle(0.05))
+
+        started = time.monotonic()
+        await worker.process_new_questions()
+
+        self.assertEqual(use_case.max_active, 4)
+        self.assertEqual(len(client.posted_at), 4)
+        gaps = [b - a for a, b in zip(client.posted_at, client.posted_at[1:])]
+        self.assertTrue(all(gap >= 0.045 for gap in gaps), gaps)
+        # Генерации шли одновременно: весь проход — одна генерация плюс паузы, а не четыре генерации
+        self.assertLess(time.monotonic() - started, 0.1 + 3 * 0.05 + 0.15)
+
+    async def test_throttle_shared_between_account_workers(self):
+        """Тест: вопросы и отзывы одного аккаунта публикуются через общую очередь."""
+        client = FakeWBClient(questions=_questions(2), feedbacks=[{"id": "f1", "text": "отлично"}, {"id": "f2", "text": "плохо"}])
+        throttle = PostThrottle(0.05)
+        questions = WBQuestionsWorker(client, SlowUseCase(), concurrency=4, post_throttle=throttle)
+        feedbacks = WBFeedbacksWorker(client, SlowUseCase(), concurrency=4, post_throttle=throttle)
+
+        await asyncio.gather(questions.process_new_questions(), feedbacks.process_new_feedbacks())
+
+        posted = sorted(client.posted_at)
+        self.assertEqual(len(posted), 4)
+        self.assertTrue(all(b - a >= 0.045 for a, b in zip(posted, posted[1:])))
+
+    async def test_cancelled_wait_releases_queue(self):
+        """Тест: отмена во время паузы не оставляет очередь занятой."""
+        throttle = PostThrottle(10.0)
+        async with throttle:
+            pass
+        waiter = asyncio.create_task(throttle.__aenter__())
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiter
+        self.assertFalse(throttle._lock.locked())
+
+
+if __name__ == '__main__':
+    unittest.main()
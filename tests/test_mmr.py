@@ -0,0 +1,44 @@
+import unittest
+import numpy as np
+from langchain_community.vectorstores.utils import maximal_marginal_relevance as langchain_mmr
+
+from app.adapters.retriever.mmr import maximal_marginal_relevance
+
+
+class TestVectorizedMMR(unittest.TestCase):
+
+    def test_matches_langchain_selection(self):
+        """Тест: наш MMR выбирает те же кандидаты и в том же порядке, что и LangChain."""
+        rng = np.random.default_rng(42)
+        for _ in range(20):
+            candidates = rng.normal(size=(20, 64)).astype(np.float32)
+            query = rng.normal(size=64).astype(np.float32)
+
+            expected = langchain_mmr(query, list(candidates), lambda_mult=0.7, k=6)
+            selected, _ = maximal_marginal_relevance(query, candidates, k=6, lambda_mult=0.7)
+
+            self.assertEqual(selected, expected)
+
+    def test_scores_are_cosine_similarity(self):
+        """Тест: score кандидата — косинусное сходство с запросом."""
+        query = np.array([1.0, 0.0])
+        candidates = np.array([[2.0, 0.0], [0.0, 3.0], [1.0, 1.0]])
+
+        selected, relevance = maximal_marginal_relevance(query, candidates, k=2)
+
+        self.assertEqual(selected[0], 0)
+        np.testing.assert_allclose(relevance, [1.0, 0.0, np.sqrt(0.5)], atol=1e-6)
+
+    def test_fewer_candidates_than_k(self):
+        """Тест: если кандидатов меньше k, возвращаем всех без повторов."""
+        candidates = np.eye(3)
+        selected, _ = maximal_marginal_relevance(np.ones(3), candidates, k=6)
+        self.assertEqual(sorted(selected), [0, 1, 2])
+
+    def test_empty_candidates(self):
+        selected, relevance = maximal_marginal_relevance(np.ones(3), np.empty((0, 3)), k=6)
+        self.assertEqual(selected, [])
+        self.assertEqual(len(relevance), 0)
+
+if __name__ == '__main__':
+    unittest.main()
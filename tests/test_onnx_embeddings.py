@@ -0,0 +1,90 @@
+import importlib.util
+import json
+import os
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from app.adapters.embeddings.factory import DEFAULT_LOCAL_MODEL, embedding_dimension, embedding_model_name
+from app.adapters.embeddings.onnx_embeddings import DEFAULT_MODEL_PATH, OnnxEmbeddings, embedding_parity, mean_pooling
+
+GOLDEN_QUESTIONS_PATH = Path(__file__).resolve().parent / "golden_questions.json"
+MODEL_PATH = os.getenv("ONNX_EMBEDDING_MODEL_PATH", DEFAULT_MODEL_PATH)
+
+
+class FakeEncoding:
+    def __init__(self, text):
+        self.ids = [len(word) for word in text.split()]
+        self.type_ids = [0] * len(self.ids)
+
+
+class FakeSession:
+    """Вектор токена = [id, 1.0]; запоминает ширину каждого батча."""
+    def __init__(self):
+        self.widths = []
+
+    def run(self, _, feeds):
+        self.widths.append(feeds["input_ids"].shape[1])
+        ids = feeds["input_ids"].astype(np.float32)
+        return [np.stack([ids, np.ones_like(ids)], axis=-1)]
+
+
+class FakeOnnxEmbeddings(OnnxEmbeddings):
+    """ONNX-эмбеддинги без модели: токен = слово, id токена = длина слова."""
+    def _load(self, num_threads):
+        self.session = FakeSession()
+        self.input_names = {"input_ids", "attention_mask"}
+        self.tokenizer = self
+
+    def encode_batch(self, texts):
+        return [FakeEncoding(t) for t in texts]
+
+
+class TestOnnxEmbeddings(unittest.TestCase):
+
+    def test_mean_pooling_ignores_padding(self):
+        tokens = np.array([[[1.0, 2.0], [3.0, 4.0], [100.0, 100.0]]])
+        mask = np.array([[1, 1, 0]])
+        np.testing.assert_allclose(mean_pooling(tokens, mask), [[2.0, 3.0]])
+
+    def test_dynamic_batches_pad_to_own_longest_text(self):
+        """Тест: тексты сортируются по длине, каждый батч паддится до своего максимума, порядок ответа исходный."""
+        embeddings = FakeOnnxEmbeddings("fake", batch_size=2)
+        texts = ["а " * 10, "бб", "ввв г", "дддд " * 8]
+
+        vectors = embeddings.embed_documents(texts)
+
+        self.assertEqual(embeddings.session.widths, [2, 10])
+        self.assertEqual([round(v[0], 2) for v in vectors], [1.0, 2.0, 2.0, 4.0])
+
+    def test_query_matches_document_vector(self):
+        embeddings = FakeOnnxEmbeddings("fake")
+        self.assertEqual(embeddings.embed_query("как подключить"), embeddings.embed_documents(["как подключить"])[0])
+
+    def test_same_model_as_local_provider(self):
+        """Тест: onnx использует ту же модель, что и local, — коллекции и калибровка общие."""
+        self.assertEqual(embedding_model_name("onnx"), embedding_model_name("local"))
+        self.assertEqual(embedding_dimension(embedding_model_name("onnx")), 384)
+
+
+@unittest.skipUnless(
+    os.path.isdir(MODEL_PATH) and importlib.util.find_spec("onnxruntime") and importlib.util.find_spec("sentence_transformers"),
+    "нужна экспортированная ONNX-модель (export_onnx_embeddings.py), onnxruntime и sentence-transformers",
+)
+class TestOnnxParity(unittest.TestCase):
+
+    def test_parity_with_huggingface_on_golden_questions(self):
+        """Тест: int8 ONNX-векторы совпадают с HuggingFaceEmbeddings на золотых вопросах."""
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+
+        with open(GOLDEN_QUESTIONS_PATH, "r", encoding="utf-8") as f:
+            questions = json.load(f)
+        report = embedding_parity(HuggingFaceEmbeddings(model_name=DEFAULT_LOCAL_MODEL), OnnxEmbeddings(MODEL_PATH), questions)
+
+        self.assertGreaterEqual(report["min_cosine"], 0.98)
+        self.assertGreaterEqual(report["neighbour_agreement"], 0.9)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import asyncio
+import time
+import unittest
+from dataclasses import dataclass, field
+from typing import List
+
+from app.core.models.chunk import RetrievedChunk
+from app.core.models.conversation import bot_turn, client_turn
+from app.core.ports.llm import LLMClient
+from app.core.ports.retriever import KnowledgeRetriever
+from app.core.scenarios.pipeline import Branch, LinearPipeline, PipelineState, Stage
+from app.core.scenarios.universal_graph import UniversalScenarioGraph
+
+DELAY = 0.2
+
+
+class SlowLLM(LLMClient):
+    """LLM с задержкой; запоминает системные промпты агентов."""
+    def __init__(self, intent="sales"):
+        self.intent = intent
+        self.system_prompts = []
+
+    async def generate(self, prompt):
+        await asyncio.sleep(DELAY)
+        if isinstance(prompt, str):
+            return self.intent
+        self.system_prompts.append(prompt[0].content)
+        return f"ответ ({len(prompt)} сообщений)"
+
+
+class SlowRetriever(KnowledgeRetriever):
+    def retrieve(self, query, k=6):
+        time.sleep(DELAY)
+        return [RetrievedChunk(content=f"контекст для {query}", score=0.9)]
+
+
+@dataclass
+class _State(PipelineState):
+    log: List[str] = field(default_factory=list)
+    route: str = ""
+
+
+class TestLinearPipeline(unittest.IsolatedAsyncioTestCase):
+
+    async def test_stage_runs_nodes_concurrently_and_merges_updates(self):
+        """Тест: узлы этапа идут параллельно, списки дописываются, поля заменяются."""
+        async def slow_a(state):
+            await asyncio.sleep(DELAY)
+            return {"log": ["a"]}
+
+        async def slow_b(state, runtime):
+            await asyncio.sleep(DELAY)
+            return {"log": [runtime.context], "route": "left"}
+
+        pipeline = LinearPipeline("test", [
+            Stage({"a": slow_a, "b": slow_b}),
+            Branch(lambda state: state["route"], {"left": lambda state: {"log": ["left"]}}),
+        ])
+
+        started = time.perf_counter()
+        state = await pipeline.ainvoke(_State(), context="ctx")
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(state.log, ["a", "ctx", "left"])
+        self.assertEqual(state.route, "left")
+        self.assertLess(elapsed, 1.8 * DELAY)
+
+
+class TestPipelineExecutor(unittest.IsolatedAsyncioTestCase):
+
+    async def test_same_answer_as_langgraph(self):
+        """Тест: бот с executor=pipeline отвечает так же, как через LangGraph, и с тем же промптом."""
+        answers, prompts = {}, {}
+        for executor in ("langgraph", "pipeline"):
+            llm = SlowLLM(intent="support")
+            bot = UniversalScenarioGraph(llm, SlowRetriever(), {"name": "test", "prompts": {"support": "ПОДДЕРЖКА {context}"}, "executor": executor})
+            answers[executor] = await bot.execute("не работает", history=[client_turn("привет"), bot_turn("здравствуйте")])
+            prompts[executor] = llm.system_prompts
+
+        self.assertEqual(answers["langgraph"], answers["pipeline"])
+        self.assertEqual(prompts["pipeline"], ["ПОДДЕРЖКА контекст для не работает"])
+        self.assertEqual(prompts["langgraph"], prompts["pipeline"])
+
+    async def test_router_and_retrieval_run_concurrently(self):
+        bot = UniversalScenarioGraph(SlowLLM(), SlowRetriever(), {"name": "test", "prompts": {}, "executor": "pipeline"})
+
+        started = time.perf_counter()
+        await bot.execute("сколько стоит?")
+        self.assertLess(time.perf_counter() - started, 2.8 * DELAY)
+
+
+if __name__ == '__main__':
+    unittest.main()
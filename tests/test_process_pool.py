@@ -0,0 +1,83 @@
+import asyncio
+import os
+import unittest
+
+from app.adapters.embeddings.process_pool import ProcessPoolEmbeddings
+from app.adapters.retriever.reranker import CrossEncoderReranker, PooledCrossEncoderReranker
+from app.core.models.chunk import RetrievedChunk
+
+
+class PidEmbeddings:
+    """Фейковая модель для воркера: вектор = [длина текста, pid процесса]."""
+    def embed_documents(self, texts):
+        if "сломай" in texts:
+            raise ValueError("модель упала")
+        return [[float(len(t)), float(os.getpid())] for t in texts]
+
+
+class KeywordReranker(CrossEncoderReranker):
+    """Кросс-энкодер без модели: релевантность = доля слов запроса в тексте."""
+    def _load(self, num_threads):
+        pass
+
+    def _predict(self, query, texts):
+        words = query.lower().split()
+        return [sum(w in text.lower() for w in words) / len(words) for text in texts]
+
+
+class PooledKeywordReranker(PooledCrossEncoderReranker):
+    model_class = KeywordReranker
+
+
+class TestProcessPoolEmbeddings(unittest.IsolatedAsyncioTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.embeddings = ProcessPoolEmbeddings(PidEmbeddings, workers=2, batch_window_ms=50, max_batch_size=8)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.embeddings.close()
+
+    async def test_concurrent_queries_are_batched_in_worker_process(self):
+        """Тест: одновременные запросы уходят в воркер одной пачкой, считаются не в нашем процессе."""
+        await self.embeddings.aembed_query("прогрев")
+        batches_before = self.embeddings.batches
+
+        vectors = await asyncio.gather(*(self.embeddings.aembed_query("а" * i) for i in range(1, 6)))
+
+        self.assertEqual(self.embeddings.batches - batches_before, 1)
+        self.assertEqual([v[0] for v in vectors], [1.0, 2.0, 3.0, 4.0, 5.0])
+        self.assertNotEqual(vectors[0][1], float(os.getpid()))
+
+    async def test_large_batch_is_split_across_workers(self):
+        """Тест: батч индексации больше max_batch_size режется на части, порядок векторов сохраняется."""
+        texts = ["б" * i for i in range(1, 21)]
+        batches_before = self.embeddings.batches
+
+        vectors = await asyncio.to_thread(self.embeddings.embed_documents, texts)
+
+        self.assertEqual([v[0] for v in vectors], [float(len(t)) for t in texts])
+        self.assertGreaterEqual(self.embeddings.batches - batches_before, 3)
+
+    async def test_worker_errors_reach_the_caller(self):
+        with self.assertRaises(ValueError):
+            await self.embeddings.aembed_documents(["сломай"])
+
+
+class TestPooledReranker(unittest.TestCase):
+
+    def test_scores_computed_in_pool(self):
+        """Тест: реранкер в пуле процессов дает те же оценки, что и в процессе, и кэширует их у себя."""
+        reranker = PooledKeywordReranker("fake-model", workers=2, batch_size=2)
+        self.addCleanup(reranker.pool.shutdown)
+        chunks = [RetrievedChunk(content=t, metadata={"chunk_id": str(i)}) for i, t in enumerate(["подключить пульт", "доставка", "пульт", "оплата"])]
+
+        scores = reranker.score("подключить пульт", chunks)
+
+        self.assertEqual(scores, [1.0, 0.0, 0.5, 0.0])
+        self.assertEqual(reranker.uncached_count("подключить пульт", chunks), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+from qdrant_client import QdrantClient
+
+from app.adapters.retriever.qdrant_adapter import QdrantRetrieverAdapter
+
+from fakes import LengthEmbeddings
+
+KB = """#### Как подключить пульт?
+Ответ: зажмите OK на 5 секунд.
+
+#### Нужен ли интернет?
+Ответ: да, для онлайн-каналов.
+"""
+
+
+class TestLazyStartup(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.NamedTemporaryFile("w", suffix=".md", delete=False, encoding="utf-8")
+        tmp.write(KB)
+        tmp.close()
+        self.addCleanup(os.remove, tmp.name)
+        self.kb_path = tmp.name
+
+    def make_adapter(self, collection):
+        with patch.dict(os.environ, {"QDRANT_URL": "http://127.0.0.1:1"}):
+            adapter = QdrantRetrieverAdapter(collection_name=collection, knowledge_base_path=self.kb_path)
+        adapter.client = QdrantClient(":memory:")
+        adapter._embeddings = LengthEmbeddings()
+        return adapter
+
+    def test_constructor_does_not_touch_network(self):
+        """Тест: конструктор не подключается к Qdrant и не создает эмбеддинги."""
+        start = time.perf_counter()
+        with patch.dict(os.environ, {"QDRANT_URL": "http://127.0.0.1:1"}):
+            adapter = QdrantRetrieverAdapter(collection_name="kb", knowledge_base_path=self.kb_path)
+        self.assertLess(time.perf_counter() - start, 1.0)
+        self.assertFalse(adapter.is_ready)
+        self.assertIsNone(adapter._embeddings)
+
+    def test_missing_collection_is_built_in_background(self):
+        """Тест: если коллекции нет, первый запрос не ждет сборку, а коллекция собирается в фоне."""
+        adapter = self.make_adapter("kb_lazy")
+        self.assertEqual(adapter.retrieve("пульт"), [])
+        self.assertTrue(adapter.status()["building"] or adapter.is_ready)
+
+        adapter._build_thread.join(timeout=10)
+        self.assertTrue(adapter.is_ready)
+        self.assertEqual(len(adapter.retrieve("пульт", k=2)), 2)
+
+    def test_existing_collection_is_bound_on_first_query(self):
+        """Тест: существующая коллекция привязывается при первом запросе без пересборки."""
+        builder = self.make_adapter("kb_existing")
+        builder._build_first_version()
+
+        adapter = self.make_adapter("kb_existing")
+        adapter.client = builder.client
+        self.assertEqual(len(adapter.retrieve("интернет", k=1)), 1)
+        self.assertIsNone(adapter._build_thread)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+from unittest.mock import MagicMock
+
+from app.core.models.chunk import RetrievedChunk
+from app.adapters.retriever.reranker import CrossEncoderReranker, RerankingRetriever, with_reranking
+
+
+class KeywordReranker(CrossEncoderReranker):
+    """Кросс-энкодер без модели: релевантность = доля слов запроса в тексте чанка."""
+    def _load(self, num_threads):
+        self.predicted = 0
+
+    def _predict(self, query, texts):
+        self.predicted += len(texts)
+        words = query.lower().split()
+        return [sum(w in text.lower() for w in words) / len(words) for text in texts]
+
+
+def make_chunks():
+    texts = [
+        "Оплата картой на сайте",
+        "Как подключить пульт: зажмите OK",
+        "Пульт не работает — замените батарейки",
+        "Доставка по России",
+        "Гарантия 12 месяцев",
+    ]
+    return [RetrievedChunk(content=t, score=0.5, metadata={"chunk_id": f"id{i}"}) for i, t in enumerate(texts)]
+
+
+class TestReranking(unittest.TestCase):
+
+    def setUp(self):
+        self.base = MagicMock()
+        self.base.retrieve.return_value = make_chunks()
+        self.reranker = KeywordReranker("fake-model", batch_size=2)
+        self.retriever = RerankingRetriever(self.base, self.reranker, candidates=30, top_n=4, min_top_n=2, threshold=0.5)
+
+    def test_keeps_only_relevant_chunks(self):
+        """Тест: после реранкинга остаются лучшие чанки выше порога, но не меньше min_top_n."""
+        chunks = self.retriever.retrieve("подключить пульт", k=6)
+
+        self.base.retrieve.assert_called_once_with("подключить пульт", k=30)
+        self.assertEqual([c.metadata["chunk_id"] for c in chunks], ["id1", "id2"])
+        self.assertEqual(chunks[0].score, 1.0)
+        self.assertEqual(chunks[0].metadata["retrieval_score"], 0.5)
+
+    def test_scores_are_cached(self):
+        """Тест: повторный запрос берет оценки пар (query, chunk_id) из кэша."""
+        self.retriever.retrieve("подключить пульт")
+        self.retriever.retrieve("подключить пульт")
+        self.assertEqual(self.reranker.predicted, 5)
+
+    def test_skips_rerank_when_budget_is_tight(self):
+        """Тест: если оценка времени реранкинга не влезает в бюджет, отдаем кандидатов как есть."""
+        self.reranker.ms_per_pair = 100.0
+        chunks = self.retriever.retrieve("подключить пульт", k=3)
+
+        self.assertEqual(self.reranker.predicted, 0)
+        self.assertEqual([c.metadata["chunk_id"] for c in chunks], ["id0", "id1", "id2"])
+
+    def test_disabled_by_tenant_config(self):
+        """Тест: без ключа rerank в конфиге ретривер не оборачивается."""
+        self.assertIs(with_reranking(self.base, None), self.base)
+        self.assertIs(with_reranking(self.base, {"enabled": False}), self.base)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+from qdrant_client import QdrantClient
+
+from app.core.models.chunk import RetrievedChunk
+from app.adapters.retriever.cache import CachedRetriever, KnowledgeBaseVersions, RetrievalCache, get_kb_versions, normalize_query
+from app.adapters.retriever.kb_indexer import QdrantKnowledgeIndexer
+from app.adapters.retriever.score_gate import ScoreGate, ScoreGatedRetriever
+
+from fakes import LengthEmbeddings
+
+
+class FakeRedis:
+    """Минимальный Redis в памяти: get/set/setex."""
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value):
+        self.data[key] = value
+
+    def setex(self, key, ttl, value):
+        self.data[key] = value
+
+
+class TestRetrievalCache(unittest.TestCase):
+
+    def setUp(self):
+        self.base = MagicMock()
+        self.base.retrieve.return_value = [RetrievedChunk(content="Зажмите OK", score=0.9, metadata={"chunk_id": "a"})]
+        self.version = "v1"
+        self.retriever = CachedRetriever(self.base, "kb", RetrievalCache(max_size=10), version_provider=lambda: self.version)
+
+    def test_normalized_queries_share_entry(self):
+        """Тест: запросы, отличающиеся регистром, пунктуацией и пробелами, попадают в кэш."""
+        self.assertEqual(normalize_query("  Не включается   приставка?! "), "не включается приставка")
+        self.retriever.retrieve("Как подключить пульт?")
+        chunks = self.retriever.retrieve("как  подключить ПУЛЬТ")
+
+        self.assertEqual(self.base.retrieve.call_count, 1)
+        self.assertEqual(chunks[0].content, "Зажмите OK")
+
+    def test_new_kb_version_invalidates(self):
+        """Тест: смена версии базы знаний дает промах кэша."""
+        self.retriever.retrieve("пульт")
+        self.version = "v2"
+        self.retriever.retrieve("пульт")
+        self.assertEqual(self.base.retrieve.call_count, 2)
+
+    def test_unknown_version_bypasses_cache(self):
+        """Тест: пока версия неизвестна, кэш не используется."""
+        self.version = None
+        self.retriever.retrieve("пульт")
+        self.retriever.retrieve("пульт")
+        self.assertEqual(self.base.retrieve.call_count, 2)
+
+    def test_redis_tier_shared_between_processes(self):
+        """Тест: второй процесс (свой LRU) берет результат из общего Redis."""
+        redis = FakeRedis()
+        first = CachedRetriever(self.base, "kb", RetrievalCache(redis_client=redis), version_provider=lambda: "v1")
+        second = CachedRetriever(self.base, "kb", RetrievalCache(redis_client=redis), version_provider=lambda: "v1")
+        first.retrieve("пульт")
+        chunks = second.retrieve("пульт")
+
+        self.assertEqual(self.base.retrieve.call_count, 1)
+        self.assertEqual(chunks[0].metadata["chunk_id"], "a")
+
+    def test_hit_returns_copy(self):
+        """Тест: изменение списка, полученного из кэша, не портит закэшированное значение."""
+        first = self.retriever.retrieve("пульт")
+        first.clear()
+        second = self.retriever.retrieve("пульт")
+        second.append(RetrievedChunk(content="лишний", score=0.1, metadata={}))
+
+        self.assertEqual(self.base.retrieve.call_count, 1)
+        self.assertEqual([c.content for c in self.retriever.retrieve("пульт")], ["Зажмите OK"])
+
+    def test_chain_follows_decorator_base(self):
+        """Тест: ключ кэша включает все слои-декораторы, а не атрибуты base произвольных объектов."""
+        gated = ScoreGatedRetriever(self.base, ScoreGate())
+        retriever = CachedRetriever(gated, "kb", RetrievalCache(), version_provider=lambda: "v1")
+        self.assertEqual(retriever.chain, "ScoreGatedRetriever+MagicMock")
+
+    def test_versions_are_shared_through_redis(self):
+        """Тест: версия, записанная пересборкой в одном процессе, видна в другом."""
+        redis = FakeRedis()
+        KnowledgeBaseVersions(redis_client=redis).record("kb", "abc")
+        self.assertEqual(KnowledgeBaseVersions(redis_client=redis).get("kb"), "abc")
+
+    def test_rebuild_records_new_version(self):
+        """Тест: инкрементальная синхронизация меняет версию, если поменялась база знаний."""
+        tmp = tempfile.NamedTemporaryFile("w", suffix=".md", delete=False, encoding="utf-8")
+        tmp.write("#### Как подключить пульт?\nОтвет: зажмите OK.\n")
+        tmp.close()
+        self.addCleanup(os.remove, tmp.name)
+
+        indexer = QdrantKnowledgeIndexer(QdrantClient(":memory:"), "kb_cache_test", LengthEmbeddings())
+        indexer.sync(tmp.name)
+        before = get_kb_versions().get("kb_cache_test")
+
+        with open(tmp.name, "a", encoding="utf-8") as f:
+            f.write("\n#### Нужен ли интернет?\nОтвет: да.\n")
+        indexer.sync(tmp.name)
+
+        self.assertIsNotNone(before)
+        self.assertNotEqual(get_kb_versions().get("kb_cache_test"), before)
+
+
+if __name__ == '__main__':
+    unittest.main()
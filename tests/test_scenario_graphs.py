@@ -0,0 +1,99 @@
+import asyncio
+import time
+import unittest
+
+from langchain_core.messages import HumanMessage
+
+from app.core.models.chunk import RetrievedChunk
+from app.core.models.conversation import bot_turn, client_turn
+from app.core.ports.llm import LLMClient
+from app.core.ports.retriever import KnowledgeRetriever
+from app.core.scenarios.universal_graph import UniversalScenarioGraph
+from app.utils.metrics import get_metrics
+
+DELAY = 0.2
+
+
+class SlowLLM(LLMClient):
+    """LLM с задержкой: маршрутизатору отвечает интентом, агенту — текстом с контекстом из промпта."""
+    def __init__(self, intent="sales"):
+        self.intent = intent
+
+    async def generate(self, prompt):
+        await asyncio.sleep(DELAY)
+        if isinstance(prompt, str):
+            return self.intent
+        return f"ответ ({len(prompt)} сообщений)"
+
+
+class RecordingLLM(SlowLLM):
+    """Запоминает системные промпты агентов."""
+    def __init__(self, intent="sales"):
+        super().__init__(intent)
+        self.system_prompts = []
+
+    async def generate(self, prompt):
+        if not isinstance(prompt, str):
+            self.system_prompts.append(prompt[0].content)
+        return await super().generate(prompt)
+
+
+class SlowRetriever(KnowledgeRetriever):
+    def retrieve(self, query, k=6):
+        time.sleep(DELAY)
+        return [RetrievedChunk(content=f"контекст для {query}", score=0.9)]
+
+
+class TestParallelRouterAndRetrieval(unittest.IsolatedAsyncioTestCase):
+
+    async def test_router_and_retrieval_run_concurrently(self):
+        """Тест: router и retrieve_context стартуют вместе — ход стоит ~2 задержки, а не 3."""
+        graph = UniversalScenarioGraph(SlowLLM(), SlowRetriever(), {"name": "test", "prompts": {}})
+
+        started = time.perf_counter()
+        answer = await graph.execute("сколько стоит?", history=[client_turn("привет"), bot_turn("здравствуйте")])
+        elapsed = time.perf_counter() - started
+
+        self.assertTrue(answer.startswith("ответ"))
+        self.assertLess(elapsed, 2.8 * DELAY)
+
+    async def test_agent_sees_both_intent_and_context(self):
+        """Тест: агент выбирается по интенту и получает найденный контекст."""
+        graph = UniversalScenarioGraph(SlowLLM(intent="support"), SlowRetriever(), {"name": "test", "prompts": {}})
+        state = await graph.graph.ainvoke({"messages": [HumanMessage(content="не входит")], "intent": "", "context": ""}, context=graph.bot)
+
+        self.assertEqual(state["intent"], "support")
+        self.assertEqual(state["context"], "контекст для не входит")
+
+    async def test_node_timings_are_recorded(self):
+        graph = UniversalScenarioGraph(SlowLLM(), SlowRetriever(), {"name": "test", "prompts": {}})
+        await graph.execute("вопрос")
+
+        nodes = {s["labels"]["node"] for s in get_metrics().snapshot()["graph_node_seconds"] if s["labels"]["graph"] == "UniversalGraph"}
+        self.assertTrue({"router", "retrieve_context", "sales_agent"} <= nodes)
+
+
+
+class TestSharedGraph(unittest.IsolatedAsyncioTestCase):
+
+    async def test_bots_share_one_compiled_graph(self):
+        """Тест: граф компилируется один раз, боты различаются только конфигом при вызове."""
+        sales_llm, support_llm = RecordingLLM(intent="sales"), RecordingLLM(intent="support")
+        sales_bot = UniversalScenarioGraph(sales_llm, SlowRetriever(), {"name": "a", "prompts": {"sales": "ПРОДАЖИ {context}"}})
+        support_bot = UniversalScenarioGraph(support_llm, SlowRetriever(), {"name": "b", "prompts": {"support": "ПОДДЕРЖКА {context}"}})
+        self.assertIs(sales_bot.graph, support_bot.graph)
+
+        await asyncio.gather(sales_bot.execute("вопрос"), support_bot.execute("вопрос"))
+        self.assertEqual(sales_llm.system_prompts, ["ПРОДАЖИ контекст для вопрос"])
+        self.assertEqual(support_llm.system_prompts, ["ПОДДЕРЖКА контекст для вопрос"])
+
+    async def test_router_model_role(self):
+        """Тест: маршрутизатор вызывает свою модель, агент — свою."""
+        agent, router = SlowLLM(intent="unknown"), SlowLLM(intent="sales")
+        graph = UniversalScenarioGraph(agent, SlowRetriever(), {"name": "test", "prompts": {}}, router_llm=router)
+        state = await graph.graph.ainvoke({"messages": [HumanMessage(content="цена?")], "intent": "", "context": ""}, context=graph.bot)
+        self.assertEqual(state["intent"], "sales")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import os
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.core.models.chunk import RetrievedChunk
+from app.core.ports.llm import LLMClient
+from app.core.ports.retriever import KnowledgeRetriever
+from app.core.use_cases.answer_question import AnswerQuestionUseCase
+from app.adapters.embeddings.factory import calibrate_score, score_calibration
+from app.adapters.retriever.reranker import RerankingRetriever
+from app.adapters.retriever.score_gate import ScoreGate, ScoreGatedRetriever, resolve_score_gate
+from app.utils.metrics import get_metrics
+
+from test_reranker import KeywordReranker, make_chunks
+
+
+def chunk(score, content="Ответ: зажмите OK."):
+    return RetrievedChunk(content=content, score=score, metadata={})
+
+
+class TestScoreGate(unittest.TestCase):
+
+    def test_calibration_maps_model_range_to_unit_interval(self):
+        """Тест: косинус переводится в 0..1 по диапазону модели и обрезается по краям."""
+        calibration = score_calibration("text-embedding-3-small")
+        self.assertEqual(calibrate_score(0.05, calibration), 0.0)
+        self.assertAlmostEqual(calibrate_score(0.35, calibration), 0.5)
+        self.assertEqual(calibrate_score(0.9, calibration), 1.0)
+
+    def test_weak_matches_return_nothing(self):
+        """Тест: если даже лучший чанк ниже порога — сигнал 'нет уверенного совпадения' (пустой список)."""
+        self.assertEqual(ScoreGate(min_score=0.4).apply([chunk(0.3), chunk(0.2)]), [])
+
+    def test_drops_chunks_far_below_top(self):
+        """Тест: чанки сильно хуже лучшего отбрасываются, порядок остальных сохраняется."""
+        chunks = [chunk(0.7, "a"), chunk(0.9, "b"), chunk(0.5, "c"), chunk(0.8, "d")]
+        kept = ScoreGate(min_score=0.3, max_drop=0.25).apply(chunks)
+        self.assertEqual([c.content for c in kept], ["a", "b", "d"])
+
+    def test_token_budget_keeps_at_least_one_chunk(self):
+        """Тест: бюджет токенов обрезает контекст, но первый уверенный чанк остается всегда."""
+        long_text = "слово " * 400
+        kept = ScoreGate(min_score=0.1, max_context_tokens=50).apply([chunk(0.9, long_text), chunk(0.9, long_text)])
+        self.assertEqual(len(kept), 1)
+
+    def test_resolve_from_tenant_config(self):
+        self.assertIsNone(resolve_score_gate(False))
+        self.assertEqual(resolve_score_gate({"min_score": 0.5}).min_score, 0.5)
+
+    def test_opt_in_per_tenant(self):
+        """Тест: без ключа score_gate в конфиге тенанта гейт выключен."""
+        with patch.dict("os.environ", {}, clear=False):
+            os.environ.pop("SCORE_GATE_ENABLED", None)
+            self.assertIsNone(resolve_score_gate(None))
+
+    def test_reranked_results_keep_reranker_selection(self):
+        """Тест: после реранкера би-энкодерные пороги не применяются, min_top_n чанков доходят до промпта."""
+        base = MagicMock()
+        base.retrieve.return_value = make_chunks()
+        reranking = RerankingRetriever(base, KeywordReranker("fake-model"), top_n=4, min_top_n=2, threshold=0.5)
+        retriever = ScoreGatedRetriever(reranking, ScoreGate(), collection="kb_gate_rerank")
+
+        # Кросс-энкодер: 1.0 и 0.5 — по порогам би-энкодера второй отбросился бы по max_drop
+        chunks = retriever.retrieve("подключить пульт", k=6)
+        self.assertEqual(len(chunks), 2)
+        self.assertIn("подключить пульт", chunks[0].content.lower())
+
+    def test_reranked_results_with_own_thresholds(self):
+        """Тест: отдельные пороги для оценок кросс-энкодера задаются в конфиге тенанта."""
+        reranked = [RetrievedChunk(content="a", score=0.9, metadata={"retrieval_score": 0.4}), RetrievedChunk(content="b", score=0.1, metadata={"retrieval_score": 0.8})]
+        self.assertEqual(len(ScoreGate().apply(reranked)), 2)
+        self.assertEqual([c.content for c in ScoreGate(rerank_min_score=0.2).apply(reranked)], ["a"])
+
+    def test_gated_retriever_records_context_size(self):
+        """Тест: декоратор пишет размер контекста в метрики."""
+        base = MagicMock()
+        base.retrieve.return_value = [chunk(0.9), chunk(0.1)]
+        retriever = ScoreGatedRetriever(base, ScoreGate(), collection="kb_gate")
+
+        self.assertEqual(len(retriever.retrieve("пульт")), 1)
+        series = [s for s in get_metrics().snapshot()["retrieval_context_chunks"] if s["labels"]["collection"] == "kb_gate"]
+        self.assertEqual(series[0]["sum"], 1)
+
+
+class TestNoConfidentMatchPrompt(unittest.IsolatedAsyncioTestCase):
+
+    async def test_short_prompt_without_confident_match(self):
+        """Тест: без уверенного совпадения в промпт идет только хвост истории."""
+        mock_llm = AsyncMock(spec=LLMClient)
+        mock_llm.generate.return_value = "переписанный_запрос"
+        mock_retriever = MagicMock(spec=KnowledgeRetriever)
+        mock_retriever.aretrieve.return_value = []
+
+        history = [f"Клиент: сообщение {i}" for i in range(10)]
+        await AnswerQuestionUseCase(llm=mock_llm, retriever=mock_retriever).execute(user_id="1", question="привет", history=history)
+
+        answer_prompt = mock_llm.generate.call_args_list[-1][0][0]
+        self.assertIn("сообщение 9", answer_prompt)
+        self.assertNotIn("сообщение 5", answer_prompt)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+import asyncio
+import time
+import unittest
+
+from app.adapters.conversation.memory_store import MemoryConversationStore
+from app.adapters.openai_assistants.thread_pool import AssistantsThreadPool
+from app.core.models.conversation import bot_turn
+
+DELAY = 0.1
+
+
+class FakeAssistants:
+    """threads.create с задержкой сети; запоминает созданные и удаленные треды."""
+    def __init__(self):
+        self.created = 0
+        self.deleted = []
+
+    async def create_thread(self):
+        await asyncio.sleep(DELAY)
+        self.created += 1
+        return f"thread_{self.created}"
+
+    async def delete_thread(self, thread_id):
+        self.deleted.append(thread_id)
+
+
+class FakeAsyncRedis:
+    """Sorted set в памяти с интерфейсом redis.asyncio (zadd/zrangebyscore/zrem)."""
+    def __init__(self):
+        self.zsets = {}
+
+    async def zadd(self, key, mapping):
+        self.zsets.setdefault(key, {}).update(mapping)
+
+    async def zrangebyscore(self, key, low, high, start=0, num=None):
+        items = sorted((score, member) for member, score in self.zsets.get(key, {}).items() if score <= high)
+        members = [member for _, member in items]
+        return members[start:start + num] if num is not None else members[start:]
+
+    async def zrem(self, key, member):
+        return 1 if self.zsets.get(key, {}).pop(member, None) is not None else 0
+
+
+class TestAssistantsThreadPool(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.assistants = FakeAssistants()
+        self.conversations = MemoryConversationStore()
+        self.pool = AssistantsThreadPool(self.assistants, self.conversations, size=2, lease_seconds=60)
+
+    async def test_acquire_from_warm_pool_skips_round_trip(self):
+        """Тест: тред из пула выдается без обращения к OpenAI, пул добирается в фоне."""
+        worker = asyncio.create_task(self.pool.start())
+        await asyncio.sleep(3 * DELAY)
+        self.assertEqual(self.pool.idle, 2)
+
+        started = time.perf_counter()
+        thread_id = await self.pool.acquire("session:asst_1:s1")
+        self.assertLess(time.perf_counter() - started, DELAY / 2)
+        self.assertEqual(thread_id, "thread_2")
+
+        await asyncio.sleep(2 * DELAY)
+        self.assertEqual(self.pool.idle, 2)
+        self.assertEqual(self.assistants.created, 3)
+
+        await self.pool.close()
+        await worker
+        self.assertEqual(sorted(self.assistants.deleted), ["thread_1", "thread_3"])
+
+    async def test_refill_is_concurrent_and_capped(self):
+        """Тест: пул добирается параллельно, не больше refill_concurrency threads.create одновременно."""
+        active = max_active = 0
+        create_thread = self.assistants.create_thread
+
+        async def counting_create():
+            nonlocal active, max_active
+            active += 1
+            max_active = max(max_active, active)
+            try:
+                return await create_thread()
+            finally:
+                active -= 1
+
+        self.assistants.create_thread = counting_create
+        pool = AssistantsThreadPool(self.assistants, self.conversations, size=6, refill_concurrency=3)
+        pool.is_running = True
+
+        started = time.perf_counter()
+        await pool.refill()
+
+        self.assertEqual(pool.idle, 6)
+        self.assertEqual(max_active, 3)
+        self.assertLess(time.perf_counter() - started, 3 * DELAY)
+
+    async def test_idle_threads_of_crashed_process_are_reclaimed(self):
+        """Тест: невыданные треды упавшей реплики удаляет проход другой, а живой реплики — нет."""
+        redis = FakeAsyncRedis()
+        crashed = AssistantsThreadPool(self.assistants, self.conversations, redis, size=2, lease_seconds=60)
+        alive = AssistantsThreadPool(self.assistants, self.conversations, redis, size=1, lease_seconds=60)
+        for pool in (crashed, alive):
+            pool.is_running = True
+            await pool.refill()
+        leased = await alive.acquire("session:asst_1:s1")
+        await self.conversations.save("session:asst_1:s1", [bot_turn("привет")], state={"thread_id": leased})
+        await alive.refill()
+
+        # Живая реплика продлевает свои невыданные треды на каждом проходе
+        now = time.time()
+        await alive.sweep(now=now + 50)
+        self.assertEqual(await alive.sweep(now=now + 61), 2)
+        self.assertEqual(sorted(self.assistants.deleted), sorted(crashed._idle))
+        self.assertEqual(alive.idle, 1)
+
+    async def test_worker_starts_once(self):
+        """Тест: повторный ensure_started не запускает второй воркер."""
+        self.pool.ensure_started()
+        task = self.pool._task
+        self.pool.ensure_started()
+        self.assertIs(self.pool._task, task)
+        await self.pool.close()
+        await task
+
+    async def test_empty_pool_creates_thread(self):
+        thread_id = await self.pool.acquire("session:asst_1:s1")
+        self.assertEqual(thread_id, "thread_1")
+        self.assertEqual((self.pool.hits, self.pool.misses), (0, 1))
+
+    async def test_sweep_reclaims_abandoned_threads(self):
+        """Тест: после истечения аренды тред живой сессии остается, брошенный — удаляется."""
+        alive = await self.pool.acquire("session:asst_1:alive")
+        abandoned = await self.pool.acquire("session:asst_1:gone")
+        await self.conversations.save("session:asst_1:alive", [bot_turn("привет")], state={"thread_id": alive})
+
+        self.assertEqual(await self.pool.sweep(now=time.time()), 0)
+        self.assertEqual(await self.pool.sweep(now=time.time() + 61), 1)
+        self.assertEqual(self.assistants.deleted, [abandoned])
+
+        # Аренда живой сессии продлена: пока она не истекла, тред не трогаем
+        await self.conversations.clear("session:asst_1:alive")
+        self.assertEqual(await self.pool.sweep(now=time.time() + 62), 0)
+        self.assertEqual(await self.pool.sweep(now=time.time() + 122), 1)
+        self.assertEqual(self.assistants.deleted, [abandoned, alive])
+
+
+if __name__ == '__main__':
+    unittest.main()
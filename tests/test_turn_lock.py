@@ -0,0 +1,138 @@
+import asyncio
+import gc
+import os
+import unittest
+
+from app.adapters.conversation.turn_lock import SessionBusyError, SessionTurnGuard
+
+DELAY = 0.1
+
+
+class RecordingTurn:
+    """Ход с задержкой LLM: считает вызовы и максимум одновременных ходов."""
+    def __init__(self):
+        self.calls = 0
+        self.active = 0
+        self.max_active = 0
+
+    async def __call__(self, reply="ответ"):
+        self.calls += 1
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(DELAY)
+        self.active -= 1
+        return f"{reply} {self.calls}"
+
+
+class GuardContract:
+    """Общие проверки (make_guard задают наследники)."""
+
+    async def test_turns_of_one_session_are_serialized(self):
+        guard, turn = self.make_guard(), RecordingTurn()
+        await asyncio.gather(*(guard.run("session:1", None, turn) for _ in range(3)))
+        self.assertEqual(turn.calls, 3)
+        self.assertEqual(turn.max_active, 1)
+
+    async def test_sessions_do_not_wait_for_each_other(self):
+        guard, turn = self.make_guard(), RecordingTurn()
+        await asyncio.gather(*(guard.run(f"session:{i}", None, turn) for i in range(3)))
+        self.assertEqual(turn.max_active, 3)
+
+    async def test_duplicate_message_joins_running_turn(self):
+        """Тест: двойной клик с тем же client_message_id — один вызов LLM, один ответ на оба запроса."""
+        guard, turn = self.make_guard(), RecordingTurn()
+        first, second = await asyncio.gather(
+            guard.run("session:1", "m1", turn),
+            guard.run("session:1", "m1", turn),
+        )
+        self.assertEqual((first, second), ("ответ 1", "ответ 1"))
+        self.assertEqual((turn.calls, guard.coalesced), (1, 1))
+
+        # Новое сообщение после завершенного хода — новый ход
+        self.assertEqual(await guard.run("session:1", "m2", turn), "ответ 2")
+
+    async def test_cancelled_request_does_not_cancel_turn_for_duplicate(self):
+        guard, turn = self.make_guard(), RecordingTurn()
+        first = asyncio.create_task(guard.run("session:1", "m1", turn))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(guard.run("session:1", "m1", turn))
+        await asyncio.sleep(DELAY / 2)
+        first.cancel()
+        self.assertEqual(await second, "ответ 1")
+
+
+class TestLocalGuard(GuardContract, unittest.IsolatedAsyncioTestCase):
+
+    def make_guard(self):
+        return SessionTurnGuard()
+
+    async def test_locks_are_released(self):
+        guard = SessionTurnGuard()
+        await guard.run("session:1", None, RecordingTurn())
+        self.assertEqual(guard._locks, {})
+
+    async def test_hung_turn_does_not_block_session_forever(self):
+        """Тест: ожидание локальной блокировки ограничено wait_seconds, как и в Redis."""
+        guard = SessionTurnGuard(wait_seconds=DELAY / 2)
+        async with guard.lock("session:1"):
+            with self.assertRaises(SessionBusyError):
+                await guard.run("session:1", None, RecordingTurn())
+        self.assertEqual(await guard.run("session:1", None, RecordingTurn()), "ответ 1")
+        self.assertEqual(guard._locks, {})
+
+    async def test_failed_turn_without_waiters_is_retrieved(self):
+        """Тест: ошибка хода, который уже никто не ждет, не дает 'Task exception was never retrieved'."""
+        errors = []
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: errors.append(context))
+        guard = SessionTurnGuard()
+
+        async def failing_turn():
+            await asyncio.sleep(DELAY / 2)
+            raise RuntimeError("LLM недоступна")
+
+        request = asyncio.create_task(guard.run("session:1", "m1", failing_turn))
+        await asyncio.sleep(0.01)
+        request.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await request
+        await asyncio.sleep(DELAY)
+        gc.collect()
+        self.assertEqual(errors, [])
+
+
+class TestRedisGuard(GuardContract, unittest.IsolatedAsyncioTestCase):
+    """Нужен живой Redis (REDIS_URL), иначе тесты пропускаются."""
+
+    async def asyncSetUp(self):
+        url = os.getenv("REDIS_URL")
+        if not url:
+            self.skipTest("REDIS_URL не задан")
+        import redis.asyncio as redis
+        self.redis = redis.from_url(url, decode_responses=True)
+        try:
+            await self.redis.ping()
+        except Exception as e:
+            self.skipTest(f"Redis недоступен: {e}")
+
+    async def asyncTearDown(self):
+        await self.redis.aclose()
+
+    def make_guard(self):
+        return SessionTurnGuard(self.redis, lock_seconds=5, wait_seconds=5)
+
+    async def test_replicas_are_serialized(self):
+        """Тест: две «реплики» (разные guard) не выполняют ходы одной сессии одновременно."""
+        turn = RecordingTurn()
+        await asyncio.gather(self.make_guard().run("session:1", None, turn), self.make_guard().run("session:1", None, turn))
+        self.assertEqual(turn.max_active, 1)
+
+    async def test_busy_session(self):
+        holder = self.make_guard()
+        waiter = SessionTurnGuard(self.redis, lock_seconds=5, wait_seconds=DELAY / 2)
+        async with holder.lock("session:busy"):
+            with self.assertRaises(SessionBusyError):
+                await waiter.run("session:busy", None, RecordingTurn())
+
+
+if __name__ == '__main__':
+    unittest.main()
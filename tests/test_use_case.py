@@ -13,7 +13,7 @@ class TestAnswerQuestionUseCase(unittest.IsolatedAsyncioTestCase):
         mock_llm.generate.return_value = "переписанный_запрос"
         
         mock_retriever = MagicMock(spec=KnowledgeRetriever)
-        mock_retriever.retrieve.return_value = []
+        mock_retriever.aretrieve.return_value = []
         
         use_case = AnswerQuestionUseCase(llm=mock_llm, retriever=mock_retriever)
         